@@ -0,0 +1,660 @@
+#!/usr/bin/env python3
+"""
+bench.py - Micro-benchmarks du kit d'indexation
+Usage: python bench.py <benchmark> [options]
+
+Exemples:
+    python bench.py textnorm
+    python bench.py textnorm --iterations 20000
+    python bench.py dates
+    python bench.py startup
+    python bench.py vault --iterations 20000
+    python bench.py html --db vpo_affaire.db
+    python bench.py hybrid
+    python bench.py hybrid --db vpo_affaire.db --qrels pertinence.json
+    python bench.py passages
+    python bench.py facets
+    python bench.py timeline
+    python bench.py shards
+    python bench.py quality
+"""
+
+import argparse
+import json
+import math
+import random
+import re
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+from pathlib import Path
+from html.parser import HTMLParser
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+import init_db
+import query_db
+from vpokit import (dates, facets, fusion, htmltext, ocrquality, participants, passages, querylang, shards,
+                    textnorm, timeline, vectors)
+from vpokit.packvault import PackVault
+from vpokit.vault import Vault, read_blob
+
+def _report(label: str, func: Callable[[], object], iterations: int) -> float:
+    """Chronomètre func (meilleur de 3 séries) et affiche le coût par appel."""
+    best = min(timeit.repeat(func, number=iterations, repeat=3))
+    per_call = best / iterations * 1e6
+    print(f"  {label:<28} {per_call:10.2f} µs/appel")
+    return per_call
+
+def _sample_email(rng: random.Random) -> str:
+    """Génère un corps d'email réaliste (CRLF, tabulations, lignes vides)."""
+    words = ("pension alimentaire tribunal avocat expertise audience jugement "
+             "contribution entretien enfant garde recours délai").split()
+    lines = []
+    for _ in range(60):
+        line = " ".join(rng.choice(words) for _ in range(rng.randint(3, 14)))
+        if rng.random() < 0.2:
+            line = "\t" + line + "   "
+        lines.append(line)
+        if rng.random() < 0.1:
+            lines.extend(["", "", ""])
+    return "\r\n".join(lines)
+
+# Implémentation historique de ingest_msg.clean_text / extract_email_address
+def _legacy_clean_text(text: Optional[str]) -> Optional[str]:
+    if not text:
+        return None
+    text = re.sub(r'\r\n', '\n', text)
+    text = re.sub(r'[ \t]+', ' ', text)
+    text = re.sub(r'\n{3,}', '\n\n', text)
+    return text.strip()
+
+def _legacy_extract_email_address(sender: str) -> Optional[str]:
+    if not sender:
+        return None
+    match = re.search(r'[\w\.-]+@[\w\.-]+\.\w+', sender)
+    return match.group(0).lower() if match else None
+
+def bench_textnorm(args: argparse.Namespace) -> None:
+    """Normalisation de texte: historique vs textnorm."""
+    rng = random.Random(42)
+    bodies = [_sample_email(rng) for _ in range(50)]
+    clean = textnorm.normalize_text(bodies[0])
+    senders = [f"Me Avocat {i % 40} <avocat{i % 40}@etude-{i % 7}.ch>" for i in range(200)]
+
+    for body in bodies:
+        assert textnorm.normalize_text(body) == _legacy_clean_text(body)
+
+    n = args.iterations
+    it = iter(range(10**12))
+    print(f"Corps d'email ({len(bodies[0])} caractères):")
+    _report("clean_text (historique)", lambda: _legacy_clean_text(bodies[next(it) % 50]), n)
+    _report("normalize_text", lambda: textnorm.normalize_text(bodies[next(it) % 50]), n)
+    print("Texte déjà propre:")
+    _report("clean_text (historique)", lambda: _legacy_clean_text(clean), n)
+    _report("normalize_text", lambda: textnorm.normalize_text(clean), n)
+    print("Adresse expéditeur:")
+    _report("extract_email (historique)",
+            lambda: _legacy_extract_email_address(senders[next(it) % 200]), n)
+    _report("extract_email_address",
+            lambda: textnorm.extract_email_address(senders[next(it) % 200]), n)
+
+def bench_dates(args: argparse.Namespace) -> None:
+    """Dates d'en-têtes: dateutil vs dates.parse_date (cache froid et chaud)."""
+    rng = random.Random(42)
+    months = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+    raws = [
+        f"Mon, {rng.randint(1, 28)} {rng.choice(months)} {rng.randint(2015, 2024)} "
+        f"{rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}:{rng.randint(0, 59):02d} +0100"
+        for _ in range(args.iterations)
+    ]
+    n = args.iterations
+
+    try:
+        from dateutil import parser
+        it = iter(range(10**12))
+        _report("dateutil.parser.parse", lambda: parser.parse(raws[next(it) % n]).isoformat(), n)
+    except ImportError:
+        print("  (dateutil non installé, référence ignorée)")
+
+    def cold():
+        dates._parse_string.cache_clear()
+        for raw in raws:
+            dates.parse_date(raw)
+
+    best = min(timeit.repeat(cold, number=1, repeat=3))
+    print(f"  {'parse_date (cache froid)':<28} {best / n * 1e6:10.2f} µs/appel")
+    it = iter(range(10**12))
+    _report("parse_date (cache chaud)", lambda: dates.parse_date(raws[next(it) % 100]), n)
+
+HEAVY_MODULES = ("fitz", "docx", "PIL", "extract_msg", "dateutil")
+
+def bench_startup(args: argparse.Namespace) -> None:
+    """Temps d'import de chaque script (interpréteur neuf) et modules lourds chargés."""
+    scripts_dir = Path(__file__).resolve().parent
+    runs = max(3, min(args.iterations, 20))
+    probe = ("import sys, time; t = time.perf_counter(); import {module}; "
+             "print(time.perf_counter() - t); "
+             "print(','.join(m for m in {heavy!r} if m in sys.modules))")
+
+    for module in ("ingest_docs", "ingest_msg", "query_db", "init_db"):
+        timings = []
+        heavy = ""
+        for _ in range(runs):
+            result = subprocess.run(
+                [sys.executable, "-c", probe.format(module=module, heavy=HEAVY_MODULES)],
+                cwd=scripts_dir, capture_output=True, text=True
+            )
+            if result.returncode != 0:
+                print(f"  {module:<14} ERREUR: {result.stderr.strip().splitlines()[-1]}")
+                break
+            lines = result.stdout.splitlines()
+            timings.append(float(lines[0]))
+            heavy = lines[1] if len(lines) > 1 else ""
+        if timings:
+            print(f"  {module:<14} {min(timings) * 1000:8.1f} ms   modules lourds: {heavy or 'aucun'}")
+
+def _sample_attachments(rng: random.Random, count: int):
+    """Pièces jointes typiques: surtout des petites images de signature, quelques gros PDF."""
+    logos = [rng.randbytes(rng.randint(2_000, 12_000)) for _ in range(20)]
+    for i in range(count):
+        roll = rng.random()
+        if roll < 0.6:
+            yield "image001.png", rng.choice(logos)  # Doublons massifs
+        elif roll < 0.9:
+            yield f"note{i}.txt", (f"Note {i} " + "contribution d'entretien " * rng.randint(10, 400)).encode()
+        else:
+            yield f"piece{i}.pdf", b"%PDF-1.4\n" + rng.randbytes(rng.randint(50_000, 400_000))
+
+def _tree_usage(root: Path):
+    """(nombre de fichiers, octets alloués sur disque) sous root."""
+    files = disk = 0
+    for path in root.rglob("*"):
+        if path.is_file():
+            files += 1
+            st = path.stat()
+            disk += st.st_blocks * 512 if hasattr(st, "st_blocks") else st.st_size
+    return files, disk
+
+def bench_vault(args: argparse.Namespace) -> None:
+    """Vault classique (un fichier par blob) vs vault compacté (packs)."""
+    rng = random.Random(42)
+    attachments = list(_sample_attachments(rng, args.iterations))
+    total = sum(len(data) for _, data in attachments)
+    print(f"{len(attachments)} pièces jointes, {total / 1024 / 1024:.1f} Mo\n")
+
+    for label, factory in (("classique", Vault), ("packs", PackVault)):
+        with tempfile.TemporaryDirectory() as tmp:
+            vault = factory(Path(tmp) / "vault", fsync=False)
+            start = time.perf_counter()
+            paths = []
+            for i, (filename, data) in enumerate(attachments, 1):
+                paths.append(vault.store_bytes(data, filename))
+                if i % 100 == 0:
+                    vault.sync()
+            vault.sync()
+            write = time.perf_counter() - start
+            if isinstance(vault, PackVault):
+                vault.close()
+
+            files, disk = _tree_usage(Path(tmp) / "vault")
+            start = time.perf_counter()
+            for path in paths[::10]:
+                read_blob(path)
+            read = (time.perf_counter() - start) / len(paths[::10]) * 1e6
+            print(f"  {label:<10} écriture {write:6.2f} s   {files:7d} fichiers   "
+                  f"{disk / 1024 / 1024:8.1f} Mo sur disque   lecture {read:8.1f} µs/blob")
+
+class _ParserText(HTMLParser):
+    """Référence: conversion HTML → texte avec html.parser."""
+
+    SKIP = {"script", "style", "head", "title"}
+    BLOCKS = {"br", "p", "div", "tr", "li", "h1", "h2", "h3", "table", "blockquote"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts: List[str] = []
+        self.skip = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP:
+            self.skip += 1
+        elif tag in self.BLOCKS:
+            self.parts.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP and self.skip:
+            self.skip -= 1
+        elif tag in self.BLOCKS:
+            self.parts.append("\n")
+
+    def handle_data(self, data):
+        if not self.skip:
+            self.parts.append(data)
+
+def _parser_html_to_text(body: str) -> Optional[str]:
+    parser = _ParserText()
+    parser.feed(body)
+    parser.close()
+    return textnorm.normalize_text("".join(parser.parts))
+
+def _sample_html(rng: random.Random) -> str:
+    """Corps HTML façon Outlook: styles, commentaires conditionnels, tableaux, entités."""
+    body = _sample_email(rng).replace("\r\n", "<br>\r\n")
+    return (
+        "<html xmlns:o=\"urn:schemas-microsoft-com:office:office\"><head>"
+        "<meta http-equiv=\"Content-Type\" content=\"text/html; charset=utf-8\">"
+        "<style><!-- p.MsoNormal {margin:0cm; font-family:\"Calibri\",sans-serif;} --></style>"
+        "<!--[if gte mso 9]><xml><o:shapedefaults v:ext=\"edit\" spidmax=\"1026\" /></xml><![endif]-->"
+        "</head><body lang=\"FR-CH\"><div class=\"WordSection1\">"
+        f"<p class=\"MsoNormal\">Ma&icirc;tre,&nbsp;<o:p></o:p></p><p class=\"MsoNormal\">{body}</p>"
+        "<table><tr><td>R&eacute;f.</td><td>VPO/2023</td></tr></table>"
+        "</div></body></html>"
+    )
+
+def bench_html(args: argparse.Namespace) -> None:
+    """HTML → texte: html.parser vs htmltext, et coût de stockage de body_html."""
+    if args.db:
+        conn = sqlite3.connect(args.db)
+        rows = conn.execute(
+            "SELECT body_html FROM emails WHERE body_html IS NOT NULL LIMIT ?", [args.iterations]
+        ).fetchall()
+        conn.close()
+        bodies = [htmltext.unpack_html(r[0]) for r in rows]
+        print(f"Corpus: {len(bodies)} corps HTML de {args.db}")
+    else:
+        rng = random.Random(42)
+        bodies = [_sample_html(rng) for _ in range(200)]
+        print(f"Corpus synthétique: {len(bodies)} corps HTML")
+    if not bodies:
+        print("  (aucun corps HTML)")
+        return
+
+    volume = sum(len(b) for b in bodies)
+    for label, convert in (("html.parser", _parser_html_to_text), ("htmltext", htmltext.html_to_text)):
+        best = min(timeit.repeat(lambda: [convert(b) for b in bodies], number=1, repeat=3))
+        print(f"  {label:<28} {volume / best / 1e6:8.1f} Mo/s   {best / len(bodies) * 1e6:8.1f} µs/email")
+
+    start = time.perf_counter()
+    packed = [htmltext.pack_html(b, "compress") for b in bodies]
+    elapsed = time.perf_counter() - start
+    stored = sum(len(p) for p in packed)
+    print(f"  {'--html compress':<28} {volume / elapsed / 1e6:8.1f} Mo/s   "
+          f"{volume / 1e6:.1f} Mo → {stored / 1e6:.1f} Mo ({stored / volume:.0%})")
+
+_SYLLABLES = [c + v for c in "bdfgklmnprstvz" for v in "aeiou"]
+
+def _pseudo_word(rng: random.Random) -> str:
+    return "".join(rng.choice(_SYLLABLES) for _ in range(3))
+
+def _relevance_corpus(conn: sqlite3.Connection, rng: random.Random, topics: int = 40,
+                      per_topic: int = 20, noise: int = 2000) -> Dict[str, Set[str]]:
+    """
+    Corpus synthétique et jeu de pertinence {requête: {"type:id"}}.
+    Chaque sujet a deux vocabulaires synonymes (A, B) et un contexte commun;
+    la requête est en vocabulaire A, un tiers des textes pertinents n'emploie que B
+    (introuvables par bm25). Des textes de bruit contiennent un mot A isolé.
+    Une partie des pièces jointes est envoyée deux fois (même hash).
+    """
+    common = [_pseudo_word(rng) for _ in range(1500)]
+    subjects = [([_pseudo_word(rng) for _ in range(3)], [_pseudo_word(rng) for _ in range(3)],
+                 [_pseudo_word(rng) for _ in range(6)]) for _ in range(topics)]
+
+    def text(topic: Optional[int]) -> str:
+        words = [rng.choice(common) for _ in range(rng.randint(40, 120))]
+        if topic is None:
+            if rng.random() < 0.5:
+                words[rng.randrange(len(words))] = rng.choice(rng.choice(subjects)[0])
+            return " ".join(words)
+        lex_a, lex_b, context = subjects[topic]
+        lexicon = rng.choice((lex_a, lex_b, lex_a + lex_b))
+        for i in range(len(words)):
+            roll = rng.random()
+            if roll < 0.2:
+                words[i] = rng.choice(context)
+            elif roll < 0.35:
+                words[i] = rng.choice(lexicon)
+        return " ".join(words)
+
+    items = [t for t in range(topics) for _ in range(per_topic)] + [None] * noise
+    rng.shuffle(items)
+    qrels: Dict[str, Set[str]] = {" ".join(s[0][:2]): set() for s in subjects}
+    queries = list(qrels)
+    email_ids: List[int] = []
+    sent: List[Tuple[str, str, str]] = []
+    for n, topic in enumerate(items):
+        body = text(topic)
+        kind = ("email", "document", "attachment")[n % 3] if email_ids else "email"
+        if kind == "email":
+            cursor = conn.execute(
+                "INSERT INTO emails (file_hash, subject, body_text, body_new, date_sent) VALUES (?, ?, ?, ?, ?)",
+                [f"e{n}", f"Message {n}", body, body, f"2023-{1 + n % 12:02d}-01"]
+            )
+            email_ids.append(cursor.lastrowid)
+        elif kind == "document":
+            cursor = conn.execute(
+                "INSERT INTO documents (file_hash, filename, doc_type, extracted_text) VALUES (?, ?, 'pdf', ?)",
+                [f"d{n}", f"piece{n}.pdf", body]
+            )
+        else:
+            file_hash = f"a{n}"
+            if sent and rng.random() < 0.1:
+                file_hash, _, body = rng.choice(sent)
+            cursor = conn.execute(
+                "INSERT INTO attachments (email_id, file_hash, filename, extracted_text) VALUES (?, ?, ?, ?)",
+                [rng.choice(email_ids), file_hash, f"annexe{n}.pdf", body]
+            )
+            topic = next((t for h, t, _ in sent if h == file_hash), topic) if file_hash != f"a{n}" else topic
+            sent.append((file_hash, topic, body))
+        if topic is not None:
+            qrels[queries[topic]].add(f"{kind}:{cursor.lastrowid}")
+    conn.commit()
+    return qrels
+
+def _evaluate(search: Callable[[str], List[Dict]], qrels: Dict[str, Set[str]], k: int = 10):
+    """(nDCG@k, rappel@R, MRR, latences en ms) d'une méthode; un résultat compte avec ses 'also'."""
+    ndcg = recall = mrr = 0.0
+    latencies = []
+    for query, relevant in qrels.items():
+        start = time.perf_counter()
+        results = search(query)
+        latencies.append((time.perf_counter() - start) * 1000)
+        found = [bool(({f"{r['type']}:{r['id']}"} | set(r.get("also", []))) & relevant) for r in results]
+        dcg = sum(1 / math.log2(i + 2) for i, hit in enumerate(found[:k]) if hit)
+        ndcg += dcg / sum(1 / math.log2(i + 2) for i in range(min(k, len(relevant))))
+        matched: Set[str] = set()
+        for r in results[:len(relevant)]:
+            matched |= ({f"{r['type']}:{r['id']}"} | set(r.get("also", []))) & relevant
+        recall += len(matched) / len(relevant)
+        mrr += next((1 / (i + 1) for i, hit in enumerate(found) if hit), 0.0)
+    n = len(qrels)
+    latencies.sort()
+    return ndcg / n, recall / n, mrr / n, latencies
+
+def bench_hybrid(args: argparse.Namespace) -> None:
+    """Pertinence et latence: bm25, sémantique, hybride (RRF), et poids appris sur le jeu."""
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.db:
+            if not args.qrels:
+                print("  --db demande --qrels (JSON {requête: [\"email:12\", \"document:3\", ...]})")
+                return
+            db_path = args.db
+            with open(args.qrels, encoding="utf-8") as f:
+                qrels = {q: set(ids) for q, ids in json.load(f).items() if ids}
+            print(f"Corpus: {db_path}, {len(qrels)} requêtes ({args.qrels})")
+        else:
+            db_path = str(Path(tmp) / "bench.db")
+            conn = sqlite3.connect(db_path)
+            conn.executescript(init_db.SCHEMA)
+            qrels = _relevance_corpus(conn, random.Random(42))
+            start = time.perf_counter()
+            vectors.build(conn, vectors.vec_dir_for(db_path), dim=64)
+            conn.close()
+            print(f"Corpus synthétique: {len(qrels)} requêtes, "
+                  f"index vectoriel construit en {time.perf_counter() - start:.1f} s")
+
+        conn = sqlite3.connect(db_path)
+        index = vectors.VectorIndex(vectors.vec_dir_for(db_path))
+        depth = 50
+        methods: List[Tuple[str, Optional[float], Callable[[str], List[Dict]]]] = [
+            ("bm25", None, lambda q: query_db.search_fts(conn, q, limit=depth)),
+            ("sémantique", None,
+             lambda q: query_db.search_semantic(conn, db_path, q, limit=depth, index=index)),
+        ]
+        default = fusion.DEFAULT_WEIGHTS["semantic"]
+        for w in [default] + [w for w in (0.25, 0.5, 2.0, 4.0) if w != default]:
+            methods.append((f"hybride (sém. ×{w:g})", w, lambda q, w=w: query_db.search_hybrid(
+                db_path, q, limit=depth, index=index, weights={"bm25": 1.0, "semantic": w}
+            )[0]))
+
+        print(f"\n  {'méthode':<22} {'nDCG@10':>8} {'rappel@R':>9} {'MRR':>6} {'p50 ms':>8} {'p95 ms':>8}")
+        best = (-1.0, default)
+        for label, weight, search in methods:
+            ndcg, recall, mrr, lat = _evaluate(search, qrels)
+            print(f"  {label:<22} {ndcg:8.3f} {recall:9.3f} {mrr:6.3f} "
+                  f"{lat[len(lat) // 2]:8.1f} {lat[int(len(lat) * 0.95)]:8.1f}")
+            # Poids appris: meilleur nDCG, le poids par défaut (testé en premier) si égalité
+            if weight is not None and ndcg > best[0] + 1e-3:
+                best = (ndcg, weight)
+        conn.close()
+        print(f"\nMeilleur poids sur ce jeu: query_db.py --hybrid --semantic-weight {best[1]:g}")
+
+def bench_passages(args: argparse.Namespace) -> None:
+    """Documents longs: recherche sur le texte entier (documents_fts) vs par passage (passages_fts)."""
+    rng = random.Random(42)
+    vocabulary = [_pseudo_word(rng) for _ in range(5000)]
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = sqlite3.connect(str(Path(tmp) / "bench.db"))
+        conn.executescript(init_db.SCHEMA)
+        needles = {}
+        for n in range(200):
+            pages = [" ".join(rng.choice(vocabulary) for _ in range(350))
+                     for _ in range(300 if n % 20 == 0 else rng.randint(1, 10))]
+            page = rng.randrange(len(pages))
+            needle = f"aiguille{n}"
+            pages[page] += f" {needle}"
+            needles[needle] = page + 1
+            conn.execute("INSERT INTO documents (file_hash, filename, doc_type, extracted_text) VALUES (?, ?, 'pdf', ?)",
+                         [f"d{n}", f"piece{n}.pdf", "\n\n--- PAGE ---\n\n".join(pages)])
+        conn.commit()
+        start = time.perf_counter()
+        count = passages.sync(conn)
+        print(f"{len(needles)} documents (dont 10 de 300 pages), {count} passages découpés "
+              f"en {time.perf_counter() - start:.1f} s\n")
+
+        queries = list(needles) + rng.sample(vocabulary, 50)
+        whole_sql = """
+            SELECT d.id, snippet(documents_fts, 1, '>>>', '<<<', '...', 64), bm25(documents_fts) AS score
+            FROM documents_fts JOIN documents d ON d.id = documents_fts.rowid
+            WHERE documents_fts MATCH ? ORDER BY score LIMIT 20
+        """
+        for label, search in (
+            ("texte entier", lambda q: conn.execute(whole_sql, [q]).fetchall()),
+            ("passages", lambda q: query_db.search_passages(conn, q, "document", 20)),
+        ):
+            best = min(timeit.repeat(lambda: [search(q) for q in queries], number=1, repeat=3))
+            print(f"  {label:<14} {best / len(queries) * 1000:8.2f} ms/requête")
+        pages_ok = sum(1 for needle, page in needles.items()
+                       if query_db.search_passages(conn, needle, "document", 1)[0]["page"] == page)
+        print(f"\n  Page exacte trouvée: {pages_ok}/{len(needles)}")
+        conn.close()
+
+def bench_facets(args: argparse.Namespace) -> None:
+    """Comptes par facette: un GROUP BY par facette vs colonnes précalculées (facet_columns)."""
+    rng = random.Random(42)
+    senders = [f"{_pseudo_word(rng)}@{_pseudo_word(rng)}.fr" for _ in range(300)]
+    common = [_pseudo_word(rng) for _ in range(20)]
+    rare = [_pseudo_word(rng) for _ in range(2000)]
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = sqlite3.connect(str(Path(tmp) / "bench.db"))
+        conn.executescript(init_db.SCHEMA)
+        for n in range(100000):
+            words = rng.sample(common, 3) + rng.sample(rare, 20)
+            conn.execute("""
+                INSERT INTO emails (subject, sender_email, date_sent, body_new, has_attachments)
+                VALUES (?, ?, ?, ?, ?)
+            """, (f"Message {n}", rng.choice(senders),
+                  f"20{rng.randint(15, 24)}-{rng.randint(1, 12):02d}-01", " ".join(words), rng.random() < 0.3))
+        conn.commit()
+        start = time.perf_counter()
+        facets.load(conn)
+        print(f"100000 emails, colonnes de facettes calculées en {time.perf_counter() - start:.2f} s\n")
+
+        group_by = [f"""
+            SELECT {column}, COUNT(*) FROM emails_fts JOIN emails e ON e.id = emails_fts.rowid
+            WHERE emails_fts MATCH ? GROUP BY 1
+        """ for column in ("lower(e.sender_email)", "substr(e.date_sent, 1, 7)", "e.has_attachments")]
+        for label, queries in (("fréquents", common[:5]), ("rares", rare[:5])):
+            hits = sum(query_db.search_facets(conn, q, "email").get("type", {}).get("email", 0)
+                       for q in queries) // len(queries)
+            print(f"Termes {label} (~{hits} résultats):")
+            for method, count in (
+                ("GROUP BY", lambda q: [conn.execute(sql, [q]).fetchall() for sql in group_by]),
+                ("facet_columns", lambda q: query_db.search_facets(conn, q, "email")),
+            ):
+                best = min(timeit.repeat(lambda: [count(q) for q in queries], number=1, repeat=3))
+                print(f"  {method:<14} {best / len(queries) * 1000:8.2f} ms/requête")
+            print()
+        conn.close()
+
+def bench_timeline(args: argparse.Namespace) -> None:
+    """Activité par période: GROUP BY sur les emails vs cumul par jour (table timeline)."""
+    rng = random.Random(42)
+    people = [f"{_pseudo_word(rng)}@{_pseudo_word(rng)}.fr" for _ in range(300)]
+    words = [_pseudo_word(rng) for _ in range(500)]
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = sqlite3.connect(str(Path(tmp) / "bench.db"))
+        conn.executescript(init_db.SCHEMA)
+        for n in range(100000):
+            sender, *recipients = rng.sample(people, 3)
+            conn.execute("""
+                INSERT INTO emails (subject, sender_email, recipients, date_sent, body_new)
+                VALUES (?, ?, ?, ?, ?)
+            """, (f"Message {n}", sender, json.dumps(recipients),
+                  f"20{rng.randint(15, 24)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}T10:00:00",
+                  " ".join(rng.sample(words, 20))))
+        conn.commit()
+        participants.sync(conn)
+        start = time.perf_counter()
+        timeline.refresh(conn)
+        print(f"100000 emails, cumul par jour calculé en {time.perf_counter() - start:.2f} s "
+              f"({conn.execute('SELECT COUNT(*) FROM timeline').fetchone()[0]} lignes)\n")
+
+        person = people[0]
+        cases = (
+            ("Tout, par mois", "month", None,
+             "SELECT substr(date_sent, 1, 7), COUNT(*) FROM emails GROUP BY 1", []),
+            ("2020, par semaine", "week", None,
+             "SELECT strftime('%Y-S%W', date_sent), COUNT(*) FROM emails "
+             "WHERE date_sent >= '2020' AND date_sent < '2020~' GROUP BY 1", []),
+            ("Un correspondant, par mois", "month", person,
+             "SELECT substr(e.date_sent, 1, 7), COUNT(DISTINCT e.id) FROM participants p "
+             "JOIN emails e ON e.id = p.email_id WHERE p.address = ? GROUP BY 1", [person]),
+        )
+        for label, period, address, sql, params in cases:
+            bounds = ("2020", "2020") if period == "week" else (None, None)
+            print(f"{label}:")
+            for method, run in (
+                ("GROUP BY", lambda: conn.execute(sql, params).fetchall()),
+                ("timeline", lambda: timeline.activity(conn, period, *bounds, address, ("email",))),
+            ):
+                best = min(timeit.repeat(run, number=5, repeat=3)) / 5
+                print(f"  {method:<10} {best * 1000:8.2f} ms")
+            print()
+        node = querylang.parse(words[0])
+        best = min(timeit.repeat(lambda: timeline.hits(conn, node, "month", sources=("email",)),
+                                 number=5, repeat=3)) / 5
+        print(f"Résultats d'un terme par mois (timeline.hits): {best * 1000:.2f} ms")
+        conn.close()
+
+def bench_shards(args: argparse.Namespace) -> None:
+    """Recherche: une base vs le même corpus en shards annuels (connexions en parallèle)."""
+    rng = random.Random(42)
+    common = [_pseudo_word(rng) for _ in range(20)]
+    rare = [_pseudo_word(rng) for _ in range(2000)]
+    years = [str(year) for year in range(2017, 2025)]
+    with tempfile.TemporaryDirectory() as tmp:
+        single = sqlite3.connect(str(Path(tmp) / "bench.db"))
+        single.executescript(init_db.SCHEMA)
+        manifest = shards.create(str(Path(tmp) / f"bench{shards.MANIFEST_SUFFIX}"), "year")
+        router = shards.Router(str(manifest.path), init_db.create_shard)
+        for n in range(80000):
+            row = (f"Message {n}", f"{rng.choice(years)}-{rng.randint(1, 12):02d}-01",
+                   " ".join(rng.sample(common, 3) + rng.sample(rare, 20)))
+            sql = "INSERT INTO emails (subject, date_sent, body_new) VALUES (?, ?, ?)"
+            single.execute(sql, row)
+            router.conn_for(row[1]).execute(sql, row)
+        single.commit()
+        router.commit()
+        router.close()
+        dbs = shards.resolve([str(manifest.path)])
+        print(f"80000 emails: une base, et {len(dbs)} shards annuels ({fusion.MAX_THREADS} threads au plus)\n")
+
+        for label, queries in (("fréquents", common[:5]), ("rares", rare[:5])):
+            print(f"Termes {label}:")
+            for method, run in (
+                ("une base", lambda q: query_db.search_fts(single, q, "email", limit=20)),
+                ("shards", lambda q: query_db.search_shards(dbs, q, "email", limit=20, budget=60)[0]),
+                ("une base 2024", lambda q: query_db.search_fts(single, q, "email", "2024-01-01", limit=20)),
+                ("shards 2024", lambda q: query_db.search_shards(dbs, q, "email", "2024-01-01", limit=20,
+                                                                 budget=60)[0]),
+            ):
+                best = min(timeit.repeat(lambda: [run(q) for q in queries], number=1, repeat=3))
+                print(f"  {method:<14} {best / len(queries) * 1000:8.2f} ms/requête")
+            print()
+        single.close()
+
+# Pages natives propres (jamais à OCRiser), dont hors phrases et hors lexique
+_CLEAN_PAGES = {
+    "lettre fr": "Madame, Monsieur, nous accusons réception de votre courrier du 12 mars concernant la "
+                 "contribution d'entretien. Conformément au jugement, le montant sera versé chaque mois "
+                 "sur le compte indiqué. Nous restons à votre disposition pour tout renseignement.",
+    "facture fr": "FACTURE N° 2024-0153\nClient: SARL Dupont Immobilier\nDésignation Quantité Prix unitaire\n"
+                  "Honoraires expertise 1 1250,00\nFrais de déplacement 2 85,00\nMontant HT 1420,00\n"
+                  "TVA 8,1 % 115,02\nTotal TTC CHF 1535,02\nÉchéance 30 jours IBAN CH93 0076 2011 6238 5295 7",
+    "lettre de": "Sehr geehrte Damen und Herren, wir bestätigen den Eingang Ihrer Zahlung vom 3. Mai. "
+                 "Die Unterlagen werden Ihnen nach Prüfung durch unsere Buchhaltung zugestellt. "
+                 "Mit freundlichen Grüßen, Ihre Verwaltung",
+    "liste de": "Geschäftsführung Rechnungsprüfung Vertragsverlängerung Kündigungsfrist Mietvertrag "
+                "Nebenkostenabrechnung Hausverwaltung Schlüsselübergabe Wohnungsübergabeprotokoll",
+    "lettre it": "Gentili signori, con la presente confermiamo il ricevimento della vostra lettera. "
+                 "Il pagamento sarà effettuato entro la fine del mese sul conto indicato.",
+    "lettre en": "Dear Sir, please find enclosed the report that was requested by the court before the hearing.",
+}
+
+def _shift_letters(text: str, k: int) -> str:
+    """Couche texte cassée: lettres décalées de k (police mal encodée)."""
+    return "".join(chr((ord(c) - base + k) % 26 + base) if c.isascii() and c.isalpha() else c
+                   for c in text for base in [ord("a") if c.islower() else ord("A")])
+
+def bench_quality(args: argparse.Namespace) -> None:
+    """Score de qualité des pages: contrôle natif propre / couche cassée, puis coût par page."""
+    broken = {f"{name} décalée +{k}": _shift_letters(text, k)
+              for name, text in _CLEAN_PAGES.items() if name != "lettre en" for k in (1, 3, 13)}
+    broken["(cid:N)"] = " ".join(f"(cid:{i * 7 % 90})" for i in range(60))
+    broken["symboles"] = "¤¤ ÿþ ¦¦ ¬¬ ¶ ¸¸ ¹ ºº ¼ ½ ¾ ¿¿ Þ ß ð ñ " * 4
+
+    threshold = ocrquality.QUALITY_THRESHOLD
+    print(f"Seuil: {threshold}")
+    for name, text in list(_CLEAN_PAGES.items()) + list(broken.items()):
+        score = ocrquality.page_score(text)
+        clean = name in _CLEAN_PAGES
+        print(f"  {name:<26} {score.score:5.3f}  (lexique {score.dict_ratio:.3f}, "
+              f"parasites {score.garbage_ratio:.3f})")
+        assert (score.score >= threshold) == clean, f"{name}: {score}"
+
+    n = args.iterations // 10
+    pages = list(_CLEAN_PAGES.values()) * 4
+    it = iter(range(10**12))
+    print(f"\nPage de ~{sum(map(len, pages)) // len(pages)} caractères:")
+    _report("page_score", lambda: ocrquality.page_score(pages[next(it) % len(pages)]), n)
+
+BENCHMARKS = {
+    "textnorm": bench_textnorm,
+    "dates": bench_dates,
+    "startup": bench_startup,
+    "vault": bench_vault,
+    "html": bench_html,
+    "hybrid": bench_hybrid,
+    "passages": bench_passages,
+    "facets": bench_facets,
+    "timeline": bench_timeline,
+    "shards": bench_shards,
+    "quality": bench_quality,
+}
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks du kit d'indexation")
+    parser.add_argument("benchmark", choices=sorted(BENCHMARKS), help="Benchmark à lancer")
+    parser.add_argument("--iterations", type=int, default=5000, help="Appels par série")
+    parser.add_argument("--db", help="html: corpus réel (body_html de la base); hybrid: base indexée")
+    parser.add_argument("--qrels", help="hybrid: jeu de pertinence JSON {requête: [\"email:12\", ...]}")
+    args = parser.parse_args()
+
+    print(f"=== BENCHMARK {args.benchmark} ===\n")
+    BENCHMARKS[args.benchmark](args)
+
+if __name__ == "__main__":
+    main()
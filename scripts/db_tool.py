@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+db_tool.py - Maintenance de la base: sauvegarde à chaud, compactage, rapport
+Usage: python db_tool.py <commande> [options]
+
+Copier vpo_affaire.db pendant un import peut donner une copie incohérente
+(pages d'avant et d'après un commit). backup passe par l'API de
+sauvegarde de SQLite, par lots de pages: le verrou de lecture est rendu
+entre deux lots et l'import continue. snapshot écrit une copie compactée
+(VACUUM INTO). Les lignes supprimées laissent des pages libres que le
+fichier garde: vacuum les rend au disque (mode incrémental, activé par
+init_db.py pour les bases nouvelles; --full pour une base ancienne).
+
+Le vault (pièces jointes) se sauvegarde à part, par simple copie: ses
+fichiers ne changent plus une fois écrits.
+
+Exemples:
+    python db_tool.py report
+    python db_tool.py backup --dest sauvegarde/vpo_affaire.db
+    python db_tool.py snapshot --dest archive/vpo_affaire-2024-06.db
+    python db_tool.py vacuum
+    python db_tool.py vacuum --full
+    python db_tool.py report --db affaire.shards.json
+"""
+
+import argparse
+import os
+import shutil
+import sqlite3
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+from vpokit import shards
+
+DEFAULT_DB = "vpo_affaire.db"
+BACKUP_PAGES = 1024          # Pages copiées par lot (4 Mio en pages de 4 Kio)
+BACKUP_SLEEP = 0.05          # Pause entre deux lots (s): les écritures passent
+MAX_RESTARTS = 5             # Copies relancées par des écritures avant la copie d'un seul tenant
+AUTO_VACUUM_MODES = {0: "none", 1: "full", 2: "incremental"}
+# Objet signalé à compacter (report): au moins 1 Mio, pages peu remplies ou dispersées
+FRAGMENTED_MIN_BYTES = 1024 * 1024
+FRAGMENTED_FILL = 0.6
+FRAGMENTED_JUMPS = 0.5
+MB = 1024 * 1024
+
+class _Restarted(Exception):
+    """La copie par lots a été relancée trop souvent (base modifiée pendant la copie)."""
+
+def targets(db_path: str, dest: str) -> List[Tuple[Path, Path]]:
+    """
+    (source, destination) de chaque base. Un manifeste de shards se copie
+    dans un dossier (mêmes noms de fichiers, manifeste copié à part).
+    """
+    if shards.is_manifest(db_path):
+        dest_dir = Path(dest)
+        dest_dir.mkdir(parents=True, exist_ok=True)
+        return [(path, dest_dir / path.name) for _, path in shards.resolve([db_path])]
+    target = Path(dest)
+    # Dossier: existant, ou désigné par un séparateur final (bk/) ou un nom sans extension
+    if target.is_dir() or dest.endswith(("/", os.sep)) or not target.suffix:
+        target.mkdir(parents=True, exist_ok=True)
+        target = target / Path(db_path).name
+    target.parent.mkdir(parents=True, exist_ok=True)
+    return [(Path(db_path), target)]
+
+def _replace(tmp: Path, target: Path) -> None:
+    """Remplace la destination seulement une fois la copie complète et vérifiée."""
+    conn = sqlite3.connect(str(tmp))
+    check = conn.execute("PRAGMA quick_check").fetchone()[0]
+    conn.close()
+    if check != "ok":
+        tmp.unlink()
+        raise RuntimeError(f"copie invalide ({check}), destination inchangée")
+    os.replace(tmp, target)
+
+def backup(source: Path, target: Path, pages: int = BACKUP_PAGES, sleep: float = BACKUP_SLEEP,
+           max_restarts: int = MAX_RESTARTS) -> int:
+    """
+    Copie à chaud par lots de pages (API de sauvegarde SQLite). Une écriture
+    d'une autre connexion relance la copie; après max_restarts relances, la
+    fin se fait d'un seul tenant (verrou de lecture tenu jusqu'au bout).
+    Retourne le nombre de relances.
+    """
+    tmp = target.with_name(target.name + ".tmp")
+    tmp.unlink(missing_ok=True)
+    src = sqlite3.connect(str(source))
+    dst = sqlite3.connect(str(tmp))
+    restarts = 0
+    last_remaining = None
+
+    def progress(status: int, remaining: int, total: int) -> None:
+        nonlocal restarts, last_remaining
+        if last_remaining is not None and remaining > last_remaining:
+            restarts += 1
+            if restarts > max_restarts:
+                raise _Restarted()
+        last_remaining = remaining
+        done = total - remaining
+        print(f"\r  {source.name}: {done}/{total} pages ({done * 100 // max(total, 1)} %)", end="")
+
+    try:
+        try:
+            src.backup(dst, pages=pages, progress=progress, sleep=sleep)
+        except _Restarted:
+            print(f"\n  {source.name}: base modifiée pendant la copie, copie d'un seul tenant")
+            src.backup(dst)
+    finally:
+        dst.close()
+        src.close()
+    print()
+    _replace(tmp, target)
+    return restarts
+
+def snapshot(source: Path, target: Path) -> None:
+    """Copie compactée (VACUUM INTO): pages libres retirées, tables défragmentées."""
+    tmp = target.with_name(target.name + ".tmp")
+    tmp.unlink(missing_ok=True)
+    conn = sqlite3.connect(str(source))
+    try:
+        conn.execute("VACUUM INTO ?", (str(tmp),))
+    finally:
+        conn.close()
+    _replace(tmp, target)
+
+def vacuum(db_path: Path, full: bool = False, pages: int = 0) -> Tuple[int, int]:
+    """
+    Rend au disque les pages libres: PRAGMA incremental_vacuum (pages: au
+    plus ce nombre, 0 = toutes), ou VACUUM complet qui active aussi le mode
+    incrémental (--full: base ancienne, verrou exclusif, double d'espace
+    disque le temps de l'opération). Retourne (octets avant, après).
+    """
+    before = db_path.stat().st_size
+    conn = sqlite3.connect(str(db_path), isolation_level=None)
+    try:
+        if full:
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("VACUUM")
+        else:
+            # execute() ne fait qu'un pas (une page rendue); executescript va jusqu'au bout
+            conn.executescript(f"PRAGMA incremental_vacuum({int(pages)});")
+    finally:
+        conn.close()
+    return before, db_path.stat().st_size
+
+def report(db_path: Path, top: int = 10) -> Dict[str, Any]:
+    """Taille, pages libres, mode auto_vacuum et, si dbstat est disponible, objets les plus gros."""
+    conn = sqlite3.connect(db_path.resolve().as_uri() + "?mode=ro", uri=True)
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    wal = db_path.with_name(db_path.name + "-wal")
+    info: Dict[str, Any] = {
+        "path": str(db_path),
+        "size": db_path.stat().st_size,
+        "wal_size": wal.stat().st_size if wal.exists() else 0,
+        "page_size": page_size,
+        "page_count": conn.execute("PRAGMA page_count").fetchone()[0],
+        "freelist": conn.execute("PRAGMA freelist_count").fetchone()[0],
+        "auto_vacuum": AUTO_VACUUM_MODES.get(conn.execute("PRAGMA auto_vacuum").fetchone()[0], "?"),
+        "journal_mode": conn.execute("PRAGMA journal_mode").fetchone()[0],
+        "objects": None,
+    }
+    try:
+        # Fragmentation: pages non contiguës dans l'ordre de parcours du B-tree
+        rows = conn.execute("""
+            SELECT name, COUNT(*), SUM(pgsize), SUM(unused), SUM(pageno != prev + 1)
+            FROM (SELECT name, pageno, pgsize, unused,
+                         LAG(pageno, 1, pageno - 1) OVER (PARTITION BY name ORDER BY path) AS prev
+                  FROM dbstat)
+            GROUP BY name ORDER BY 3 DESC LIMIT ?
+        """, (top,)).fetchall()
+        info["objects"] = [{"name": name, "pages": count, "bytes": size,
+                            "fill": 1 - unused / size if size else 0.0,
+                            "fragmentation": jumps / count if count else 0.0}
+                           for name, count, size, unused, jumps in rows]
+    except sqlite3.OperationalError:
+        pass  # SQLite compilé sans dbstat
+    conn.close()
+    return info
+
+def print_report(info: Dict[str, Any]) -> None:
+    free = info["freelist"] * info["page_size"]
+    print(f"\n=== BASE {info['path']} ===\n")
+    print(f"Taille:                {info['size'] / MB:.1f} Mo (WAL: {info['wal_size'] / MB:.1f} Mo)")
+    print(f"Pages:                 {info['page_count']} × {info['page_size']} o")
+    print(f"Pages libres:          {info['freelist']} "
+          f"({info['freelist'] * 100 / max(info['page_count'], 1):.1f} %, {free / MB:.1f} Mo récupérables)")
+    print(f"auto_vacuum:           {info['auto_vacuum']}")
+    print(f"Journal:               {info['journal_mode']}")
+    if info["objects"] is None:
+        print("\n(détail par table indisponible: SQLite sans dbstat)")
+    elif info["objects"]:
+        print("\nPlus gros objets:      taille   remplissage  fragmentation")
+        for obj in info["objects"]:
+            print(f"  {obj['name'][:24]:<24}{obj['bytes'] / MB:8.1f} Mo"
+                  f"{obj['fill'] * 100:9.0f} %{obj['fragmentation'] * 100:11.0f} %")
+    scattered = [obj["name"] for obj in info["objects"] or []
+                 if obj["bytes"] >= FRAGMENTED_MIN_BYTES
+                 and (obj["fill"] < FRAGMENTED_FILL or obj["fragmentation"] > FRAGMENTED_JUMPS)]
+    if info["auto_vacuum"] != "incremental":
+        print("\nPlace jamais rendue au disque: python db_tool.py vacuum --full (active le mode incrémental)")
+    elif scattered:
+        print(f"\nPages à moitié vides ou dispersées ({', '.join(scattered)}): "
+              "python db_tool.py vacuum --full (ou snapshot)")
+    elif info["freelist"]:
+        print("\nRendre les pages libres: python db_tool.py vacuum")
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintenance de la base (sauvegarde, compactage, rapport)")
+    parser.add_argument("command", choices=["report", "backup", "snapshot", "vacuum"], help="Commande")
+    parser.add_argument("--db", default=DEFAULT_DB, help="Chemin de la base (ou manifeste de shards)")
+    parser.add_argument("--dest", help="backup/snapshot: fichier (.db) ou dossier de destination")
+    parser.add_argument("--pages", type=int,
+                        help=f"backup: pages par lot (défaut {BACKUP_PAGES}); vacuum: pages rendues au plus "
+                             "(défaut: toutes)")
+    parser.add_argument("--sleep", type=float, default=BACKUP_SLEEP,
+                        help="backup: pause entre deux lots (s)")
+    parser.add_argument("--full", action="store_true",
+                        help="vacuum: VACUUM complet (base ancienne: active le mode incrémental)")
+    parser.add_argument("--top", type=int, default=10, help="report: nombre d'objets détaillés")
+    args = parser.parse_args()
+
+    if not Path(args.db).exists():
+        print(f"ERREUR: Base non trouvée: {args.db}")
+        sys.exit(1)
+    db_paths = [path for _, path in shards.resolve([args.db])]
+
+    if args.command == "report":
+        for db_path in db_paths:
+            print_report(report(db_path, args.top))
+        return
+
+    if args.command == "vacuum":
+        for db_path in db_paths:
+            start = time.perf_counter()
+            before, after = vacuum(db_path, args.full, args.pages or 0)
+            print(f"{db_path.name}: {before / MB:.1f} → {after / MB:.1f} Mo "
+                  f"({time.perf_counter() - start:.1f} s)")
+        return
+
+    if not args.dest:
+        print(f"Indique --dest pour {args.command}")
+        sys.exit(1)
+    for source, target in targets(args.db, args.dest):
+        if target.resolve() == source.resolve():
+            print(f"ERREUR: la destination est la base elle-même: {target}")
+            sys.exit(1)
+        start = time.perf_counter()
+        if args.command == "backup":
+            restarts = backup(source, target, args.pages or BACKUP_PAGES, args.sleep)
+            note = f", {restarts} relance(s)" if restarts else ""
+        else:
+            snapshot(source, target)
+            note = ""
+        print(f"✓ {source.name} → {target} ({target.stat().st_size / MB:.1f} Mo, "
+              f"{time.perf_counter() - start:.1f} s{note})")
+    if shards.is_manifest(args.db):
+        shutil.copy2(args.db, Path(args.dest) / Path(args.db).name)
+        print(f"✓ Manifeste copié dans {args.dest}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+embed.py - Index vectoriel pour la recherche sémantique (query_db.py --semantic)
+Usage: python embed.py <commande> [options]
+
+Exemples:
+    python embed.py build
+    python embed.py build --dim 128
+    python embed.py build --model st:paraphrase-multilingual-MiniLM-L12-v2
+    python embed.py update
+    python embed.py stats
+    python embed.py update --db affaire.shards.json   (un index par base)
+
+Dépendances:
+    pip install numpy
+    (optionnel) pip install sentence-transformers
+"""
+
+import argparse
+import sqlite3
+import sys
+import time
+from pathlib import Path
+
+from vpokit import shards, vectors
+
+DEFAULT_DB = "vpo_affaire.db"
+
+def progress(count: int) -> None:
+    print(f"\r  {count} passages encodés", end="", flush=True)
+
+def print_index_stats(conn: sqlite3.Connection, vec_dir: Path) -> None:
+    meta = vectors.read_meta(vec_dir)
+    size = (vec_dir / vectors.VECTORS_NAME).stat().st_size
+    print(f"\n=== INDEX VECTORIEL {vec_dir} ===\n")
+    print(f"Modèle:              {meta['model']} ({meta['dim']} dimensions)")
+    print(f"Passages:            {meta['count']}")
+    print(f"  - dans l'IVF:      {meta['indexed']} ({meta['lists']} listes)")
+    tail = meta["count"] - meta["indexed"]
+    if tail:
+        print(f"  - ajoutés (queue): {tail}")
+    for source_type, sources, chunks in conn.execute(
+        "SELECT source_type, COUNT(DISTINCT source_id), COUNT(*) FROM vec_chunks GROUP BY source_type"
+    ):
+        print(f"  - {source_type}:{' ' * (15 - len(source_type))}{chunks} ({sources} sources)")
+    print(f"Taille:              {size / 1024 / 1024:.1f} Mo")
+    print(f"Construit le:        {meta['built_at']} ({meta['build_seconds']} s)")
+    if tail > meta["indexed"] // 5:
+        print("\nLa queue dépasse 20 % de l'index: python embed.py build pour la répartir dans l'IVF")
+
+def main():
+    parser = argparse.ArgumentParser(description="Index vectoriel pour la recherche sémantique")
+    parser.add_argument("command", choices=["build", "update", "stats"], help="Commande")
+    parser.add_argument("--db", default=DEFAULT_DB, help="Chemin de la base (ou manifeste de shards)")
+    parser.add_argument("--dim", type=int, default=vectors.DEFAULT_DIM,
+                        help="build: dimensions des vecteurs (LSA)")
+    parser.add_argument("--lists", type=int, help="build: nombre de listes IVF (défaut: ~4·√n)")
+    parser.add_argument("--model", help="build: modèle local, ex: st:paraphrase-multilingual-MiniLM-L12-v2")
+    args = parser.parse_args()
+
+    if not Path(args.db).exists():
+        print(f"ERREUR: Base non trouvée: {args.db}")
+        sys.exit(1)
+
+    model_name = None
+    if args.model:
+        if not args.model.startswith("st:"):
+            print("Modèle attendu sous la forme st:<nom sentence-transformers>")
+            sys.exit(1)
+        model_name = args.model[3:]
+
+    # Manifeste: un index par base (--semantic interroge une base à la fois)
+    for _, db_path in shards.resolve([args.db]):
+        conn = sqlite3.connect(db_path)
+        vec_dir = vectors.vec_dir_for(str(db_path))
+        try:
+            conn.execute("SELECT 1 FROM vec_chunks LIMIT 1")
+        except sqlite3.OperationalError:
+            print(f"ERREUR: Table vec_chunks absente de {db_path}: python init_db.py --upgrade")
+            sys.exit(1)
+
+        start = time.perf_counter()
+        try:
+            if args.command == "build":
+                print(f"Construction de l'index: {vec_dir}")
+                vectors.build(conn, vec_dir, args.dim, model_name, args.lists, progress)
+            elif args.command == "update":
+                before = vectors.read_meta(vec_dir)["count"]
+                meta = vectors.update(conn, vec_dir, progress)
+                print(f"\n{meta['count'] - before} passages ajoutés")
+            if args.command != "stats":
+                print(f"\nTerminé en {time.perf_counter() - start:.1f} s")
+            print_index_stats(conn, vec_dir)
+        except (RuntimeError, ValueError, FileNotFoundError) as e:
+            print(f"\nERREUR: {e}")
+            sys.exit(1)
+        conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,7 @@
 #!/usr/bin/env python3
 """
 ingest_docs.py - Importe les documents (PDF, images, DOCX) dans la base SQLite
-Usage: python ingest_docs.py <dossier_source> [chemin_db]
+Usage: python ingest_docs.py <dossier_source> [chemin_db] [--workers N] [--timeout S] [--ocr queue|later|inline]
 
 Dépendances:
     pip install pymupdf python-docx pillow
@@ -11,49 +11,46 @@ Pour OCR (optionnel mais recommandé):
     + Tesseract installé sur le système
 """
 
+import argparse
 import sqlite3
 import hashlib
+import html
+import io
+import re
 import json
 import sys
 import subprocess
 import tempfile
+import time
+from contextlib import contextmanager
 from pathlib import Path
 from datetime import datetime
-from typing import Optional, Dict, Any, Tuple
+from typing import Optional, Dict, Any, Iterator, List, Set, Tuple, Union
 import traceback
+import zipfile
+from functools import partial
 
-# Imports conditionnels
-try:
-    import fitz  # PyMuPDF
-    HAS_PYMUPDF = True
-except ImportError:
-    HAS_PYMUPDF = False
-    print("⚠ PyMuPDF non installé (pip install pymupdf)")
-
-try:
-    from docx import Document as DocxDocument
-    HAS_DOCX = True
-except ImportError:
-    HAS_DOCX = False
-    print("⚠ python-docx non installé (pip install python-docx)")
-
-try:
-    from PIL import Image
-    import io
-    HAS_PIL = True
-except ImportError:
-    HAS_PIL = False
-    print("⚠ Pillow non installé (pip install pillow)")
+import init_db
+from vpokit import (dates, expand, extractors, minhash, ocrquality, ocrqueue, participants, passages,
+                    pipeline, shards, supervisor, textnorm, timeline, tools)
+from vpokit.vault import Vault
 
 DEFAULT_DB = "vpo_affaire.db"
+VAULT_DIR = "vault"  # Pièces jointes des emails contenus dans les archives
 
 # Extensions supportées
-EXTENSIONS = {
-    'pdf': ['.pdf'],
-    'docx': ['.docx', '.doc'],
-    'image': ['.png', '.jpg', '.jpeg', '.tiff', '.tif', '.bmp', '.gif'],
-    'text': ['.txt', '.csv', '.json', '.xml', '.html', '.htm']
-}
+EXTENSIONS = extractors.EXTENSIONS
+
+DEGRADED_MAX_PAGES = 50  # Pages PDF lues en mode dégradé
+OCR_MODES = ("queue", "later", "inline")
+OCR_TOOLS = {"pdf": "ocrmypdf", "image": "tesseract"}  # Outil requis par type de travail OCR
+TEXT_FLAGS = {"low_text", "sparse_text", "low_quality", "ocr_pending"}  # Flags recalculés après OCR
+PAGE_SEP = "\n\n--- PAGE ---\n\n"
+PARSER_VERSION = 2  # documents.parsed_version; à incrémenter quand l'extraction change (reparse.py)
+DOCX_TEXT_RE = re.compile(r'<w:t(?:\s[^>]*)?>([^<]*)</w:t>')
+
+# Source d'un extracteur: fichier sur disque ou contenu en mémoire (membre d'archive)
+Source = Union[Path, bytes]
 
 # Stats globales
 stats = {
@@ -61,7 +58,12 @@ stats = {
     "imported": 0,
     "skipped": 0,
     "errors": 0,
-    "ocr_done": 0
+    "ocr_done": 0,
+    "expanded": 0,
+    "degraded": 0,
+    "quarantined": 0,
+    "ocr_queued": 0,
+    "ocr_failed": 0
 }
 
 def sha256_file(path: Path) -> str:
@@ -72,76 +74,137 @@ def sha256_file(path: Path) -> str:
             h.update(chunk)
     return h.hexdigest()
 
+@contextmanager
+def as_file(source: Source, suffix: str) -> Iterator[Path]:
+    """Chemin sur disque pour les outils externes (OCR); fichier temporaire si source en mémoire."""
+    if isinstance(source, Path):
+        yield source
+        return
+    with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as tmp:
+        tmp.write(source)
+    try:
+        yield Path(tmp.name)
+    finally:
+        Path(tmp.name).unlink(missing_ok=True)
+
 def get_doc_type(path: Path) -> Optional[str]:
     """Détermine le type de document."""
-    ext = path.suffix.lower()
-    for doc_type, exts in EXTENSIONS.items():
-        if ext in exts:
-            return doc_type
-    return None
+    return extractors.doc_type(path.name)
 
-def extract_pdf_text(path: Path) -> Tuple[str, int, bool]:
-    """
-    Extrait le texte d'un PDF.
-    Retourne: (texte, nb_pages, ocr_fait)
-    """
-    if not HAS_PYMUPDF:
-        return "", 0, False
-    
-    doc = fitz.open(str(path))
+def pdf_pages(source: Source, degraded: bool = False) -> Tuple[List[str], List[bool]]:
+    """Texte natif de chaque page et présence d'images (mode dégradé: premières pages)."""
+    fitz = extractors.load("pymupdf")
+    if fitz is None:
+        return [], []
+    
+    if isinstance(source, Path):
+        doc = fitz.open(str(source))
+    else:
+        doc = fitz.open(stream=source, filetype="pdf")
     pages = []
-    total_chars = 0
+    has_images = []
     
-    for page in doc:
-        text = page.get_text("text")
-        pages.append(text)
-        total_chars += len(text.strip())
+    for page_no, page in enumerate(doc):
+        if degraded and page_no >= DEGRADED_MAX_PAGES:
+            break
+        pages.append(page.get_text("text"))
+        has_images.append(bool(page.get_images()))
     
     doc.close()
+    return pages, has_images
+
+def score_pages(pages: List[str], has_images: List[bool]) -> List[Optional[ocrquality.PageScore]]:
+    """Score de chaque page; None pour une page blanche (ni texte ni image: rien à OCRiser)."""
+    return [
+        None if not images and ocrquality.visible_chars(text) < ocrquality.MIN_PAGE_CHARS
+        else ocrquality.page_score(text)
+        for text, images in zip(pages, has_images)
+    ]
+
+def ocr_pdf_pages(path: Path, pages: List[str], scores: List[Optional[ocrquality.PageScore]],
+                  threshold: float = ocrquality.QUALITY_THRESHOLD
+                  ) -> Tuple[List[str], List[Optional[ocrquality.PageScore]], Optional[List[int]]]:
+    """
+    (Ré)OCRise seulement les pages sous le seuil; une page OCRisée ne remplace
+    la page native que si son score est meilleur.
+    Retourne: (pages, scores, numéros des pages prises de l'OCR, None si l'OCR a échoué)
+    """
+    targets = ocrquality.low_pages(scores, threshold)
+    if not targets:
+        return pages, scores, []
+    # Couche texte présente mais mauvaise: il faut forcer l'OCR de ces pages
+    force = any(ocrquality.visible_chars(pages[p - 1]) for p in targets)
+    ocr_pages = try_ocr_pdf(path, targets, force)
+    if ocr_pages is None:
+        return pages, scores, None
+    
+    pages, scores, used = list(pages), list(scores), []
+    for p in targets:
+        if p > len(ocr_pages):
+            continue
+        score = ocrquality.page_score(ocr_pages[p - 1])
+        if score.score > scores[p - 1].score:
+            pages[p - 1], scores[p - 1] = ocr_pages[p - 1], score
+            used.append(p)
+    return pages, scores, used
+
+def extract_pdf_text(source: Source, degraded: bool = False, ocr: bool = True,
+                     threshold: float = ocrquality.QUALITY_THRESHOLD
+                     ) -> Tuple[str, int, List[int], List[Optional[ocrquality.PageScore]]]:
+    """
+    Extrait le texte d'un PDF, page par page, avec un score de qualité par page.
+    Les pages sous le seuil (scans, couche texte cassée) sont OCRisées.
+    Mode dégradé: premières pages seulement, sans OCR.
+    ocr=False: texte natif seul (l'OCR passe par la file ocr_jobs).
+    Retourne: (texte, nb_pages, pages prises de l'OCR, scores)
+    """
+    pages, has_images = pdf_pages(source, degraded)
+    scores = score_pages(pages, has_images)
+    used: Optional[List[int]] = []
     
-    page_count = len(pages)
-    native_text = "\n\n--- PAGE ---\n\n".join(pages)
-    
-    # Si très peu de texte et plusieurs pages → probablement scan
-    needs_ocr = total_chars < 100 * page_count and page_count > 0
-    
-    if needs_ocr:
-        ocr_text = try_ocr_pdf(path)
-        if ocr_text and len(ocr_text) > len(native_text):
-            return ocr_text, page_count, True
+    if ocr and not degraded and ocrquality.low_pages(scores, threshold):
+        with as_file(source, '.pdf') as path:
+            pages, scores, used = ocr_pdf_pages(path, pages, scores, threshold)
     
-    return native_text, page_count, False
+    return PAGE_SEP.join(pages), len(pages), used or [], scores
 
-def try_ocr_pdf(path: Path) -> Optional[str]:
-    """Tente l'OCR sur un PDF avec ocrmypdf."""
+def try_ocr_pdf(path: Path, pages: Optional[List[int]] = None, force: bool = False) -> Optional[List[str]]:
+    """
+    Tente l'OCR sur un PDF avec ocrmypdf; retourne le texte de chaque page.
+    pages: numéros (1..n) à OCRiser, les autres sont laissées telles quelles.
+    force: OCRise aussi les pages qui ont déjà une couche texte (cassée).
+    """
+    if not tools.has_tool('ocrmypdf'):
+        return None
+    
     try:
         with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as tmp:
             tmp_path = tmp.name
         
         # Lance ocrmypdf
-        result = subprocess.run([
+        command = [
             'ocrmypdf',
             '--rotate-pages',
             '--deskew',
             '--clean',
-            '--skip-text',  # Ne pas ré-OCR les pages avec texte
+            # Ne pas ré-OCR les pages avec texte, sauf couche texte cassée
+            '--force-ocr' if force else '--skip-text',
             '-l', 'fra+eng',  # Français + Anglais
-            str(path),
-            tmp_path
-        ], capture_output=True, timeout=120)
+        ]
+        if pages:
+            command += ['--pages', ','.join(str(p) for p in pages)]
+        result = subprocess.run(command + [str(path), tmp_path], capture_output=True, timeout=120)
         
         if result.returncode == 0:
             # Extrait le texte du PDF OCRisé
-            doc = fitz.open(tmp_path)
-            text = "\n\n".join(page.get_text("text") for page in doc)
+            doc = extractors.load("pymupdf").open(tmp_path)
+            texts = [page.get_text("text") for page in doc]
             doc.close()
             Path(tmp_path).unlink(missing_ok=True)
-            return text
+            return texts
         
         Path(tmp_path).unlink(missing_ok=True)
         
-    except FileNotFoundError:
-        print("    (ocrmypdf non installé, OCR ignoré)")
     except subprocess.TimeoutExpired:
         print("    (OCR timeout)")
     except Exception as e:
@@ -149,99 +212,347 @@ def try_ocr_pdf(path: Path) -> Optional[str]:
     
     return None
 
-def extract_docx_text(path: Path) -> str:
-    """Extrait le texte d'un fichier DOCX."""
-    if not HAS_DOCX:
+def extract_docx_text(source: Source, degraded: bool = False) -> str:
+    """Extrait le texte d'un fichier DOCX (mode dégradé: XML brut, sans python-docx)."""
+    if degraded:
+        return extract_docx_xml(source)
+    
+    docx = extractors.load("docx")
+    if docx is None:
         return ""
     
     try:
-        doc = DocxDocument(str(path))
+        doc = docx.Document(str(source) if isinstance(source, Path) else io.BytesIO(source))
         paragraphs = [p.text for p in doc.paragraphs if p.text.strip()]
         return "\n\n".join(paragraphs)
     except Exception as e:
         print(f"    Erreur DOCX: {e}")
         return ""
 
-def extract_image_text(path: Path) -> Tuple[str, bool]:
+def extract_docx_xml(source: Source) -> str:
+    """Texte des paragraphes de word/document.xml, lu directement dans le ZIP."""
+    try:
+        with zipfile.ZipFile(source if isinstance(source, Path) else io.BytesIO(source)) as zf:
+            xml = zf.read("word/document.xml").decode("utf-8", errors="replace")
+    except (KeyError, zipfile.BadZipFile, OSError):
+        return ""
+    paragraphs = ("".join(DOCX_TEXT_RE.findall(p)) for p in xml.split("</w:p>"))
+    return html.unescape("\n\n".join(p for p in paragraphs if p.strip()))
+
+def extract_image_text(source: Source, suffix: str = '.png') -> Tuple[str, bool, Optional[float]]:
     """
-    Extrait le texte d'une image via OCR.
-    Retourne: (texte, ocr_fait)
+    Extrait le texte d'une image via OCR (sortie TSV: texte + confiance par mot).
+    Retourne: (texte, ocr_fait, confiance moyenne 0..1)
     """
+    if not tools.has_tool('tesseract'):
+        return "", False, None
+    
     try:
-        result = subprocess.run([
-            'tesseract',
-            str(path),
-            'stdout',
-            '-l', 'fra+eng'
-        ], capture_output=True, text=True, timeout=60)
+        with as_file(source, suffix) as path:
+            result = subprocess.run([
+                'tesseract',
+                str(path),
+                'stdout',
+                '-l', 'fra+eng',
+                'tsv'
+            ], capture_output=True, text=True, timeout=60)
         
         if result.returncode == 0:
-            return result.stdout.strip(), True
+            text, confidence = ocrquality.parse_tesseract_tsv(result.stdout)
+            return text.strip(), True, confidence
             
-    except FileNotFoundError:
-        print("    (tesseract non installé)")
     except subprocess.TimeoutExpired:
         print("    (OCR timeout)")
     except Exception as e:
         print(f"    (OCR erreur: {e})")
     
-    return "", False
+    return "", False, None
 
-def extract_text_file(path: Path) -> str:
+def extract_text_file(source: Source) -> str:
     """Lit un fichier texte."""
+    raw = source.read_bytes() if isinstance(source, Path) else source
     encodings = ['utf-8', 'latin-1', 'cp1252']
     for enc in encodings:
         try:
-            return path.read_text(encoding=enc)
+            return raw.decode(enc)
         except:
             continue
     return ""
 
-def process_document(path: Path) -> Dict[str, Any]:
-    """Traite un document et extrait ses métadonnées + texte."""
+def text_flags(text: str, quality: Optional[float] = None,
+               threshold: float = ocrquality.QUALITY_THRESHOLD) -> List[str]:
+    """Flags de qualité qui dépendent du texte extrait."""
+    flags = []
+    if len(text) < 50:
+        flags.append("low_text")
+    if quality is not None and quality < threshold:
+        flags.append("low_quality")
+    return flags
+
+def process_document(path: Path, content: Optional[bytes] = None,
+                     depth: int = 0, budget: Optional[expand.Budget] = None,
+                     degraded: bool = False, defer_ocr: bool = False,
+                     ocr_threshold: float = ocrquality.QUALITY_THRESHOLD) -> Dict[str, Any]:
+    """
+    Traite un document et extrait ses métadonnées + texte.
+    content: contenu déjà en mémoire (membre d'archive, path n'est alors qu'un libellé).
+    budget: si fourni, les archives ZIP sont développées (clé "children").
+    degraded: extracteurs de repli après un échec (sans OCR ni python-docx,
+    premières pages des PDF, archives non développées).
+    defer_ocr: pas d'OCR ici, data["ocr_pending"] indique un travail à enfiler
+    (fichiers sur disque seulement; les membres d'archive restent OCRisés sur place).
+    ocr_threshold: score de page en dessous duquel une page est OCRisée.
+    """
     doc_type = get_doc_type(path)
+    source = path if content is None else content
+    defer_ocr = defer_ocr and content is None
     
     data = {
-        "file_hash": sha256_file(path),
+        "file_hash": sha256_file(path) if content is None else hashlib.sha256(content).hexdigest(),
         "file_path": str(path),
         "filename": path.name,
         "doc_type": doc_type,
-        "size_bytes": path.stat().st_size,
+        "size_bytes": path.stat().st_size if content is None else len(content),
         "extracted_text": "",
         "ocr_done": 0,
         "ocr_quality": None,
         "page_count": None,
+        "page_scores": [],
+        "ocr_pages": [],
         "quality_flags": []
     }
     
     if doc_type == 'pdf':
-        text, pages, ocr = extract_pdf_text(path)
+        text, pages, used, scores = extract_pdf_text(source, degraded, not defer_ocr, ocr_threshold)
         data["extracted_text"] = text
         data["page_count"] = pages
-        data["ocr_done"] = 1 if ocr else 0
+        data["ocr_done"] = 1 if used else 0
+        data["page_scores"] = scores
+        data["ocr_pages"] = used
+        data["ocr_pending"] = defer_ocr and not degraded and bool(ocrquality.low_pages(scores, ocr_threshold))
         
     elif doc_type == 'docx':
-        data["extracted_text"] = extract_docx_text(path)
+        data["extracted_text"] = extract_docx_text(source, degraded)
+        
+    elif doc_type == 'image' and defer_ocr:
+        data["ocr_pending"] = not degraded
         
-    elif doc_type == 'image':
-        text, ocr = extract_image_text(path)
+    elif doc_type == 'image' and not degraded:
+        text, ocr, confidence = extract_image_text(source, path.suffix)
         data["extracted_text"] = text
         data["ocr_done"] = 1 if ocr else 0
+        if ocr:
+            data["page_scores"] = [ocrquality.page_score(text, confidence)]
+            data["ocr_pages"] = [1]
         
     elif doc_type == 'text':
-        data["extracted_text"] = extract_text_file(path)
+        data["extracted_text"] = extract_text_file(source)
+        
+    elif doc_type == 'archive':
+        # Le texte d'une archive est la liste de ses membres; les membres sont des documents liés
+        data["extracted_text"] = "\n".join(expand.list_members(source))
+        if budget is not None and not degraded:
+            data["children"] = expand.expand(source, path.name, str(path), member_parsers(),
+                                             depth + 1, budget)
+    
+    data["extracted_text"] = textnorm.normalize_text(data["extracted_text"]) or ""
+    data["ocr_quality"] = ocrquality.document_score(data["page_scores"])
+    data["doc_date"], data["doc_date_source"] = timeline.document_date(
+        doc_type, source if not degraded else None, data["extracted_text"])
     
     # Évalue la qualité
-    text_len = len(data["extracted_text"] or "")
-    if text_len < 50:
-        data["quality_flags"].append("low_text")
-    if doc_type == 'pdf' and data["page_count"] and text_len < 100 * data["page_count"]:
-        data["quality_flags"].append("sparse_text")
+    data["quality_flags"].extend(text_flags(data["extracted_text"],
+                                            data["ocr_quality"], ocr_threshold))
+    if data.get("ocr_pending"):
+        data["quality_flags"].append("ocr_pending")
+    if budget is not None and depth == 0:
+        data["quality_flags"].extend(sorted(budget.notes))
+    if degraded:
+        data["quality_flags"].append("degraded")
     
     data["quality_flags"] = json.dumps(data["quality_flags"]) if data["quality_flags"] else None
     
+    # Signature MinHash (quasi-doublons)
+    data["minhash"] = minhash.signature(data["extracted_text"])
+    
     return data
 
+def extract_task(path: Path, degraded: bool = False, defer_ocr: bool = False,
+                 ocr_threshold: float = ocrquality.QUALITY_THRESHOLD) -> Dict[str, Any]:
+    """Tâche d'un worker supervisé: un fichier source, archives développées."""
+    return process_document(path, budget=expand.Budget(), degraded=degraded,
+                            defer_ocr=defer_ocr, ocr_threshold=ocr_threshold)
+
+def ocr_task(job: Dict[str, Any], degraded: bool = False,
+             ocr_threshold: float = ocrquality.QUALITY_THRESHOLD) -> Dict[str, Any]:
+    """
+    Tâche d'un worker OCR: les pages d'un PDF sous le seuil (ou une image).
+    Retourne le texte complet, les scores par page et les pages prises de l'OCR.
+    """
+    path = Path(job["file_path"])
+    if not path.exists():
+        raise FileNotFoundError(f"Fichier introuvable: {path}")
+    if job["doc_type"] == 'pdf':
+        pages, has_images = pdf_pages(path)
+        scores = score_pages(pages, has_images)
+        if not ocrquality.low_pages(scores, ocr_threshold):
+            return {"text": None, "page_scores": scores, "ocr_pages": []}
+        pages, scores, used = ocr_pdf_pages(path, pages, scores, ocr_threshold)
+        if used is None:
+            raise RuntimeError("OCR sans résultat")
+        text = PAGE_SEP.join(pages)
+    else:
+        text, ocr, confidence = extract_image_text(path, path.suffix)
+        if not ocr:
+            raise RuntimeError("OCR sans résultat")
+        scores, used = [ocrquality.page_score(text, confidence)], [1]
+    return {"text": textnorm.normalize_text(text) or "", "page_scores": scores, "ocr_pages": used}
+
+def apply_ocr(conn: sqlite3.Connection, job: Dict[str, Any], result: Dict[str, Any],
+              threshold: float = ocrquality.QUALITY_THRESHOLD) -> bool:
+    """
+    Reporte le résultat d'un travail OCR dans documents (FTS mis à jour par trigger)
+    et les scores dans page_quality. Retourne True si du texte OCR a été retenu.
+    """
+    row = conn.execute(
+        "SELECT extracted_text, doc_type, quality_flags, doc_date, doc_date_source FROM documents WHERE id = ?",
+        (job["document_id"],)
+    ).fetchone()
+    if row is None:
+        return False
+    current, doc_type, flags_json, doc_date, date_source = row
+    
+    used = bool(result["ocr_pages"])
+    new_text = result["text"] if used else (current or "")
+    quality = ocrquality.document_score(result["page_scores"])
+    flags = [f for f in json.loads(flags_json or "[]") if f not in TEXT_FLAGS]
+    flags.extend(text_flags(new_text, quality, threshold))
+    
+    # Date écrite dans le scan plutôt que date du scan (métadonnées)
+    text_date = dates.find_date(new_text) if used and date_source != "text" else None
+    if text_date:
+        doc_date, date_source = text_date, "text"
+    
+    conn.execute("""
+        UPDATE documents SET extracted_text = ?, ocr_done = ?, ocr_quality = ?, quality_flags = ?,
+            doc_date = ?, doc_date_source = ?
+        WHERE id = ?
+    """, (new_text, 1 if used else 0, quality, json.dumps(flags) if flags else None,
+          doc_date, date_source, job["document_id"]))
+    ocrquality.store(conn, job["document_id"], result["page_scores"], result["ocr_pages"])
+    if used:
+        minhash.store(conn, "document", job["document_id"], minhash.signature(new_text))
+    return used
+
+def run_ocr_queue(conn: sqlite3.Connection, workers: int = 1,
+                  timeout: float = supervisor.DEFAULT_TIMEOUT,
+                  max_memory: Optional[int] = supervisor.DEFAULT_MAX_MEMORY,
+                  threshold: float = ocrquality.QUALITY_THRESHOLD) -> None:
+    """
+    Traite la file ocr_jobs par priorité dans des workers supervisés.
+    Chaque résultat est validé aussitôt: les documents deviennent cherchables au fil de l'eau.
+    """
+    stale = ocrqueue.reset_stale(conn)
+    if stale:
+        print(f"{stale} travaux OCR interrompus remis en attente")
+    
+    doc_types = [t for t, tool in OCR_TOOLS.items() if tools.has_tool(tool)]
+    missing = {t: tool for t, tool in OCR_TOOLS.items() if t not in doc_types}
+    waiting = ocrqueue.pending_count(conn, missing)
+    if waiting:
+        print(f"⚠ {waiting} travaux OCR gardés en file: {', '.join(sorted(missing.values()))} non disponible")
+    pending = ocrqueue.pending_count(conn, doc_types)
+    if not pending:
+        return
+    
+    print(f"\nOCR: {pending} travaux en attente ({', '.join(doc_types)}), {workers} worker(s), "
+          f"seuil de qualité {threshold}")
+    print("-" * 50)
+    
+    jobs = ocrqueue.iter_claims(conn, doc_types)
+    task = partial(ocr_task, ocr_threshold=threshold)
+    outcomes = supervisor.supervise(jobs, task, workers, timeout, max_memory, retry_degraded=False)
+    for i, outcome in enumerate(outcomes, 1):
+        job = outcome.item
+        print(f"[OCR {i}] [{job['doc_type']}] {Path(job['file_path']).name[:50]}...", end=" ")
+        if outcome.reason is not None:
+            error = f"{outcome.reason}: {(outcome.error or '').splitlines()[0] if outcome.error else ''}"
+            print(f"✗ {error[:80]}")
+            ocrqueue.finish(conn, job["id"], error)
+            stats["ocr_failed"] += 1
+        else:
+            result = outcome.result
+            used = apply_ocr(conn, job, result, threshold)
+            ocrqueue.finish(conn, job["id"])
+            quality = ocrquality.document_score(result["page_scores"])
+            if used:
+                stats["ocr_done"] += 1
+                print(f"✓ {len(result['ocr_pages'])} page(s) OCRisée(s), qualité {quality}")
+            else:
+                print(f"✓ texte natif gardé, qualité {quality}")
+        conn.commit()
+
+def file_mtime(path: Path) -> str:
+    """Date de modification d'un fichier (ISO, à la seconde)."""
+    return datetime.fromtimestamp(path.stat().st_mtime).isoformat(timespec="seconds")
+
+def rescore_documents(conn: sqlite3.Connection, threshold: float = ocrquality.QUALITY_THRESHOLD,
+                      rescore_all: bool = False) -> Tuple[int, int]:
+    """
+    Calcule les scores de qualité des PDF et images déjà importés (ceux qui
+    n'en ont pas, ou tous) et met en file OCR ceux qui ont des pages sous
+    le seuil. Retourne: (documents notés, travaux mis en file).
+    """
+    sql = """
+        SELECT id, file_path, doc_type, size_bytes, extracted_text, ocr_done, quality_flags
+        FROM documents WHERE doc_type IN ('pdf', 'image')
+    """
+    if not rescore_all:
+        sql += " AND ocr_quality IS NULL"
+    scored = queued = 0
+    for doc_id, file_path, doc_type, size, text, ocr_done, flags_json in conn.execute(sql).fetchall():
+        path = Path(file_path)
+        scores: List[Optional[ocrquality.PageScore]] = []
+        to_ocr = False
+        if ocr_done or not path.exists():
+            # Texte déjà OCRisé (ou fichier absent): on note le texte en base
+            pages = (text or "").split(PAGE_SEP.strip()) if doc_type == 'pdf' and not ocr_done else [text or ""]
+            scores = [ocrquality.page_score(p) for p in pages]
+        elif doc_type == 'pdf':
+            scores = score_pages(*pdf_pages(path))
+            to_ocr = bool(ocrquality.low_pages(scores, threshold))
+        else:
+            to_ocr = True  # Image jamais OCRisée
+        
+        quality = ocrquality.document_score(scores)
+        flags = [f for f in json.loads(flags_json or "[]") if f not in ("sparse_text", "low_quality")]
+        flags.extend(f for f in text_flags(text or "", quality, threshold)
+                     if f not in flags)
+        conn.execute("UPDATE documents SET ocr_quality = ?, quality_flags = ? WHERE id = ?",
+                     (quality, json.dumps(flags) if flags else None, doc_id))
+        if not ocr_done:
+            ocrquality.store(conn, doc_id, scores)
+        if to_ocr:
+            ocrqueue.enqueue(conn, doc_id, file_path, doc_type, size, file_mtime(path), requeue=rescore_all)
+            queued += 1
+        scored += 1
+    conn.commit()
+    return scored, queued
+
+def parse_member(content: bytes, filename: str, label: str,
+                 depth: int, budget: expand.Budget) -> Dict[str, Any]:
+    """Parser des membres d'archive: un document (développé s'il est lui-même une archive)."""
+    return process_document(Path(label), content, depth, budget)
+
+def member_parsers() -> Dict[str, expand.Parser]:
+    """Parsers passés à expand(): emails via ingest_msg, tout le reste en documents."""
+    import ingest_msg  # Import tardif: ingest_msg importe ce module
+    return {
+        "msg": ingest_msg.parse_msg_bytes,
+        "eml": ingest_msg.parse_eml_bytes,
+        "document": parse_member,
+    }
+
 def insert_document(conn: sqlite3.Connection, data: Dict[str, Any]) -> Optional[int]:
     """Insère un document dans la DB."""
     cursor = conn.cursor()
@@ -254,19 +565,93 @@ def insert_document(conn: sqlite3.Connection, data: Dict[str, Any]) -> Optional[
     cursor.execute("""
         INSERT INTO documents (
             file_hash, file_path, filename, doc_type, size_bytes,
-            extracted_text, ocr_done, ocr_quality, page_count, quality_flags
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            extracted_text, ocr_done, ocr_quality, page_count, quality_flags,
+            doc_date, doc_date_source, parsed_version
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
     """, (
         data["file_hash"], data["file_path"], data["filename"], data["doc_type"],
         data["size_bytes"], data["extracted_text"], data["ocr_done"],
-        data["ocr_quality"], data["page_count"], data["quality_flags"]
+        data["ocr_quality"], data["page_count"], data["quality_flags"],
+        data.get("doc_date"), data.get("doc_date_source"), PARSER_VERSION
     ))
+    ocrquality.store(conn, cursor.lastrowid, data.get("page_scores", []), data.get("ocr_pages", []))
     
     return cursor.lastrowid
 
-def process_directory(source_dir: Path, db_path: str) -> None:
-    """Traite tous les documents d'un dossier."""
-    conn = sqlite3.connect(db_path)
+def insert_members(conn: sqlite3.Connection, parent_id: int,
+                   children: List[Dict[str, Any]], vault: Vault) -> int:
+    """
+    Insère les éléments développés d'une archive (documents ou emails) et
+    leurs liens parent → enfant. Retourne le nombre d'éléments liés.
+    """
+    import ingest_msg
+    count = 0
+    for node in children:
+        record = node["record"]
+        if node["kind"] == "message":
+            ingest_msg.store_attachments(record, vault)
+            child_type, child_id = "email", ingest_msg.insert_email_tree(conn, record)
+        else:
+            child_type, child_id = "document", insert_document(conn, record)
+            if child_id is None:
+                # Déjà importé (ailleurs): on garde le lien, ses propres membres sont déjà liés
+                child_id = conn.execute(
+                    "SELECT id FROM documents WHERE file_hash = ?", (record["file_hash"],)
+                ).fetchone()[0]
+            else:
+                minhash.store(conn, "document", child_id, record["minhash"])
+                count += insert_members(conn, child_id, record.get("children", []), vault)
+        expand.add_link(conn, "document", parent_id, child_type, child_id)
+        count += 1
+    return count
+
+def load_quarantine(conn: sqlite3.Connection) -> Set[str]:
+    """Chemins en quarantaine (vide si la table n'existe pas encore)."""
+    try:
+        return {row[0] for row in conn.execute("SELECT file_path FROM quarantine")}
+    except sqlite3.OperationalError:
+        print("⚠ Table quarantine absente: python init_db.py --upgrade pour la créer")
+        return set()
+
+def quarantine_file(conn: sqlite3.Connection, path: Path, reason: str,
+                    detail: Optional[str], attempts: int) -> None:
+    """Met un fichier en quarantaine (ou met à jour sa raison s'il y est déjà)."""
+    try:
+        file_hash = sha256_file(path)
+    except OSError:
+        file_hash = None
+    try:
+        conn.execute("""
+            INSERT INTO quarantine (file_path, file_hash, reason, detail, attempts)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(file_path) DO UPDATE SET
+                file_hash = excluded.file_hash, reason = excluded.reason,
+                detail = excluded.detail, attempts = excluded.attempts,
+                runs = runs + 1, updated_at = CURRENT_TIMESTAMP
+        """, (str(path), file_hash, reason, detail, attempts))
+        conn.commit()
+    except sqlite3.OperationalError as e:
+        print(f"    (quarantaine impossible: {e})")
+
+def process_directory(source_dir: Path, db_path: str, workers: int = 1,
+                      timeout: float = supervisor.DEFAULT_TIMEOUT,
+                      max_memory: Optional[int] = supervisor.DEFAULT_MAX_MEMORY,
+                      retry_quarantine: bool = False, ocr_mode: str = "queue",
+                      ocr_threshold: float = ocrquality.QUALITY_THRESHOLD) -> None:
+    """
+    Traite tous les documents d'un dossier (archives ZIP développées).
+    L'extraction tourne dans des workers supervisés; les fichiers qui
+    échouent même en mode dégradé vont en quarantaine.
+    ocr_mode: 'queue' (texte natif d'abord, puis file OCR), 'later'
+    (file OCR remplie seulement, voir ocr_queue.py) ou 'inline' (OCR pendant l'import).
+    ocr_threshold: seules les pages de score inférieur sont OCRisées.
+    db_path: une base, ou un manifeste de shards (chaque document va dans la
+    base de sa date ou de son hash; la quarantaine dans celle des non datés / 0).
+    """
+    router = shards.Router(db_path, init_db.create_shard)
+    vault = Vault(Path(VAULT_DIR))  # Pièces jointes des emails trouvés dans les archives
+    for conn in router.connections():
+        vault.seed_from_db(conn)
     
     # Collecte tous les fichiers supportés
     all_files = []
@@ -275,19 +660,40 @@ def process_directory(source_dir: Path, db_path: str) -> None:
             all_files.extend(source_dir.rglob(f"*{ext}"))
             all_files.extend(source_dir.rglob(f"*{ext.upper()}"))
     
-    # Déduplique
-    all_files = list(set(all_files))
+    # Déduplique (ordre stable d'un run à l'autre)
+    all_files = sorted(set(all_files))
     stats["total"] = len(all_files)
     
-    print(f"Trouvé {stats['total']} documents")
+    quarantined: Set[str] = set()
+    if not retry_quarantine:
+        for conn in router.connections():
+            quarantined |= load_quarantine(conn)
+    if quarantined:
+        before = len(all_files)
+        all_files = [f for f in all_files if str(f) not in quarantined]
+        stats["quarantined"] = before - len(all_files)
+        print(f"{stats['quarantined']} fichiers en quarantaine ignorés (--retry-quarantine pour les retenter)")
+    
+    print(f"Trouvé {stats['total']} documents, {workers} worker(s), "
+          f"limite {timeout:.0f} s / {max_memory // (1024 * 1024) if max_memory else '∞'} Mio par fichier")
     print("-" * 50)
     
-    for i, doc_path in enumerate(all_files, 1):
+    task = partial(extract_task, defer_ocr=ocr_mode != "inline", ocr_threshold=ocr_threshold)
+    outcomes = supervisor.supervise(all_files, task, workers, timeout, max_memory)
+    for i, outcome in enumerate(outcomes, 1):
+        doc_path = outcome.item
+        print(f"[{i}/{len(all_files)}] [{get_doc_type(doc_path)}] {doc_path.name[:50]}...", end=" ")
+        
+        if outcome.reason is not None:
+            print(f"✗ QUARANTAINE ({outcome.reason}): {(outcome.error or '').splitlines()[0][:80]}")
+            quarantine_file(router.conn_for(), doc_path, outcome.reason, outcome.error, outcome.attempts)
+            stats["errors"] += 1
+            stats["quarantined"] += 1
+            continue
+        
         try:
-            doc_type = get_doc_type(doc_path)
-            print(f"[{i}/{stats['total']}] [{doc_type}] {doc_path.name[:50]}...", end=" ")
-            
-            data = process_document(doc_path)
+            data = outcome.result
+            conn = router.conn_for(data["doc_date"], data["file_hash"])
             doc_id = insert_document(conn, data)
             
             if doc_id is None:
@@ -295,16 +701,37 @@ def process_directory(source_dir: Path, db_path: str) -> None:
                 stats["skipped"] += 1
                 continue
             
-            conn.commit()
+            minhash.store(conn, "document", doc_id, data["minhash"])
+            members = insert_members(conn, doc_id, data.get("children", []), vault)
+            stats["expanded"] += members
+            if data.get("ocr_pending"):
+                ocrqueue.enqueue(conn, doc_id, str(doc_path), data["doc_type"],
+                                 data["size_bytes"], file_mtime(doc_path))
+                stats["ocr_queued"] += 1
+            if retry_quarantine:
+                for shard_conn in router.connections():
+                    shard_conn.execute("DELETE FROM quarantine WHERE file_path = ?", (str(doc_path),))
+            vault.sync()  # Blobs durables avant de valider les lignes qui les citent
+            router.commit()
             stats["imported"] += 1
             
             if data["ocr_done"]:
                 stats["ocr_done"] += 1
+            if outcome.degraded:
+                stats["degraded"] += 1
             
             text_len = len(data["extracted_text"] or "")
             status = f"✓ {text_len} chars"
             if data["ocr_done"]:
                 status += " (OCR)"
+            if data["ocr_quality"] is not None:
+                status += f" (qualité {data['ocr_quality']:.2f})"
+            if data.get("ocr_pending"):
+                status += " (OCR en file)"
+            if outcome.degraded:
+                status += " (mode dégradé)"
+            if members:
+                status += f" ({members} éléments développés)"
             print(status)
             
         except Exception as e:
@@ -312,7 +739,33 @@ def process_directory(source_dir: Path, db_path: str) -> None:
             stats["errors"] += 1
             traceback.print_exc()
     
-    conn.close()
+    for conn in router.connections():
+        if ocr_mode == "queue":
+            run_ocr_queue(conn, workers, timeout, max_memory, ocr_threshold)
+        sync_passages(conn)
+        sync_participants(conn)
+    if ocr_mode != "queue" and stats["ocr_queued"]:
+        print(f"\n{stats['ocr_queued']} travaux OCR en file: python ocr_queue.py run --db {db_path}")
+    router.close()
+
+def sync_passages(conn: sqlite3.Connection) -> None:
+    """Découpe en passages (passages_fts) les textes nouveaux, modifiés ou antérieurs."""
+    if not passages.available(conn):
+        print("⚠ Table passages absente: python init_db.py --upgrade pour la créer")
+        return
+    start = time.perf_counter()
+    created = passages.sync(conn)
+    if created:
+        print(f"Passages indexés: {created} ({time.perf_counter() - start:.1f} s)")
+
+def sync_participants(conn: sqlite3.Connection) -> None:
+    """Indexe les correspondants (participants) des emails nouveaux, modifiés ou antérieurs."""
+    if not participants.available(conn):
+        print("⚠ Table participants absente: python init_db.py --upgrade pour la créer")
+        return
+    indexed = participants.sync(conn)
+    if indexed:
+        print(f"Correspondants indexés: {indexed} emails")
 
 def print_stats():
     """Affiche les statistiques."""
@@ -321,18 +774,38 @@ def print_stats():
     print("=" * 50)
     print(f"Total documents:        {stats['total']}")
     print(f"Importés:               {stats['imported']}")
+    print(f"  - en mode dégradé:    {stats['degraded']}")
     print(f"Doublons ignorés:       {stats['skipped']}")
     print(f"Erreurs:                {stats['errors']}")
+    print(f"En quarantaine:         {stats['quarantined']}")
     print(f"OCR effectués:          {stats['ocr_done']}")
+    print(f"  - mis en file:        {stats['ocr_queued']}")
+    print(f"  - en échec:           {stats['ocr_failed']}")
+    print(f"Éléments d'archives:    {stats['expanded']}")
     print("=" * 50)
 
 def main():
-    if len(sys.argv) < 2:
-        print("Usage: python ingest_docs.py <dossier_source> [chemin_db]")
-        sys.exit(1)
-    
-    source_dir = Path(sys.argv[1])
-    db_path = sys.argv[2] if len(sys.argv) > 2 else DEFAULT_DB
+    parser = argparse.ArgumentParser(description="Importe les documents (PDF, DOCX, images, ZIP) dans la base VPO")
+    parser.add_argument("source_dir", help="Dossier source (parcouru récursivement)")
+    parser.add_argument("db", nargs="?", default=DEFAULT_DB, help="Chemin de la base")
+    parser.add_argument("--workers", type=int, default=pipeline.default_workers(),
+                        help="Processus d'extraction en parallèle")
+    parser.add_argument("--timeout", type=float, default=supervisor.DEFAULT_TIMEOUT,
+                        help="Durée maximale par fichier (s) avant arrêt du worker")
+    parser.add_argument("--max-memory", type=int,
+                        default=supervisor.DEFAULT_MAX_MEMORY // (1024 * 1024),
+                        help="Mémoire maximale par worker (Mio, 0 = sans limite)")
+    parser.add_argument("--retry-quarantine", action="store_true",
+                        help="Retenter les fichiers en quarantaine")
+    parser.add_argument("--ocr", choices=OCR_MODES, default="queue",
+                        help="queue: texte natif d'abord puis OCR par priorité; "
+                             "later: remplir la file seulement; inline: OCR pendant l'import")
+    parser.add_argument("--ocr-threshold", type=float, default=ocrquality.QUALITY_THRESHOLD,
+                        help="Score de qualité (0..1) sous lequel une page est OCRisée")
+    args = parser.parse_args()
+    
+    source_dir = Path(args.source_dir)
+    db_path = args.db
     
     if not source_dir.exists():
         print(f"ERREUR: Dossier non trouvé: {source_dir}")
@@ -347,29 +820,18 @@ def main():
     print(f"Base:    {db_path}")
     print()
     
-    # Vérifie les outils disponibles
+    # Vérifie les outils disponibles (sans importer ni lancer quoi que ce soit)
     print("Outils disponibles:")
-    print(f"  PyMuPDF (PDF):     {'✓' if HAS_PYMUPDF else '✗'}")
-    print(f"  python-docx:       {'✓' if HAS_DOCX else '✗'}")
-    print(f"  Pillow:            {'✓' if HAS_PIL else '✗'}")
-    
-    # Vérifie tesseract
-    try:
-        subprocess.run(['tesseract', '--version'], capture_output=True)
-        print("  Tesseract OCR:     ✓")
-    except:
-        print("  Tesseract OCR:     ✗")
-    
-    # Vérifie ocrmypdf
-    try:
-        subprocess.run(['ocrmypdf', '--version'], capture_output=True)
-        print("  ocrmypdf:          ✓")
-    except:
-        print("  ocrmypdf:          ✗")
-    
+    print(f"  PyMuPDF (PDF):     {'✓' if extractors.is_available('pymupdf') else '✗'}")
+    print(f"  python-docx:       {'✓' if extractors.is_available('docx') else '✗'}")
+    print(f"  Pillow:            {'✓' if extractors.is_available('pillow') else '✗'}")
+    print(f"  Tesseract OCR:     {'✓' if tools.has_tool('tesseract') else '✗'}")
+    print(f"  ocrmypdf:          {'✓' if tools.has_tool('ocrmypdf') else '✗'}")
     print()
     
-    process_directory(source_dir, db_path)
+    process_directory(source_dir, db_path, args.workers, args.timeout,
+                      args.max_memory * 1024 * 1024 or None, args.retry_quarantine, args.ocr,
+                      args.ocr_threshold)
     print_stats()
 
 if __name__ == "__main__":
@@ -1,30 +1,43 @@
 #!/usr/bin/env python3
 """
-ingest_msg.py - Importe les emails .msg dans la base SQLite
-Usage: python ingest_msg.py <dossier_source> [chemin_db]
+ingest_msg.py - Importe les emails (.msg, .eml, mbox) dans la base SQLite
+Usage: python ingest_msg.py <dossier_source|fichier_mbox> [chemin_db] [--workers N]
+
+Un dossier est parcouru récursivement (.msg, .eml, .mbox/.mbx); un fichier
+sans extension .msg/.eml est lu comme un mbox, message par message.
 
 Dépendances:
     pip install extract-msg python-dateutil
 """
 
+import argparse
 import sqlite3
 import hashlib
+import email
+import email.message
+import email.policy
+import email.utils
 import json
+import mimetypes
 import sys
-import re
+import time
+from functools import partial
 from pathlib import Path
 from datetime import datetime
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, Iterator, List, Union
 import traceback
 
-try:
-    import extract_msg
-except ImportError:
-    print("ERREUR: install extract-msg avec: pip install extract-msg")
-    sys.exit(1)
+import ingest_docs
+import init_db
+from vpokit import dates, expand, extractors, htmltext, mbox, minhash, pipeline, quotes, shards, textnorm
+from vpokit.packvault import PackVault
+from vpokit.vault import Vault, spool
 
 DEFAULT_DB = "vpo_affaire.db"
 VAULT_DIR = "vault"  # Dossier pour stocker les pièces jointes
+COMMIT_EVERY = 100   # Emails par transaction (un seul écrivain DB)
+MAX_ATT_MEM = 8 * 1024 * 1024  # Au-delà, une PJ est écrite par blocs dans le vault par le worker
+PARSER_VERSION = 2  # emails.parsed_version; à incrémenter quand le parsing change (reparse.py)
 
 # Stats globales
 stats = {
@@ -47,103 +60,273 @@ def sha256_bytes(data: bytes) -> str:
     """Calcule le SHA256 de bytes."""
     return hashlib.sha256(data).hexdigest()
 
-def clean_text(text: Optional[str]) -> Optional[str]:
-    """Nettoie le texte (encoding, whitespace)."""
-    if not text:
-        return None
-    # Normalise les fins de ligne et espaces multiples
-    text = re.sub(r'\r\n', '\n', text)
-    text = re.sub(r'[ \t]+', ' ', text)
-    text = re.sub(r'\n{3,}', '\n\n', text)
-    return text.strip()
+def parse_msg(path: Path, vault_root: Optional[Path] = None,
+              max_att_mem: int = MAX_ATT_MEM) -> Dict[str, Any]:
+    """
+    Parse un fichier .msg et extrait toutes les infos.
+    Exécuté dans un worker. Les pièces jointes jusqu'à max_att_mem octets
+    sont retournées en mémoire (clé "data") pour l'étage vault; au-delà,
+    elles sont écrites par blocs dans le staging du vault (clé "staged") et
+    ne traversent plus le pipeline. Les pièces jointes ZIP/.msg/.eml sont
+    développées (clé "children" de la pièce jointe).
+    """
+    msg = extractors.load("extract_msg").Message(str(path))
+    return _parse_msg_object(msg, sha256_file(path), str(path), 0, expand.Budget(),
+                             vault_root, max_att_mem)
 
-def extract_email_address(sender: str) -> Optional[str]:
-    """Extrait l'adresse email d'un champ sender."""
-    if not sender:
-        return None
-    # Pattern basique pour email
-    match = re.search(r'[\w\.-]+@[\w\.-]+\.\w+', sender)
-    return match.group(0).lower() if match else None
+def parse_eml(path: Path, vault_root: Optional[Path] = None,
+              max_att_mem: int = MAX_ATT_MEM) -> Dict[str, Any]:
+    """Parse un fichier .eml (lu dans le worker)."""
+    return parse_eml_bytes(path.read_bytes(), path.name, str(path), 0, expand.Budget(),
+                           vault_root, max_att_mem)
 
-def parse_date(date_str: Optional[str]) -> Optional[str]:
-    """Parse une date Outlook en ISO format."""
-    if not date_str:
-        return None
-    try:
-        from dateutil import parser
-        dt = parser.parse(date_str)
-        return dt.isoformat()
-    except:
-        return date_str  # Retourne tel quel si parsing échoue
+def parse_item(item: Union[Path, mbox.RawMessage], vault_root: Optional[Path] = None,
+               max_att_mem: int = MAX_ATT_MEM) -> Dict[str, Any]:
+    """Parser du pipeline: fichier .msg / .eml, ou message extrait d'un mbox."""
+    if isinstance(item, mbox.RawMessage):
+        return parse_eml_bytes(item.content, "message.eml", item.label, 0, expand.Budget(),
+                               vault_root, max_att_mem)
+    if item.suffix.lower() == ".eml":
+        return parse_eml(item, vault_root, max_att_mem)
+    return parse_msg(item, vault_root, max_att_mem)
 
-def save_attachment(att_data: bytes, filename: str, vault_dir: Path) -> str:
-    """Sauvegarde une pièce jointe dans le vault, retourne le chemin."""
-    file_hash = sha256_bytes(att_data)
-    # Structure: vault/ab/cd/abcd1234...ext
-    subdir = vault_dir / file_hash[:2] / file_hash[2:4]
-    subdir.mkdir(parents=True, exist_ok=True)
+def iter_messages(source: Path, with_msg: bool = True) -> Iterator[Union[Path, mbox.RawMessage]]:
+    """
+    Découverte: fichiers .msg/.eml (parsés par les workers) et messages des
+    mbox, lus en flux sans fichier intermédiaire.
+    """
+    if source.is_file():
+        if source.suffix.lower() in (".msg", ".eml"):
+            yield source
+        else:
+            yield from mbox.iter_mbox(source)
+        return
     
-    ext = Path(filename).suffix if filename else ''
-    dest = subdir / f"{file_hash}{ext}"
-    
-    if not dest.exists():
-        dest.write_bytes(att_data)
-    
-    return str(dest)
+    for path in source.rglob("*"):
+        suffix = path.suffix.lower()
+        if suffix == ".eml" or (suffix == ".msg" and with_msg):
+            yield path
+        elif suffix in mbox.MBOX_EXTS and path.is_file():
+            yield from mbox.iter_mbox(path)
 
-def parse_msg(path: Path, vault_dir: Path) -> Dict[str, Any]:
-    """Parse un fichier .msg et extrait toutes les infos."""
-    msg = extract_msg.Message(str(path))
-    
-    # Extraire les infos de base
+def parse_msg_bytes(content: bytes, filename: str, label: str, depth: int,
+                    budget: expand.Budget, vault_root: Optional[Path] = None,
+                    max_att_mem: int = MAX_ATT_MEM) -> Dict[str, Any]:
+    """Parse un .msg en mémoire (pièce jointe, membre d'archive): parser pour expand()."""
+    msg = extractors.load("extract_msg").Message(content)
+    return _parse_msg_object(msg, sha256_bytes(content), label, depth, budget,
+                             vault_root, max_att_mem)
+
+def _parse_msg_object(msg: Any, file_hash: str, file_path: str, depth: int,
+                      budget: expand.Budget, vault_root: Optional[Path],
+                      max_att_mem: int) -> Dict[str, Any]:
+    """Construit l'enregistrement d'un message extract_msg ouvert."""
     data = {
-        "file_hash": sha256_file(path),
-        "file_path": str(path),
+        "file_hash": file_hash,
+        "file_path": file_path,
         "message_id": getattr(msg, 'messageId', None),
-        "subject": clean_text(msg.subject),
-        "sender": clean_text(msg.sender),
-        "sender_email": extract_email_address(msg.sender),
+        "subject": textnorm.normalize_text(msg.subject),
+        "sender": textnorm.normalize_text(msg.sender),
+        "sender_email": textnorm.extract_email_address(msg.sender),
         "recipients": json.dumps(msg.to.split(';') if msg.to else []),
         "cc": json.dumps(msg.cc.split(';') if msg.cc else []),
-        "date_sent": parse_date(msg.date),
+        "date_sent": dates.parse_date(msg.date),
         "date_parsed": datetime.now().isoformat(),
-        "body_text": clean_text(msg.body),
+        "body_text": textnorm.normalize_text(msg.body),
         "body_html": getattr(msg, 'htmlBody', None),
         "attachments": []
     }
     
-    # Qualité
-    quality_flags = []
-    if not data["body_text"] and not data["body_html"]:
-        quality_flags.append("no_body")
-    if not data["date_sent"]:
-        quality_flags.append("no_date")
-    if not data["sender"]:
-        quality_flags.append("no_sender")
-    data["quality_flags"] = json.dumps(quality_flags) if quality_flags else None
-    
     # Pièces jointes
     for att in msg.attachments:
+        filename = "unnamed"
         try:
             filename = att.longFilename or att.shortFilename or "unnamed"
             att_data = att.data
-            if att_data:
-                vault_path = save_attachment(att_data, filename, vault_dir)
-                data["attachments"].append({
-                    "filename": filename,
-                    "file_hash": sha256_bytes(att_data),
-                    "size_bytes": len(att_data),
-                    "vault_path": vault_path,
-                    "content_type": getattr(att, 'mimeType', None)
-                })
+            if att_data is not None and not isinstance(att_data, (bytes, bytearray)):
+                # Email joint (objet extract_msg): repris sous forme de .msg
+                att_data = att_data.exportBytes() if hasattr(att_data, "exportBytes") else None
+                if not filename.lower().endswith(".msg"):
+                    filename += ".msg"
+            if not att_data:
+                continue
+            data["attachments"].append(make_attachment(
+                filename, att_data, getattr(att, 'mimeType', None), f"{file_path}!/{filename}",
+                depth, budget, vault_root, max_att_mem
+            ))
+            del att_data
         except Exception as e:
             print(f"  ⚠ Erreur pièce jointe {filename}: {e}")
     
+    raw_date = msg.date
     msg.close()
+    return finish_record(data, raw_date, depth, budget)
+
+def parse_eml_bytes(content: bytes, filename: str, label: str, depth: int,
+                    budget: expand.Budget, vault_root: Optional[Path] = None,
+                    max_att_mem: int = MAX_ATT_MEM) -> Dict[str, Any]:
+    """Parse un message RFC 822 (.eml) en mémoire: même enregistrement que parse_msg."""
+    msg = email.message_from_bytes(content, policy=email.policy.default)
+    sender = _header(msg, "From")
+    raw_date = _header(msg, "Date")
+    
+    data = {
+        "file_hash": sha256_bytes(content),
+        "file_path": label,
+        "message_id": _header(msg, "Message-ID"),
+        "subject": textnorm.normalize_text(_header(msg, "Subject")),
+        "sender": textnorm.normalize_text(sender),
+        "sender_email": textnorm.extract_email_address(sender),
+        "recipients": json.dumps(_addresses(msg, "To")),
+        "cc": json.dumps(_addresses(msg, "Cc")),
+        "date_sent": dates.parse_date(raw_date),
+        "date_parsed": datetime.now().isoformat(),
+        "body_text": textnorm.normalize_text(_body(msg, "plain")),
+        "body_html": _body(msg, "html"),
+        "attachments": []
+    }
+    
+    for part in msg.iter_attachments():
+        att_name = "unnamed"
+        try:
+            if part.get_content_type() == "message/rfc822":
+                att_name = part.get_filename() or "message.eml"
+                att_data = part.get_content().as_bytes()
+            else:
+                att_name = part.get_filename() or "unnamed"
+                att_data = part.get_payload(decode=True)
+            if not att_data:
+                continue
+            data["attachments"].append(make_attachment(
+                att_name, att_data, part.get_content_type(), f"{label}!/{att_name}",
+                depth, budget, vault_root, max_att_mem
+            ))
+        except Exception as e:
+            print(f"  ⚠ Erreur pièce jointe {att_name}: {e}")
+    
+    return finish_record(data, raw_date, depth, budget)
+
+def _header(msg: email.message.EmailMessage, name: str) -> Optional[str]:
+    """En-tête en texte, None si absent ou illisible."""
+    try:
+        value = msg.get(name)
+    except Exception:
+        return None
+    return str(value) if value is not None else None
+
+def _addresses(msg: email.message.EmailMessage, name: str) -> List[str]:
+    """Destinataires d'un en-tête, au format 'Nom <adresse>' comme dans les .msg."""
+    try:
+        values = [str(v) for v in msg.get_all(name, [])]
+    except Exception:
+        return []
+    return [f"{n} <{a}>" if n else a for n, a in email.utils.getaddresses(values) if a]
+
+def _body(msg: email.message.EmailMessage, subtype: str) -> Optional[str]:
+    """Corps texte ou HTML d'un message (charset inconnu: décodage latin-1)."""
+    part = msg.get_body(preferencelist=(subtype,))
+    if part is None:
+        return None
+    try:
+        return part.get_content()
+    except (LookupError, UnicodeError):
+        payload = part.get_payload(decode=True)
+        return payload.decode('latin-1') if payload else None
+
+def make_attachment(filename: str, content: bytes, content_type: Optional[str], label: str,
+                    depth: int, budget: expand.Budget, vault_root: Optional[Path],
+                    max_att_mem: int, extract_text: bool = False) -> Dict[str, Any]:
+    """
+    Enregistrement d'une pièce jointe (ou d'un membre d'archive si extract_text).
+    Les conteneurs (ZIP, .msg, .eml) sont développés dans "children".
+    """
+    record = {
+        "filename": filename,
+        "size_bytes": len(content),
+        "content_type": content_type
+    }
+    if extract_text:
+        # Membre d'archive: texte extrait comme pour un document autonome
+        doc = ingest_docs.process_document(Path(label), content)
+        record["extracted_text"] = doc["extracted_text"] or None
+        record["ocr_done"] = doc["ocr_done"]
+    if expand.container_kind(filename):
+        record["children"] = expand.expand(content, filename, label,
+                                           _parsers(vault_root, max_att_mem), depth + 1, budget)
+    if vault_root is not None and len(content) > max_att_mem:
+        record["staged"], record["file_hash"], _ = spool(vault_root, content)
+    else:
+        record["file_hash"] = sha256_bytes(content)
+        record["data"] = content
+    return record
+
+def parse_member(content: bytes, filename: str, label: str, depth: int,
+                 budget: expand.Budget, vault_root: Optional[Path] = None,
+                 max_att_mem: int = MAX_ATT_MEM) -> Dict[str, Any]:
+    """Parser des membres d'archive: une pièce jointe de plus, avec son texte."""
+    return make_attachment(filename, content, mimetypes.guess_type(filename)[0], label,
+                           depth, budget, vault_root, max_att_mem, extract_text=True)
+
+def _parsers(vault_root: Optional[Path], max_att_mem: int) -> Dict[str, expand.Parser]:
+    """Parsers passés à expand() pour les conteneurs trouvés dans un email."""
+    return {
+        "msg": partial(parse_msg_bytes, vault_root=vault_root, max_att_mem=max_att_mem),
+        "eml": partial(parse_eml_bytes, vault_root=vault_root, max_att_mem=max_att_mem),
+        "document": partial(parse_member, vault_root=vault_root, max_att_mem=max_att_mem),
+    }
+
+def finish_record(data: Dict[str, Any], raw_date: Any, depth: int = 0,
+                  budget: Optional[expand.Budget] = None) -> Dict[str, Any]:
+    """Complète un enregistrement email: texte des emails HTML seuls, nouveau contenu, qualité, MinHash."""
+    html_only = not data["body_text"] and bool(data["body_html"])
+    if html_only:
+        data["body_text"] = htmltext.html_to_text(data["body_html"])
+    
+    # Sépare le nouveau contenu de l'historique cité (seul le nouveau est indexé)
+    data["body_new"], _quoted = quotes.split_reply(data["body_text"])
+    
+    # Qualité
+    quality_flags = []
+    if not data["body_text"] and not data["body_html"]:
+        quality_flags.append("no_body")
+    if html_only:
+        quality_flags.append("body_from_html")
+    if not data["date_sent"]:
+        # Date présente mais illisible ≠ date absente
+        quality_flags.append("date_unparsed" if raw_date else "no_date")
+    if not data["sender"]:
+        quality_flags.append("no_sender")
+    if budget is not None and depth == 0:
+        quality_flags.extend(sorted(budget.notes))
+    data["quality_flags"] = json.dumps(quality_flags) if quality_flags else None
+    
+    # Signature MinHash (quasi-doublons)
+    data["minhash"] = minhash.signature(data["body_text"])
+    return data
+
+def store_attachments(data: Dict[str, Any], vault: Union[Vault, PackVault]) -> Dict[str, Any]:
+    """Étage vault: écrit les pièces jointes et remplace leur contenu par le chemin."""
+    _store_list(data["attachments"], vault)
     return data
 
-def insert_email(conn: sqlite3.Connection, data: Dict[str, Any]) -> Optional[int]:
-    """Insère un email dans la DB, retourne l'ID ou None si doublon."""
+def _store_list(attachments: List[Dict[str, Any]], vault: Union[Vault, PackVault]) -> None:
+    for att in attachments:
+        if "staged" in att:
+            att["vault_path"] = vault.adopt(att.pop("staged"), att["file_hash"], att["filename"])
+        else:
+            att["vault_path"] = vault.store_bytes(att.pop("data"), att["filename"], att["file_hash"])
+        for node in att.get("children", []):
+            if node["kind"] == "message":
+                store_attachments(node["record"], vault)
+            else:
+                _store_list([node["record"]], vault)
+
+def insert_email(conn: sqlite3.Connection, data: Dict[str, Any],
+                 html_mode: str = "keep") -> Optional[int]:
+    """
+    Insère un email dans la DB, retourne l'ID ou None si doublon.
+    html_mode: body_html gardé ("keep"), compressé ("compress") ou omis ("drop").
+    """
     cursor = conn.cursor()
     
     # Vérifie doublon par hash
@@ -154,22 +337,27 @@ def insert_email(conn: sqlite3.Connection, data: Dict[str, Any]) -> Optional[int
     cursor.execute("""
         INSERT INTO emails (
             message_id, file_hash, file_path, subject, sender, sender_email,
-            recipients, cc, date_sent, date_parsed, body_text, body_html,
-            has_attachments, attachment_count, quality_flags
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            recipients, cc, date_sent, date_parsed, body_text, body_new, body_html,
+            has_attachments, attachment_count, quality_flags, parsed_version
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
     """, (
         data["message_id"], data["file_hash"], data["file_path"],
         data["subject"], data["sender"], data["sender_email"],
         data["recipients"], data["cc"], data["date_sent"], data["date_parsed"],
-        data["body_text"], data["body_html"],
+        data["body_text"], data["body_new"], htmltext.pack_html(data["body_html"], html_mode),
         1 if data["attachments"] else 0, len(data["attachments"]),
-        data["quality_flags"]
+        data["quality_flags"], PARSER_VERSION
     ))
     
     return cursor.lastrowid
 
-def insert_attachments(conn: sqlite3.Connection, email_id: int, attachments: List[Dict]) -> int:
-    """Insère les pièces jointes, retourne le nombre inséré."""
+def insert_attachments(conn: sqlite3.Connection, email_id: int, attachments: List[Dict],
+                       parent_id: Optional[int] = None, html_mode: str = "keep") -> int:
+    """
+    Insère les pièces jointes, retourne le nombre inséré.
+    Les membres d'archive sont des pièces jointes du même email, liées à
+    leur archive (parent_id); les emails joints sont insérés à part et liés.
+    """
     cursor = conn.cursor()
     count = 0
     
@@ -184,42 +372,119 @@ def insert_attachments(conn: sqlite3.Connection, email_id: int, attachments: Lis
         
         cursor.execute("""
             INSERT INTO attachments (
-                email_id, file_hash, filename, content_type, size_bytes, vault_path
-            ) VALUES (?, ?, ?, ?, ?, ?)
+                email_id, file_hash, filename, content_type, size_bytes, vault_path,
+                extracted_text, ocr_done
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
         """, (
             email_id, att["file_hash"], att["filename"],
-            att["content_type"], att["size_bytes"], att["vault_path"]
+            att["content_type"], att["size_bytes"], att["vault_path"],
+            att.get("extracted_text"), att.get("ocr_done", 0)
         ))
+        att_id = cursor.lastrowid
         count += 1
+        if parent_id is not None:
+            expand.add_link(conn, "attachment", parent_id, "attachment", att_id)
+        
+        for node in att.get("children", []):
+            if node["kind"] == "message":
+                child_id = insert_email_tree(conn, node["record"], html_mode)
+                expand.add_link(conn, "attachment", att_id, "email", child_id)
+            else:
+                count += insert_attachments(conn, email_id, [node["record"]], att_id, html_mode)
     
     return count
 
-def process_directory(source_dir: Path, db_path: str, vault_dir: Path) -> None:
-    """Traite tous les .msg d'un dossier (récursif)."""
-    conn = sqlite3.connect(db_path)
+def insert_email_tree(conn: sqlite3.Connection, data: Dict[str, Any],
+                      html_mode: str = "keep") -> int:
+    """
+    Insère un email trouvé dans un conteneur avec ses pièces jointes.
+    Retourne son ID (celui de l'exemplaire existant si doublon).
+    """
+    try:
+        email_id = insert_email(conn, data, html_mode)
+    except sqlite3.IntegrityError:
+        # Même Message-ID qu'un email déjà importé (copie jointe d'un message de la boîte)
+        return conn.execute(
+            "SELECT id FROM emails WHERE message_id = ?", (data["message_id"],)
+        ).fetchone()[0]
+    if email_id is None:
+        return conn.execute(
+            "SELECT id FROM emails WHERE file_hash = ?", (data["file_hash"],)
+        ).fetchone()[0]
+    insert_attachments(conn, email_id, data["attachments"], html_mode=html_mode)
+    minhash.store(conn, "email", email_id, data["minhash"])
+    return email_id
+
+def process_directory(source_dir: Path, db_path: str, vault_dir: Path,
+                      workers: int = 1, fsync: bool = True,
+                      max_att_mem: int = MAX_ATT_MEM, vault_format: str = "loose",
+                      html_mode: str = "keep") -> None:
+    """
+    Traite tous les emails d'un dossier (récursif) ou d'un mbox via le pipeline:
+    découverte → parsing (workers processus) → vault → DB.
+    vault_format: "loose" (un fichier par blob) ou "packed" (fichiers pack).
+    db_path: une base, ou un manifeste de shards (chaque email va dans la base de sa date ou de son hash).
+    """
+    router = shards.Router(db_path, init_db.create_shard)
+    if vault_format == "packed":
+        vault = PackVault(vault_dir, fsync=fsync)
+    else:
+        vault = Vault(vault_dir, fsync=fsync)
+    vault.clean_staging()
+    known = 0
+    for conn in router.connections():
+        known = vault.seed_from_db(conn)
+    print(f"Vault: {known} pièces jointes déjà connues")
+    pending = 0
     
-    msg_files = list(source_dir.rglob("*.msg"))
-    stats["total"] = len(msg_files)
+    with_msg = extractors.is_available("extract_msg")
     
-    print(f"Trouvé {stats['total']} fichiers .msg")
-    print("-" * 50)
+    def discover():
+        for item in iter_messages(source_dir, with_msg):
+            stats["total"] += 1
+            yield item
     
-    for i, msg_path in enumerate(msg_files, 1):
+    def write(item: Union[Path, mbox.RawMessage, None], data: Optional[Dict[str, Any]],
+              error: Optional[str]) -> None:
+        nonlocal pending
+        i = stats["imported"] + stats["skipped"] + stats["errors"] + 1
+        if isinstance(item, mbox.RawMessage):
+            name = Path(item.label).name
+        else:
+            name = item.name if item else '?'
+        print(f"[{i}] {name[:60]}...", end=" ")
+        
+        if error:
+            print(f"✗ ERREUR: {error}")
+            stats["errors"] += 1
+            return
+        
         try:
-            print(f"[{i}/{stats['total']}] {msg_path.name[:60]}...", end=" ")
-            
-            data = parse_msg(msg_path, vault_dir)
-            email_id = insert_email(conn, data)
+            conn = router.conn_for(data["date_sent"], data["file_hash"])
+            try:
+                email_id = insert_email(conn, data, html_mode)
+            except sqlite3.IntegrityError as e:
+                if "message_id" not in str(e):
+                    raise
+                # Même Message-ID, autres octets: le même message en .msg et dans un mbox/.eml
+                print("(doublon Message-ID, ignoré)")
+                stats["skipped"] += 1
+                return
             
             if email_id is None:
                 print("(doublon, ignoré)")
                 stats["skipped"] += 1
-                continue
+                return
             
-            att_count = insert_attachments(conn, email_id, data["attachments"])
+            att_count = insert_attachments(conn, email_id, data["attachments"], html_mode=html_mode)
             stats["attachments"] += att_count
+            minhash.store(conn, "email", email_id, data["minhash"])
             
-            conn.commit()
+            pending += 1
+            if pending >= COMMIT_EVERY:
+                vault.sync()  # Blobs durables avant de valider les lignes qui les citent
+                router.commit()
+                pending = 0
             stats["imported"] += 1
             
             status = f"✓ {att_count} PJ" if att_count else "✓"
@@ -229,16 +494,40 @@ def process_directory(source_dir: Path, db_path: str, vault_dir: Path) -> None:
             print(f"✗ ERREUR: {e}")
             stats["errors"] += 1
             traceback.print_exc()
-            continue
     
-    conn.close()
+    print(f"Parsing sur {workers} worker(s)")
+    print("-" * 50)
+    
+    start = time.perf_counter()
+    try:
+        stage_stats = pipeline.run_pipeline(
+            discover(),
+            partial(parse_item, vault_root=vault_dir, max_att_mem=max_att_mem),
+            partial(store_attachments, vault=vault),
+            write,
+            workers=workers
+        )
+        vault.sync()
+        router.commit()
+        for conn in router.connections():
+            ingest_docs.sync_passages(conn)
+            ingest_docs.sync_participants(conn)
+    finally:
+        vault.sync()
+        router.commit()
+        router.close()
+        if isinstance(vault, PackVault):
+            vault.close()
+    
+    print()
+    pipeline.print_stage_stats(stage_stats, time.perf_counter() - start, workers)
 
 def print_stats():
     """Affiche les statistiques finales."""
     print("\n" + "=" * 50)
     print("RÉSUMÉ")
     print("=" * 50)
-    print(f"Total fichiers .msg:    {stats['total']}")
+    print(f"Total messages:         {stats['total']}")
     print(f"Importés:               {stats['imported']}")
     print(f"Doublons ignorés:       {stats['skipped']}")
     print(f"Erreurs:                {stats['errors']}")
@@ -246,17 +535,27 @@ def print_stats():
     print("=" * 50)
 
 def main():
-    if len(sys.argv) < 2:
-        print("Usage: python ingest_msg.py <dossier_source> [chemin_db]")
-        print("Exemple: python ingest_msg.py 'C:\\Users\\opochon\\Documents\\Affaire VPO vs OPO'")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(description="Importe les emails .msg/.eml/mbox dans la base VPO")
+    parser.add_argument("source_dir", help="Dossier source (parcouru récursivement) ou fichier mbox")
+    parser.add_argument("db", nargs="?", default=DEFAULT_DB, help="Chemin de la base")
+    parser.add_argument("--workers", type=int, default=pipeline.default_workers(),
+                        help="Processus de parsing en parallèle (1 = séquentiel)")
+    parser.add_argument("--max-att-mem", type=int, default=MAX_ATT_MEM // (1024 * 1024),
+                        help="Taille (Mio) au-delà de laquelle une PJ est écrite par blocs")
+    parser.add_argument("--no-fsync", action="store_true",
+                        help="Ne pas forcer l'écriture disque des pièces jointes (plus rapide, moins sûr)")
+    parser.add_argument("--vault-format", choices=["loose", "packed"], default="loose",
+                        help="Stockage des PJ: un fichier par blob ou fichiers pack compressés")
+    parser.add_argument("--html", choices=htmltext.HTML_MODES, default="keep",
+                        help="Stockage du corps HTML: tel quel, compressé ou supprimé (le texte reste indexé)")
+    args = parser.parse_args()
     
-    source_dir = Path(sys.argv[1])
-    db_path = sys.argv[2] if len(sys.argv) > 2 else DEFAULT_DB
+    source_dir = Path(args.source_dir)
+    db_path = args.db
     vault_dir = Path(VAULT_DIR)
     
     if not source_dir.exists():
-        print(f"ERREUR: Dossier non trouvé: {source_dir}")
+        print(f"ERREUR: Source non trouvée: {source_dir}")
         sys.exit(1)
     
     if not Path(db_path).exists():
@@ -264,14 +563,22 @@ def main():
         print("Lance d'abord: python init_db.py")
         sys.exit(1)
     
+    if not extractors.is_available("extract_msg"):
+        if source_dir.is_file() and source_dir.suffix.lower() == ".msg":
+            print("ERREUR: install extract-msg avec: pip install extract-msg")
+            sys.exit(1)
+        print("ATTENTION: extract-msg absent, les .msg seront ignorés (pip install extract-msg)")
+    
     vault_dir.mkdir(exist_ok=True)
     
     print(f"Source:  {source_dir}")
     print(f"Base:    {db_path}")
-    print(f"Vault:   {vault_dir}")
+    print(f"Vault:   {vault_dir} ({args.vault_format})")
     print()
     
-    process_directory(source_dir, db_path, vault_dir)
+    process_directory(source_dir, db_path, vault_dir, args.workers, fsync=not args.no_fsync,
+                      max_att_mem=args.max_att_mem * 1024 * 1024, vault_format=args.vault_format,
+                      html_mode=args.html)
     print_stats()
 
 if __name__ == "__main__":
@@ -1,16 +1,23 @@
 #!/usr/bin/env python3
 """
 init_db.py - Initialise la base SQLite + FTS5 pour l'affaire VPO vs OPO
-Usage: python init_db.py [chemin_db]
+Usage: python init_db.py [chemin_db] [--full-body-fts] [--upgrade]
 """
 
+import argparse
 import sqlite3
-import sys
 from pathlib import Path
+from typing import List
+
+from vpokit import participants, passages, shards, timeline
 
 DEFAULT_DB = "vpo_affaire.db"
 
-SCHEMA = """
+# Colonne des emails indexée en FTS: nouveau contenu seul (défaut) ou corps complet
+FTS_BODY_NEW = "body_new"
+FTS_BODY_FULL = "body_text"
+
+SCHEMA_TEMPLATE = """
 -- Table principale des emails
 CREATE TABLE IF NOT EXISTS emails (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -24,11 +31,12 @@ CREATE TABLE IF NOT EXISTS emails (
     cc TEXT,                         -- JSON array
     date_sent TEXT,                  -- ISO format
     date_parsed TEXT,                -- Quand on l'a parsé
-    body_text TEXT,
+    body_text TEXT,                  -- Corps complet (avec historique cité)
+    body_new TEXT,                   -- Nouveau contenu seul (sans citations ni signature)
     body_html TEXT,
     has_attachments INTEGER DEFAULT 0,
     attachment_count INTEGER DEFAULT 0,
-    parsed_version INTEGER DEFAULT 1,
+    parsed_version INTEGER DEFAULT 1,   -- Version de l'extracteur (PARSER_VERSION, voir reparse.py)
     quality_flags TEXT,              -- JSON: truncated, encoding_issues, etc.
     created_at TEXT DEFAULT CURRENT_TIMESTAMP
 );
@@ -58,9 +66,11 @@ CREATE TABLE IF NOT EXISTS documents (
     size_bytes INTEGER,
     extracted_text TEXT,
     ocr_done INTEGER DEFAULT 0,
-    ocr_quality REAL,                -- Score de confiance OCR
+    ocr_quality REAL,                -- Qualité du texte 0..1 (moyenne des pages, voir page_quality)
     page_count INTEGER,
-    parsed_version INTEGER DEFAULT 1,
+    doc_date TEXT,                   -- Date du document AAAA-MM-JJ (texte, sinon métadonnées)
+    doc_date_source TEXT,            -- 'text', 'metadata', 'none' (NULL: pas encore cherchée)
+    parsed_version INTEGER DEFAULT 1,   -- Version de l'extracteur (PARSER_VERSION, voir reparse.py)
     quality_flags TEXT,
     created_at TEXT DEFAULT CURRENT_TIMESTAMP
 );
@@ -76,12 +86,129 @@ CREATE TABLE IF NOT EXISTS links (
     created_at TEXT DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Fichiers en échec d'extraction (timeout, mémoire, plantage), ignorés aux runs suivants
+CREATE TABLE IF NOT EXISTS quarantine (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    file_path TEXT UNIQUE,
+    file_hash TEXT,
+    reason TEXT,                     -- 'timeout', 'memory', 'crash', 'error'
+    detail TEXT,
+    attempts INTEGER,                -- Essais lors du dernier run (normal + dégradé)
+    runs INTEGER DEFAULT 1,          -- Runs en échec
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+
+-- File de travaux OCR: le texte natif est importé d'abord, l'OCR suit par priorité
+CREATE TABLE IF NOT EXISTS ocr_jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    document_id INTEGER UNIQUE,
+    file_path TEXT,
+    doc_type TEXT,                   -- 'pdf', 'image'
+    size_bytes INTEGER,
+    file_mtime TEXT,                 -- Date du fichier (ISO), pour la priorité
+    flagged INTEGER DEFAULT 0,       -- Priorité demandée par l'utilisateur
+    priority REAL,                   -- Plus grand = traité plus tôt
+    status TEXT DEFAULT 'pending',   -- 'pending', 'running', 'done', 'failed'
+    attempts INTEGER DEFAULT 0,
+    error TEXT,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    updated_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (document_id) REFERENCES documents(id)
+);
+
+-- Qualité du texte par page (couche native ou OCR), pages blanches exclues
+CREATE TABLE IF NOT EXISTS page_quality (
+    document_id INTEGER,
+    page_no INTEGER,                 -- 1..n (1 pour une image)
+    score REAL,                      -- 0..1, sous le seuil: page à (ré)OCRiser
+    dict_ratio REAL,                 -- Score lexical (forme des mots, mots courants)
+    garbage_ratio REAL,              -- Part de caractères parasites
+    confidence REAL,                 -- Confiance Tesseract moyenne (OCR d'image)
+    ocr INTEGER DEFAULT 0,           -- Texte de la page issu de l'OCR
+    PRIMARY KEY (document_id, page_no),
+    FOREIGN KEY (document_id) REFERENCES documents(id)
+);
+
+-- Passages indexés dans l'index vectoriel (<base>.vec/), une ligne par vecteur
+CREATE TABLE IF NOT EXISTS vec_chunks (
+    vec_row INTEGER PRIMARY KEY,     -- Ligne dans vectors.i8
+    source_type TEXT,                -- 'email', 'document', 'attachment'
+    source_id INTEGER,
+    chunk_no INTEGER,
+    char_start INTEGER,              -- Position du passage dans le texte source
+    char_end INTEGER
+);
+
+-- Passages des documents et pièces jointes (pages, fenêtres de ~500 mots), voir passages_fts
+CREATE TABLE IF NOT EXISTS passages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    source_type TEXT,                -- 'document', 'attachment'
+    source_id INTEGER,
+    page_no INTEGER,                 -- 1..n (NULL si le texte n'a pas de pages)
+    passage_no INTEGER,              -- Rang du passage dans la source
+    char_start INTEGER,              -- Position dans extracted_text
+    char_end INTEGER
+);
+
+-- Correspondants de chaque email (forme normalisée de sender_email, recipients, cc)
+CREATE TABLE IF NOT EXISTS participants (
+    email_id INTEGER,
+    address TEXT,                    -- Adresse en minuscules
+    role TEXT,                       -- 'from', 'to', 'cc'
+    PRIMARY KEY (email_id, role, address),
+    FOREIGN KEY (email_id) REFERENCES emails(id)
+);
+
+-- Colonnes de facettes précalculées (query_db.py --facets): codes[rowid] en uint32
+CREATE TABLE IF NOT EXISTS facet_columns (
+    source_type TEXT,                -- 'email', 'attachment', 'document'
+    facet TEXT,                      -- 'sender', 'month', 'doc_type', 'has_attachments'
+    labels TEXT,                     -- JSON: libellé du code n en position n-1
+    codes BLOB,                      -- uint32 par rowid, 0: aucun libellé
+    max_rowid INTEGER,               -- Dernière ligne prise en compte
+    stale INTEGER DEFAULT 0,         -- Ligne existante modifiée: recalcul complet
+    PRIMARY KEY (source_type, facet)
+);
+
+-- Activité par jour (query_db.py --timeline): nombre d'éléments par source,
+-- et d'emails par correspondant (address = '' : tous)
+CREATE TABLE IF NOT EXISTS timeline (
+    address TEXT NOT NULL DEFAULT '',
+    source_type TEXT NOT NULL,       -- 'email', 'attachment', 'document'
+    day TEXT NOT NULL,               -- AAAA-MM-JJ
+    n INTEGER NOT NULL,
+    PRIMARY KEY (address, source_type, day)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS timeline_state (
+    source_type TEXT PRIMARY KEY,
+    max_rowid INTEGER,               -- Dernière ligne cumulée
+    stale INTEGER DEFAULT 0          -- Ligne cumulée modifiée: recalcul complet
+);
+
+-- Signatures MinHash (quasi-doublons), 64 x uint32 en BLOB
+CREATE TABLE IF NOT EXISTS minhash (
+    source_type TEXT,                -- 'email', 'document'
+    source_id INTEGER,
+    signature BLOB,
+    PRIMARY KEY (source_type, source_id)
+);
+
+-- Index LSH: une ligne par bande de la signature
+CREATE TABLE IF NOT EXISTS lsh_buckets (
+    band INTEGER,
+    bucket INTEGER,                  -- Hash 64 bits des valeurs de la bande
+    source_type TEXT,
+    source_id INTEGER
+);
+
 -- Index FTS5 pour recherche full-text sur les emails
 CREATE VIRTUAL TABLE IF NOT EXISTS emails_fts USING fts5(
     subject,
     sender,
     recipients,
-    body_text,
+    {body_col},
     content='emails',
     content_rowid='id',
     tokenize='unicode61 remove_diacritics 2'
@@ -105,22 +232,29 @@ CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5(
     tokenize='unicode61 remove_diacritics 2'
 );
 
+-- Index FTS5 des passages (rowid = passages.id): classement et extrait à l'échelle de la page
+CREATE VIRTUAL TABLE IF NOT EXISTS passages_fts USING fts5(
+    title,
+    text,
+    tokenize='unicode61 remove_diacritics 2'
+);
+
 -- Triggers pour maintenir FTS synchronisé (emails)
 CREATE TRIGGER IF NOT EXISTS emails_ai AFTER INSERT ON emails BEGIN
-    INSERT INTO emails_fts(rowid, subject, sender, recipients, body_text)
-    VALUES (new.id, new.subject, new.sender, new.recipients, new.body_text);
+    INSERT INTO emails_fts(rowid, subject, sender, recipients, {body_col})
+    VALUES (new.id, new.subject, new.sender, new.recipients, new.{body_col});
 END;
 
 CREATE TRIGGER IF NOT EXISTS emails_ad AFTER DELETE ON emails BEGIN
-    INSERT INTO emails_fts(emails_fts, rowid, subject, sender, recipients, body_text)
-    VALUES ('delete', old.id, old.subject, old.sender, old.recipients, old.body_text);
+    INSERT INTO emails_fts(emails_fts, rowid, subject, sender, recipients, {body_col})
+    VALUES ('delete', old.id, old.subject, old.sender, old.recipients, old.{body_col});
 END;
 
-CREATE TRIGGER IF NOT EXISTS emails_au AFTER UPDATE ON emails BEGIN
-    INSERT INTO emails_fts(emails_fts, rowid, subject, sender, recipients, body_text)
-    VALUES ('delete', old.id, old.subject, old.sender, old.recipients, old.body_text);
-    INSERT INTO emails_fts(rowid, subject, sender, recipients, body_text)
-    VALUES (new.id, new.subject, new.sender, new.recipients, new.body_text);
+CREATE TRIGGER IF NOT EXISTS emails_au AFTER UPDATE OF subject, sender, recipients, {body_col} ON emails BEGIN
+    INSERT INTO emails_fts(emails_fts, rowid, subject, sender, recipients, {body_col})
+    VALUES ('delete', old.id, old.subject, old.sender, old.recipients, old.{body_col});
+    INSERT INTO emails_fts(rowid, subject, sender, recipients, {body_col})
+    VALUES (new.id, new.subject, new.sender, new.recipients, new.{body_col});
 END;
 
 -- Triggers pour FTS (attachments)
@@ -134,7 +268,7 @@ CREATE TRIGGER IF NOT EXISTS attachments_ad AFTER DELETE ON attachments BEGIN
     VALUES ('delete', old.id, old.filename, old.extracted_text);
 END;
 
-CREATE TRIGGER IF NOT EXISTS attachments_au AFTER UPDATE ON attachments BEGIN
+CREATE TRIGGER IF NOT EXISTS attachments_au AFTER UPDATE OF filename, extracted_text ON attachments BEGIN
     INSERT INTO attachments_fts(attachments_fts, rowid, filename, extracted_text)
     VALUES ('delete', old.id, old.filename, old.extracted_text);
     INSERT INTO attachments_fts(rowid, filename, extracted_text)
@@ -152,13 +286,144 @@ CREATE TRIGGER IF NOT EXISTS documents_ad AFTER DELETE ON documents BEGIN
     VALUES ('delete', old.id, old.filename, old.extracted_text);
 END;
 
-CREATE TRIGGER IF NOT EXISTS documents_au AFTER UPDATE ON documents BEGIN
+CREATE TRIGGER IF NOT EXISTS documents_au AFTER UPDATE OF filename, extracted_text ON documents BEGIN
     INSERT INTO documents_fts(documents_fts, rowid, filename, extracted_text)
     VALUES ('delete', old.id, old.filename, old.extracted_text);
     INSERT INTO documents_fts(rowid, filename, extracted_text)
     VALUES (new.id, new.filename, new.extracted_text);
 END;
 
+-- Triggers des passages: une source modifiée ou supprimée perd ses passages
+-- (redécoupés par passages.sync() au prochain import)
+CREATE TRIGGER IF NOT EXISTS passages_ad AFTER DELETE ON passages BEGIN
+    DELETE FROM passages_fts WHERE rowid = old.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS documents_passages_au AFTER UPDATE OF filename, extracted_text ON documents BEGIN
+    DELETE FROM passages WHERE source_type = 'document' AND source_id = old.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS documents_passages_ad AFTER DELETE ON documents BEGIN
+    DELETE FROM passages WHERE source_type = 'document' AND source_id = old.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS attachments_passages_au AFTER UPDATE OF filename, extracted_text ON attachments BEGIN
+    DELETE FROM passages WHERE source_type = 'attachment' AND source_id = old.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS attachments_passages_ad AFTER DELETE ON attachments BEGIN
+    DELETE FROM passages WHERE source_type = 'attachment' AND source_id = old.id;
+END;
+
+-- Triggers de l'index vectoriel: un texte modifié ou supprimé perd ses
+-- vec_chunks (vecteurs ignorés par --semantic, réencodés par embed.py update)
+CREATE TRIGGER IF NOT EXISTS emails_vectors_au AFTER UPDATE OF subject, body_text ON emails BEGIN
+    DELETE FROM vec_chunks WHERE source_type = 'email' AND source_id = old.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS emails_vectors_ad AFTER DELETE ON emails BEGIN
+    DELETE FROM vec_chunks WHERE source_type = 'email' AND source_id = old.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS documents_vectors_au AFTER UPDATE OF extracted_text ON documents BEGIN
+    DELETE FROM vec_chunks WHERE source_type = 'document' AND source_id = old.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS documents_vectors_ad AFTER DELETE ON documents BEGIN
+    DELETE FROM vec_chunks WHERE source_type = 'document' AND source_id = old.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS attachments_vectors_au AFTER UPDATE OF extracted_text ON attachments BEGIN
+    DELETE FROM vec_chunks WHERE source_type = 'attachment' AND source_id = old.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS attachments_vectors_ad AFTER DELETE ON attachments BEGIN
+    DELETE FROM vec_chunks WHERE source_type = 'attachment' AND source_id = old.id;
+END;
+
+-- Triggers des signatures MinHash: une source supprimée quitte les buckets LSH
+CREATE TRIGGER IF NOT EXISTS emails_minhash_ad AFTER DELETE ON emails BEGIN
+    DELETE FROM minhash WHERE source_type = 'email' AND source_id = old.id;
+    DELETE FROM lsh_buckets WHERE source_type = 'email' AND source_id = old.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS documents_minhash_ad AFTER DELETE ON documents BEGIN
+    DELETE FROM minhash WHERE source_type = 'document' AND source_id = old.id;
+    DELETE FROM lsh_buckets WHERE source_type = 'document' AND source_id = old.id;
+END;
+
+-- Triggers des participants: un email modifié ou supprimé perd les siens
+-- (recalculés par participants.sync() au prochain import)
+CREATE TRIGGER IF NOT EXISTS emails_participants_au AFTER UPDATE OF sender_email, recipients, cc ON emails BEGIN
+    DELETE FROM participants WHERE email_id = old.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS emails_participants_ad AFTER DELETE ON emails BEGIN
+    DELETE FROM participants WHERE email_id = old.id;
+END;
+
+-- Triggers des facettes: une ligne existante modifiée ou supprimée invalide ses colonnes
+-- (les nouvelles lignes sont ajoutées par facets.load() sans recalcul)
+CREATE TRIGGER IF NOT EXISTS emails_facets_au AFTER UPDATE OF sender_email, date_sent, has_attachments ON emails BEGIN
+    UPDATE facet_columns SET stale = 1 WHERE source_type IN ('email', 'attachment');
+END;
+
+CREATE TRIGGER IF NOT EXISTS emails_facets_ad AFTER DELETE ON emails BEGIN
+    UPDATE facet_columns SET stale = 1 WHERE source_type IN ('email', 'attachment');
+END;
+
+CREATE TRIGGER IF NOT EXISTS attachments_facets_au AFTER UPDATE OF email_id, filename ON attachments BEGIN
+    UPDATE facet_columns SET stale = 1 WHERE source_type = 'attachment';
+END;
+
+CREATE TRIGGER IF NOT EXISTS attachments_facets_ad AFTER DELETE ON attachments BEGIN
+    UPDATE facet_columns SET stale = 1 WHERE source_type = 'attachment';
+END;
+
+CREATE TRIGGER IF NOT EXISTS documents_facets_au AFTER UPDATE OF doc_type, doc_date ON documents BEGIN
+    UPDATE facet_columns SET stale = 1 WHERE source_type = 'document';
+END;
+
+CREATE TRIGGER IF NOT EXISTS documents_facets_ad AFTER DELETE ON documents BEGIN
+    UPDATE facet_columns SET stale = 1 WHERE source_type = 'document';
+END;
+
+-- Triggers de la chronologie: une ligne déjà cumulée (id <= max_rowid) modifiée
+-- ou supprimée invalide le cumul de sa source (les nouvelles sont ajoutées par timeline.refresh())
+CREATE TRIGGER IF NOT EXISTS emails_timeline_au AFTER UPDATE OF date_sent ON emails BEGIN
+    UPDATE timeline_state SET stale = 1
+    WHERE source_type = 'attachment' OR (source_type = 'email' AND old.id <= max_rowid);
+END;
+
+CREATE TRIGGER IF NOT EXISTS emails_timeline_ad AFTER DELETE ON emails BEGIN
+    UPDATE timeline_state SET stale = 1
+    WHERE source_type = 'attachment' OR (source_type = 'email' AND old.id <= max_rowid);
+END;
+
+CREATE TRIGGER IF NOT EXISTS participants_timeline_ai AFTER INSERT ON participants BEGIN
+    UPDATE timeline_state SET stale = 1 WHERE source_type = 'email' AND new.email_id <= max_rowid;
+END;
+
+CREATE TRIGGER IF NOT EXISTS participants_timeline_ad AFTER DELETE ON participants BEGIN
+    UPDATE timeline_state SET stale = 1 WHERE source_type = 'email' AND old.email_id <= max_rowid;
+END;
+
+CREATE TRIGGER IF NOT EXISTS attachments_timeline_au AFTER UPDATE OF email_id ON attachments BEGIN
+    UPDATE timeline_state SET stale = 1 WHERE source_type = 'attachment' AND old.id <= max_rowid;
+END;
+
+CREATE TRIGGER IF NOT EXISTS attachments_timeline_ad AFTER DELETE ON attachments BEGIN
+    UPDATE timeline_state SET stale = 1 WHERE source_type = 'attachment' AND old.id <= max_rowid;
+END;
+
+CREATE TRIGGER IF NOT EXISTS documents_timeline_au AFTER UPDATE OF doc_date ON documents BEGIN
+    UPDATE timeline_state SET stale = 1 WHERE source_type = 'document' AND old.id <= max_rowid;
+END;
+
+CREATE TRIGGER IF NOT EXISTS documents_timeline_ad AFTER DELETE ON documents BEGIN
+    UPDATE timeline_state SET stale = 1 WHERE source_type = 'document' AND old.id <= max_rowid;
+END;
+
 -- Index classiques pour perfs
 CREATE INDEX IF NOT EXISTS idx_emails_date ON emails(date_sent);
 CREATE INDEX IF NOT EXISTS idx_emails_sender ON emails(sender_email);
@@ -166,6 +431,14 @@ CREATE INDEX IF NOT EXISTS idx_emails_hash ON emails(file_hash);
 CREATE INDEX IF NOT EXISTS idx_attachments_email ON attachments(email_id);
 CREATE INDEX IF NOT EXISTS idx_attachments_hash ON attachments(file_hash);
 CREATE INDEX IF NOT EXISTS idx_documents_hash ON documents(file_hash);
+CREATE INDEX IF NOT EXISTS idx_documents_quality ON documents(ocr_quality);
+CREATE INDEX IF NOT EXISTS idx_documents_date ON documents(doc_date);
+CREATE INDEX IF NOT EXISTS idx_ocr_jobs_next ON ocr_jobs(status, priority DESC);
+CREATE INDEX IF NOT EXISTS idx_passages_source ON passages(source_type, source_id);
+CREATE INDEX IF NOT EXISTS idx_participants_address ON participants(address, role, email_id);
+CREATE INDEX IF NOT EXISTS idx_vec_chunks_source ON vec_chunks(source_type, source_id);
+CREATE INDEX IF NOT EXISTS idx_lsh_bucket ON lsh_buckets(band, bucket);
+CREATE INDEX IF NOT EXISTS idx_lsh_source ON lsh_buckets(source_type, source_id);
 
 -- Vue pratique pour recherche unifiée
 CREATE VIEW IF NOT EXISTS search_all AS
@@ -194,18 +467,29 @@ SELECT
     d.id,
     d.filename as title,
     NULL as sender,
-    d.created_at as date,
+    d.doc_date as date,
     d.extracted_text as content,
     d.file_path
 FROM documents d;
 """
 
-def init_database(db_path: str) -> None:
+def build_schema(full_body_fts: bool = False) -> str:
+    """Retourne le schéma SQL, FTS emails sur body_new ou sur body_text."""
+    return SCHEMA_TEMPLATE.format(body_col=FTS_BODY_FULL if full_body_fts else FTS_BODY_NEW)
+
+SCHEMA = build_schema()
+
+# Avant la première table: les pages libérées sont rendues au disque par
+# PRAGMA incremental_vacuum (python db_tool.py vacuum), sans VACUUM complet
+AUTO_VACUUM = "PRAGMA auto_vacuum = INCREMENTAL"
+
+def init_database(db_path: str, full_body_fts: bool = False) -> None:
     """Initialise la base de données avec le schéma complet."""
     print(f"Initialisation de la base: {db_path}")
     
     conn = sqlite3.connect(db_path)
-    conn.executescript(SCHEMA)
+    conn.execute(AUTO_VACUUM)
+    conn.executescript(build_schema(full_body_fts))
     conn.commit()
     
     # Vérification
@@ -220,17 +504,146 @@ def init_database(db_path: str) -> None:
     conn.close()
     print("✓ Base initialisée avec succès")
 
+def create_shard(db_path: str, full_body_fts: bool = False) -> None:
+    """Crée une base de shard (appelé par les imports, sans affichage)."""
+    conn = sqlite3.connect(db_path)
+    conn.execute(AUTO_VACUUM)
+    conn.executescript(build_schema(full_body_fts))
+    conn.commit()
+    conn.close()
+
+def add_missing_columns(conn: sqlite3.Connection, schema: str) -> List[str]:
+    """ALTER TABLE ADD COLUMN pour les colonnes du schéma absentes des tables existantes."""
+    reference = sqlite3.connect(":memory:")
+    reference.executescript(schema)
+    added = []
+    tables = reference.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND sql LIKE 'CREATE TABLE%'"
+    ).fetchall()
+    for (table,) in tables:
+        existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+        if not existing:
+            continue  # Table absente: créée telle quelle par le schéma
+        for _, name, col_type, _, default, _ in reference.execute(f"PRAGMA table_info({table})"):
+            if name in existing:
+                continue
+            # ADD COLUMN n'accepte qu'un défaut constant
+            constant = default is not None and not default.upper().startswith("CURRENT_")
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {col_type}"
+                         + (f" DEFAULT {default}" if constant else ""))
+            added.append(f"{table}.{name}")
+    reference.close()
+    return added
+
+def replace_changed(conn: sqlite3.Connection, schema: str) -> List[str]:
+    """Recrée les triggers et vues dont la définition a changé dans le schéma (IF NOT EXISTS les garde)."""
+    reference = sqlite3.connect(":memory:")
+    reference.executescript(schema)
+    replaced = []
+    for kind, name, sql in reference.execute(
+        "SELECT type, name, sql FROM sqlite_master WHERE type IN ('trigger', 'view')"
+    ).fetchall():
+        row = conn.execute("SELECT sql FROM sqlite_master WHERE type = ? AND name = ?", (kind, name)).fetchone()
+        if row and row[0] != sql:
+            conn.execute(f"DROP {kind.upper()} {name}")
+            conn.execute(sql)
+            replaced.append(name)
+    conn.commit()
+    reference.close()
+    return replaced
+
+def remove_orphan_signatures(conn: sqlite3.Connection) -> int:
+    """Supprime signatures et buckets LSH des emails et documents effacés. Retourne le nombre de signatures."""
+    removed = 0
+    for source_type, table in (("email", "emails"), ("document", "documents")):
+        removed += conn.execute(f"""
+            DELETE FROM minhash WHERE source_type = ? AND source_id NOT IN (SELECT id FROM {table})
+        """, (source_type,)).rowcount
+        conn.execute(f"""
+            DELETE FROM lsh_buckets WHERE source_type = ? AND source_id NOT IN (SELECT id FROM {table})
+        """, (source_type,))
+    conn.commit()
+    return removed
+
+def upgrade_database(db_path: str) -> None:
+    """Ajoute à une base existante les tables, index et triggers manquants (sans rien effacer)."""
+    print(f"Mise à niveau de la base: {db_path}")
+    conn = sqlite3.connect(db_path)
+    # Garde le choix d'origine du corps indexé (les objets existants ne sont pas recréés)
+    row = conn.execute("SELECT sql FROM sqlite_master WHERE name = 'emails_fts'").fetchone()
+    full_body_fts = bool(row) and FTS_BODY_FULL in row[0]
+    before = {r[0] for r in conn.execute("SELECT name FROM sqlite_master")}
+    schema = build_schema(full_body_fts)
+    added_columns = add_missing_columns(conn, schema)
+    conn.executescript(schema)
+    added = sorted({r[0] for r in conn.execute("SELECT name FROM sqlite_master")} - before)
+    added = [name for name in added if not name.startswith("sqlite_") and "_fts_" not in name]
+    added += added_columns
+    added += [f"{name} (modifié)" for name in replace_changed(conn, schema)]
+    print(f"Ajoutés: {', '.join(added) if added else 'rien (schéma à jour)'}")
+    orphans = remove_orphan_signatures(conn)
+    if orphans:
+        print(f"{orphans} signatures MinHash orphelines supprimées (lignes effacées avant les triggers)")
+    
+    created = passages.sync(conn, lambda done, total: print(f"\r  passages: {done}/{total} sources", end=""))
+    if created:
+        print(f"\n{created} passages indexés")
+    indexed = participants.sync(conn, lambda done, total: print(f"\r  participants: {done}/{total} emails", end=""))
+    if indexed:
+        print(f"\n{indexed} emails: correspondants indexés")
+    searched = timeline.sync_dates(conn, lambda done, total: print(f"\r  dates: {done}/{total} documents", end=""))
+    if searched:
+        dated = conn.execute("SELECT COUNT(*) FROM documents WHERE doc_date IS NOT NULL").fetchone()[0]
+        print(f"\n{searched} documents: date recherchée ({dated} documents datés au total)")
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        print("Place des lignes supprimées jamais rendue au disque: python db_tool.py vacuum --full")
+    conn.close()
+    print("✓ Base à jour")
+
 def main():
-    db_path = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_DB
+    parser = argparse.ArgumentParser(description="Initialise la base VPO")
+    parser.add_argument("db", nargs="?", default=DEFAULT_DB, help="Chemin de la base")
+    parser.add_argument("--full-body-fts", action="store_true",
+                        help="Indexer le corps complet des emails (historique cité inclus)")
+    parser.add_argument("--upgrade", action="store_true",
+                        help="Base existante: ajouter les tables/index manquants sans rien effacer")
+    parser.add_argument("--shards", choices=shards.SPLITS,
+                        help="Corpus réparti: db est un manifeste (ex: affaire.shards.json), "
+                             "une base par année ou par hash, créées par les imports")
+    parser.add_argument("--shard-count", type=int, default=shards.DEFAULT_COUNT,
+                        help="--shards hash: nombre de bases")
+    args = parser.parse_args()
+    db_path = args.db
+    
+    if args.upgrade:
+        if not Path(db_path).exists():
+            print(f"ERREUR: Base non trouvée: {db_path}")
+            return
+        for _, path in (shards.resolve([db_path]) if shards.is_manifest(db_path) else [(None, Path(db_path))]):
+            upgrade_database(str(path))
+        return
+    
+    if shards.is_manifest(db_path) != bool(args.shards):
+        print(f"ERREUR: --shards year|hash crée un manifeste (ex: affaire{shards.MANIFEST_SUFFIX})")
+        return
     
     if Path(db_path).exists():
         response = input(f"La base {db_path} existe déjà. Écraser ? (o/N) ")
         if response.lower() != 'o':
             print("Annulé.")
             return
+        if shards.is_manifest(db_path):
+            for _, path in shards.resolve([db_path]):
+                path.unlink(missing_ok=True)
         Path(db_path).unlink()
     
-    init_database(db_path)
+    if args.shards:
+        manifest = shards.create(db_path, args.shards, args.shard_count, args.full_body_fts)
+        layout = f"{manifest.count} bases par hash" if args.shards == "hash" else "une base par année"
+        print(f"✓ Manifeste créé: {db_path} ({layout}, créées par les imports)")
+        return
+    
+    init_database(db_path, args.full_body_fts)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+ocr_queue.py - File des travaux OCR (remplie par ingest_docs.py)
+Usage: python ocr_queue.py <commande> [options]
+
+Exemples:
+    python ocr_queue.py status
+    python ocr_queue.py run --workers 4
+    python ocr_queue.py flag --path "*jugement*"
+    python ocr_queue.py flag --doc 42
+    python ocr_queue.py retry
+    python ocr_queue.py rescore --threshold 0.5
+    python ocr_queue.py run --db affaire.shards.json
+"""
+
+import argparse
+import sqlite3
+import sys
+from pathlib import Path
+
+import ingest_docs
+from vpokit import ocrquality, ocrqueue, pipeline, shards, supervisor
+
+DEFAULT_DB = "vpo_affaire.db"
+
+def print_status(conn: sqlite3.Connection, limit: int = 10) -> None:
+    counts = ocrqueue.counts(conn)
+    print("\n=== FILE OCR ===\n")
+    for status in ocrqueue.STATUSES:
+        print(f"{status + ':':<12}{counts.get(status, 0)}")
+
+    rows = conn.execute("""
+        SELECT document_id, doc_type, flagged, priority, file_path FROM ocr_jobs
+        WHERE status = 'pending' ORDER BY priority DESC, id LIMIT ?
+    """, (limit,)).fetchall()
+    if rows:
+        print("\nProchains travaux:")
+        for doc_id, doc_type, flagged, prio, file_path in rows:
+            print(f"  {'★' if flagged else ' '} {prio:7.2f}  [doc:{doc_id}] [{doc_type}] {Path(file_path).name}")
+
+    failed = conn.execute(
+        "SELECT document_id, error, file_path FROM ocr_jobs WHERE status = 'failed' LIMIT ?", (limit,)
+    ).fetchall()
+    if failed:
+        print("\nEn échec (python ocr_queue.py retry pour les retenter):")
+        for doc_id, error, file_path in failed:
+            print(f"  [doc:{doc_id}] {Path(file_path).name}: {(error or '')[:80]}")
+
+def main():
+    parser = argparse.ArgumentParser(description="File des travaux OCR")
+    parser.add_argument("command", choices=["status", "run", "flag", "retry", "rescore"], help="Commande")
+    parser.add_argument("--db", default=DEFAULT_DB, help="Chemin de la base (ou manifeste de shards)")
+    parser.add_argument("--workers", type=int, default=pipeline.default_workers(),
+                        help="run: processus OCR en parallèle")
+    parser.add_argument("--timeout", type=float, default=supervisor.DEFAULT_TIMEOUT,
+                        help="run: durée maximale par fichier (s)")
+    parser.add_argument("--max-memory", type=int,
+                        default=supervisor.DEFAULT_MAX_MEMORY // (1024 * 1024),
+                        help="run: mémoire maximale par worker (Mio, 0 = sans limite)")
+    parser.add_argument("--threshold", type=float, default=ocrquality.QUALITY_THRESHOLD,
+                        help="run/rescore: score de qualité (0..1) sous lequel une page est OCRisée")
+    parser.add_argument("--all", action="store_true",
+                        help="rescore: renoter tous les documents (sinon ceux sans score)")
+    parser.add_argument("--doc", type=int, action="append", default=[],
+                        help="flag: ID de document à traiter en priorité (répétable)")
+    parser.add_argument("--path", action="append", default=[],
+                        help="flag: motif de chemin (GLOB, ex: '*jugement*') à traiter en priorité")
+    args = parser.parse_args()
+
+    if not Path(args.db).exists():
+        print(f"ERREUR: Base non trouvée: {args.db}")
+        sys.exit(1)
+    if args.command == "flag":
+        if not args.doc and not args.path:
+            print("Indique --doc ID ou --path MOTIF")
+            sys.exit(1)
+        if args.doc and shards.is_manifest(args.db):
+            print("ERREUR: --doc désigne un ID propre à chaque base: utilise --path avec un manifeste")
+            sys.exit(1)
+
+    for name, db_path in shards.resolve([args.db]):
+        if shards.is_manifest(args.db):
+            print(f"\n##### {name} ({db_path.name}) #####")
+        conn = sqlite3.connect(db_path)
+        if not ocrqueue.counts(conn):
+            print(f"ERREUR: Table ocr_jobs absente de {db_path}: python init_db.py --upgrade")
+            sys.exit(1)
+
+        if args.command == "flag":
+            where = " OR ".join(["document_id = ?"] * len(args.doc) + ["file_path GLOB ?"] * len(args.path))
+            count = ocrqueue.flag(conn, f"status != 'done' AND ({where})", args.doc + args.path)
+            print(f"{count} travaux signalés prioritaires")
+        elif args.command == "retry":
+            print(f"{ocrqueue.retry_failed(conn)} travaux remis en attente")
+        elif args.command == "rescore":
+            scored, queued = ingest_docs.rescore_documents(conn, args.threshold, args.all)
+            print(f"{scored} documents notés, {queued} mis en file OCR")
+        elif args.command == "run":
+            ingest_docs.run_ocr_queue(conn, args.workers, args.timeout,
+                                      args.max_memory * 1024 * 1024 or None, args.threshold)
+            ingest_docs.sync_passages(conn)
+            print(f"\nOCR effectués: {ingest_docs.stats['ocr_done']}, "
+                  f"en échec: {ingest_docs.stats['ocr_failed']}")
+
+        print_status(conn)
+        conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -9,58 +9,91 @@ Exemples:
     python query_db.py "expertise" --from "2023-01-01" --to "2024-01-01"
     python query_db.py --stats
     python query_db.py --export-json results.json "divorce"
+    python query_db.py "tribunal" --collapse
+    python query_db.py --near-duplicates
+    python query_db.py --blob attachment:42 --output piece.pdf
+    python query_db.py --quarantine
+    python query_db.py --ocr-report --limit 20
+    python query_db.py "contribution d'entretien" --semantic
+    python query_db.py "pension alimentaire" --hybrid
+    python query_db.py 'pension -avocat from:jean.dupont@exemple.fr date:2023..2024'
+    python query_db.py '-avocat' --type email        (négation seule ou en tête)
+    python query_db.py '"mise en demeure" OR subject:relance' --explain
+    python query_db.py --contacts jean.dupont@exemple.fr
+    python query_db.py --between jean.dupont@exemple.fr avocat@cabinet.fr --period week
+    python query_db.py --path jean.dupont@exemple.fr expert@tribunal.fr
+    python query_db.py --timeline --from 2023-01-01 --to 2023-12-31
+    python query_db.py "pension" --timeline --period week --participant jean.dupont@exemple.fr
+    python query_db.py "expertise" --db affaire.shards.json --from 2021-01-01
+    python query_db.py "expertise" --db dossier_a.db --db dossier_b.shards.json
 """
 
 import sqlite3
 import json
 import sys
 import argparse
+import time
 from pathlib import Path
 from datetime import datetime
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Set, Tuple, Union
+
+from vpokit import (facets, fusion, htmltext, minhash, ocrquality, ocrqueue, participants, passages,
+                    querylang, shards, timeline, vectors)
+from vpokit.vault import iter_blob
 
 DEFAULT_DB = "vpo_affaire.db"
+# Modes qui lisent une seule base (IDs propres à chaque base)
+SINGLE_DB_MODES = ("stats", "near_duplicates", "contacts", "between", "path", "timeline", "ocr_report",
+                   "quarantine", "blob", "detail", "explain", "facets", "hybrid", "semantic")
+
+def _silent_error(e: sqlite3.OperationalError) -> bool:
+    """Table absente (base ancienne) ou requête interrompue (budget --hybrid)."""
+    return "no such table" in str(e) or "interrupted" in str(e)
+
+def _ranking(plan: "querylang.Plan", column: int, text: str, recent: str) -> Tuple[str, str, str]:
+    """
+    (extrait, score, tri) selon l'accès du plan: bm25 et snippet() quand l'index
+    FTS mène, sinon début du texte et plus récents d'abord (requête sans terme).
+    """
+    if plan.match:
+        return f"snippet({plan.fts}, {column}, '>>>', '<<<', '...', 64)", f"bm25({plan.fts})", "score"
+    return f"substr({text}, 1, 200)", "0", f"{recent} DESC"
 
 def search_fts(conn: sqlite3.Connection, query: str, 
                doc_type: Optional[str] = None,
                date_from: Optional[str] = None,
                date_to: Optional[str] = None,
-               limit: int = 50) -> List[Dict[str, Any]]:
+               limit: int = 50,
+               collapse: bool = False,
+               min_quality: Optional[float] = None) -> List[Dict[str, Any]]:
     """
-    Recherche full-text dans tous les contenus.
+    Recherche full-text dans tous les contenus (syntaxe: vpokit/querylang.py).
+    Si collapse=True, les quasi-doublons (MinHash) d'un meilleur résultat sont masqués.
+    min_quality: exclut les documents dont le texte a un score de qualité inférieur.
+    Lève querylang.QueryError si la requête est mal formée.
     """
     results = []
-    
-    # Prépare la requête FTS (escape les caractères spéciaux)
-    fts_query = query.replace('"', '""')
+    node = querylang.with_filters(querylang.parse(query), doc_type, date_from, date_to, min_quality)
     
     # Recherche dans les emails
-    if doc_type is None or doc_type == 'email':
-        sql = """
+    plan = querylang.plan(conn, node, "email", alias="e")
+    if plan.access != "none":
+        snippet, score, order = _ranking(plan, 3, "e.body_new", "e.date_sent")
+        from_sql, params = plan.from_sql()
+        sql = f"""
             SELECT 
                 'email' as type,
                 e.id,
                 e.subject as title,
                 e.sender,
                 e.date_sent as date,
-                snippet(emails_fts, 3, '>>>', '<<<', '...', 64) as snippet,
+                {snippet} as snippet,
                 e.file_path,
                 e.has_attachments,
-                bm25(emails_fts) as score
-            FROM emails_fts
-            JOIN emails e ON e.id = emails_fts.rowid
-            WHERE emails_fts MATCH ?
+                {score} as score
+            {from_sql}
+            ORDER BY {order} LIMIT ?
         """
-        params = [fts_query]
-        
-        if date_from:
-            sql += " AND e.date_sent >= ?"
-            params.append(date_from)
-        if date_to:
-            sql += " AND e.date_sent <= ?"
-            params.append(date_to)
-        
-        sql += " ORDER BY score LIMIT ?"
         params.append(limit)
         
         try:
@@ -78,31 +111,40 @@ def search_fts(conn: sqlite3.Connection, query: str,
                     "score": row[8]
                 })
         except sqlite3.OperationalError as e:
-            if "no such table" not in str(e):
+            if not _silent_error(e):
                 print(f"Erreur emails: {e}")
     
-    # Recherche dans les documents
-    if doc_type is None or doc_type == 'document':
-        sql = """
+    # Recherche dans les documents: passages (page) d'abord, texte entier en complément
+    # (termes répartis sur plusieurs pages, documents pas encore découpés)
+    plan = querylang.plan(conn, node, "document", alias="d")
+    if plan.access != "none":
+        found = search_passages(conn, node, "document", limit)
+        results.extend(found)
+        snippet, score, order = _ranking(plan, 1, "d.extracted_text", "d.id")
+        from_sql, params = plan.from_sql()
+        sql = f"""
             SELECT 
                 'document' as type,
                 d.id,
                 d.filename as title,
                 d.doc_type as sender,
-                d.created_at as date,
-                snippet(documents_fts, 1, '>>>', '<<<', '...', 64) as snippet,
+                d.doc_date as date,
+                {snippet} as snippet,
                 d.file_path,
                 d.ocr_done,
-                bm25(documents_fts) as score
-            FROM documents_fts
-            JOIN documents d ON d.id = documents_fts.rowid
-            WHERE documents_fts MATCH ?
-            ORDER BY score
-            LIMIT ?
+                {score} as score,
+                d.ocr_quality
+            {from_sql}
         """
+        if found:
+            sql += f" AND d.id NOT IN ({','.join('?' * len(found))})"
+            params.extend(r["id"] for r in found)
+        
+        sql += f" ORDER BY {order} LIMIT ?"
+        params.append(limit - len(found))
         
         try:
-            cursor = conn.execute(sql, [fts_query, limit])
+            cursor = conn.execute(sql, params) if len(found) < limit else []
             for row in cursor:
                 results.append({
                     "type": row[0],
@@ -113,35 +155,41 @@ def search_fts(conn: sqlite3.Connection, query: str,
                     "snippet": row[5],
                     "file_path": row[6],
                     "ocr_done": bool(row[7]),
-                    "score": row[8]
+                    "score": row[8],
+                    "ocr_quality": row[9]
                 })
         except sqlite3.OperationalError as e:
-            if "no such table" not in str(e):
+            if not _silent_error(e):
                 print(f"Erreur documents: {e}")
     
-    # Recherche dans les pièces jointes
-    if doc_type is None or doc_type == 'attachment':
-        sql = """
+    # Recherche dans les pièces jointes (même principe)
+    plan = querylang.plan(conn, node, "attachment", alias="a")
+    if plan.access != "none":
+        found = search_passages(conn, node, "attachment", limit)
+        results.extend(found)
+        snippet, score, order = _ranking(plan, 1, "a.extracted_text", "a.id")
+        from_sql, params = plan.from_sql()
+        sql = f"""
             SELECT 
                 'attachment' as type,
                 a.id,
                 a.filename as title,
-                e.sender,
-                e.date_sent as date,
-                snippet(attachments_fts, 1, '>>>', '<<<', '...', 64) as snippet,
+                (SELECT sender FROM emails WHERE id = a.email_id),
+                (SELECT date_sent FROM emails WHERE id = a.email_id),
+                {snippet} as snippet,
                 a.vault_path as file_path,
                 a.email_id,
-                bm25(attachments_fts) as score
-            FROM attachments_fts
-            JOIN attachments a ON a.id = attachments_fts.rowid
-            LEFT JOIN emails e ON e.id = a.email_id
-            WHERE attachments_fts MATCH ?
-            ORDER BY score
-            LIMIT ?
+                {score} as score
+            {from_sql}
         """
+        if found:
+            sql += f" AND a.id NOT IN ({','.join('?' * len(found))})"
+            params.extend(r["id"] for r in found)
+        sql += f" ORDER BY {order} LIMIT ?"
+        params.append(limit - len(found))
         
         try:
-            cursor = conn.execute(sql, [fts_query, limit])
+            cursor = conn.execute(sql, params) if len(found) < limit else []
             for row in cursor:
                 results.append({
                     "type": row[0],
@@ -155,14 +203,340 @@ def search_fts(conn: sqlite3.Connection, query: str,
                     "score": row[8]
                 })
         except sqlite3.OperationalError as e:
-            if "no such table" not in str(e):
+            if not _silent_error(e):
                 print(f"Erreur attachments: {e}")
     
     # Trie par score global
     results.sort(key=lambda x: x.get("score", 0))
     
+    if collapse:
+        try:
+            results = minhash.collapse_results(conn, results)
+        except sqlite3.OperationalError as e:
+            if not _silent_error(e):
+                print(f"Erreur quasi-doublons: {e}")
+    
     return results[:limit]
 
+PASSAGES_PER_SOURCE = 5  # Passages lus par source attendue (une source peut en avoir plusieurs)
+
+def search_passages(conn: sqlite3.Connection, query: Union[str, "querylang.Node"], source_type: str,
+                    limit: int = 50) -> List[Dict[str, Any]]:
+    """
+    Recherche dans passages_fts: meilleur passage de chaque document ou pièce jointe,
+    avec son numéro de page. Le classement ne lit que des passages et snippet()
+    n'est calculé que pour les passages retenus. Les champs structurés de la
+    requête (from:, type:, date:...) filtrent les sources.
+    """
+    node = querylang.parse(query) if isinstance(query, str) else query
+    plan = querylang.plan(conn, node, source_type, fts="passages_fts")
+    if not plan.match:
+        return []  # Requête sans terme: pas de passage à classer
+    fts_query = plan.match
+    sql = """
+        SELECT p.id, p.source_id, p.page_no, bm25(passages_fts) AS score
+        FROM passages_fts
+        JOIN passages p ON p.id = passages_fts.rowid
+        WHERE passages_fts MATCH ? AND p.source_type = ?
+    """
+    params: List[Any] = [fts_query, source_type]
+    if plan.where:
+        where, where_params = plan.where_sql()
+        sql += f" AND p.source_id IN (SELECT s.id FROM {querylang.SOURCES[source_type][0]} s WHERE 1{where})"
+        params += where_params
+    sql += " ORDER BY score LIMIT ?"
+    params.append(limit * PASSAGES_PER_SOURCE)
+    
+    try:
+        best: Dict[int, Tuple[int, Optional[int], float]] = {}
+        for passage_id, source_id, page_no, score in conn.execute(sql, params):
+            if source_id not in best:
+                best[source_id] = (passage_id, page_no, score)
+                if len(best) >= limit:
+                    break
+        if not best:
+            return []
+        
+        passage_ids = [v[0] for v in best.values()]
+        placeholders = ",".join("?" * len(best))
+        snippets = dict(conn.execute(f"""
+            SELECT rowid, snippet(passages_fts, 1, '>>>', '<<<', '...', 64) FROM passages_fts
+            WHERE passages_fts MATCH ? AND rowid IN ({placeholders})
+        """, [fts_query] + passage_ids))
+        
+        results = []
+        if source_type == "document":
+            rows = conn.execute(f"""
+                SELECT id, filename, doc_type, doc_date, file_path, ocr_done, ocr_quality
+                FROM documents WHERE id IN ({placeholders})
+            """, list(best))
+            for doc_id, title, dtype, date, file_path, ocr_done, quality in rows:
+                passage_id, page_no, score = best[doc_id]
+                results.append({
+                    "type": "document",
+                    "id": doc_id,
+                    "title": title,
+                    "doc_type": dtype,
+                    "date": date,
+                    "snippet": snippets.get(passage_id),
+                    "page": page_no,
+                    "file_path": file_path,
+                    "ocr_done": bool(ocr_done),
+                    "score": score,
+                    "ocr_quality": quality
+                })
+        else:
+            rows = conn.execute(f"""
+                SELECT a.id, a.filename, e.sender, e.date_sent, a.vault_path, a.email_id
+                FROM attachments a LEFT JOIN emails e ON e.id = a.email_id
+                WHERE a.id IN ({placeholders})
+            """, list(best))
+            for att_id, title, sender, date, file_path, email_id in rows:
+                passage_id, page_no, score = best[att_id]
+                results.append({
+                    "type": "attachment",
+                    "id": att_id,
+                    "title": title,
+                    "sender": sender,
+                    "date": date,
+                    "snippet": snippets.get(passage_id),
+                    "page": page_no,
+                    "file_path": file_path,
+                    "email_id": email_id,
+                    "score": score
+                })
+    except sqlite3.OperationalError as e:
+        if not _silent_error(e):
+            print(f"Erreur passages: {e}")
+        return []
+    results.sort(key=lambda r: r["score"])
+    return results
+
+_SOURCE_META = {
+    "email": "SELECT id, subject, sender, date_sent, file_path, NULL FROM emails WHERE id IN ({})",
+    "document": "SELECT id, filename, doc_type, doc_date, file_path, NULL FROM documents WHERE id IN ({})",
+    "attachment": """
+        SELECT a.id, a.filename, e.sender, e.date_sent, a.vault_path, a.email_id
+        FROM attachments a LEFT JOIN emails e ON e.id = a.email_id WHERE a.id IN ({})
+    """,
+}
+
+def _field_matches(conn: sqlite3.Connection, node: "querylang.Node",
+                   keys: List[Tuple[str, int]]) -> Set[Tuple[str, int]]:
+    """Sources (type, id) qui satisfont les champs structurés de la requête (from:, type:, date:...)."""
+    allowed: Set[Tuple[str, int]] = set()
+    fields = querylang.filters(node)
+    for source_type in querylang.SOURCE_TYPES:
+        ids = [source_id for t, source_id in keys if t == source_type]
+        plan = querylang.plan(conn, fields, source_type)
+        if not ids or plan.access == "none":
+            continue
+        from_sql, params = plan.from_sql()
+        rows = conn.execute(f"SELECT s.id {from_sql} AND s.id IN ({','.join('?' * len(ids))})", params + ids)
+        allowed.update((source_type, row[0]) for row in rows)
+    return allowed
+
+def search_semantic(conn: sqlite3.Connection, db_path: str, query: str,
+                    doc_type: Optional[str] = None,
+                    date_from: Optional[str] = None,
+                    date_to: Optional[str] = None,
+                    limit: int = 50,
+                    nprobe: int = vectors.DEFAULT_NPROBE,
+                    index: Optional["vectors.VectorIndex"] = None,
+                    min_quality: Optional[float] = None) -> List[Dict[str, Any]]:
+    """
+    Recherche sémantique dans l'index vectoriel (python embed.py build).
+    Un résultat par source (son meilleur passage); score = similarité cosinus.
+    Les mots de la requête sont encodés, ses champs (from:, date:...) filtrent.
+    """
+    node = querylang.with_filters(querylang.parse(query), doc_type, date_from, date_to, min_quality)
+    text = querylang.plain_text(node)
+    if not text:
+        raise querylang.QueryError("recherche sémantique: aucun terme à rechercher")
+    index = index or vectors.VectorIndex(vectors.vec_dir_for(db_path))
+    # Plusieurs passages par source et filtres appliqués après coup: on prend large
+    hits = index.search(index.embed(text), k=limit * 8, nprobe=nprobe)
+    if not hits:
+        return []
+    
+    scores = dict(hits)
+    placeholders = ",".join("?" * len(hits))
+    chunks = conn.execute(
+        f"SELECT vec_row, source_type, source_id, char_start, char_end FROM vec_chunks "
+        f"WHERE vec_row IN ({placeholders})", [row for row, _ in hits]
+    ).fetchall()
+    
+    best: Dict[Tuple[str, int], Tuple[float, int, int]] = {}
+    for vec_row, source_type, source_id, start, end in chunks:
+        key = (source_type, source_id)
+        if key not in best or scores[vec_row] > best[key][0]:
+            best[key] = (scores[vec_row], start, end)
+    allowed = _field_matches(conn, node, list(best))
+    
+    # Métadonnées puis textes par lots (une requête par type)
+    meta: Dict[Tuple[str, int], tuple] = {}
+    for source_type in _SOURCE_META:
+        ids = [source_id for t, source_id in allowed if t == source_type]
+        if ids:
+            for row in conn.execute(_SOURCE_META[source_type].format(",".join("?" * len(ids))), ids):
+                meta[(source_type, row[0])] = row[1:]
+    
+    results = []
+    for (source_type, source_id), (score, start, end) in sorted(best.items(), key=lambda kv: -kv[1][0]):
+        row = meta.get((source_type, source_id))
+        if row is None:
+            continue
+        title, sender, date, file_path, email_id = row
+        result = {
+            "type": source_type,
+            "id": source_id,
+            "title": title,
+            "date": date,
+            "snippet": (start, end),
+            "file_path": file_path,
+            "score": round(score, 4)
+        }
+        if source_type == "document":
+            result["doc_type"] = sender
+        else:
+            result["sender"] = sender
+        if email_id is not None:
+            result["email_id"] = email_id
+        results.append(result)
+        if len(results) >= limit:
+            break
+    
+    for source_type in _SOURCE_META:
+        texts = vectors.source_texts(conn, source_type, [r["id"] for r in results if r["type"] == source_type])
+        for r in results:
+            if r["type"] == source_type:
+                start, end = r["snippet"]
+                r["snippet"] = " ".join(texts.get(r["id"], "")[start:end].split())[:300]
+    return results
+
+def search_hybrid(db_path: str, query: str,
+                  doc_type: Optional[str] = None,
+                  date_from: Optional[str] = None,
+                  date_to: Optional[str] = None,
+                  limit: int = 50,
+                  collapse: bool = False,
+                  min_quality: Optional[float] = None,
+                  nprobe: int = vectors.DEFAULT_NPROBE,
+                  weights: Optional[Dict[str, float]] = None,
+                  budget: float = fusion.DEFAULT_BUDGET,
+                  index: Optional["vectors.VectorIndex"] = None) -> Tuple[List[Dict[str, Any]], Dict[str, str]]:
+    """
+    Recherche hybride: bm25 sur chaque table FTS et index vectoriel en parallèle,
+    listes fusionnées par rang réciproque (RRF) puis dédoublonnées.
+    Une liste qui dépasse le budget (secondes) est abandonnée et sa requête
+    interrompue. Retourne (résultats, {liste abandonnée: raison}).
+    """
+    depth = max(limit * 3, 50)
+    node = querylang.parse(query)  # Requête mal formée: erreur avant de lancer les listes
+    uri = Path(db_path).resolve().as_uri() + "?mode=ro"
+    tables = [doc_type] if doc_type else ["email", "document", "attachment"]
+    # Une connexion par liste: chacune tourne dans son thread et peut être interrompue
+    conns = {name: sqlite3.connect(uri, uri=True, check_same_thread=False)
+             for name in tables + ["semantic"]}
+    
+    def lexical(table: str) -> List[Dict[str, Any]]:
+        return search_fts(conns[table], query, doc_type=table, date_from=date_from,
+                          date_to=date_to, limit=depth, min_quality=min_quality)
+    
+    def semantic() -> List[Dict[str, Any]]:
+        return search_semantic(conns["semantic"], db_path, query, doc_type=doc_type,
+                               date_from=date_from, date_to=date_to, limit=depth,
+                               nprobe=nprobe, index=index, min_quality=min_quality)
+    
+    legs = {table: (lambda table=table: lexical(table)) for table in tables}
+    if querylang.plain_text(node):
+        legs["semantic"] = semantic
+    else:
+        conns.pop("semantic").close()  # Que des champs (from:, date:...): rien à encoder
+    lists, dropped = fusion.run_concurrently(
+        legs, budget, on_timeout={name: conn.interrupt for name, conn in conns.items()},
+        on_finish={name: conn.close for name, conn in conns.items()}
+    )
+    
+    conn = sqlite3.connect(uri, uri=True)
+    try:
+        ranked = [("bm25", lists[table]) for table in tables if table in lists]
+        results = fusion.rrf(ranked + [("semantic", lists.get("semantic", []))], weights)
+        # --collapse retire encore des résultats: on en garde davantage avant
+        results = fusion.dedupe(conn, results, None if collapse else limit)
+        if collapse:
+            results = minhash.collapse_results(conn, results)
+    except sqlite3.OperationalError as e:
+        if not _silent_error(e):
+            print(f"Erreur fusion: {e}")
+        results = []
+    finally:
+        conn.close()
+    return results[:limit], dropped
+
+def search_shards(dbs: List[Tuple[str, Path]], query: str,
+                  doc_type: Optional[str] = None,
+                  date_from: Optional[str] = None,
+                  date_to: Optional[str] = None,
+                  limit: int = 50,
+                  collapse: bool = False,
+                  min_quality: Optional[float] = None,
+                  budget: float = fusion.DEFAULT_BUDGET) -> Tuple[List[Dict[str, Any]], Dict[str, str]]:
+    """
+    Recherche sur plusieurs bases (shards d'un manifeste, dossiers différents)
+    en parallèle, résultats fusionnés par score; chacun porte 'shard'. Les
+    bases annuelles hors de --from/--to ne sont pas ouvertes.
+    Retourne (résultats, {base abandonnée: raison}).
+    """
+    querylang.parse(query)  # Requête mal formée: erreur avant d'ouvrir les bases
+    return shards.search(
+        shards.prune(dbs, date_from, date_to),
+        lambda conn: search_fts(conn, query, doc_type=doc_type, date_from=date_from, date_to=date_to,
+                                limit=limit, collapse=collapse, min_quality=min_quality),
+        limit, budget
+    )
+
+def search_facets(conn: sqlite3.Connection, query: str,
+                  doc_type: Optional[str] = None,
+                  date_from: Optional[str] = None,
+                  date_to: Optional[str] = None,
+                  min_quality: Optional[float] = None) -> Dict[str, Dict[str, int]]:
+    """
+    Comptes par facette (type, expéditeur, année, mois, type de document, PJ)
+    de tous les résultats de la recherche, pas seulement des premiers.
+    Les rowids sont lus selon le plan de la requête puis comptés sur les
+    colonnes précalculées de facet_columns (voir vpokit/facets.py).
+    """
+    node = querylang.with_filters(querylang.parse(query), doc_type, date_from, date_to, min_quality)
+    matches = {}
+    for source_type in querylang.SOURCE_TYPES:
+        plan = querylang.plan(conn, node, source_type)
+        if plan.access == "none":
+            continue
+        from_sql, params = plan.from_sql()
+        try:
+            matches[source_type] = [row[0] for row in conn.execute(f"SELECT s.id {from_sql}", params)]
+        except sqlite3.OperationalError as e:
+            if not _silent_error(e):
+                print(f"Erreur facettes {source_type}: {e}")
+    return facets.count(conn, matches)
+
+def explain(conn: sqlite3.Connection, query: str,
+            doc_type: Optional[str] = None,
+            date_from: Optional[str] = None,
+            date_to: Optional[str] = None,
+            min_quality: Optional[float] = None) -> List[str]:
+    """Plan de la requête par source: arbre analysé, accès choisi, MATCH et prédicats estimés."""
+    node = querylang.with_filters(querylang.parse(query), doc_type, date_from, date_to, min_quality)
+    lines = [f"Requête: {querylang.to_text(node)}", ""]
+    for source_type in querylang.SOURCE_TYPES:
+        lines.append(querylang.plan(conn, node, source_type).describe())
+        if source_type in passages.SOURCE_TYPES:
+            plan = querylang.plan(conn, node, source_type, fts="passages_fts")
+            if plan.match:
+                lines.append(f"  passages: MATCH passages_fts: {plan.match}")
+    return lines
+
 def get_email_detail(conn: sqlite3.Connection, email_id: int) -> Optional[Dict]:
     """Récupère le détail complet d'un email."""
     cursor = conn.execute("""
@@ -175,6 +549,7 @@ def get_email_detail(conn: sqlite3.Connection, email_id: int) -> Optional[Dict]:
     
     columns = [d[0] for d in cursor.description]
     email = dict(zip(columns, row))
+    email["body_html"] = htmltext.unpack_html(email.get("body_html"))
     
     # Récupère les pièces jointes
     cursor = conn.execute("""
@@ -245,8 +620,107 @@ def get_stats(conn: sqlite3.Connection) -> Dict[str, Any]:
     """)
     stats["top_senders"] = [{"email": r[0], "count": r[1]} for r in cursor]
     
+    # Top correspondants (expéditeur, destinataire ou copie; table absente sur les bases anciennes)
+    try:
+        cursor = conn.execute("""
+            SELECT address, COUNT(DISTINCT email_id) as cnt
+            FROM participants
+            GROUP BY address
+            ORDER BY cnt DESC
+            LIMIT 10
+        """)
+        stats["top_participants"] = [{"email": r[0], "count": r[1]} for r in cursor]
+    except sqlite3.OperationalError:
+        stats["top_participants"] = []
+    
+    # File OCR (texte natif déjà cherchable, OCR en attente)
+    stats["ocr_jobs"] = ocrqueue.counts(conn)
+    
+    # Quarantaine (table absente sur les bases anciennes)
+    try:
+        stats["quarantine_count"] = conn.execute("SELECT COUNT(*) FROM quarantine").fetchone()[0]
+    except sqlite3.OperationalError:
+        stats["quarantine_count"] = 0
+    
     return stats
 
+def get_worst_quality(conn: sqlite3.Connection, limit: int = 20) -> List[Dict[str, Any]]:
+    """Documents au texte de moindre qualité, avec leurs pages sous le seuil."""
+    docs = []
+    cursor = conn.execute("""
+        SELECT id, filename, doc_type, page_count, ocr_done, ocr_quality, file_path
+        FROM documents WHERE ocr_quality IS NOT NULL
+        ORDER BY ocr_quality, id LIMIT ?
+    """, [limit])
+    columns = [d[0] for d in cursor.description]
+    for row in cursor.fetchall():
+        doc = dict(zip(columns, row))
+        try:
+            doc["low_pages"] = [
+                {"page": r[0], "score": r[1], "ocr": bool(r[2])}
+                for r in conn.execute(
+                    "SELECT page_no, score, ocr FROM page_quality "
+                    "WHERE document_id = ? AND score < ? ORDER BY page_no",
+                    [doc["id"], ocrquality.QUALITY_THRESHOLD]
+                )
+            ]
+        except sqlite3.OperationalError:
+            doc["low_pages"] = []
+        docs.append(doc)
+    return docs
+
+def get_quarantine(conn: sqlite3.Connection) -> List[Dict[str, Any]]:
+    """Fichiers mis en quarantaine par ingest_docs, du plus récent au plus ancien."""
+    try:
+        cursor = conn.execute("""
+            SELECT file_path, reason, detail, attempts, runs, updated_at
+            FROM quarantine ORDER BY updated_at DESC
+        """)
+    except sqlite3.OperationalError:
+        return []
+    columns = [d[0] for d in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor]
+
+def get_near_duplicates(conn: sqlite3.Connection,
+                        threshold: float = minhash.DEFAULT_THRESHOLD) -> List[List[Dict[str, Any]]]:
+    """Retourne les groupes de quasi-doublons (emails et documents)."""
+    groups = []
+    for cluster in minhash.find_clusters(conn, threshold):
+        group = []
+        for source_type, source_id in cluster:
+            if source_type == "email":
+                row = conn.execute(
+                    "SELECT subject, date_sent, file_path FROM emails WHERE id = ?", [source_id]
+                ).fetchone()
+            else:
+                row = conn.execute(
+                    "SELECT filename, doc_date, file_path FROM documents WHERE id = ?", [source_id]
+                ).fetchone()
+            if row:
+                group.append({
+                    "type": source_type,
+                    "id": source_id,
+                    "title": row[0],
+                    "date": row[1],
+                    "file_path": row[2]
+                })
+        if len(group) > 1:
+            groups.append(group)
+    return groups
+
+def export_attachment(conn: sqlite3.Connection, att_id: int, output: Optional[str] = None) -> Optional[str]:
+    """Copie le contenu d'une pièce jointe (vault classique ou pack://) vers un fichier."""
+    row = conn.execute(
+        "SELECT filename, vault_path FROM attachments WHERE id = ?", [att_id]
+    ).fetchone()
+    if not row or not row[1]:
+        return None
+    output = output or Path(row[0] or f"attachment_{att_id}").name
+    with open(output, 'wb') as f:
+        for chunk in iter_blob(row[1]):
+            f.write(chunk)
+    return output
+
 def print_results(results: List[Dict], verbose: bool = False):
     """Affiche les résultats de recherche."""
     if not results:
@@ -258,26 +732,244 @@ def print_results(results: List[Dict], verbose: bool = False):
     
     for i, r in enumerate(results, 1):
         type_icon = {"email": "📧", "document": "📄", "attachment": "📎"}.get(r["type"], "?")
+        shard = f" ({r['shard']})" if r.get("shard") else ""
         
-        print(f"{i}. {type_icon} [{r['type'].upper()}] {r.get('title', 'Sans titre')}")
+        print(f"{i}. {type_icon} [{r['type'].upper()}]{shard} {r.get('title', 'Sans titre')}")
+        
+        if r.get("near_duplicates"):
+            print(f"   (+{r['near_duplicates']} quasi-doublon(s) masqué(s))")
+        if r.get("also"):
+            print(f"   (aussi: {', '.join(r['also'])})")
         
         if r.get("sender"):
             print(f"   De: {r['sender']}")
         if r.get("date"):
             print(f"   Date: {r['date']}")
+        if r.get("page"):
+            print(f"   Page: {r['page']}")
         if r.get("snippet"):
             snippet = r["snippet"].replace(">>>", "\033[1m").replace("<<<", "\033[0m")
             print(f"   ...{snippet}...")
         
         if verbose and r.get("file_path"):
             print(f"   Fichier: {r['file_path']}")
+        if verbose and r.get("ranks"):
+            print(f"   Rangs: {', '.join(f'{m} {rank}' for m, rank in r['ranks'].items())}")
         
         print()
 
+def print_volume(rows: List[Tuple[str, int]]):
+    """Histogramme du volume par période."""
+    top = max((n for _, n in rows), default=0)
+    for bucket, n in rows:
+        print(f"  {bucket:<10} {n:5d}  {'█' * max(1, round(n * 40 / top))}")
+
+def print_contacts(conn: sqlite3.Connection, address: str, args: argparse.Namespace):
+    """Correspondants d'une adresse et son activité (--contacts)."""
+    people = participants.contacts(conn, address, args.limit, args.date_from, args.date_to)
+    if args.export_json:
+        volume = participants.volume(conn, address, None, args.period, args.date_from, args.date_to)
+        _export_data(args.export_json, {"contacts": people, "volume": volume})
+        return
+    print(f"\n=== CORRESPONDANTS DE {address.lower()} ===\n")
+    if not people:
+        print("Aucun échange trouvé.")
+        return
+    print(f"  {'envoyés':>8} {'reçus':>6}  {'premier':<10} {'dernier':<10}  adresse")
+    for p in people:
+        print(f"  {p['sent']:8d} {p['received']:6d}  {(p['first'] or '')[:10]:<10} {(p['last'] or '')[:10]:<10}  {p['address']}")
+    print(f"\nActivité ({args.period}):")
+    print_volume(participants.volume(conn, address, None, args.period, args.date_from, args.date_to))
+
+def print_between(conn: sqlite3.Connection, a: str, b: str, args: argparse.Namespace):
+    """Emails échangés entre deux adresses et volume par période (--between)."""
+    emails = participants.between(conn, a, b, args.limit, args.date_from, args.date_to)
+    volume = participants.volume(conn, a, b, args.period, args.date_from, args.date_to)
+    if args.export_json:
+        _export_data(args.export_json, {"emails": emails, "volume": volume})
+        return
+    print(f"\n=== ÉCHANGES {a.lower()} ↔ {b.lower()} ===\n")
+    if not emails:
+        print("Aucun échange trouvé.")
+        return
+    print(f"Volume ({args.period}):")
+    print_volume(volume)
+    print()
+    for e in emails:
+        arrow = "→" if (e["sender"] or "").lower() == a.lower() else "←"
+        print(f"  {(e['date'] or '')[:16]:<16} {arrow} [email:{e['id']}] {e['title']}")
+    if len(emails) >= args.limit:
+        print(f"  ... (--limit {args.limit})")
+
+def print_path(conn: sqlite3.Connection, a: str, b: str):
+    """Plus courte chaîne de correspondants (--path)."""
+    chain = participants.path(conn, a, b)
+    if chain is None:
+        print(f"Aucune chaîne de {participants.MAX_HOPS} échanges au plus entre {a} et {b}.")
+        return
+    print(f"\n=== CHAÎNE {a.lower()} → {b.lower()} ({len(chain) - 1} échange(s)) ===\n")
+    for i, address in enumerate(chain):
+        print(f"  {address}")
+        if i + 1 < len(chain):
+            emails = participants.between(conn, address, chain[i + 1], limit=1000)
+            print(f"    │ {len(emails)} email(s), dont [email:{emails[0]['id']}] {emails[0]['title']}")
+
+def get_timeline(conn: sqlite3.Connection, query: Optional[str] = None, period: str = "month",
+                 date_from: Optional[str] = None, date_to: Optional[str] = None,
+                 address: Optional[str] = None, doc_type: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Chronologie: éléments par période et par source (table timeline) et,
+    avec une requête, nombre de résultats par période ("period": None pour
+    les résultats sans date).
+    """
+    sources = (doc_type,) if doc_type else timeline.SOURCES
+    if address:
+        sources = tuple(s for s in sources if s == "email")  # Cumul par correspondant: emails
+    counts = timeline.activity(conn, period, date_from, date_to, address, sources)
+    found: Dict[Optional[str], Dict[str, int]] = {}
+    if query:
+        node = querylang.with_filters(querylang.parse(query), doc_type, date_from, date_to)
+        found = timeline.hits(conn, node, period, address, sources)
+    rows = []
+    buckets: List[Optional[str]] = sorted(set(counts) | {b for b in found if b is not None})
+    if None in found:
+        buckets.append(None)
+    for bucket in buckets:
+        row: Dict[str, Any] = {"period": bucket}
+        row.update({source: counts.get(bucket, {}).get(source, 0) for source in sources})
+        if query:
+            row["hits"] = sum(found.get(bucket, {}).values())
+        rows.append(row)
+    return rows
+
+TIMELINE_TITLES = {"email": "emails", "attachment": "PJ", "document": "docs"}
+
+def print_timeline(rows: List[Dict[str, Any]], title: str):
+    """Tableau de la chronologie, barre sur les résultats (ou le total sans requête)."""
+    print(f"\n=== CHRONOLOGIE {title} ===\n")
+    if not rows:
+        print("Aucune activité sur la période.")
+        return
+    sources = [s for s in timeline.SOURCES if s in rows[0]]
+    with_hits = "hits" in rows[0]
+    value = (lambda r: r["hits"]) if with_hits else (lambda r: sum(r[s] for s in sources))
+    top = max(value(r) for r in rows) or 1
+    print("  " + f"{'période':<11}" + "".join(f"{TIMELINE_TITLES[s]:>8}" for s in sources)
+          + (f"{'résultats':>11}" if with_hits else ""))
+    for r in rows:
+        bar = "█" * round(value(r) * 30 / top)
+        if r["period"] is None:
+            print(f"  {'(sans date)':<11}" + " " * 8 * len(sources) + f"{r['hits']:>11}")
+            continue
+        print(f"  {r['period']:<11}" + "".join(f"{r[s]:>8}" for s in sources)
+              + (f"{r['hits']:>11}" if with_hits else "") + f"  {bar}")
+
+FACET_TITLES = {
+    "type": "Type", "sender": "Expéditeur", "year": "Année", "month": "Mois",
+    "doc_type": "Type de document", "has_attachments": "Avec PJ",
+}
+
+def print_facets(counts: Dict[str, Dict[str, int]], top: int = 10):
+    """Affiche les comptes par facette (les 'top' valeurs les plus fréquentes)."""
+    if not counts:
+        return
+    print("=== FACETTES ===\n")
+    for facet in facets.FACETS:
+        values = counts.get(facet)
+        if not values:
+            continue
+        print(f"{FACET_TITLES[facet]}:")
+        # Années et mois dans l'ordre chronologique, le reste par effectif
+        items = sorted(values.items()) if facet in ("year", "month") else list(values.items())
+        for label, n in items[:top]:
+            print(f"  {n:6d}  {label}")
+        if len(items) > top:
+            print(f"  ... +{len(items) - top} autre(s)")
+        print()
+
+def _export_data(path: str, data: Any):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, ensure_ascii=False, default=str)
+    print(f"Exporté vers {path}")
+
+def _export(path: str, results: List[Dict], counts: Optional[Dict[str, Dict[str, int]]] = None):
+    """Exporte les résultats en JSON ({"results", "facets"} avec --facets)."""
+    _export_data(path, results if counts is None else {"results": results, "facets": counts})
+
+def search_federated(args: argparse.Namespace):
+    """Recherche sur plusieurs bases (--db répété ou manifeste de shards)."""
+    modes = [f"--{mode.replace('_', '-')}" for mode in SINGLE_DB_MODES if getattr(args, mode)]
+    if modes:
+        print(f"ERREUR: {', '.join(modes)} lit une seule base: --db <base>.db (voir le manifeste)")
+        sys.exit(1)
+    if not args.query:
+        print("ERREUR: indique une recherche")
+        sys.exit(1)
+    dbs = shards.resolve(args.db)
+    try:
+        start = time.perf_counter()
+        results, dropped = search_shards(
+            dbs, args.query, doc_type=args.type, date_from=args.date_from, date_to=args.date_to,
+            limit=args.limit, collapse=args.collapse, min_quality=args.min_quality,
+            budget=args.budget / 1000
+        )
+        elapsed = time.perf_counter() - start
+    except querylang.QueryError as e:
+        print(f"Requête invalide: {e}")
+        sys.exit(1)
+    if args.export_json:
+        _export(args.export_json, results)
+    else:
+        print_results(results, args.verbose)
+        searched = len(shards.prune(dbs, args.date_from, args.date_to))
+        print(f"({searched}/{len(dbs)} bases interrogées: {elapsed * 1000:.0f} ms)")
+    for name, reason in dropped.items():
+        print(f"Base {name} ignorée: {reason}")
+
+def protect_negations(parser: argparse.ArgumentParser, argv: List[str]) -> List[str]:
+    """
+    Les négations ('-avocat', '-avocat pension') passent pour des options:
+    précédées d'une espace, argparse les range dans la requête, à leur
+    place. Les valeurs d'options et ce qui suit '--' ne sont pas touchés;
+    une valeur qui commence par '-' est collée à son option (--output=-scan.pdf).
+    """
+    arity: Dict[str, int] = {}
+    for action in parser._actions:
+        count = action.nargs if isinstance(action.nargs, int) else 0 if action.nargs == 0 else 1
+        for option in action.option_strings:
+            arity[option] = count
+
+    def values_of(arg: str) -> int:
+        name = arg.split("=", 1)[0]
+        if "=" in arg:
+            return 0
+        if name in arity:
+            return arity[name]
+        matches = [option for option in arity if option.startswith("--") and option.startswith(name)]
+        return arity[matches[0]] if name.startswith("--") and len(matches) == 1 else 0
+
+    protected, pending = [], 0
+    for i, arg in enumerate(argv):
+        if pending:
+            pending -= 1
+            if arg.startswith("-") and values_of(protected[-1]) == 1:
+                protected[-1] += "=" + arg
+                continue
+        elif arg == "--":
+            return protected + argv[i:]
+        elif arg.startswith("-") and not arg.startswith("--") and arg.split("=", 1)[0] not in arity and len(arg) > 1:
+            arg = " " + arg
+        elif arg.startswith("-"):
+            pending = values_of(arg)
+        protected.append(arg)
+    return protected
+
 def main():
     parser = argparse.ArgumentParser(description="Recherche dans la base VPO")
-    parser.add_argument("query", nargs="?", help="Termes de recherche")
-    parser.add_argument("--db", default=DEFAULT_DB, help="Chemin de la base")
+    parser.add_argument("query", nargs="*", help="Termes de recherche")
+    parser.add_argument("--db", action="append",
+                        help="Chemin de la base, ou manifeste de shards (.shards.json); "
+                             "répétable pour chercher dans plusieurs dossiers")
     parser.add_argument("--type", choices=["email", "document", "attachment"], help="Filtrer par type")
     parser.add_argument("--from", dest="date_from", help="Date début (YYYY-MM-DD)")
     parser.add_argument("--to", dest="date_to", help="Date fin (YYYY-MM-DD)")
@@ -285,13 +977,60 @@ def main():
     parser.add_argument("--stats", action="store_true", help="Afficher les statistiques")
     parser.add_argument("--detail", help="Afficher détail (email:ID ou doc:ID)")
     parser.add_argument("--export-json", help="Exporter en JSON")
+    parser.add_argument("--collapse", action="store_true", help="Masquer les quasi-doublons dans les résultats")
+    parser.add_argument("--near-duplicates", action="store_true", help="Rapport des quasi-doublons")
+    parser.add_argument("--threshold", type=float, default=minhash.DEFAULT_THRESHOLD,
+                        help="Similarité minimale des quasi-doublons (0-1)")
+    parser.add_argument("--semantic", action="store_true",
+                        help="Recherche sémantique (index vectoriel: python embed.py build)")
+    parser.add_argument("--hybrid", action="store_true",
+                        help="Recherche hybride: mots (bm25) et sens (vecteurs) fusionnés en une liste")
+    parser.add_argument("--nprobe", type=int, default=vectors.DEFAULT_NPROBE,
+                        help="--semantic/--hybrid: listes IVF parcourues (plus = plus précis, plus lent)")
+    parser.add_argument("--semantic-weight", type=float, default=fusion.DEFAULT_WEIGHTS["semantic"],
+                        help="--hybrid: poids de la liste sémantique (bm25 = 1)")
+    parser.add_argument("--budget", type=int, default=int(fusion.DEFAULT_BUDGET * 1000),
+                        help="--hybrid: temps maximal par liste (ms) avant fusion sans elle; "
+                             "plusieurs bases: temps maximal par base")
+    parser.add_argument("--contacts", metavar="ADRESSE",
+                        help="Correspondants d'une adresse (envoyés, reçus) et activité par période")
+    parser.add_argument("--between", nargs=2, metavar=("A", "B"),
+                        help="Emails échangés entre deux adresses, volume par période")
+    parser.add_argument("--path", nargs=2, metavar=("A", "B"),
+                        help="Plus courte chaîne de correspondants reliant deux adresses")
+    parser.add_argument("--timeline", action="store_true",
+                        help="Chronologie: activité par période (avec une requête: résultats par période)")
+    parser.add_argument("--participant", metavar="ADRESSE",
+                        help="--timeline: emails de ce correspondant seulement")
+    parser.add_argument("--period", choices=sorted(timeline.PERIODS), default="month",
+                        help="--timeline/--contacts/--between: période (défaut: month)")
+    parser.add_argument("--explain", action="store_true",
+                        help="Afficher le plan de la requête (accès par source, estimations) sans l'exécuter")
+    parser.add_argument("--facets", action="store_true",
+                        help="Comptes par type, expéditeur, année/mois, type de document (tous les résultats)")
+    parser.add_argument("--min-quality", type=float,
+                        help="Exclure les documents dont la qualité du texte (0..1) est inférieure")
+    parser.add_argument("--ocr-report", action="store_true",
+                        help="Documents au texte de moindre qualité (--limit pour le nombre)")
+    parser.add_argument("--quarantine", action="store_true", help="Lister les fichiers en quarantaine")
+    parser.add_argument("--blob", help="Extraire le fichier d'une pièce jointe (attachment:ID)")
+    parser.add_argument("--output", help="Fichier de sortie pour --blob")
     parser.add_argument("-v", "--verbose", action="store_true", help="Mode verbeux")
     
-    args = parser.parse_args()
+    # Termes dans l'ordre tapé, même séparés par des options
+    args = parser.parse_intermixed_args(protect_negations(parser, sys.argv[1:]))
+    args.query = " ".join(args.query).strip() or None
+    args.db = args.db or [DEFAULT_DB]
     
-    if not Path(args.db).exists():
-        print(f"ERREUR: Base non trouvée: {args.db}")
-        sys.exit(1)
+    for db_path in args.db:
+        if not Path(db_path).exists():
+            print(f"ERREUR: Base non trouvée: {db_path}")
+            sys.exit(1)
+    
+    if len(args.db) > 1 or shards.is_manifest(args.db[0]):
+        search_federated(args)
+        return
+    args.db = args.db[0]
     
     conn = sqlite3.connect(args.db)
     
@@ -308,9 +1047,127 @@ def main():
         for dtype, count in stats.get("documents_by_type", {}).items():
             print(f"  - {dtype}:          {count}")
         print(f"  - OCR fait:        {stats['documents_ocr_done']}")
+        print(f"  - en quarantaine:  {stats['quarantine_count']}")
+        if stats["ocr_jobs"]:
+            jobs = stats["ocr_jobs"]
+            print(f"  - OCR en file:     {jobs['pending'] + jobs['running']} "
+                  f"(faits: {jobs['done']}, en échec: {jobs['failed']})")
         print("\nTop expéditeurs:")
         for sender in stats.get("top_senders", [])[:5]:
             print(f"  {sender['count']:4d}  {sender['email']}")
+        if stats["top_participants"]:
+            print("\nTop correspondants (envoyés + reçus):")
+            for person in stats["top_participants"][:5]:
+                print(f"  {person['count']:4d}  {person['email']}")
+        conn.close()
+        return
+    
+    # Mode quasi-doublons
+    if args.near_duplicates:
+        groups = get_near_duplicates(conn, args.threshold)
+        if args.export_json:
+            with open(args.export_json, 'w', encoding='utf-8') as f:
+                json.dump(groups, f, indent=2, ensure_ascii=False, default=str)
+            print(f"Exporté vers {args.export_json}")
+        else:
+            print(f"\n=== QUASI-DOUBLONS (similarité ≥ {args.threshold}) ===\n")
+            if not groups:
+                print("Aucun quasi-doublon trouvé.")
+            for i, group in enumerate(groups, 1):
+                print(f"Groupe {i} ({len(group)} éléments):")
+                for item in group:
+                    print(f"   [{item['type']}:{item['id']}] {item['title']} ({item['date']})")
+                print()
+        conn.close()
+        return
+    
+    # Modes correspondants (table participants)
+    if args.contacts or args.between or args.path:
+        if not participants.available(conn):
+            print("ERREUR: Table participants absente: python init_db.py --upgrade")
+            sys.exit(1)
+        if args.contacts:
+            print_contacts(conn, args.contacts, args)
+        elif args.between:
+            print_between(conn, *args.between, args)
+        else:
+            print_path(conn, *args.path)
+        conn.close()
+        return
+    
+    # Mode chronologie (requête facultative)
+    if args.timeline:
+        if not timeline.available(conn):
+            print("ERREUR: Table timeline absente: python init_db.py --upgrade")
+            sys.exit(1)
+        try:
+            start = time.perf_counter()
+            rows = get_timeline(conn, args.query, args.period, args.date_from, args.date_to,
+                                args.participant, args.type)
+            elapsed = time.perf_counter() - start
+        except querylang.QueryError as e:
+            print(f"Requête invalide: {e}")
+            sys.exit(1)
+        if args.export_json:
+            _export_data(args.export_json, rows)
+        else:
+            title = " ".join(filter(None, [f"par {args.period}", args.query and f"«{args.query}»",
+                                           args.participant and args.participant.lower()]))
+            print_timeline(rows, title)
+            print(f"\n(chronologie: {elapsed * 1000:.0f} ms)")
+        conn.close()
+        return
+    
+    # Mode rapport de qualité du texte
+    if args.ocr_report:
+        docs = get_worst_quality(conn, args.limit)
+        if args.export_json:
+            with open(args.export_json, 'w', encoding='utf-8') as f:
+                json.dump(docs, f, indent=2, ensure_ascii=False, default=str)
+            print(f"Exporté vers {args.export_json}")
+        else:
+            print(f"\n=== QUALITÉ DU TEXTE: {len(docs)} PIRES DOCUMENTS ===\n")
+            for doc in docs:
+                ocr = " (OCR)" if doc["ocr_done"] else ""
+                print(f"{doc['ocr_quality']:.2f}  [doc:{doc['id']}] [{doc['doc_type']}] {doc['filename']}{ocr}")
+                if doc["low_pages"]:
+                    pages = ", ".join(f"{p['page']} ({p['score']:.2f})" for p in doc["low_pages"][:10])
+                    more = f" +{len(doc['low_pages']) - 10}" if len(doc["low_pages"]) > 10 else ""
+                    print(f"      pages sous {ocrquality.QUALITY_THRESHOLD}: {pages}{more}")
+            print("\nRé-OCRiser: python ocr_queue.py rescore --all --threshold X, puis run")
+        conn.close()
+        return
+    
+    # Mode quarantaine
+    if args.quarantine:
+        entries = get_quarantine(conn)
+        if args.export_json:
+            with open(args.export_json, 'w', encoding='utf-8') as f:
+                json.dump(entries, f, indent=2, ensure_ascii=False, default=str)
+            print(f"Exporté vers {args.export_json}")
+        else:
+            print(f"\n=== QUARANTAINE ({len(entries)} fichiers) ===\n")
+            for entry in entries:
+                first_line = (entry["detail"] or "").splitlines()[0] if entry["detail"] else ""
+                print(f"[{entry['reason']}] {entry['file_path']}")
+                print(f"   {entry['attempts']} tentative(s), {entry['runs']} run(s), {entry['updated_at']}: {first_line[:100]}")
+            if entries:
+                print("\nRetenter: python ingest_docs.py <dossier> --retry-quarantine")
+        conn.close()
+        return
+    
+    # Mode extraction de pièce jointe
+    if args.blob:
+        dtype, _, did = args.blob.partition(":")
+        if dtype != "attachment" or not did.isdigit():
+            print("Utilise --blob attachment:ID")
+            sys.exit(1)
+        try:
+            output = export_attachment(conn, int(did), args.output)
+        except FileNotFoundError as e:
+            print(f"ERREUR: {e}")
+            sys.exit(1)
+        print(f"Extrait vers {output}" if output else "Non trouvé")
         conn.close()
         return
     
@@ -338,6 +1195,69 @@ def main():
     if not args.query:
         parser.print_help()
         sys.exit(1)
+    try:
+        querylang.parse(args.query)
+    except querylang.QueryError as e:
+        print(f"Requête invalide: {e}")
+        sys.exit(1)
+    
+    if args.explain:
+        for line in explain(conn, args.query, doc_type=args.type, date_from=args.date_from,
+                            date_to=args.date_to, min_quality=args.min_quality):
+            print(line)
+        conn.close()
+        return
+    
+    counts = None
+    if args.facets:
+        if not facets.available(conn):
+            print("ERREUR: Table facet_columns absente: python init_db.py --upgrade")
+            sys.exit(1)
+        if args.semantic:
+            print("--facets compte les résultats par mots (recherche normale ou --hybrid)")
+            sys.exit(1)
+        counts = search_facets(conn, args.query, doc_type=args.type, date_from=args.date_from,
+                               date_to=args.date_to, min_quality=args.min_quality)
+    
+    if args.hybrid:
+        start = time.perf_counter()
+        results, dropped = search_hybrid(
+            args.db, args.query, doc_type=args.type, date_from=args.date_from,
+            date_to=args.date_to, limit=args.limit, collapse=args.collapse,
+            min_quality=args.min_quality, nprobe=args.nprobe,
+            weights={"bm25": 1.0, "semantic": args.semantic_weight}, budget=args.budget / 1000
+        )
+        elapsed = time.perf_counter() - start
+        if args.export_json:
+            _export(args.export_json, results, counts)
+        else:
+            print_results(results, args.verbose)
+            print(f"(recherche hybride: {elapsed * 1000:.0f} ms)\n")
+            print_facets(counts or {})
+        for name, reason in dropped.items():
+            print(f"Liste {name} ignorée: {reason}")
+        conn.close()
+        return
+    
+    if args.semantic:
+        try:
+            start = time.perf_counter()
+            results = search_semantic(conn, args.db, args.query, doc_type=args.type,
+                                      date_from=args.date_from, date_to=args.date_to,
+                                      limit=args.limit, nprobe=args.nprobe, min_quality=args.min_quality)
+            elapsed = time.perf_counter() - start
+        except (RuntimeError, FileNotFoundError, querylang.QueryError) as e:
+            print(f"ERREUR: {e}")
+            sys.exit(1)
+        if args.export_json:
+            with open(args.export_json, 'w', encoding='utf-8') as f:
+                json.dump(results, f, indent=2, ensure_ascii=False, default=str)
+            print(f"Exporté vers {args.export_json}")
+        else:
+            print_results(results, args.verbose)
+            print(f"(recherche sémantique: {elapsed * 1000:.0f} ms)")
+        conn.close()
+        return
     
     results = search_fts(
         conn, 
@@ -345,15 +1265,16 @@ def main():
         doc_type=args.type,
         date_from=args.date_from,
         date_to=args.date_to,
-        limit=args.limit
+        limit=args.limit,
+        collapse=args.collapse,
+        min_quality=args.min_quality
     )
     
     if args.export_json:
-        with open(args.export_json, 'w', encoding='utf-8') as f:
-            json.dump(results, f, indent=2, ensure_ascii=False, default=str)
-        print(f"Exporté vers {args.export_json}")
+        _export(args.export_json, results, counts)
     else:
         print_results(results, args.verbose)
+        print_facets(counts or {})
     
     conn.close()
 
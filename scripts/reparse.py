@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+"""
+reparse.py - Retraite les emails et documents extraits par une version antérieure
+Usage: python reparse.py [--db chemin_db] [--type email|document|all] [--workers N] [--dry-run]
+
+Chaque ligne note la version de l'extracteur qui l'a produite
+(parsed_version: ingest_msg.PARSER_VERSION, ingest_docs.PARSER_VERSION).
+Quand un extracteur s'améliore, on incrémente sa version: les lignes plus
+anciennes sont relues depuis leur source (fichier d'origine, message d'un
+mbox, pièce jointe du vault, membre d'une archive) et mises à jour sur
+place, sans effacer la base ni réimporter. Seules les colonnes qui
+changent sont écrites: un texte identique ne touche ni les index FTS ni
+les passages; un texte modifié perd ses vecteurs (embed.py update). Les
+lignes dont la source a disparu ou changé (hash différent) gardent leur
+version et sont comptées à part.
+
+Non retraités: body_html (mode de stockage choisi à l'import) et les
+pièces jointes des emails (texte et vault inchangés).
+
+Exemples:
+    python reparse.py --dry-run
+    python reparse.py --workers 4
+    python reparse.py --type document --limit 500
+"""
+
+import argparse
+import io
+import sqlite3
+import sys
+import time
+import traceback
+import zipfile
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+import ingest_docs
+import ingest_msg
+from vpokit import expand, mbox, minhash, ocrquality, ocrqueue, pipeline, shards, supervisor, timeline, vectors
+from vpokit.vault import read_blob
+
+DEFAULT_DB = "vpo_affaire.db"
+COMMIT_EVERY = 100  # Lignes mises à jour par transaction
+
+# Colonnes recalculées par le parsing (message_id: contrainte UNIQUE, gardé)
+EMAIL_COLUMNS = ("subject", "sender", "sender_email", "recipients", "cc", "date_sent",
+                 "body_text", "body_new", "has_attachments", "attachment_count", "quality_flags")
+DOCUMENT_COLUMNS = ("doc_type", "size_bytes", "extracted_text", "ocr_done", "ocr_quality",
+                    "page_count", "quality_flags", "doc_date", "doc_date_source")
+# Document déjà OCRisé dont l'extraction native demande encore l'OCR: texte OCR gardé
+OCR_KEPT_COLUMNS = ("doc_type", "size_bytes", "page_count", "doc_date", "doc_date_source")
+
+VERSIONS = {"email": ingest_msg.PARSER_VERSION, "document": ingest_docs.PARSER_VERSION}
+TABLES = {"email": "emails", "document": "documents"}
+
+stats = {
+    "examined": 0,
+    "updated": 0,
+    "unchanged": 0,
+    "text_changed": 0,
+    "missing": 0,
+    "source_changed": 0,
+    "errors": 0,
+    "ocr_queued": 0
+}
+
+class Source(NamedTuple):
+    """Où relire une ligne: fichier, message de mbox ou blob du vault, puis membres ZIP."""
+    kind: str                       # 'file', 'mbox' ('<fichier>#<offset>'), 'vault'
+    location: str
+    name: str                       # Nom du fichier relu (son extension choisit le parser)
+    members: Tuple[str, ...] = ()   # Membres ZIP à extraire successivement
+
+class Item(NamedTuple):
+    """Ligne à retraiter (picklable, envoyée aux workers)."""
+    row_id: int
+    label: str                      # file_path en base
+    source: Source
+
+# --- Sources ---
+
+def locate(conn: sqlite3.Connection, row_type: str, row_id: int, label: str) -> Optional[Source]:
+    """
+    Source d'une ligne, ou None si introuvable. Un email joint ou un membre
+    d'archive se relit dans son conteneur (lien links vers le parent).
+    """
+    if not label:
+        return None
+    path = Path(label)
+    if path.is_file():
+        return Source("file", label, path.name)
+    head, _, offset = label.rpartition("#")
+    if row_type == "email" and offset.isdigit() and Path(head).is_file():
+        return Source("mbox", label, "message.eml")
+    if "!/" not in label:
+        return None
+    member = label.rsplit("!/", 1)[1]
+    for parent_type, parent_id in conn.execute("""
+        SELECT source_type, source_id FROM links
+        WHERE target_type = ? AND target_id = ? AND source_type IN ('attachment', 'document')
+        ORDER BY id
+    """, (row_type, row_id)).fetchall():
+        if parent_type == "attachment":
+            row = conn.execute("SELECT vault_path, filename FROM attachments WHERE id = ?",
+                               (parent_id,)).fetchone()
+            if row and row[0]:
+                vault_path, filename = row
+                if expand.container_kind(filename) == "zip":
+                    return Source("vault", vault_path, member, (member,))
+                return Source("vault", vault_path, filename or member)
+        else:
+            row = conn.execute("SELECT file_path FROM documents WHERE id = ?", (parent_id,)).fetchone()
+            parent = locate(conn, "document", parent_id, row[0]) if row else None
+            if parent is not None:
+                return parent._replace(name=member, members=parent.members + (member,))
+    return None
+
+def read_source(source: Source) -> bytes:
+    """Contenu d'une source (dans le worker)."""
+    if source.kind == "mbox":
+        content = mbox.read_message(source.location).content
+    elif source.kind == "vault":
+        content = read_blob(source.location)
+    else:
+        content = Path(source.location).read_bytes()
+    for member in source.members:
+        with zipfile.ZipFile(io.BytesIO(content)) as zf:
+            content = zf.read(member)
+    return content
+
+def iter_items(conn: sqlite3.Connection, row_type: str, limit: Optional[int]) -> Iterator[Item]:
+    """Lignes de version antérieure dont la source est accessible (les autres sont comptées)."""
+    sql = f"SELECT id, file_path FROM {TABLES[row_type]} WHERE COALESCE(parsed_version, 1) < ? ORDER BY id"
+    if limit:
+        sql += f" LIMIT {int(limit)}"
+    for row_id, label in conn.execute(sql, (VERSIONS[row_type],)).fetchall():
+        stats["examined"] += 1
+        source = locate(conn, row_type, row_id, label)
+        if source is None:
+            stats["missing"] += 1
+            continue
+        yield Item(row_id, label, source)
+
+# --- Workers ---
+
+def parse_email(item: Item) -> Dict[str, Any]:
+    """Worker: parse l'email; seules ses colonnes reviennent (pas le contenu des pièces jointes)."""
+    content = read_source(item.source)
+    nested = item.source.kind == "vault" or bool(item.source.members)
+    parse = (ingest_msg.parse_msg_bytes if item.source.name.lower().endswith(".msg")
+             else ingest_msg.parse_eml_bytes)
+    # Profondeur de l'import d'origine: les notes du budget ne vont qu'au message de tête
+    data = parse(content, Path(item.source.name).name, item.label, 1 if nested else 0, expand.Budget())
+    data["has_attachments"] = 1 if data["attachments"] else 0
+    data["attachment_count"] = len(data["attachments"])
+    return {key: data[key] for key in EMAIL_COLUMNS + ("file_hash", "minhash")}
+
+def parse_document(item: Item, degraded: bool = False,
+                   ocr_threshold: float = ocrquality.QUALITY_THRESHOLD) -> Dict[str, Any]:
+    """Tâche supervisée: extraction comme à l'import (OCR en file pour un fichier sur disque)."""
+    if item.source.kind == "file" and not item.source.members:
+        return ingest_docs.process_document(Path(item.label), degraded=degraded, defer_ocr=True,
+                                            ocr_threshold=ocr_threshold)
+    return ingest_docs.process_document(Path(item.label), read_source(item.source), degraded=degraded)
+
+# --- Mise à jour ---
+
+def update_row(conn: sqlite3.Connection, row_type: str, row_id: int, columns: Tuple[str, ...],
+               data: Dict[str, Any], extra: Dict[str, Any]) -> Optional[List[str]]:
+    """
+    Écrit les colonnes qui changent (et extra, toujours écrit). Retourne
+    leur liste, ou None si la source n'a plus le hash de l'import.
+    """
+    row = conn.execute(f"SELECT file_hash, {', '.join(columns)} FROM {TABLES[row_type]} WHERE id = ?",
+                       (row_id,)).fetchone()
+    if row is None or row[0] != data["file_hash"]:
+        return None
+    changed = {col: data[col] for col, old in zip(columns, row[1:]) if data[col] != old}
+    values = {**changed, **extra}
+    conn.execute(f"UPDATE {TABLES[row_type]} SET {', '.join(f'{col} = ?' for col in values)} WHERE id = ?",
+                 list(values.values()) + [row_id])
+    return list(changed)
+
+def _count(changed: Optional[List[str]], text_column: str) -> str:
+    if changed is None:
+        stats["source_changed"] += 1
+        return "source modifiée depuis l'import, ignoré"
+    if not changed:
+        stats["unchanged"] += 1
+        return ""
+    stats["updated"] += 1
+    if text_column in changed:
+        stats["text_changed"] += 1
+    return "✓ " + ", ".join(changed)
+
+def reparse_emails(conn: sqlite3.Connection, workers: int, limit: Optional[int]) -> None:
+    """Retraite les emails (parsing dans le pool du pipeline, écritures ici)."""
+    pending = 0
+
+    def write(item: Optional[Item], data: Optional[Dict[str, Any]], error: Optional[str]) -> None:
+        nonlocal pending
+        name = Path(item.label).name[:60] if item else "?"
+        if error:
+            print(f"[email:{item.row_id if item else '?'}] {name} ✗ ERREUR: {error.splitlines()[0]}")
+            stats["errors"] += 1
+            return
+        changed = update_row(conn, "email", item.row_id, EMAIL_COLUMNS, data, {
+            "parsed_version": ingest_msg.PARSER_VERSION,
+            "date_parsed": datetime.now().isoformat(),
+        })
+        if changed and "body_text" in changed:
+            minhash.store(conn, "email", item.row_id, data["minhash"])
+        status = _count(changed, "body_text")
+        if status:
+            print(f"[email:{item.row_id}] {name} {status}")
+        pending += 1
+        if pending >= COMMIT_EVERY:
+            conn.commit()
+            pending = 0
+
+    items = list(iter_items(conn, "email", limit))  # Connexion réservée au thread écrivain
+    try:
+        pipeline.run_pipeline(items, parse_email, lambda data: data,
+                              write, workers=workers)
+    finally:
+        conn.commit()
+
+def reparse_documents(conn: sqlite3.Connection, workers: int, limit: Optional[int],
+                      timeout: float = supervisor.DEFAULT_TIMEOUT,
+                      max_memory: Optional[int] = supervisor.DEFAULT_MAX_MEMORY) -> None:
+    """Retraite les documents (workers supervisés, sans mode dégradé ni quarantaine)."""
+    items = list(iter_items(conn, "document", limit))
+    pending = 0
+    for outcome in supervisor.supervise(items, parse_document, workers, timeout, max_memory,
+                                        retry_degraded=False):
+        item, data = outcome.item, outcome.result
+        name = Path(item.label).name[:60]
+        if outcome.reason is not None:
+            print(f"[doc:{item.row_id}] {name} ✗ {outcome.reason}: {(outcome.error or '').splitlines()[0][:80]}")
+            stats["errors"] += 1
+            continue
+        try:
+            ocr_done = conn.execute("SELECT ocr_done FROM documents WHERE id = ?", (item.row_id,)).fetchone()[0]
+            columns = DOCUMENT_COLUMNS
+            if ocr_done and data.get("ocr_pending"):
+                # Le texte en base vient de l'OCR: on le garde, la date en est retirée
+                columns = OCR_KEPT_COLUMNS
+                text = conn.execute("SELECT extracted_text FROM documents WHERE id = ?",
+                                    (item.row_id,)).fetchone()[0]
+                path = Path(item.label)
+                data["doc_date"], data["doc_date_source"] = timeline.document_date(
+                    data["doc_type"], path if path.is_file() else None, text)
+            changed = update_row(conn, "document", item.row_id, columns, data,
+                                 {"parsed_version": ingest_docs.PARSER_VERSION})
+            if changed is not None and columns is DOCUMENT_COLUMNS:
+                ocrquality.store(conn, item.row_id, data["page_scores"], data["ocr_pages"])
+                if "extracted_text" in changed:
+                    minhash.store(conn, "document", item.row_id, data["minhash"])
+                if data.get("ocr_pending"):
+                    ocrqueue.enqueue(conn, item.row_id, item.label, data["doc_type"], data["size_bytes"],
+                                     ingest_docs.file_mtime(Path(item.label)))
+                    stats["ocr_queued"] += 1
+            status = _count(changed, "extracted_text")
+            if status:
+                print(f"[doc:{item.row_id}] {name} {status}")
+            pending += 1
+            if pending >= COMMIT_EVERY:
+                conn.commit()
+                pending = 0
+        except Exception as e:
+            print(f"[doc:{item.row_id}] {name} ✗ ERREUR: {e}")
+            stats["errors"] += 1
+            traceback.print_exc()
+    conn.commit()
+
+def dry_run(conn: sqlite3.Connection, row_types: List[str], limit: Optional[int]) -> None:
+    """Compte les lignes à retraiter par type de source, sans rien relire."""
+    for row_type in row_types:
+        kinds: Dict[str, int] = {}
+        for item in iter_items(conn, row_type, limit):
+            kind = item.source.kind + (" (membre d'archive)" if item.source.members else "")
+            kinds[kind] = kinds.get(kind, 0) + 1
+        if not kinds:
+            continue
+        print(f"\n{TABLES[row_type]} (version < {VERSIONS[row_type]}):")
+        for kind, n in sorted(kinds.items()):
+            print(f"  {kind:<28}{n}")
+
+def print_stats():
+    """Affiche les statistiques finales."""
+    print("\n" + "=" * 50)
+    print("RÉSUMÉ")
+    print("=" * 50)
+    print(f"Lignes examinées:       {stats['examined']}")
+    print(f"Mises à jour:           {stats['updated']} (texte modifié: {stats['text_changed']})")
+    print(f"Inchangées:             {stats['unchanged']}")
+    print(f"Source introuvable:     {stats['missing']}")
+    print(f"Source modifiée:        {stats['source_changed']}")
+    print(f"Erreurs:                {stats['errors']}")
+    if stats["ocr_queued"]:
+        print(f"Mis en file OCR:        {stats['ocr_queued']}")
+    print("=" * 50)
+
+def main():
+    parser = argparse.ArgumentParser(description="Retraite les lignes extraites par une version antérieure")
+    parser.add_argument("--db", default=DEFAULT_DB, help="Chemin de la base (ou manifeste de shards)")
+    parser.add_argument("--type", choices=["email", "document", "all"], default="all",
+                        help="Lignes à retraiter")
+    parser.add_argument("--workers", type=int, default=pipeline.default_workers(),
+                        help="Processus d'extraction en parallèle")
+    parser.add_argument("--limit", type=int, help="Nombre maximal de lignes par type")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Compte les lignes à retraiter et leurs sources, sans rien modifier")
+    args = parser.parse_args()
+
+    if not Path(args.db).exists():
+        print(f"ERREUR: Base non trouvée: {args.db}")
+        sys.exit(1)
+
+    row_types = ["email", "document"] if args.type == "all" else [args.type]
+    db_paths = [path for _, path in shards.resolve([args.db])]
+    if args.dry_run:
+        for db_path in db_paths:
+            conn = sqlite3.connect(db_path)
+            dry_run(conn, row_types, args.limit)
+            conn.close()
+        print(f"\nSource introuvable: {stats['missing']} sur {stats['examined']}")
+        return
+
+    print(f"Retraitement sur {args.workers} worker(s)")
+    print("-" * 50)
+    start = time.perf_counter()
+    for db_path in db_paths:
+        conn = sqlite3.connect(db_path)
+        if "email" in row_types:
+            reparse_emails(conn, args.workers, args.limit)
+        if "document" in row_types:
+            reparse_documents(conn, args.workers, args.limit)
+        # Textes modifiés: passages et correspondants supprimés par les triggers, refaits ici
+        ingest_docs.sync_passages(conn)
+        ingest_docs.sync_participants(conn)
+        conn.close()
+
+    print_stats()
+    print(f"Durée: {time.perf_counter() - start:.1f} s")
+    if stats["text_changed"] and any(vectors.vec_dir_for(str(p)).exists() for p in db_paths):
+        # vec_chunks des textes modifiés supprimés par les triggers
+        print(f"Textes modifiés à réencoder: python embed.py update --db {args.db}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+vault_tool.py - Maintenance du vault des pièces jointes
+Usage: python vault_tool.py <commande> [options]
+
+Exemples:
+    python vault_tool.py stats
+    python vault_tool.py migrate
+    python vault_tool.py migrate --delete-loose
+    python vault_tool.py migrate --db affaire.shards.json --delete-loose
+
+Les shards d'un manifeste partagent le même vault: migrate les met tous à
+jour ensemble (un blob peut être cité par plusieurs bases).
+"""
+
+import argparse
+import sqlite3
+import sys
+from pathlib import Path
+from typing import Any, Dict, List
+
+from vpokit import shards
+from vpokit.packvault import INDEX_NAME, PACK_DIR, URI_PREFIX, PackVault
+from vpokit.vault import STAGING_DIR
+
+DEFAULT_DB = "vpo_affaire.db"
+VAULT_DIR = "vault"
+MIGRATE_BATCH = 500  # Blobs par lot (sync du pack + commit DB)
+
+def disk_usage(path: Path) -> int:
+    """Espace réellement occupé (blocs alloués), à défaut la taille apparente."""
+    st = path.stat()
+    return st.st_blocks * 512 if hasattr(st, "st_blocks") else st.st_size
+
+def vault_stats(vault_dir: Path) -> Dict[str, Any]:
+    """Compte fichiers et octets du vault classique et des packs."""
+    stats = {"loose_files": 0, "loose_bytes": 0, "loose_disk": 0,
+             "packs": 0, "pack_bytes": 0, "pack_disk": 0,
+             "packed_blobs": 0, "packed_original": 0, "codecs": {}}
+    pack_dir = vault_dir / PACK_DIR
+
+    for path in vault_dir.rglob("*"):
+        if not path.is_file() or STAGING_DIR in path.parts:
+            continue
+        if path.parent == pack_dir:
+            if path.suffix == ".pack":
+                stats["packs"] += 1
+                stats["pack_bytes"] += path.stat().st_size
+                stats["pack_disk"] += disk_usage(path)
+        elif not path.name.startswith("."):
+            stats["loose_files"] += 1
+            stats["loose_bytes"] += path.stat().st_size
+            stats["loose_disk"] += disk_usage(path)
+
+    index_path = pack_dir / INDEX_NAME
+    if index_path.exists():
+        index = sqlite3.connect(str(index_path))
+        row = index.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM blobs").fetchone()
+        stats["packed_blobs"], stats["packed_original"] = row
+        stats["codecs"] = dict(index.execute("SELECT codec, COUNT(*) FROM blobs GROUP BY codec"))
+        index.close()
+    return stats
+
+def migrate(db_paths: List[Path], vault_dir: Path, delete_loose: bool = False, fsync: bool = True) -> None:
+    """
+    Recopie les blobs du vault classique dans des packs et met à jour
+    vault_path dans chaque base (shards d'un même vault: toutes à la fois).
+    """
+    conns = [sqlite3.connect(str(db_path)) for db_path in db_paths]
+    paths = sorted({row[0] for conn in conns for row in conn.execute(
+        "SELECT DISTINCT vault_path FROM attachments "
+        "WHERE vault_path IS NOT NULL AND vault_path NOT LIKE ?", [URI_PREFIX + "%"]
+    )})
+    print(f"{len(paths)} blobs à migrer ({len(conns)} base(s))")
+
+    vault = PackVault(vault_dir, fsync=fsync)
+    migrated = missing = 0
+    try:
+        for start in range(0, len(paths), MIGRATE_BATCH):
+            batch = []
+            for vault_path in paths[start:start + MIGRATE_BATCH]:
+                path = Path(vault_path)
+                if not path.exists():
+                    print(f"  ✗ Absent: {vault_path}")
+                    missing += 1
+                    continue
+                batch.append((vault.store_file(path, path.name), vault_path))
+
+            vault.sync()  # Packs durables avant de faire pointer les bases dessus
+            for conn in conns:
+                conn.executemany("UPDATE attachments SET vault_path = ? WHERE vault_path = ?", batch)
+                conn.commit()
+            migrated += len(batch)
+
+            if delete_loose:  # Plus aucune base ne cite ces fichiers
+                for _, vault_path in batch:
+                    Path(vault_path).unlink(missing_ok=True)
+            print(f"  {migrated}/{len(paths)}")
+    finally:
+        vault.close()
+        for conn in conns:
+            conn.close()
+
+    print(f"Migrés: {migrated}, absents: {missing}")
+    if not delete_loose and migrated:
+        print("Fichiers d'origine conservés (--delete-loose pour libérer la place)")
+
+def print_vault_stats(vault_dir: Path) -> None:
+    s = vault_stats(vault_dir)
+    mb = 1024 * 1024
+    print(f"\n=== VAULT {vault_dir} ===\n")
+    print(f"Fichiers individuels:  {s['loose_files']}")
+    print(f"  - taille:            {s['loose_bytes'] / mb:.1f} Mo ({s['loose_disk'] / mb:.1f} Mo sur disque)")
+    print(f"\nPacks:                 {s['packs']}")
+    print(f"  - blobs:             {s['packed_blobs']}")
+    print(f"  - taille d'origine:  {s['packed_original'] / mb:.1f} Mo")
+    print(f"  - taille stockée:    {s['pack_bytes'] / mb:.1f} Mo ({s['pack_disk'] / mb:.1f} Mo sur disque)")
+    for codec, count in sorted(s["codecs"].items()):
+        print(f"  - {codec}:{' ' * (17 - len(codec))}{count}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintenance du vault des pièces jointes")
+    parser.add_argument("command", choices=["stats", "migrate"], help="Commande")
+    parser.add_argument("--db", default=DEFAULT_DB, help="Chemin de la base (ou manifeste de shards)")
+    parser.add_argument("--vault", default=VAULT_DIR, help="Dossier du vault")
+    parser.add_argument("--delete-loose", action="store_true",
+                        help="migrate: supprimer les fichiers individuels une fois migrés")
+    parser.add_argument("--no-fsync", action="store_true", help="Ne pas forcer l'écriture disque")
+    args = parser.parse_args()
+
+    vault_dir = Path(args.vault)
+    if not vault_dir.exists():
+        print(f"ERREUR: Vault non trouvé: {vault_dir}")
+        sys.exit(1)
+
+    if args.command == "stats":
+        print_vault_stats(vault_dir)
+        return
+
+    if not Path(args.db).exists():
+        print(f"ERREUR: Base non trouvée: {args.db}")
+        sys.exit(1)
+    manifest = None if shards.is_manifest(args.db) else shards.manifest_of(args.db)
+    if manifest and args.delete_loose:
+        # Les autres shards citent peut-être les mêmes fichiers
+        print(f"ERREUR: {args.db} fait partie de {manifest.name}: --delete-loose avec --db {manifest}")
+        sys.exit(1)
+    db_paths = [path for _, path in shards.resolve([args.db])]
+    migrate(db_paths, vault_dir, args.delete_loose, fsync=not args.no_fsync)
+    print_vault_stats(vault_dir)
+
+if __name__ == "__main__":
+    main()
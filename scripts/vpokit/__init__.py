@@ -0,0 +1,7 @@
+"""
+vpokit - Composants partagés du kit d'indexation (ingestion et recherche)
+
+Les sous-modules ne sont pas importés ici: chaque script n'importe que ce
+qu'il utilise, et les dépendances lourdes (PyMuPDF, python-docx,
+extract-msg) ne sont chargées qu'au premier besoin (voir extractors).
+"""
@@ -0,0 +1,166 @@
+"""
+dates.py - Normalisation des dates d'en-têtes email en ISO 8601
+
+Les dates Outlook/MIME se limitent à quelques formats fixes: on les reconnaît
+par expressions précompilées, dateutil (lent, import tardif) ne sert qu'en
+dernier recours. Les résultats sont mémoïsés par chaîne brute: un même
+en-tête revient souvent (fils de discussion, doublons, exports multiples).
+
+Dates des documents (AAAA-MM-JJ): date écrite au début du texte ("Lausanne,
+le 15 janvier 2024"), date de création des métadonnées PDF ou DOCX.
+"""
+
+import re
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import Any, Optional
+
+TEXT_HEAD_CHARS = 2000       # Début du texte où chercher la date d'un document
+MIN_YEAR = 1950              # En deçà: numéro, montant ou référence, pas une date
+
+_MONTHS = {
+    "jan": 1, "feb": 2, "mar": 3, "apr": 4, "may": 5, "jun": 6,
+    "jul": 7, "aug": 8, "sep": 9, "oct": 10, "nov": 11, "dec": 12,
+}
+
+# RFC 2822: "Mon, 15 Jan 2024 10:30:00 +0100 (CET)"
+_RFC2822_RE = re.compile(
+    r"^\s*(?:[A-Za-z]{3},?\s*)?(\d{1,2})\s+([A-Za-z]{3})[a-z]*\s+(\d{4})\s+"
+    r"(\d{1,2}):(\d{2})(?::(\d{2}))?\s*"
+    r"(?:([+-])(\d{2}):?(\d{2})|(GMT|UTC|UT|Z))?\s*(?:\([^)]*\))?\s*$"
+)
+# Format numérique européen: "15.01.2024 10:30", "15/01/2024"
+_NUMERIC_RE = re.compile(
+    r"^\s*(\d{1,2})[./](\d{1,2})[./](\d{4})(?:\s+(\d{1,2}):(\d{2})(?::(\d{2}))?)?\s*$"
+)
+_ISO_PREFIX_RE = re.compile(r"^\d{4}-\d{2}-\d{2}")
+
+def _parse_rfc2822(raw: str) -> Optional[datetime]:
+    m = _RFC2822_RE.match(raw)
+    if not m:
+        return None
+    day, mon, year, hour, minute, second, sign, tzh, tzm, tzname = m.groups()
+    month = _MONTHS.get(mon.lower())
+    if month is None:
+        return None
+    tz = None
+    if sign:
+        offset = timedelta(hours=int(tzh), minutes=int(tzm))
+        tz = timezone(-offset if sign == "-" else offset)
+    elif tzname:
+        tz = timezone.utc
+    return datetime(int(year), month, int(day), int(hour), int(minute),
+                    int(second or 0), tzinfo=tz)
+
+def _parse_numeric(raw: str) -> Optional[datetime]:
+    m = _NUMERIC_RE.match(raw)
+    if not m:
+        return None
+    day, month, year, hour, minute, second = m.groups()
+    return datetime(int(year), int(month), int(day), int(hour or 0),
+                    int(minute or 0), int(second or 0))
+
+@lru_cache(maxsize=65536)
+def _parse_string(raw: str) -> Optional[str]:
+    """Parse une date texte en ISO, None si aucun format ne convient."""
+    try:
+        if _ISO_PREFIX_RE.match(raw):
+            return datetime.fromisoformat(raw.strip()).isoformat()
+        dt = _parse_rfc2822(raw) or _parse_numeric(raw)
+        if dt is not None:
+            return dt.isoformat()
+    except ValueError:
+        pass  # Format reconnu mais valeur invalide → dateutil
+
+    try:
+        from dateutil import parser
+        return parser.parse(raw).isoformat()
+    except (ImportError, ValueError, OverflowError, TypeError):
+        return None
+
+def parse_date(value: Any) -> Optional[str]:
+    """
+    Normalise une date d'en-tête (datetime ou texte) en ISO 8601.
+    Retourne None si la date est absente ou non reconnue.
+    """
+    if value is None or value == "":
+        return None
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return _parse_string(str(value))
+
+# --- Dates des documents ---
+
+_MONTH_NAMES = {
+    "janvier": 1, "janv": 1, "jan": 1, "january": 1,
+    "février": 2, "fevrier": 2, "févr": 2, "fevr": 2, "fév": 2, "fev": 2, "february": 2, "feb": 2,
+    "mars": 3, "march": 3, "mar": 3,
+    "avril": 4, "avr": 4, "april": 4, "apr": 4,
+    "mai": 5, "may": 5,
+    "juin": 6, "june": 6, "jun": 6,
+    "juillet": 7, "juil": 7, "july": 7, "jul": 7,
+    "août": 8, "aout": 8, "august": 8, "aug": 8,
+    "septembre": 9, "september": 9, "sept": 9, "sep": 9,
+    "octobre": 10, "october": 10, "oct": 10,
+    "novembre": 11, "november": 11, "nov": 11,
+    "décembre": 12, "decembre": 12, "december": 12, "déc": 12, "dec": 12,
+}
+_MONTH_ALT = "|".join(sorted(_MONTH_NAMES, key=len, reverse=True))
+
+# "15 janvier 2024", "1er mars 2023", "January 15, 2024", "15.01.2024", "2024-01-15"
+_TEXT_DATE_RE = re.compile(
+    rf"\b(?P<d1>\d{{1,2}})(?:er)?\.?\s+(?P<m1>{_MONTH_ALT})\.?\s+(?P<y1>\d{{4}})\b"
+    rf"|\b(?P<m2>{_MONTH_ALT})\.?\s+(?P<d2>\d{{1,2}})(?:st|nd|rd|th)?,?\s+(?P<y2>\d{{4}})\b"
+    r"|\b(?P<d3>\d{1,2})[./-](?P<m3>\d{1,2})[./-](?P<y3>\d{4})\b"
+    r"|\b(?P<y4>\d{4})-(?P<m4>\d{2})-(?P<d4>\d{2})\b",
+    re.IGNORECASE,
+)
+# Date du document plutôt que date citée: "Lausanne, le ...", "Date: ..."
+_DATED_RE = re.compile(r"(?:\ble|\bdate[ds]?\s*:?|\bdated?)\s*$", re.IGNORECASE)
+
+def _iso_day(year: int, month: int, day: int) -> Optional[str]:
+    """AAAA-MM-JJ si la date existe et l'année est plausible."""
+    if not MIN_YEAR <= year <= datetime.now().year + 1:
+        return None
+    try:
+        return datetime(year, month, day).date().isoformat()
+    except ValueError:
+        return None
+
+def _match_day(m: "re.Match") -> Optional[str]:
+    g = m.groupdict()
+    for n in "1234":
+        if g[f"y{n}"]:
+            month = g[f"m{n}"]
+            month = int(month) if month.isdigit() else _MONTH_NAMES[month.lower()]
+            return _iso_day(int(g[f"y{n}"]), month, int(g[f"d{n}"]))
+    return None
+
+def find_date(text: Optional[str], head: int = TEXT_HEAD_CHARS) -> Optional[str]:
+    """
+    Date d'un document d'après son début (AAAA-MM-JJ): la première date
+    annoncée ("le 15 janvier 2024", "Date: 15.01.2024"), sinon la première
+    date plausible. None si aucune.
+    """
+    if not text:
+        return None
+    start = text[:head]
+    first = None
+    for m in _TEXT_DATE_RE.finditer(start):
+        day = _match_day(m)
+        if day is None:
+            continue
+        if _DATED_RE.search(start[max(0, m.start() - 12):m.start()]):
+            return day
+        first = first or day
+    return first
+
+def metadata_date(value: Any) -> Optional[str]:
+    """
+    Date de métadonnées en AAAA-MM-JJ: PDF ("D:20240115103000+01'00'"),
+    DOCX/ISO ("2024-01-15T10:30:00Z") ou datetime.
+    """
+    if isinstance(value, datetime):
+        return _iso_day(value.year, value.month, value.day)
+    m = re.match(r"^\s*(?:D:)?(\d{4})-?(\d{2})-?(\d{2})", str(value or ""))
+    return _iso_day(int(m.group(1)), int(m.group(2)), int(m.group(3))) if m else None
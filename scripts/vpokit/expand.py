@@ -0,0 +1,163 @@
+"""
+expand.py - Expansion récursive des conteneurs (ZIP, .msg, .eml)
+
+Un ZIP ou un email transféré en pièce jointe n'était qu'un blob opaque du
+vault, jamais indexé. expand() lit les membres un par un en mémoire (rien
+n'est extrait sur disque) et les confie aux extracteurs de l'appelant:
+un parser par type ("msg", "eml", "document"). Chaque parser peut
+rappeler expand() sur ses propres conteneurs (profondeur + 1).
+
+Garde-fous contre les bombes ZIP, partagés par tout l'arbre d'un même
+fichier source (Budget): profondeur, nombre de membres, taille par
+membre, volume décompressé total et taux de compression. Un dépassement
+arrête l'expansion (les membres déjà lus sont gardés) et laisse la note
+"expansion_truncated" dans budget.notes.
+"""
+
+import io
+import sqlite3
+import zipfile
+from pathlib import Path, PurePosixPath
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, Optional, Set, Tuple, Union
+
+MAX_DEPTH = 3                       # Conteneurs imbriqués au plus
+MAX_MEMBERS = 10_000                # Membres par fichier source
+MAX_MEMBER_SIZE = 256 * 1024 * 1024 # Taille décompressée d'un membre
+MAX_TOTAL_SIZE = 2 * 1024 * 1024 * 1024  # Volume décompressé par fichier source
+MAX_RATIO = 200                     # Taux de compression suspect (au-delà de 1 Mio)
+CHUNK_SIZE = 1 << 20
+
+CONTAINER_EXTS = {".zip": "zip", ".msg": "msg", ".eml": "eml"}
+
+# Parser: (contenu, nom_fichier, libellé, profondeur, budget) -> enregistrement
+Parser = Callable[[bytes, str, str, int, "Budget"], Dict[str, Any]]
+
+class LimitExceeded(Exception):
+    """Un garde-fou d'expansion a été atteint."""
+
+class Budget:
+    """Compteurs partagés par toute l'expansion d'un fichier source."""
+
+    def __init__(self, max_depth: int = MAX_DEPTH, max_members: int = MAX_MEMBERS,
+                 max_member_size: int = MAX_MEMBER_SIZE, max_total_size: int = MAX_TOTAL_SIZE):
+        self.max_depth = max_depth
+        self.max_members = max_members
+        self.max_member_size = max_member_size
+        self.max_total_size = max_total_size
+        self.members = 0
+        self.total_size = 0
+        self.notes: Set[str] = set()
+
+    def enter(self, depth: int) -> None:
+        if depth > self.max_depth:
+            raise LimitExceeded(f"profondeur > {self.max_depth}")
+
+    def admit(self, info: zipfile.ZipInfo) -> None:
+        """Contrôle un membre d'après son en-tête, avant décompression."""
+        self.members += 1
+        if self.members > self.max_members:
+            raise LimitExceeded(f"plus de {self.max_members} membres")
+        if info.file_size > self.max_member_size:
+            raise LimitExceeded(f"{info.filename}: {info.file_size} octets")
+        if (info.file_size > CHUNK_SIZE and info.compress_size > 0
+                and info.file_size / info.compress_size > MAX_RATIO):
+            raise LimitExceeded(f"{info.filename}: taux de compression suspect")
+
+    def charge(self, size: int) -> None:
+        self.total_size += size
+        if self.total_size > self.max_total_size:
+            raise LimitExceeded(f"plus de {self.max_total_size} octets décompressés")
+
+def container_kind(filename: Optional[str]) -> Optional[str]:
+    """'zip', 'msg', 'eml' ou None."""
+    return CONTAINER_EXTS.get(Path(filename).suffix.lower()) if filename else None
+
+def _open_zip(source: Union[bytes, Path]) -> zipfile.ZipFile:
+    return zipfile.ZipFile(io.BytesIO(source) if isinstance(source, (bytes, bytearray)) else source)
+
+def _read_limited(f: BinaryIO, limit: int) -> bytes:
+    """Lit un membre sans croire l'en-tête: s'arrête dès que limit est dépassé."""
+    buf = bytearray()
+    for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+        buf += chunk
+        if len(buf) > limit:
+            raise LimitExceeded(f"membre > {limit} octets une fois décompressé")
+    return bytes(buf)
+
+def _skip_member(info: zipfile.ZipInfo) -> bool:
+    return info.is_dir() or info.filename.startswith("__MACOSX/")
+
+def list_members(source: Union[bytes, Path]) -> List[str]:
+    """Noms des fichiers d'une archive ZIP (sans rien décompresser)."""
+    try:
+        with _open_zip(source) as zf:
+            return [info.filename for info in zf.infolist() if not _skip_member(info)]
+    except (zipfile.BadZipFile, OSError):
+        return []
+
+def iter_zip(source: Union[bytes, Path], budget: Budget) -> Iterator[Tuple[str, bytes]]:
+    """Itère (nom, contenu) sur les membres d'un ZIP, un seul en mémoire à la fois."""
+    with _open_zip(source) as zf:
+        for info in zf.infolist():
+            if _skip_member(info):
+                continue
+            if info.flag_bits & 0x1:
+                budget.notes.add("encrypted_member")
+                continue
+            budget.admit(info)
+            with zf.open(info) as f:
+                content = _read_limited(f, budget.max_member_size)
+            budget.charge(len(content))
+            yield info.filename, content
+
+def expand(source: Union[bytes, Path], filename: str, label: str,
+           parsers: Dict[str, Parser], depth: int, budget: Budget) -> List[Dict[str, Any]]:
+    """
+    Développe un conteneur et passe chaque élément au parser de son type.
+    Retourne les noeuds enfants: {"kind": "message"|"member", "name": ..., "record": ...}.
+    label identifie le conteneur (ex: 'boite/mail.msg!/pieces.zip'); les
+    membres reçoivent '<label>!/<nom>'.
+    """
+    kind = container_kind(filename)
+    if kind is None:
+        return []
+
+    children = []
+    try:
+        budget.enter(depth)
+        if kind == "zip":
+            items = ((f"{label}!/{name}", name, content) for name, content in iter_zip(source, budget))
+        else:
+            # Email autonome: le conteneur est lui-même le message
+            content = source if isinstance(source, (bytes, bytearray)) else Path(source).read_bytes()
+            items = iter([(label, filename, content)])
+
+        for member_label, name, content in items:
+            member_file = PurePosixPath(name).name
+            member_kind = container_kind(member_file)
+            is_message = member_kind in ("msg", "eml")
+            try:
+                record = parsers[member_kind if is_message else "document"](
+                    content, member_file, member_label, depth, budget
+                )
+            except LimitExceeded:
+                raise
+            except Exception:
+                budget.notes.add("member_error")
+                continue
+            children.append({"kind": "message" if is_message else "member",
+                             "name": name, "record": record})
+    except LimitExceeded:
+        budget.notes.add("expansion_truncated")
+    except (zipfile.BadZipFile, NotImplementedError, OSError):
+        budget.notes.add("bad_archive")
+    return children
+
+def add_link(conn: sqlite3.Connection, source_type: str, source_id: int,
+             target_type: str, target_id: int, link_type: str = "contains") -> None:
+    """Enregistre une relation parent → enfant dans links."""
+    conn.execute(
+        "INSERT INTO links (source_type, source_id, target_type, target_id, link_type) "
+        "VALUES (?, ?, ?, ?, ?)",
+        (source_type, source_id, target_type, target_id, link_type)
+    )
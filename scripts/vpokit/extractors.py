@@ -0,0 +1,58 @@
+"""
+extractors.py - Chargement paresseux des bibliothèques d'extraction
+
+PyMuPDF, python-docx, Pillow et extract-msg coûtent cher à importer: un run
+qui ne traite que du texte ne doit pas les charger. Chaque backend est
+importé au premier appel, puis mémorisé (module ou None si absent).
+"""
+
+import importlib
+import importlib.util
+from functools import lru_cache
+from typing import Any, Optional
+
+# Type de document → extensions supportées (ingest_docs, facettes des pièces jointes)
+EXTENSIONS = {
+    'pdf': ['.pdf'],
+    'docx': ['.docx', '.doc'],
+    'image': ['.png', '.jpg', '.jpeg', '.tiff', '.tif', '.bmp', '.gif'],
+    'text': ['.txt', '.csv', '.json', '.xml', '.html', '.htm'],
+    'archive': ['.zip']
+}
+
+# nom logique → (modules candidats par ordre de préférence, commande d'installation)
+BACKENDS = {
+    "pymupdf": (("pymupdf", "fitz"), "pip install pymupdf"),
+    "docx": (("docx",), "pip install python-docx"),
+    "pillow": (("PIL.Image",), "pip install pillow"),
+    "extract_msg": (("extract_msg",), "pip install extract-msg"),
+    "psutil": (("psutil",), "pip install psutil"),
+    "numpy": (("numpy",), "pip install numpy"),
+    "sentence_transformers": (("sentence_transformers",), "pip install sentence-transformers"),
+}
+
+@lru_cache(maxsize=None)
+def is_available(name: str) -> bool:
+    """Vérifie qu'un backend est installé, sans l'importer."""
+    modules, _ = BACKENDS[name]
+    return any(importlib.util.find_spec(m.split(".")[0]) is not None for m in modules)
+
+@lru_cache(maxsize=None)
+def load(name: str) -> Optional[Any]:
+    """Importe un backend au premier besoin; None (avec avertissement unique) si absent."""
+    modules, install = BACKENDS[name]
+    for module in modules:
+        try:
+            return importlib.import_module(module)
+        except ImportError:
+            continue
+    print(f"⚠ {name} non installé ({install})")
+    return None
+
+def doc_type(filename: Optional[str]) -> Optional[str]:
+    """Type de document d'après l'extension du nom de fichier (None si non supporté)."""
+    ext = "." + filename.rsplit(".", 1)[-1].lower() if filename and "." in filename else ""
+    for name, exts in EXTENSIONS.items():
+        if ext in exts:
+            return name
+    return None
@@ -0,0 +1,192 @@
+"""
+facets.py - Comptes par facette des résultats (query_db.py --facets)
+
+Pour chaque source (email, pièce jointe, document) et chaque facette
+(expéditeur, mois, type de document, présence de PJ), une colonne compacte
+est précalculée: codes[rowid] = n° du libellé (0: aucun), un uint32 par
+ligne, stockée en BLOB dans facet_columns. Compter les facettes d'une
+recherche revient alors à un seul passage sur les rowids trouvés par FTS
+(une lecture indexée par facette), au lieu d'un GROUP BY par facette qui
+rejoint et relit la table.
+
+Les lignes ajoutées depuis le dernier calcul (rowid > max_rowid) sont
+complétées à la volée; les triggers de init_db marquent la colonne
+'stale' quand une ligne existante change ou disparaît: elle est alors
+recalculée en entier à la recherche suivante.
+"""
+
+import json
+import sqlite3
+from array import array
+from collections import Counter
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from . import extractors
+
+# Source → facette → requête (id, valeur); l'alias s désigne la table de la source
+_COLUMNS = {
+    "email": {
+        "sender": "SELECT s.id, lower(s.sender_email) FROM emails s",
+        "month": "SELECT s.id, substr(s.date_sent, 1, 7) FROM emails s",
+        "has_attachments": "SELECT s.id, CASE WHEN s.has_attachments THEN 'oui' ELSE 'non' END FROM emails s",
+    },
+    "attachment": {
+        "sender": "SELECT s.id, lower(e.sender_email) FROM attachments s LEFT JOIN emails e ON e.id = s.email_id",
+        "month": "SELECT s.id, substr(e.date_sent, 1, 7) FROM attachments s LEFT JOIN emails e ON e.id = s.email_id",
+        "doc_type": "SELECT s.id, s.filename FROM attachments s",
+    },
+    "document": {
+        "month": "SELECT s.id, substr(s.doc_date, 1, 7) FROM documents s",
+        "doc_type": "SELECT s.id, s.doc_type FROM documents s",
+    },
+}
+
+# Valeur brute → libellé (le type d'une pièce jointe vient de son extension)
+_LABELS = {("attachment", "doc_type"): extractors.doc_type}
+
+_TABLES = {"email": "emails", "attachment": "attachments", "document": "documents"}
+
+# Ordre d'affichage
+FACETS = ("type", "sender", "year", "month", "doc_type", "has_attachments")
+NONE_LABEL = "(aucun)"
+NUMPY_MIN_ROWS = 1000  # En dessous, la boucle Python coûte moins que la conversion numpy
+
+class Column:
+    """Colonne de facette: libellés et code du libellé de chaque rowid."""
+
+    def __init__(self, labels: List[str], codes: array, max_rowid: int):
+        self.labels = labels
+        self.codes = codes
+        self.max_rowid = max_rowid
+        self._index = {label: n for n, label in enumerate(labels, 1)}
+
+    def extend(self, rows: Sequence[Tuple[int, Optional[str]]]) -> None:
+        """Ajoute (ou remplace) les codes des lignes (rowid, libellé)."""
+        for rowid, label in rows:
+            if rowid >= len(self.codes):
+                self.codes.extend([0] * (rowid + 1 - len(self.codes)))
+            code = 0
+            if label:
+                code = self._index.get(label, 0)
+                if not code:
+                    self.labels.append(label)
+                    code = self._index[label] = len(self.labels)
+            self.codes[rowid] = code
+            self.max_rowid = max(self.max_rowid, rowid)
+
+def _fetch(conn: sqlite3.Connection, source_type: str, facet: str,
+           after: int) -> List[Tuple[int, Optional[str]]]:
+    """Valeurs de la facette pour les lignes de rowid > after."""
+    rows = conn.execute(f"{_COLUMNS[source_type][facet]} WHERE s.id > ?", (after,)).fetchall()
+    label = _LABELS.get((source_type, facet))
+    if label:
+        rows = [(rowid, label(value)) for rowid, value in rows]
+    return rows
+
+def _stored(conn: sqlite3.Connection) -> Dict[Tuple[str, str], Column]:
+    """Colonnes à jour de facet_columns (les colonnes 'stale' sont omises)."""
+    columns = {}
+    for source_type, facet, labels, codes, max_rowid in conn.execute(
+        "SELECT source_type, facet, labels, codes, max_rowid FROM facet_columns WHERE stale = 0"
+    ):
+        column_codes = array("I")
+        column_codes.frombytes(codes)
+        columns[(source_type, facet)] = Column(json.loads(labels), column_codes, max_rowid)
+    return columns
+
+def _last_rowids(conn: sqlite3.Connection) -> Dict[str, int]:
+    return {source_type: conn.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table}").fetchone()[0]
+            for source_type, table in _TABLES.items()}
+
+def _todo(columns: Dict[Tuple[str, str], Column], last: Dict[str, int]) -> List[Tuple[str, str]]:
+    """Colonnes absentes, 'stale' ou en retard sur leur table."""
+    return [(source_type, facet) for source_type in _COLUMNS for facet in _COLUMNS[source_type]
+            if (source_type, facet) not in columns or columns[(source_type, facet)].max_rowid < last[source_type]]
+
+def load(conn: sqlite3.Connection) -> Dict[Tuple[str, str], Column]:
+    """
+    Colonnes de toutes les facettes, complétées ou recalculées si besoin.
+    Les colonnes modifiées sont enregistrées (ignoré si la base est en
+    lecture seule ou occupée: le calcul reste valable pour cette recherche).
+    """
+    columns = _stored(conn)
+    last = _last_rowids(conn)
+    todo = _todo(columns, last)
+    if not todo:
+        return columns
+
+    began = False
+    try:
+        conn.execute("BEGIN IMMEDIATE")  # Aucun trigger 'stale' entre lecture et écriture
+        began = True
+        columns = _stored(conn)
+        last = _last_rowids(conn)
+        todo = _todo(columns, last)
+    except sqlite3.OperationalError:
+        pass
+    for key in todo:
+        column = columns.get(key) or Column([], array("I"), 0)
+        column.extend(_fetch(conn, key[0], key[1], column.max_rowid))
+        column.max_rowid = max(column.max_rowid, last[key[0]])
+        columns[key] = column
+    if began:
+        try:
+            for source_type, facet in todo:
+                column = columns[(source_type, facet)]
+                conn.execute("""
+                    INSERT OR REPLACE INTO facet_columns (source_type, facet, labels, codes, max_rowid, stale)
+                    VALUES (?, ?, ?, ?, ?, 0)
+                """, (source_type, facet, json.dumps(column.labels, ensure_ascii=False),
+                      column.codes.tobytes(), column.max_rowid))
+            conn.commit()
+        except sqlite3.OperationalError:
+            conn.rollback()  # Lecture seule: BEGIN IMMEDIATE passe, l'écriture échoue
+    return columns
+
+def _tally(columns: List[Column], rowids: Sequence[int]) -> List[Counter]:
+    """Comptes par code de chaque colonne, en un passage sur les rowids."""
+    np = extractors.load("numpy") if extractors.is_available("numpy") else None
+    if np is not None and len(rowids) >= NUMPY_MIN_ROWS:
+        ids = np.asarray(rowids, dtype=np.int64)
+        tallies = []
+        for column in columns:
+            codes = np.frombuffer(column.codes, dtype=np.uint32)
+            known = ids < len(codes)
+            counts = np.bincount(codes[ids[known]], minlength=len(column.labels) + 1)
+            counts[0] += len(ids) - int(known.sum())
+            tallies.append(Counter({code: int(n) for code, n in enumerate(counts) if n}))
+        return tallies
+    tallies = [Counter() for _ in columns]
+    pairs = [(tally, column.codes, len(column.codes)) for tally, column in zip(tallies, columns)]
+    for rowid in rowids:
+        for tally, codes, size in pairs:
+            tally[codes[rowid] if rowid < size else 0] += 1
+    return tallies
+
+def count(conn: sqlite3.Connection, matches: Dict[str, Sequence[int]]) -> Dict[str, Dict[str, int]]:
+    """
+    Comptes par facette des rowids trouvés ({source: rowids}), triés par
+    effectif décroissant. 'type' compte les sources, 'year' cumule les mois.
+    """
+    columns = load(conn)
+    result: Dict[str, Counter] = {facet: Counter() for facet in FACETS}
+    for source_type, rowids in matches.items():
+        if not rowids:
+            continue
+        result["type"][source_type] += len(rowids)
+        facets = list(_COLUMNS[source_type])
+        source_columns = [columns[(source_type, facet)] for facet in facets]
+        for facet, column, tally in zip(facets, source_columns, _tally(source_columns, rowids)):
+            for code, n in tally.items():
+                result[facet][column.labels[code - 1] if code else NONE_LABEL] += n
+    for month, n in result["month"].items():
+        result["year"][month if month == NONE_LABEL else month[:4]] += n
+    return {facet: dict(counts.most_common()) for facet, counts in result.items() if counts}
+
+def available(conn: sqlite3.Connection) -> bool:
+    """Table facet_columns présente (base initialisée avec cette version)."""
+    try:
+        conn.execute("SELECT 1 FROM facet_columns LIMIT 1")
+    except sqlite3.OperationalError:
+        return False
+    return True
@@ -0,0 +1,147 @@
+"""
+fusion.py - Fusion de listes classées (recherche hybride bm25 + vecteurs)
+
+Les scores bm25 des trois tables FTS et la similarité cosinus de l'index
+vectoriel ne sont pas comparables entre eux. La fusion par rang
+réciproque (RRF) n'utilise que la position de chaque résultat dans sa
+liste:
+
+    score(r) = Σ poids(liste) / (RRF_K + rang de r dans la liste)
+
+Un résultat trouvé à la fois par les mots et par le sens passe devant
+un résultat trouvé d'une seule façon. Les poids par méthode se règlent
+sur un jeu de pertinence (python bench.py hybrid --qrels).
+"""
+
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+RRF_K = 60                  # Amortit l'écart entre les premiers rangs
+DEFAULT_WEIGHTS = {"bm25": 1.0, "semantic": 1.0}
+DEFAULT_BUDGET = 1.5        # Secondes accordées aux listes avant fusion
+MAX_THREADS = 8
+
+_pool: Optional[ThreadPoolExecutor] = None
+
+Key = Tuple[str, Any]
+
+def rrf(lists: Sequence[Tuple[str, List[Dict[str, Any]]]],
+        weights: Optional[Dict[str, float]] = None, k: int = RRF_K) -> List[Dict[str, Any]]:
+    """
+    Fusionne des listes (méthode, résultats classés) par rang réciproque.
+    Chaque résultat reçoit 'score' (fusionné) et 'ranks' {méthode: rang}; pour un
+    résultat présent dans plusieurs listes, la première qui le contient fournit
+    titre et extrait (mettre les listes bm25 en tête: extrait surligné).
+    """
+    weights = weights or DEFAULT_WEIGHTS
+    fused: Dict[Key, Dict[str, Any]] = {}
+    for method, results in lists:
+        weight = weights.get(method, 1.0)
+        for rank, r in enumerate(results, 1):
+            key = (r["type"], r["id"])
+            if key not in fused:
+                fused[key] = dict(r, score=0.0, ranks={})
+            hit = fused[key]
+            if method not in hit["ranks"]:
+                hit["ranks"][method] = rank
+                hit["score"] += weight / (k + rank)
+            if not hit.get("snippet") and r.get("snippet"):
+                hit["snippet"] = r["snippet"]
+    return sorted(fused.values(), key=lambda r: -r["score"])
+
+def _in(ids: List[int]) -> str:
+    return ",".join("?" * len(ids))
+
+def dedupe(conn: sqlite3.Connection, results: List[Dict[str, Any]],
+           limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Regroupe les résultats (déjà triés) qui désignent le même contenu:
+    pièce jointe et son email, pièce jointe et document au même hash, même
+    pièce jointe envoyée plusieurs fois. Le mieux classé reste et reçoit
+    'also' (["attachment:12", ...]). S'arrête à limit résultats gardés.
+    """
+    att_ids = [r["id"] for r in results if r["type"] == "attachment"]
+    doc_ids = [r["id"] for r in results if r["type"] == "document"]
+    attachments: Dict[int, Tuple[Optional[str], Optional[int]]] = {}
+    doc_hashes: Dict[int, Optional[str]] = {}
+    if att_ids:
+        for att_id, file_hash, email_id in conn.execute(
+            f"SELECT id, file_hash, email_id FROM attachments WHERE id IN ({_in(att_ids)})", att_ids
+        ):
+            attachments[att_id] = (file_hash, email_id)
+    if doc_ids:
+        doc_hashes = dict(conn.execute(
+            f"SELECT id, file_hash FROM documents WHERE id IN ({_in(doc_ids)})", doc_ids
+        ))
+
+    def keys(r: Dict[str, Any]) -> Tuple[Set[Key], Set[Key]]:
+        """(clés revendiquées, clés cherchées): le lien email → PJ est orienté."""
+        own: Set[Key] = {(r["type"], r["id"])}
+        if r["type"] == "email":
+            return own, own | {("parent", r["id"])}
+        if r["type"] == "attachment":
+            file_hash, email_id = attachments.get(r["id"], (None, None))
+            if file_hash:
+                own.add(("hash", file_hash))
+            if email_id is None:
+                return own, own
+            return own | {("parent", email_id)}, own | {("email", email_id)}
+        if doc_hashes.get(r["id"]):
+            own.add(("hash", doc_hashes[r["id"]]))
+        return own, own
+
+    kept: List[Dict[str, Any]] = []
+    owner: Dict[Key, int] = {}
+    for r in results:
+        if limit is not None and len(kept) >= limit:
+            break
+        own, lookup = keys(r)
+        match = next((owner[key] for key in lookup if key in owner), None)
+        if match is not None:
+            kept[match].setdefault("also", []).append(f"{r['type']}:{r['id']}")
+            continue
+        for key in own:
+            owner.setdefault(key, len(kept))
+        kept.append(r)
+    return kept
+
+def run_concurrently(legs: Dict[str, Callable[[], Any]], budget: float,
+                     on_timeout: Optional[Dict[str, Callable[[], None]]] = None,
+                     on_finish: Optional[Dict[str, Callable[[], None]]] = None
+                     ) -> Tuple[Dict[str, Any], Dict[str, str]]:
+    """
+    Lance les fonctions en parallèle (threads: SQLite et numpy relâchent le GIL)
+    et attend au plus 'budget' secondes. Retourne (résultats, {nom: raison})
+    pour les listes abandonnées; on_timeout[nom] est appelé pour les
+    interrompre (connection.interrupt()). on_finish[nom] est appelé une fois
+    la fonction terminée, y compris abandonnée (connection.close()): une
+    fonction ne ferme pas elle-même ce que on_timeout peut encore toucher.
+    Les threads sont réutilisés d'une recherche à l'autre.
+    """
+    global _pool
+    if _pool is None:
+        _pool = ThreadPoolExecutor(max_workers=MAX_THREADS, thread_name_prefix="fusion")
+    futures = {_pool.submit(fn): name for name, fn in legs.items()}
+    done, pending = wait(futures, timeout=budget)
+
+    results: Dict[str, Any] = {}
+    dropped: Dict[str, str] = {}
+    for future in pending:
+        name = futures[future]
+        dropped[name] = f"budget de {budget * 1000:.0f} ms dépassé"
+        if on_timeout and name in on_timeout:
+            on_timeout[name]()
+        if on_finish and name in on_finish:
+            # Après l'interruption: si la fonction vient de finir, appelé tout de suite
+            future.add_done_callback(lambda _, finish=on_finish[name]: finish())
+    for future in done:
+        name = futures[future]
+        try:
+            results[name] = future.result()
+        except (RuntimeError, FileNotFoundError, sqlite3.Error) as e:
+            dropped[name] = str(e)
+        finally:
+            if on_finish and name in on_finish:
+                on_finish[name]()
+    return results, dropped
@@ -0,0 +1,77 @@
+"""
+htmltext.py - Corps HTML → texte indexable, et stockage compact du HTML
+
+Les emails HTML seuls (body_text vide) n'étaient pas trouvables par la
+recherche. html_to_text() convertit en un seul passage d'expressions
+régulières précompilées (blocs script/style/head et commentaires
+supprimés, balises de bloc → retours à la ligne, entités décodées,
+espaces normalisés): plusieurs fois plus rapide que html.parser
+(voir: python bench.py html).
+
+pack_html() / unpack_html(): body_html gardé tel quel, compressé (zlib,
+préfixe HTML_MAGIC) ou supprimé, selon l'option --html de ingest_msg.
+"""
+
+import html
+import re
+import zlib
+from typing import Optional, Union
+
+from . import textnorm
+
+HTML_MODES = ("keep", "compress", "drop")
+HTML_MAGIC = b"\x00zlib"  # Aucun HTML ne commence par NUL
+
+_CHARSET = re.compile(rb'charset\s*=\s*["\']?([\w.:-]+)', re.I)
+_DROP = re.compile(r'<(script|style|head|title|xml)\b.*?</\1\s*>|<!--.*?-->', re.I | re.S)
+_BREAK = re.compile(
+    r'<(?:br|hr|/?p|/?div|/?tr|/?li|/?ul|/?ol|/?h[1-6]|/?table|/?blockquote|/?pre)\b[^>]*>',
+    re.I
+)
+_CELL = re.compile(r'</t[dh]\s*>', re.I)
+_TAG = re.compile(r'<[^>]*>')
+_SPACES_AROUND_NL = re.compile(r'[ \t\xa0]*\n[ \t\xa0]*')
+
+def decode_html(raw: bytes) -> str:
+    """Décode un HTML brut: charset déclaré, sinon UTF-8, sinon cp1252."""
+    match = _CHARSET.search(raw, 0, 4096)
+    candidates = [match.group(1).decode('ascii', 'ignore')] if match else []
+    for encoding in candidates + ['utf-8']:
+        try:
+            return raw.decode(encoding)
+        except (LookupError, UnicodeDecodeError):
+            continue
+    return raw.decode('cp1252', errors='replace')
+
+def html_to_text(body_html: Union[str, bytes, None]) -> Optional[str]:
+    """Texte lisible d'un corps HTML (None si vide)."""
+    if not body_html:
+        return None
+    text = decode_html(body_html) if isinstance(body_html, bytes) else body_html
+    text = _DROP.sub(' ', text)
+    text = _BREAK.sub('\n', text)
+    text = _CELL.sub(' ', text)
+    text = _TAG.sub('', text)
+    if '&' in text:
+        text = html.unescape(text)
+    text = _SPACES_AROUND_NL.sub('\n', text)
+    return textnorm.normalize_text(text.replace('\xa0', ' ')) or None
+
+def pack_html(body_html: Union[str, bytes, None], mode: str = "keep") -> Union[str, bytes, None]:
+    """Valeur à stocker dans emails.body_html selon le mode (keep, compress, drop)."""
+    if not body_html or mode == "drop":
+        return None
+    if mode == "compress":
+        text = decode_html(body_html) if isinstance(body_html, bytes) else body_html
+        return HTML_MAGIC + zlib.compress(text.encode('utf-8'), 6)
+    return body_html
+
+def unpack_html(value: Union[str, bytes, None]) -> Optional[str]:
+    """Relit emails.body_html quel que soit le mode de stockage."""
+    if value is None:
+        return None
+    if isinstance(value, bytes):
+        if value.startswith(HTML_MAGIC):
+            return zlib.decompress(value[len(HTML_MAGIC):]).decode('utf-8')
+        return decode_html(value)
+    return value
@@ -0,0 +1,65 @@
+"""
+mbox.py - Lecture en flux des fichiers mbox (exports Thunderbird, Google Takeout...)
+
+mailbox.mbox indexe tout le fichier avant de rendre le premier message.
+Ici on lit ligne à ligne et chaque message (octets bruts RFC 822) est
+rendu dès que la ligne "From " suivante apparaît: un seul passage
+séquentiel, mémoire bornée par le plus gros message, aucun fichier
+intermédiaire.
+"""
+
+import re
+from pathlib import Path
+from typing import Iterator, List, NamedTuple
+
+MBOX_EXTS = {'.mbox', '.mbx'}
+
+# mboxrd: les lignes "From " du corps sont échappées en ">From ", ">>From "...
+_QUOTED_FROM = re.compile(rb'^>+From ')
+
+class RawMessage(NamedTuple):
+    """Message extrait d'un mbox; label = '<fichier>#<offset octet du séparateur>'."""
+    label: str
+    content: bytes
+
+def _finish(lines: List[bytes]) -> bytes:
+    content = b''.join(lines)
+    # La ligne vide avant le séparateur suivant appartient au format, pas au message
+    if content.endswith(b'\r\n'):
+        return content[:-2]
+    return content[:-1] if content.endswith(b'\n') else content
+
+def iter_mbox(path: Path) -> Iterator[RawMessage]:
+    """Itère les messages d'un fichier mbox dans l'ordre du fichier."""
+    with open(path, 'rb', buffering=1 << 20) as f:
+        lines: List[bytes] = []
+        offset = None
+        pos = 0
+        prev_blank = True
+        for line in f:
+            if prev_blank and line.startswith(b'From '):
+                if offset is not None:
+                    yield RawMessage(f"{path}#{offset}", _finish(lines))
+                lines = []
+                offset = pos
+            elif offset is not None:
+                lines.append(line[1:] if _QUOTED_FROM.match(line) else line)
+            prev_blank = line in (b'\n', b'\r\n')
+            pos += len(line)
+        if offset is not None:
+            yield RawMessage(f"{path}#{offset}", _finish(lines))
+
+def read_message(label: str) -> RawMessage:
+    """Relit un seul message d'après son label '<fichier>#<offset>' (retraitement)."""
+    path, _, offset = label.rpartition("#")
+    with open(path, 'rb') as f:
+        f.seek(int(offset))
+        f.readline()  # Séparateur "From "
+        lines: List[bytes] = []
+        prev_blank = False
+        for line in f:
+            if prev_blank and line.startswith(b'From '):
+                break
+            lines.append(line[1:] if _QUOTED_FROM.match(line) else line)
+            prev_blank = line in (b'\n', b'\r\n')
+    return RawMessage(label, _finish(lines))
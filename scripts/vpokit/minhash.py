@@ -0,0 +1,207 @@
+"""
+minhash.py - Signatures MinHash + index LSH pour la détection de quasi-doublons
+
+Une signature = NUM_PERM minima de hash (uint32) sur les shingles de mots du
+texte, stockée en BLOB de 256 octets. L'index LSH découpe la signature en
+BANDS bandes de ROWS valeurs; deux textes partageant une bande sont candidats,
+ce qui évite la comparaison deux à deux de tout le corpus.
+"""
+
+import hashlib
+import random
+import re
+import sqlite3
+import struct
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS       # 4 → seuil LSH ≈ (1/16)^(1/4) ≈ 0.5
+SHINGLE_SIZE = 3               # shingles de 3 mots
+DEFAULT_THRESHOLD = 0.8        # Jaccard estimé pour considérer un quasi-doublon
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_SIG_STRUCT = struct.Struct(f"<{NUM_PERM}I")
+_BAND_STRUCT = struct.Struct(f"<B{ROWS}I")
+_WORD_RE = re.compile(r"\w+")
+
+# Permutations fixes (graine constante → signatures comparables entre runs)
+_rng = random.Random(0x5EED)
+_PERMS = [
+    (_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME))
+    for _ in range(NUM_PERM)
+]
+del _rng
+
+def _hash64(value: str) -> int:
+    """Hash 64 bits stable (indépendant de PYTHONHASHSEED)."""
+    return int.from_bytes(
+        hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "little"
+    )
+
+def shingles(text: str) -> Set[int]:
+    """Retourne l'ensemble des hash de shingles de mots du texte."""
+    words = _WORD_RE.findall(text.lower())
+    if not words:
+        return set()
+    if len(words) < SHINGLE_SIZE:
+        return {_hash64(" ".join(words))}
+    return {
+        _hash64(" ".join(words[i:i + SHINGLE_SIZE]))
+        for i in range(len(words) - SHINGLE_SIZE + 1)
+    }
+
+def signature(text: Optional[str]) -> Optional[bytes]:
+    """Calcule la signature MinHash d'un texte (None si texte vide)."""
+    if not text:
+        return None
+    hashes = shingles(text)
+    if not hashes:
+        return None
+    values = [
+        min((a * h + b) % _MERSENNE_PRIME for h in hashes) & _MAX_HASH
+        for a, b in _PERMS
+    ]
+    return _SIG_STRUCT.pack(*values)
+
+def similarity(sig_a: bytes, sig_b: bytes) -> float:
+    """Estime la similarité de Jaccard entre deux signatures."""
+    a = _SIG_STRUCT.unpack(sig_a)
+    b = _SIG_STRUCT.unpack(sig_b)
+    return sum(1 for x, y in zip(a, b) if x == y) / NUM_PERM
+
+def band_keys(sig: bytes) -> List[Tuple[int, int]]:
+    """Retourne les clés (bande, bucket) LSH d'une signature."""
+    values = _SIG_STRUCT.unpack(sig)
+    keys = []
+    for band in range(BANDS):
+        packed = _BAND_STRUCT.pack(band, *values[band * ROWS:(band + 1) * ROWS])
+        bucket = int.from_bytes(
+            hashlib.blake2b(packed, digest_size=8).digest(), "little", signed=True
+        )
+        keys.append((band, bucket))
+    return keys
+
+def store(conn: sqlite3.Connection, source_type: str, source_id: int,
+          sig: Optional[bytes]) -> None:
+    """Enregistre la signature et ses buckets LSH (sans commit)."""
+    if sig is None:
+        return
+    conn.execute(
+        "INSERT OR REPLACE INTO minhash (source_type, source_id, signature) VALUES (?, ?, ?)",
+        (source_type, source_id, sig)
+    )
+    conn.execute(
+        "DELETE FROM lsh_buckets WHERE source_type = ? AND source_id = ?",
+        (source_type, source_id)
+    )
+    conn.executemany(
+        "INSERT INTO lsh_buckets (band, bucket, source_type, source_id) VALUES (?, ?, ?, ?)",
+        [(band, bucket, source_type, source_id) for band, bucket in band_keys(sig)]
+    )
+
+def load_signatures(conn: sqlite3.Connection,
+                    keys: Iterable[Tuple[str, int]]) -> Dict[Tuple[str, int], bytes]:
+    """Charge les signatures d'une liste de (type, id)."""
+    sigs = {}
+    for source_type, source_id in keys:
+        row = conn.execute(
+            "SELECT signature FROM minhash WHERE source_type = ? AND source_id = ?",
+            (source_type, source_id)
+        ).fetchone()
+        if row:
+            sigs[(source_type, source_id)] = row[0]
+    return sigs
+
+def find_clusters(conn: sqlite3.Connection,
+                  threshold: float = DEFAULT_THRESHOLD) -> List[List[Tuple[str, int]]]:
+    """
+    Regroupe les quasi-doublons du corpus.
+    Seuls les buckets LSH partagés sont examinés (pas de comparaison globale).
+    """
+    parent: Dict[Tuple[str, int], Tuple[str, int]] = {}
+
+    def find(x):
+        while parent.setdefault(x, x) != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    cursor = conn.execute("""
+        SELECT b.band, b.bucket, b.source_type, b.source_id, m.signature
+        FROM lsh_buckets b
+        JOIN minhash m ON m.source_type = b.source_type AND m.source_id = b.source_id
+        WHERE (b.band, b.bucket) IN (
+            SELECT band, bucket FROM lsh_buckets
+            GROUP BY band, bucket HAVING COUNT(*) > 1
+        )
+        ORDER BY b.band, b.bucket
+    """)
+
+    current = None
+    members: List[Tuple[Tuple[str, int], bytes]] = []
+
+    def flush_bucket():
+        # Toutes les paires du bucket (petit): deux membres peuvent se ressembler
+        # sans ressembler au premier. Paire déjà réunie: pas de comparaison.
+        for i, (key_a, sig_a) in enumerate(members):
+            for key_b, sig_b in members[i + 1:]:
+                if find(key_a) != find(key_b) and similarity(sig_a, sig_b) >= threshold:
+                    parent[find(key_b)] = find(key_a)
+
+    for band, bucket, source_type, source_id, sig in cursor:
+        if (band, bucket) != current:
+            flush_bucket()
+            current = (band, bucket)
+            members = []
+        members.append(((source_type, source_id), sig))
+    flush_bucket()
+
+    clusters: Dict[Tuple[str, int], List[Tuple[str, int]]] = {}
+    for key in parent:
+        clusters.setdefault(find(key), []).append(key)
+
+    return sorted(
+        (sorted(c) for c in clusters.values() if len(c) > 1),
+        key=len, reverse=True
+    )
+
+def collapse_results(conn: sqlite3.Connection, results: List[Dict[str, Any]],
+                     threshold: float = DEFAULT_THRESHOLD) -> List[Dict[str, Any]]:
+    """
+    Retire des résultats (déjà triés) les quasi-doublons d'un résultat mieux classé.
+    Le résultat conservé reçoit un compteur 'near_duplicates'.
+    """
+    sigs = load_signatures(
+        conn, [(r["type"], r["id"]) for r in results if r["type"] in ("email", "document")]
+    )
+    kept: List[Dict[str, Any]] = []
+    buckets: Dict[Tuple[int, int], List[int]] = {}
+
+    for r in results:
+        sig = sigs.get((r["type"], r["id"]))
+        if sig is None:
+            kept.append(r)
+            continue
+
+        keys = band_keys(sig)
+        duplicate_of = None
+        for key in keys:
+            for idx in buckets.get(key, []):
+                other = sigs[(kept[idx]["type"], kept[idx]["id"])]
+                if similarity(sig, other) >= threshold:
+                    duplicate_of = idx
+                    break
+            if duplicate_of is not None:
+                break
+
+        if duplicate_of is not None:
+            kept[duplicate_of]["near_duplicates"] = kept[duplicate_of].get("near_duplicates", 0) + 1
+            continue
+
+        for key in keys:
+            buckets.setdefault(key, []).append(len(kept))
+        kept.append(r)
+
+    return kept
@@ -0,0 +1,185 @@
+"""
+ocrquality.py - Score de qualité du texte d'une page (couche texte native ou OCR)
+
+Remplace la règle "moins de 100 caractères par page → OCR", qui OCRisait
+des PDF natifs peu bavards et laissait passer les couches texte cassées
+(polices sans table Unicode: "(cid:12)", "Ã©", lettres décalées...).
+Chaque page reçoit un score entre 0 et 1 combinant:
+
+    - forme des mots: part de mots plausibles (voyelles, longueur), pondérée
+      par la part de paires de lettres courantes (en, er, ch, ou...: une
+      police décalée ou sans table Unicode en produit peu); c'est le
+      plancher du score, valable pour une facture sans phrases et pour les
+      langues hors lexique
+    - mots du lexique: mots courants français, anglais, allemands et
+      italiens (un texte réel en contient 30 à 50 %), en bonus
+    - caractères parasites: symboles, caractères de contrôle, U+FFFD...
+    - confiance Tesseract (moyenne des mots), quand le texte vient de l'OCR
+
+Seules les pages sous QUALITY_THRESHOLD sont (ré)OCRisées.
+"""
+
+import re
+import sqlite3
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+QUALITY_THRESHOLD = 0.4    # En dessous: page à (ré)OCRiser
+MIN_PAGE_CHARS = 10        # Moins de caractères visibles: page vide ou scannée
+EXPECTED_HIT_RATIO = 0.25  # Part de mots du lexique d'un texte normal
+MIN_WORDS = 8              # En dessous, le ratio du lexique est peu fiable
+SHAPE_WEIGHT = 0.6         # Plancher: texte aux mots plausibles, sans mot du lexique
+BIGRAM_RANGE = (0.3, 0.5)  # Part de paires de lettres courantes: texte décalé → réel (réel: 55-80 %)
+GARBAGE_WEIGHT = 2.0       # 25 % de caractères parasites → score divisé par deux
+
+LEXICON = frozenset("""
+a à afin ai aie ainsi alors après au aucun aujourd auprès aussi autre autres aux avant avec avez
+avoir avons ayant bien c ça car ce ceci cela celle celui ces cet cette chez ci comme comment
+concernant conformément contre d dans de depuis des dès dit doit donc dont du durant elle elles
+en encore entre est et été être eu eux fait faire fin fois hors il ils j je jusqu l la le les
+leur leurs lors lui m ma madame mais me même mes moi mon monsieur n ne ni nos notre nous on ont
+ou où par parce pas pendant peu peut peuvent plus pour pourquoi qu quand que quel quelle quelles
+quels qui quoi s sa sans se selon ses si sien son sont sous suis sur t ta te tes toi ton tous
+tout toute toutes très tu un une vos votre vous y
+about after all also am an and any are as at be been before being between both but by can could
+did do does each for from had has have he her here him his how i if in into is it its may me
+more most my no not of on once only or other our out over own same shall she should so some such
+than that the their them then there these they this those through to under until up very was
+we were what when where which while who whom why will with would you your
+aber alle als am an auch auf aus bei bis bitte dass das dem den der des die dies diese diesem
+dieser durch ein eine einem einen einer es für haben hat hier ich ihr ihre ihnen im ist kann
+mit nach nicht noch nur oder sehr sich sie sind über um und uns unter vom von vor war wenn werden
+wie wir wird zu zum zur
+agli al alla alle anche che chi con cui da dal dalla degli dei del della delle di ed gli il
+lo nel nella non per più può questa questo se sono su sua suo tra una uno
+""".split())
+
+# Paires de lettres les plus fréquentes en français, anglais, allemand et italien
+_BIGRAMS = frozenset("""
+ab ac ag ai al an ar as at au be ca ce ch ci co ct de di ea ed ei el em en er es et eu fe ge ha
+he ht ic ie ig il in io is it la le li ll ma me mm mo na nd ne ng ni nn no ns nt oi on or ou pa
+pe po pr ra re ri ro sa sc se si so ss st ta te th ti to tr tt ue ui un ur us ut ve vo ze zu
+""".split())
+
+_WORD_RE = re.compile(r"[^\W\d_]+")
+# Visibles attendus: lettres, chiffres, ponctuation et symboles usuels d'un courrier
+_GARBAGE_RE = re.compile(r"[^\w\s.,;:!?'\"()\[\]{}«»“”‘’/\\%&@#€$£+\-–—*=<>°§…•|_]")
+_CID_RE = re.compile(r"\(cid:\d+\)")
+_MOJIBAKE_RE = re.compile(r"Ã[\x80-\xbf©¨ª«¢§®´¹]|â€")
+_VOWELS = set("aeiouyàâäéèêëîïôöùûüÿæœ")
+
+class PageScore(NamedTuple):
+    """Score d'une page et ses composantes (confidence None hors OCR Tesseract)."""
+    score: float
+    dict_ratio: float
+    garbage_ratio: float
+    confidence: Optional[float]
+
+def _plausible(word: str) -> bool:
+    return len(word) <= 25 and any(c in _VOWELS for c in word)
+
+def word_shape(words: List[str]) -> float:
+    """Part de mots plausibles, réduite si les paires de lettres courantes sont rares."""
+    pairs = [w[i:i + 2] for w in words for i in range(len(w) - 1)]
+    common = sum(1 for pair in pairs if pair in _BIGRAMS) / len(pairs) if pairs else 0.0
+    plausible = sum(1 for w in words if _plausible(w)) / len(words)
+    low, high = BIGRAM_RANGE
+    return plausible * min(1.0, max(0.0, (common - low) / (high - low)))
+
+def dict_ratio(text: str) -> float:
+    """
+    Score lexical 0..1: plancher donné par la forme des mots, complété par
+    les mots du lexique (ramenés à un texte normal).
+    """
+    words = [w.lower() for w in _WORD_RE.findall(text)]
+    if not words:
+        return 0.0
+    shape = word_shape(words)
+    hits = sum(1 for w in words if w in LEXICON)
+    lexical = min(1.0, hits / len(words) / EXPECTED_HIT_RATIO)
+    if len(words) < MIN_WORDS:
+        # Texte court (titre, annexe): le lexique ne dit pas grand-chose, on mélange
+        weight = len(words) / MIN_WORDS
+        lexical = weight * lexical + (1 - weight) * shape
+    floor = SHAPE_WEIGHT * shape
+    return floor + (1 - floor) * lexical
+
+def garbage_ratio(text: str) -> float:
+    """Part des caractères visibles qui sont parasites (symboles, (cid:N), mojibake)."""
+    visible = len(text) - sum(1 for c in text if c.isspace())
+    if not visible:
+        return 0.0
+    bad = len(_GARBAGE_RE.findall(text))
+    bad += sum(len(m) for m in _CID_RE.findall(text))
+    bad += len(_MOJIBAKE_RE.findall(text)) * 2
+    return min(1.0, bad / visible)
+
+def visible_chars(text: Optional[str]) -> int:
+    return len("".join((text or "").split()))
+
+def page_score(text: Optional[str], confidence: Optional[float] = None) -> PageScore:
+    """Score d'une page; une page (quasi) vide vaut 0."""
+    if visible_chars(text) < MIN_PAGE_CHARS:
+        return PageScore(0.0, 0.0, 0.0, confidence)
+    lexical = dict_ratio(text)
+    garbage = garbage_ratio(text)
+    score = lexical * max(0.0, 1.0 - garbage * GARBAGE_WEIGHT)
+    if confidence is not None:
+        score = 0.5 * score + 0.5 * confidence
+    return PageScore(round(score, 3), round(lexical, 3), round(garbage, 3), confidence)
+
+def document_score(scores: Iterable[Optional[PageScore]]) -> Optional[float]:
+    """Qualité d'un document: moyenne des pages notées (None si aucune)."""
+    values = [s.score for s in scores if s is not None]
+    return round(sum(values) / len(values), 3) if values else None
+
+def low_pages(scores: List[Optional[PageScore]], threshold: float = QUALITY_THRESHOLD) -> List[int]:
+    """Numéros (1..n) des pages sous le seuil; None = page blanche, ignorée."""
+    return [i for i, s in enumerate(scores, 1) if s is not None and s.score < threshold]
+
+def store(conn: sqlite3.Connection, document_id: int, scores: List[Optional[PageScore]],
+          ocr_pages: Iterable[int] = ()) -> None:
+    """Enregistre les scores par page (sans commit); remplace ceux du document."""
+    if not scores:
+        return
+    ocr = set(ocr_pages)
+    conn.execute("DELETE FROM page_quality WHERE document_id = ?", (document_id,))
+    conn.executemany("""
+        INSERT INTO page_quality (document_id, page_no, score, dict_ratio, garbage_ratio, confidence, ocr)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, [(document_id, page_no, s.score, s.dict_ratio, s.garbage_ratio, s.confidence,
+           1 if page_no in ocr else 0)
+          for page_no, s in enumerate(scores, 1) if s is not None])
+
+def parse_tesseract_tsv(tsv: str) -> Tuple[str, Optional[float]]:
+    """
+    Texte et confiance moyenne (0..1) depuis la sortie 'tsv' de Tesseract.
+    Colonnes: level page block par line word left top width height conf text.
+    """
+    lines: Dict[Tuple[str, str, str], List[str]] = {}
+    order: List[Tuple[str, str, str]] = []
+    confidences = []
+    for row in tsv.splitlines()[1:]:
+        cols = row.split("\t")
+        if len(cols) < 12 or cols[0] != "5" or not cols[11].strip():
+            continue
+        key = (cols[2], cols[3], cols[4])
+        if key not in lines:
+            lines[key] = []
+            order.append(key)
+        lines[key].append(cols[11])
+        try:
+            conf = float(cols[10])
+        except ValueError:
+            continue
+        if conf >= 0:
+            confidences.append(conf / 100.0)
+
+    text_lines = []
+    previous_par = None
+    for key in order:
+        if previous_par is not None and key[:2] != previous_par:
+            text_lines.append("")  # Nouveau paragraphe
+        text_lines.append(" ".join(lines[key]))
+        previous_par = key[:2]
+    confidence = round(sum(confidences) / len(confidences), 3) if confidences else None
+    return "\n".join(text_lines), confidence
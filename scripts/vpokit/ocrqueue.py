@@ -0,0 +1,139 @@
+"""
+ocrqueue.py - File persistante des travaux OCR (table ocr_jobs)
+
+L'OCR est de loin l'étape la plus lente. ingest_docs importe d'abord le
+texte natif de tous les documents (cherchables tout de suite), puis
+enfile ici ceux qui ont besoin d'OCR. Les travaux sont pris par priorité
+décroissante, un à la fois (claim), si bien qu'un signalement fait
+pendant un run est pris en compte au travail suivant:
+
+    - signalés par l'utilisateur (ocr_queue.py flag) avant tout le reste
+    - puis fichiers récents, puis petits fichiers
+
+La file survit aux interruptions: un travail resté 'running' (run tué)
+repasse 'pending' au run suivant (reset_stale).
+"""
+
+import math
+import sqlite3
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+FLAG_BONUS = 1000.0     # Un travail signalé passe devant tous les autres
+RECENT_WEIGHT = 10.0    # Poids de la récence (0..1 sur RECENT_DAYS)
+RECENT_DAYS = 3650
+SMALL_WEIGHT = 5.0      # Poids de la petite taille (1 Mio ≈ 0.5)
+SIZE_SCALE = 1024 * 1024
+
+STATUSES = ("pending", "running", "done", "failed")
+
+def priority(size_bytes: Optional[int], file_mtime: Optional[str], flagged: bool = False,
+             now: Optional[datetime] = None) -> float:
+    """Score d'un travail: signalement, puis récence, puis petite taille."""
+    score = FLAG_BONUS if flagged else 0.0
+    if file_mtime:
+        try:
+            age = ((now or datetime.now()) - datetime.fromisoformat(file_mtime)).days
+            score += RECENT_WEIGHT * max(0.0, 1.0 - age / RECENT_DAYS)
+        except ValueError:
+            pass
+    if size_bytes is not None:
+        score += SMALL_WEIGHT / (1.0 + math.log2(1.0 + size_bytes / SIZE_SCALE))
+    return score
+
+def enqueue(conn: sqlite3.Connection, document_id: int, file_path: str, doc_type: str,
+            size_bytes: Optional[int], file_mtime: Optional[str], requeue: bool = False) -> None:
+    """
+    Ajoute un travail (sans commit); un document déjà en file n'est pas dupliqué.
+    requeue: un travail terminé ou en échec repasse en attente (nouveau seuil de qualité).
+    """
+    conflict = ("DO UPDATE SET status = 'pending', error = NULL, updated_at = CURRENT_TIMESTAMP "
+                "WHERE status IN ('done', 'failed')") if requeue else "DO NOTHING"
+    conn.execute(f"""
+        INSERT INTO ocr_jobs (document_id, file_path, doc_type, size_bytes, file_mtime, priority)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT(document_id) {conflict}
+    """, (document_id, file_path, doc_type, size_bytes, file_mtime,
+          priority(size_bytes, file_mtime)))
+
+def flag(conn: sqlite3.Connection, where: str, params: Iterable[Any] = ()) -> int:
+    """Signale les travaux choisis par une condition SQL; retourne le nombre touché."""
+    rows = conn.execute(
+        f"SELECT id, size_bytes, file_mtime FROM ocr_jobs WHERE {where}", list(params)
+    ).fetchall()
+    conn.executemany("""
+        UPDATE ocr_jobs SET flagged = 1, priority = ?,
+            status = CASE status WHEN 'failed' THEN 'pending' ELSE status END,
+            updated_at = CURRENT_TIMESTAMP
+        WHERE id = ?
+    """, [(priority(size, mtime, True), job_id) for job_id, size, mtime in rows])
+    conn.commit()
+    return len(rows)
+
+def reset_stale(conn: sqlite3.Connection) -> int:
+    """Remet en attente les travaux 'running' d'un run interrompu."""
+    cursor = conn.execute("UPDATE ocr_jobs SET status = 'pending' WHERE status = 'running'")
+    conn.commit()
+    return cursor.rowcount
+
+def retry_failed(conn: sqlite3.Connection) -> int:
+    """Remet en attente les travaux en échec."""
+    cursor = conn.execute(
+        "UPDATE ocr_jobs SET status = 'pending', error = NULL WHERE status = 'failed'"
+    )
+    conn.commit()
+    return cursor.rowcount
+
+def claim(conn: sqlite3.Connection, doc_types: Iterable[str]) -> Optional[Dict[str, Any]]:
+    """Prend le travail en attente le plus prioritaire (statut 'running', commit)."""
+    types = list(doc_types)
+    if not types:
+        return None
+    row = conn.execute(f"""
+        SELECT id, document_id, file_path, doc_type FROM ocr_jobs
+        WHERE status = 'pending' AND doc_type IN ({",".join("?" * len(types))})
+        ORDER BY priority DESC, id LIMIT 1
+    """, types).fetchone()
+    if row is None:
+        return None
+    conn.execute("""
+        UPDATE ocr_jobs SET status = 'running', attempts = attempts + 1,
+            updated_at = CURRENT_TIMESTAMP
+        WHERE id = ?
+    """, (row[0],))
+    conn.commit()
+    return {"id": row[0], "document_id": row[1], "file_path": row[2], "doc_type": row[3]}
+
+def iter_claims(conn: sqlite3.Connection, doc_types: Iterable[str]) -> Iterator[Dict[str, Any]]:
+    """Travaux pris un par un, à la demande (l'ordre suit les signalements en cours de run)."""
+    types = list(doc_types)
+    while True:
+        job = claim(conn, types)
+        if job is None:
+            return
+        yield job
+
+def pending_count(conn: sqlite3.Connection, doc_types: Iterable[str]) -> int:
+    """Travaux en attente pour les types donnés."""
+    types = list(doc_types)
+    if not types:
+        return 0
+    return conn.execute(
+        f"SELECT COUNT(*) FROM ocr_jobs WHERE status = 'pending' "
+        f"AND doc_type IN ({','.join('?' * len(types))})", types
+    ).fetchone()[0]
+
+def finish(conn: sqlite3.Connection, job_id: int, error: Optional[str] = None) -> None:
+    """Marque un travail terminé ('done') ou en échec ('failed'), sans commit."""
+    conn.execute("""
+        UPDATE ocr_jobs SET status = ?, error = ?, updated_at = CURRENT_TIMESTAMP
+        WHERE id = ?
+    """, ("failed" if error else "done", error, job_id))
+
+def counts(conn: sqlite3.Connection) -> Dict[str, int]:
+    """Nombre de travaux par statut (vide si la table n'existe pas)."""
+    try:
+        rows = dict(conn.execute("SELECT status, COUNT(*) FROM ocr_jobs GROUP BY status"))
+    except sqlite3.OperationalError:
+        return {}
+    return {status: rows.get(status, 0) for status in STATUSES}
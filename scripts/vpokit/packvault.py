@@ -0,0 +1,245 @@
+"""
+packvault.py - Vault compacté: fichiers pack en ajout seul + index SQLite
+
+Des millions de petites pièces jointes (logos, images de signature) coûtent
+un inode et un bloc disque chacune dans le vault classique. Ici les blobs
+sont concaténés dans vault/packs/pack-NNNNNN.pack; vault/packs/index.db
+donne pour chaque blob (pack, offset, longueur, codec). Compression zstd
+(zlib si zstandard n'est pas installé), gardée seulement si elle fait
+gagner au moins 10 %.
+
+Les chemins retournés sont des URI "pack://<racine_vault>/<nom_blob>",
+lisibles via vault.iter_blob() / vault.read_blob().
+
+Même interface que vault.Vault (store_bytes, adopt, sync, ...): un seul
+écrivain à la fois (l'étage vault du pipeline).
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import zlib
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+from . import vault as loose
+
+try:
+    import zstandard
+    HAS_ZSTD = True
+except ImportError:
+    HAS_ZSTD = False
+
+PACK_DIR = "packs"
+INDEX_NAME = "index.db"
+PACK_MAX = 1 << 30          # Nouveau pack au-delà de 1 Gio
+MIN_GAIN = 0.9              # Compression gardée si taille ≤ 90 % de l'original
+URI_PREFIX = "pack://"
+
+# Formats déjà compressés: inutile d'essayer
+COMPRESSED_EXTS = {
+    '.zip', '.gz', '.7z', '.rar', '.jpg', '.jpeg', '.png', '.gif', '.webp',
+    '.mp3', '.mp4', '.mov', '.avi', '.docx', '.xlsx', '.pptx', '.odt', '.heic',
+}
+
+INDEX_SCHEMA = """
+CREATE TABLE IF NOT EXISTS blobs (
+    name TEXT PRIMARY KEY,           -- sha256 + extension
+    pack INTEGER,
+    offset INTEGER,
+    length INTEGER,                  -- Octets stockés (compressés)
+    size INTEGER,                    -- Taille d'origine
+    codec TEXT                       -- 'raw', 'zstd', 'zlib'
+);
+"""
+
+def make_uri(root: Path, name: str) -> str:
+    return f"{URI_PREFIX}{Path(root).as_posix()}/{name}"
+
+def parse_uri(uri: str) -> Tuple[Path, str]:
+    """'pack://vault/abcd.pdf' → (Path('vault'), 'abcd.pdf')"""
+    root, _, name = uri[len(URI_PREFIX):].rpartition("/")
+    return Path(root), name
+
+def _compressor(codec: str):
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=3).compressobj()
+    return zlib.compressobj(6)
+
+def _decompressor(codec: str):
+    if codec == "zstd":
+        if not HAS_ZSTD:
+            raise RuntimeError("Blob compressé en zstd: pip install zstandard")
+        return zstandard.ZstdDecompressor().decompressobj()
+    return zlib.decompressobj()
+
+class PackVault:
+    """Vault à fichiers pack, même interface que vault.Vault."""
+
+    def __init__(self, root: Path, fsync: bool = True, compress: bool = True):
+        self.root = Path(root)
+        self.fsync = fsync
+        self.codec = ("zstd" if HAS_ZSTD else "zlib") if compress else "raw"
+        self.pack_dir = self.root / PACK_DIR
+        self.pack_dir.mkdir(parents=True, exist_ok=True)
+        self._index = sqlite3.connect(str(self.pack_dir / INDEX_NAME), check_same_thread=False)
+        self._index.executescript(INDEX_SCHEMA)
+        self._known: Set[str] = {name for (name,) in self._index.execute("SELECT name FROM blobs")}
+        self._pending: List[Tuple[str, int, int, int, int, str]] = []
+        self._lock = threading.Lock()
+        self._pack_no, self._pack = self._open_pack()
+
+    def _open_pack(self) -> Tuple[int, object]:
+        """Ouvre le dernier pack en ajout (ou le suivant s'il est plein)."""
+        existing = sorted(self.pack_dir.glob("pack-*.pack"))
+        pack_no = int(existing[-1].stem.split("-")[1]) if existing else 1
+        path = self.pack_dir / f"pack-{pack_no:06d}.pack"
+        if path.exists() and path.stat().st_size >= PACK_MAX:
+            pack_no += 1
+            path = self.pack_dir / f"pack-{pack_no:06d}.pack"
+        return pack_no, open(path, "ab")
+
+    def seed_from_db(self, conn: sqlite3.Connection) -> int:
+        """Les blobs connus viennent de l'index des packs; retourne leur nombre."""
+        return len(self._known)
+
+    blob_name = staticmethod(loose.Vault.blob_name)
+
+    def uri_for(self, name: str) -> str:
+        return make_uri(self.root, name)
+
+    def contains(self, name: str) -> bool:
+        with self._lock:
+            return name in self._known
+
+    def _should_compress(self, name: str) -> bool:
+        return self.codec != "raw" and Path(name).suffix.lower() not in COMPRESSED_EXTS
+
+    def _append(self, name: str, chunks: Callable[[], Iterator[bytes]], size_hint: int) -> None:
+        """Ajoute un blob au pack courant (appelé sous verrou)."""
+        if self._pack.tell() + size_hint > PACK_MAX and self._pack.tell() > 0:
+            self._flush_pack()
+            self._pack.close()
+            self._pack_no += 1
+            self._pack = open(self.pack_dir / f"pack-{self._pack_no:06d}.pack", "ab")
+
+        offset = self._pack.tell()
+        size = 0
+        codec = self.codec if self._should_compress(name) else "raw"
+        comp = _compressor(codec) if codec != "raw" else None
+        for chunk in chunks():
+            size += len(chunk)
+            self._pack.write(comp.compress(chunk) if comp else chunk)
+        if comp:
+            self._pack.write(comp.flush())
+
+        # Compression sans gain suffisant: on réécrit le blob brut à la place
+        if comp and self._pack.tell() - offset > size * MIN_GAIN:
+            self._pack.truncate(offset)
+            self._pack.seek(offset)
+            codec = "raw"
+            for chunk in chunks():
+                self._pack.write(chunk)
+
+        self._pending.append((name, self._pack_no, offset, self._pack.tell() - offset, size, codec))
+
+    def store_bytes(self, data: bytes, filename: Optional[str],
+                    file_hash: Optional[str] = None) -> str:
+        """Ajoute un blob au pack (indexé au prochain sync), retourne son URI."""
+        file_hash = file_hash or hashlib.sha256(data).hexdigest()
+        name = self.blob_name(file_hash, filename)
+        with self._lock:
+            if name not in self._known:
+                self._known.add(name)
+                self._append(name, lambda: iter([data]), len(data))
+        return self.uri_for(name)
+
+    def store_file(self, path: Path, name: str) -> str:
+        """Ajoute au pack un fichier existant (par blocs, sans le supprimer), retourne son URI."""
+        def read_chunks():
+            with open(path, "rb") as f:
+                yield from iter(lambda: f.read(loose.CHUNK_SIZE), b"")
+
+        with self._lock:
+            if name not in self._known:
+                self._known.add(name)
+                self._append(name, read_chunks, os.path.getsize(path))
+        return self.uri_for(name)
+
+    def adopt(self, tmp_path: str, file_hash: str, filename: Optional[str]) -> str:
+        """Ajoute au pack un fichier produit par spool() puis le supprime."""
+        uri = self.store_file(Path(tmp_path), self.blob_name(file_hash, filename))
+        Path(tmp_path).unlink(missing_ok=True)
+        return uri
+
+    def clean_staging(self) -> None:
+        loose.Vault(self.root).clean_staging()
+
+    def _flush_pack(self) -> None:
+        self._pack.flush()
+        if self.fsync:
+            os.fsync(self._pack.fileno())
+
+    def sync(self) -> int:
+        """fsync du pack puis publication des entrées d'index. Retourne le nombre de blobs."""
+        with self._lock:
+            pending, self._pending = self._pending, []
+            if not pending:
+                return 0
+            self._flush_pack()
+            self._index.executemany(
+                "INSERT OR REPLACE INTO blobs (name, pack, offset, length, size, codec) "
+                "VALUES (?, ?, ?, ?, ?, ?)", pending
+            )
+            self._index.commit()
+        return len(pending)
+
+    def close(self) -> None:
+        self.sync()
+        self._pack.close()
+        self._index.close()
+
+class PackReader:
+    """Lecture des blobs d'un vault compacté (ouverture paresseuse de l'index)."""
+
+    _instances: Dict[Path, "PackReader"] = {}
+
+    def __init__(self, root: Path):
+        self.pack_dir = Path(root) / PACK_DIR
+        self._index = sqlite3.connect(str(self.pack_dir / INDEX_NAME), check_same_thread=False)
+
+    @classmethod
+    def for_root(cls, root: Path) -> "PackReader":
+        root = Path(root)
+        if root not in cls._instances:
+            cls._instances[root] = cls(root)
+        return cls._instances[root]
+
+    def locate(self, name: str) -> Optional[Tuple[int, int, int, int, str]]:
+        return self._index.execute(
+            "SELECT pack, offset, length, size, codec FROM blobs WHERE name = ?", (name,)
+        ).fetchone()
+
+    def iter_blob(self, name: str, chunk_size: int = loose.CHUNK_SIZE) -> Iterator[bytes]:
+        """Restitue le contenu d'origine d'un blob, par blocs."""
+        entry = self.locate(name)
+        if entry is None:
+            raise FileNotFoundError(f"Blob absent de l'index: {name}")
+        pack_no, offset, length, _, codec = entry
+        decomp = _decompressor(codec) if codec != "raw" else None
+        with open(self.pack_dir / f"pack-{pack_no:06d}.pack", "rb") as f:
+            f.seek(offset)
+            remaining = length
+            while remaining > 0:
+                chunk = f.read(min(chunk_size, remaining))
+                if not chunk:
+                    raise IOError(f"Pack tronqué: {name}")
+                remaining -= len(chunk)
+                out = decomp.decompress(chunk) if decomp else chunk
+                if out:
+                    yield out
+        if decomp:
+            tail = decomp.flush() if hasattr(decomp, "flush") else b""
+            if tail:
+                yield tail
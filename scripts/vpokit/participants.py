@@ -0,0 +1,204 @@
+"""
+participants.py - Index des correspondants et graphe des échanges
+
+emails.recipients et emails.cc sont des listes JSON de 'Nom <adresse>':
+retrouver les échanges entre deux personnes demandait un LIKE sur toute
+la table. La table participants (email_id, address, role) en est la
+forme normalisée, indexée par adresse: chaque question devient une
+jointure sur index.
+
+Arête du graphe: a et b sont reliés quand l'un a écrit à l'autre
+(expéditeur → destinataire ou copie). Deux destinataires d'un même email
+ne sont pas reliés: être en copie ensemble n'est pas un échange.
+
+Les triggers de init_db suppriment les participants d'un email modifié
+ou supprimé; sync() remplit les emails qui n'en ont pas (fin de chaque
+import, python init_db.py --upgrade pour une base existante).
+"""
+
+import json
+import sqlite3
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from . import textnorm, timeline
+
+ROLES = ("from", "to", "cc")
+COMMIT_EVERY = 1000          # Emails traités par transaction
+MAX_HOPS = 6                 # Longueur maximale d'une chaîne (--path)
+_CHUNK = 500                 # Adresses par requête (limite de paramètres SQLite)
+
+def addresses(raw: Optional[str]) -> List[str]:
+    """Adresses (minuscules, sans doublon) d'une liste JSON de destinataires."""
+    if not raw:
+        return []
+    try:
+        entries = json.loads(raw)
+    except ValueError:
+        entries = raw.split(";")
+    found = []
+    for entry in entries if isinstance(entries, list) else [entries]:
+        address = textnorm.extract_email_address(str(entry))
+        if address and address not in found:
+            found.append(address)
+    return found
+
+def store(conn: sqlite3.Connection, email_id: int, sender_email: Optional[str],
+          recipients: Optional[str], cc: Optional[str]) -> int:
+    """Remplace les participants d'un email (sans commit); retourne leur nombre."""
+    conn.execute("DELETE FROM participants WHERE email_id = ?", (email_id,))
+    rows = [(email_id, sender_email.lower(), "from")] if sender_email else []
+    rows += [(email_id, address, "to") for address in addresses(recipients)]
+    rows += [(email_id, address, "cc") for address in addresses(cc)]
+    conn.executemany("INSERT OR IGNORE INTO participants (email_id, address, role) VALUES (?, ?, ?)", rows)
+    return len(rows)
+
+def sync(conn: sqlite3.Connection, progress: Optional[Callable[[int, int], None]] = None) -> int:
+    """Indexe les emails sans participants (commit par lots); retourne le nombre d'emails traités."""
+    todo = conn.execute("""
+        SELECT id, sender_email, recipients, cc FROM emails e
+        WHERE NOT EXISTS (SELECT 1 FROM participants p WHERE p.email_id = e.id)
+          AND (sender_email IS NOT NULL OR recipients LIKE '%@%' OR cc LIKE '%@%')
+    """).fetchall()
+    for done, row in enumerate(todo, 1):
+        store(conn, *row)
+        if done % COMMIT_EVERY == 0:
+            conn.commit()
+            if progress:
+                progress(done, len(todo))
+    conn.commit()
+    if progress and todo:
+        progress(len(todo), len(todo))
+    return len(todo)
+
+def available(conn: sqlite3.Connection) -> bool:
+    """Table participants présente (base initialisée avec cette version)."""
+    try:
+        conn.execute("SELECT 1 FROM participants LIMIT 1")
+    except sqlite3.OperationalError:
+        return False
+    return True
+
+# --- Graphe ---
+
+def _dates(date_from: Optional[str], date_to: Optional[str]) -> Tuple[str, List[str]]:
+    sql, params = "", []
+    if date_from:
+        sql += " AND e.date_sent >= ?"
+        params.append(date_from)
+    if date_to:
+        sql += " AND e.date_sent < ?"
+        params.append(date_to + "~")  # Jour de fin inclus (heure ISO après la date)
+    return sql, params
+
+def contacts(conn: sqlite3.Connection, address: str, limit: int = 20,
+             date_from: Optional[str] = None, date_to: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Correspondants d'une adresse: emails envoyés et reçus, premier et dernier échange."""
+    dates, params = _dates(date_from, date_to)
+    rows = conn.execute(f"""
+        SELECT p2.address,
+               COUNT(DISTINCT CASE WHEN p1.role = 'from' THEN p1.email_id END),
+               COUNT(DISTINCT CASE WHEN p2.role = 'from' THEN p1.email_id END),
+               MIN(e.date_sent), MAX(e.date_sent)
+        FROM participants p1
+        JOIN participants p2 ON p2.email_id = p1.email_id AND p2.address != p1.address
+        JOIN emails e ON e.id = p1.email_id
+        WHERE p1.address = ? AND (p1.role = 'from' OR p2.role = 'from'){dates}
+        GROUP BY p2.address
+        ORDER BY COUNT(DISTINCT p1.email_id) DESC
+        LIMIT ?
+    """, [address.lower()] + params + [limit])
+    return [{"address": r[0], "sent": r[1], "received": r[2], "first": r[3], "last": r[4]} for r in rows]
+
+def between(conn: sqlite3.Connection, a: str, b: str, limit: int = 100,
+            date_from: Optional[str] = None, date_to: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Emails échangés entre deux adresses (dans un sens ou l'autre), par date."""
+    dates, params = _dates(date_from, date_to)
+    rows = conn.execute(f"""
+        SELECT DISTINCT e.id, e.date_sent, e.sender_email, e.subject
+        FROM participants p1
+        JOIN participants p2 ON p2.email_id = p1.email_id
+        JOIN emails e ON e.id = p1.email_id
+        WHERE p1.address = ? AND p2.address = ? AND (p1.role = 'from' OR p2.role = 'from'){dates}
+        ORDER BY e.date_sent
+        LIMIT ?
+    """, [a.lower(), b.lower()] + params + [limit])
+    return [{"type": "email", "id": r[0], "date": r[1], "sender": r[2], "title": r[3]} for r in rows]
+
+def volume(conn: sqlite3.Connection, a: str, b: Optional[str] = None, period: str = "month",
+           date_from: Optional[str] = None, date_to: Optional[str] = None) -> List[Tuple[str, int]]:
+    """Emails par période (day, week, month, year) d'une adresse, ou échangés entre deux."""
+    dates, params = _dates(date_from, date_to)
+    bucket = timeline.period_sql(period, "e.date_sent")
+    if b is None:
+        sql = f"""
+            SELECT {bucket}, COUNT(DISTINCT p1.email_id)
+            FROM participants p1 JOIN emails e ON e.id = p1.email_id
+            WHERE p1.address = ? AND e.date_sent IS NOT NULL{dates}
+            GROUP BY 1 ORDER BY 1
+        """
+        params = [a.lower()] + params
+    else:
+        sql = f"""
+            SELECT {bucket}, COUNT(DISTINCT p1.email_id)
+            FROM participants p1
+            JOIN participants p2 ON p2.email_id = p1.email_id
+            JOIN emails e ON e.id = p1.email_id
+            WHERE p1.address = ? AND p2.address = ? AND (p1.role = 'from' OR p2.role = 'from')
+              AND e.date_sent IS NOT NULL{dates}
+            GROUP BY 1 ORDER BY 1
+        """
+        params = [a.lower(), b.lower()] + params
+    return conn.execute(sql, params).fetchall()
+
+def _neighbors(conn: sqlite3.Connection, frontier: Sequence[str]) -> List[Tuple[str, str]]:
+    """Arêtes (adresse de la frontière, voisin), une requête indexée par lot d'adresses."""
+    edges = []
+    for i in range(0, len(frontier), _CHUNK):
+        chunk = list(frontier[i:i + _CHUNK])
+        edges += conn.execute(f"""
+            SELECT DISTINCT p1.address, p2.address
+            FROM participants p1
+            JOIN participants p2 ON p2.email_id = p1.email_id AND p2.address != p1.address
+            WHERE p1.address IN ({','.join('?' * len(chunk))}) AND (p1.role = 'from' OR p2.role = 'from')
+        """, chunk).fetchall()
+    return edges
+
+def path(conn: sqlite3.Connection, a: str, b: str, max_hops: int = MAX_HOPS) -> Optional[List[str]]:
+    """
+    Plus courte chaîne de correspondants de a à b (recherche en largeur
+    bidirectionnelle: on étend toujours la plus petite frontière). None si
+    aucune chaîne de max_hops échanges au plus.
+    """
+    a, b = a.lower(), b.lower()
+    if a == b:
+        return [a]
+    parents = ({a: None}, {b: None})   # Côté a, côté b: adresse → adresse précédente
+    frontiers = ([a], [b])
+    for _ in range(max_hops):
+        side = 0 if len(frontiers[0]) <= len(frontiers[1]) else 1
+        if not frontiers[side]:
+            return None
+        seen, other = parents[side], parents[1 - side]
+        next_frontier = []
+        for node, neighbor in _neighbors(conn, frontiers[side]):
+            if neighbor in seen:
+                continue
+            seen[neighbor] = node
+            if neighbor in other:
+                return _join(parents, neighbor)
+            next_frontier.append(neighbor)
+        frontiers = (next_frontier, frontiers[1]) if side == 0 else (frontiers[0], next_frontier)
+    return None
+
+def _join(parents: Tuple[Dict[str, Optional[str]], Dict[str, Optional[str]]], meet: str) -> List[str]:
+    chain = []
+    node: Optional[str] = meet
+    while node is not None:
+        chain.append(node)
+        node = parents[0][node]
+    chain.reverse()
+    node = parents[1][meet]
+    while node is not None:
+        chain.append(node)
+        node = parents[1][node]
+    return chain
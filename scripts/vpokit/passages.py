@@ -0,0 +1,101 @@
+"""
+passages.py - Index des passages des documents et pièces jointes (passages_fts)
+
+documents_fts et attachments_fts indexent chaque texte d'un seul bloc: dans
+un PDF de 300 pages, la normalisation de longueur de bm25 noie la page
+pertinente et snippet() relit tout le document. Ici chaque page (découpée en
+fenêtres de PASSAGE_WORDS mots si elle est longue) est une ligne de
+passages_fts avec son numéro de page: classement et extrait ne coûtent que
+la taille du passage.
+
+Les triggers de init_db suppriment les passages d'une source modifiée ou
+supprimée; sync() découpe les sources qui n'en ont pas (fin de chaque
+import, python init_db.py --upgrade pour une base existante).
+"""
+
+import re
+import sqlite3
+from typing import Callable, List, Optional, Tuple
+
+from .vectors import chunk_spans
+
+PASSAGE_WORDS = 400        # ~500 tokens
+PASSAGE_OVERLAP = 50       # Mots repris du passage précédent (expression à cheval)
+COMMIT_EVERY = 200         # Sources découpées par transaction
+
+SOURCE_TYPES = ("document", "attachment")
+
+# Séparateur de pages de ingest_docs (PAGE_SEP, espaces normalisés)
+_PAGE_RE = re.compile(r"\s*--- PAGE ---\s*")
+
+_SOURCES = {
+    "document": "SELECT id, filename, extracted_text, doc_type = 'pdf' FROM documents",
+    "attachment": "SELECT id, filename, extracted_text, lower(filename) LIKE '%.pdf' FROM attachments",
+}
+
+def split(text: str, paged: bool = False) -> List[Tuple[Optional[int], int, int]]:
+    """
+    Passages (n° de page, début, fin) d'un texte; pages blanches ignorées.
+    Sans séparateur, la page vaut 1 si paged (PDF d'une page), None sinon.
+    """
+    bounds = [0]
+    for m in _PAGE_RE.finditer(text):
+        bounds.extend((m.start(), m.end()))
+    bounds.append(len(text))
+    has_pages = paged or len(bounds) > 2
+
+    spans = []
+    for page_no, i in enumerate(range(0, len(bounds), 2), 1):
+        start, end = bounds[i], bounds[i + 1]
+        for a, b in chunk_spans(text[start:end], PASSAGE_WORDS, PASSAGE_OVERLAP):
+            spans.append((page_no if has_pages else None, start + a, start + b))
+    return spans
+
+def store(conn: sqlite3.Connection, source_type: str, source_id: int,
+          title: Optional[str], text: Optional[str], paged: bool = False) -> int:
+    """Remplace les passages d'une source (sans commit); retourne leur nombre."""
+    conn.execute("DELETE FROM passages WHERE source_type = ? AND source_id = ?", (source_type, source_id))
+    spans = split(text or "", paged)
+    for passage_no, (page_no, start, end) in enumerate(spans):
+        cursor = conn.execute("""
+            INSERT INTO passages (source_type, source_id, page_no, passage_no, char_start, char_end)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (source_type, source_id, page_no, passage_no, start, end))
+        conn.execute("INSERT INTO passages_fts (rowid, title, text) VALUES (?, ?, ?)",
+                     (cursor.lastrowid, title, text[start:end]))
+    return len(spans)
+
+def missing(conn: sqlite3.Connection, source_type: str) -> List[int]:
+    """Sources avec du texte mais sans passages (nouvelles, modifiées, base antérieure)."""
+    table = "documents" if source_type == "document" else "attachments"
+    return [row[0] for row in conn.execute(f"""
+        SELECT s.id FROM {table} s
+        WHERE s.extracted_text IS NOT NULL AND s.extracted_text != ''
+          AND NOT EXISTS (SELECT 1 FROM passages p WHERE p.source_type = ? AND p.source_id = s.id)
+    """, (source_type,))]
+
+def sync(conn: sqlite3.Connection, progress: Optional[Callable[[int, int], None]] = None) -> int:
+    """Découpe toutes les sources sans passages (commit par lots); retourne le nombre de passages créés."""
+    todo = [(source_type, source_id) for source_type in SOURCE_TYPES
+            for source_id in missing(conn, source_type)]
+    created = 0
+    for done, (source_type, source_id) in enumerate(todo, 1):
+        row = conn.execute(f"{_SOURCES[source_type]} WHERE id = ?", (source_id,)).fetchone()
+        if row:
+            created += store(conn, source_type, source_id, row[1], row[2], bool(row[3]))
+        if done % COMMIT_EVERY == 0:
+            conn.commit()
+            if progress:
+                progress(done, len(todo))
+    conn.commit()
+    if progress and todo:
+        progress(len(todo), len(todo))
+    return created
+
+def available(conn: sqlite3.Connection) -> bool:
+    """Table des passages présente (base initialisée avec cette version)."""
+    try:
+        conn.execute("SELECT 1 FROM passages LIMIT 1")
+    except sqlite3.OperationalError:
+        return False
+    return True
@@ -0,0 +1,165 @@
+"""
+pipeline.py - Pipeline d'ingestion par étages (producteur/consommateur)
+
+    découverte → parsing (pool de processus) → vault → écriture DB
+
+Chaque étage tourne dans son propre thread; les files bornées entre étages
+donnent la contre-pression (un disque lent freine le parsing au lieu de
+remplir la mémoire). L'écriture DB reste sur un seul thread (SQLite n'a
+qu'un écrivain). L'ordre de découverte est conservé jusqu'à la DB.
+"""
+
+import os
+import queue
+import threading
+import time
+import traceback
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+_DONE = object()
+
+class StageStats:
+    """Compteurs d'un étage: éléments traités et temps actif."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.items = 0
+        self.busy = 0.0
+
+    def add(self, seconds: float, items: int = 1) -> None:
+        self.items += items
+        self.busy += seconds
+
+    def rate(self) -> float:
+        """Débit de l'étage en éléments/s de temps actif."""
+        return self.items / self.busy if self.busy > 0 else 0.0
+
+class _InlineExecutor:
+    """Exécuteur synchrone (workers=1): même pipeline, sans sous-processus."""
+
+    def submit(self, fn: Callable, *args) -> Future:
+        future: Future = Future()
+        future.set_result(fn(*args))
+        return future
+
+    def shutdown(self, wait: bool = True, cancel_futures: bool = False) -> None:
+        pass
+
+def _run_timed(parse_fn: Callable[[Any], Any], item: Any) -> Tuple[float, Any, Optional[str]]:
+    """Exécuté dans le worker: retourne (durée, résultat, erreur formatée)."""
+    start = time.perf_counter()
+    try:
+        result = parse_fn(item)
+        return time.perf_counter() - start, result, None
+    except Exception as e:
+        return time.perf_counter() - start, None, f"{e}\n{traceback.format_exc()}"
+
+def default_workers() -> int:
+    """Nombre de workers de parsing par défaut (cœurs - 1, au moins 1)."""
+    return max(1, (os.cpu_count() or 2) - 1)
+
+def run_pipeline(items: Iterable[Any],
+                 parse_fn: Callable[[Any], Any],
+                 vault_fn: Callable[[Any], Any],
+                 db_fn: Callable[[Any, Any, Optional[str]], None],
+                 workers: int = 1,
+                 queue_size: int = 64) -> Dict[str, StageStats]:
+    """
+    Fait passer chaque élément par parse_fn (pool), vault_fn puis db_fn.
+
+    parse_fn doit être une fonction de module (picklable). db_fn reçoit
+    (élément, résultat, erreur) et tourne dans le thread appelant.
+    Retourne les statistiques par étage.
+    """
+    stats = {name: StageStats(name) for name in ("discovery", "parse", "vault", "db")}
+    in_flight = threading.BoundedSemaphore(queue_size)
+    futures_q: "queue.Queue" = queue.Queue(maxsize=queue_size)
+    db_q: "queue.Queue" = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else _InlineExecutor()
+
+    def discover():
+        try:
+            iterator = iter(items)
+            while not stop.is_set():
+                start = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    break
+                stats["discovery"].add(time.perf_counter() - start)
+                while not in_flight.acquire(timeout=0.1):
+                    if stop.is_set():
+                        return
+                futures_q.put((item, executor.submit(_run_timed, parse_fn, item)))
+        except Exception as e:
+            failed: Future = Future()
+            failed.set_result((0.0, None, f"Découverte interrompue: {e}"))
+            in_flight.acquire()
+            futures_q.put((None, failed))
+        finally:
+            futures_q.put(_DONE)
+
+    def store():
+        while True:
+            entry = futures_q.get()
+            if entry is _DONE:
+                break
+            item, future = entry
+            try:
+                elapsed, result, error = future.result()
+            except Exception as e:  # Worker tué, résultat non picklable...
+                elapsed, result, error = 0.0, None, str(e)
+            finally:
+                in_flight.release()
+            stats["parse"].add(elapsed)
+
+            if error is None and not stop.is_set():
+                start = time.perf_counter()
+                try:
+                    result = vault_fn(result)
+                except Exception as e:
+                    result, error = None, f"Vault: {e}\n{traceback.format_exc()}"
+                stats["vault"].add(time.perf_counter() - start)
+            db_q.put((item, result, error))
+        db_q.put(_DONE)
+
+    threads = [
+        threading.Thread(target=discover, name="discovery", daemon=True),
+        threading.Thread(target=store, name="vault", daemon=True),
+    ]
+    for t in threads:
+        t.start()
+
+    try:
+        while True:
+            entry = db_q.get()
+            if entry is _DONE:
+                break
+            start = time.perf_counter()
+            db_fn(*entry)
+            stats["db"].add(time.perf_counter() - start)
+    except BaseException:
+        # Interruption (Ctrl+C, erreur DB): on annule le travail en attente
+        # et on vide la file DB pour que les étages amont se terminent.
+        stop.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+        while any(t.is_alive() for t in threads):
+            try:
+                db_q.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        raise
+
+    for t in threads:
+        t.join()
+    executor.shutdown()
+    return stats
+
+def print_stage_stats(stats: Dict[str, StageStats], wall: float, workers: int = 1) -> None:
+    """Affiche le débit par étage (le plus lent borne le débit global)."""
+    print(f"Pipeline: {wall:.1f} s, {stats['db'].items / wall if wall > 0 else 0:.1f} éléments/s")
+    for s in stats.values():
+        rate = s.rate() * (workers if s.name == "parse" else 1)
+        print(f"  {s.name:<10} {s.items:8d} éléments  {s.busy:8.1f} s actifs  {rate:10.1f} /s")
@@ -0,0 +1,594 @@
+"""
+querylang.py - Langage de requête de query_db.py, compilé en FTS5 + SQL
+
+    pension alimentaire              les deux mots (ET implicite)
+    "mise en demeure"                expression exacte
+    pension OR contribution          OU (aussi OU), parenthèses pour grouper
+    pension -avocat                  sans avocat (aussi NOT, SAUF)
+    expert NEAR/5 rapport            mots à 5 mots d'écart au plus (NEAR: 10)
+    pens*                            préfixe
+    subject:jugement                 dans le sujet (nom de fichier des documents)
+    from:jean.dupont@exemple.fr      expéditeur (adresse, @domaine ou nom)
+    to:dupont                        destinataires
+    type:email|attachment|document   type de source, ou type de fichier (type:pdf)
+    date:2023..2024                  période (date:2023-05, date:2023.., date:..2024-06-30),
+                                     date d'envoi ou date du document (doc_date)
+
+La requête est analysée en arbre, puis compilée pour chaque source: les
+termes deviennent une expression MATCH de la table FTS (filtres de
+colonne pour subject:/from:/to:), les champs structurés des prédicats SQL
+sur colonnes indexées (sender_email, date_sent, doc_date, doc_type). Le plan
+estime la sélectivité de chaque partie (fréquences des termes via
+fts5vocab, comptes bornés sur les index):
+
+- une source qu'aucun résultat ne peut satisfaire (type:pdf pour les
+  emails, terme absent du vocabulaire) n'est pas interrogée;
+- sans terme positif, la source est lue par ses index (from:, date:),
+  les exclusions devenant un anti-join sur l'index FTS;
+- avec des termes, l'index FTS mène (bm25, extrait) et les prédicats
+  sont évalués du plus sélectif au moins sélectif. FTS5 réévalue toute
+  l'expression pour chaque rowid sondé: partir d'un index SQL pour sonder
+  FTS ligne à ligne est toujours plus lent que l'inverse.
+"""
+
+import re
+import sqlite3
+import unicodedata
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+from . import extractors
+
+DEFAULT_NEAR = 10            # Distance de NEAR sans /n
+ESTIMATE_CAP = 10000         # Comptes sur index bornés (estimation, pas dénombrement)
+
+SOURCE_TYPES = ("email", "document", "attachment")
+# Source → (table, table FTS)
+SOURCES = {
+    "email": ("emails", "emails_fts"),
+    "document": ("documents", "documents_fts"),
+    "attachment": ("attachments", "attachments_fts"),
+}
+# Table FTS → champ texte → colonne FTS
+TEXT_COLUMNS = {
+    "emails_fts": {"subject": "subject", "from": "sender", "to": "recipients"},
+    "documents_fts": {"subject": "filename"},
+    "attachments_fts": {"subject": "filename"},
+    "passages_fts": {"subject": "title"},
+}
+TEXT_FIELDS = ("subject", "from", "to")
+FILTER_FIELDS = ("from", "type", "date")  # + "quality" (--min-quality), hors syntaxe
+
+OPERATORS = {"AND": "AND", "ET": "AND", "OR": "OR", "OU": "OR", "NOT": "NOT", "SAUF": "NOT"}
+
+class QueryError(ValueError):
+    """Requête mal formée (message destiné à l'utilisateur)."""
+
+# --- Arbre ---
+
+class Term(NamedTuple):
+    """Mot ou expression ("..."), avec préfixe (*) et champ texte éventuel."""
+    text: str
+    prefix: bool = False
+    field: Optional[str] = None
+
+class Near(NamedTuple):
+    terms: Tuple[Term, ...]
+    distance: int
+
+class Filter(NamedTuple):
+    """Champ structuré (from: adresse, type:, date:), compilé en SQL."""
+    field: str
+    value: str
+
+class Not(NamedTuple):
+    child: "Node"
+
+class And(NamedTuple):
+    children: Tuple["Node", ...]
+
+class Or(NamedTuple):
+    children: Tuple["Node", ...]
+
+Node = Union[Term, Near, Filter, Not, And, Or]
+
+# --- Analyse ---
+
+_TOKEN_RE = re.compile(r'''
+    \s*(?:
+      (?P<field_phrase>[A-Za-z]+):"(?P<fp_text>[^"]*)"?
+    | "(?P<phrase>[^"]*)"?
+    | (?P<paren>[()])
+    | (?P<neg>-)(?=[^\s()-])
+    | (?P<word>[^\s()"]+)
+    )''', re.VERBOSE)
+_FIELD_RE = re.compile(r"^([A-Za-z]+):(.+)$")
+_NEAR_RE = re.compile(r"^NEAR(?:/(\d+))?$")
+_DATE_RE = re.compile(r"^\d{4}(-\d{2}(-\d{2})?)?$")
+
+def _tokens(query: str) -> List[Tuple[str, str, Optional[str]]]:
+    """(genre, valeur, champ): 'term', 'phrase', 'field', 'op', 'near', '(', ')', '-'."""
+    tokens = []
+    pos = 0
+    while pos < len(query):
+        m = _TOKEN_RE.match(query, pos)
+        if not m or m.end() == pos:
+            break
+        pos = m.end()
+        if m.group("field_phrase"):
+            field = m.group("field_phrase").lower()
+            if field in TEXT_FIELDS + FILTER_FIELDS:
+                tokens.append(("field", m.group("fp_text"), field))
+            else:  # Pas un champ: mot suivi d'une expression
+                tokens += [("term", m.group("field_phrase"), None), ("phrase", m.group("fp_text"), None)]
+        elif m.group("phrase") is not None:
+            tokens.append(("phrase", m.group("phrase"), None))
+        elif m.group("paren"):
+            tokens.append((m.group("paren"), m.group("paren"), None))
+        elif m.group("neg"):
+            tokens.append(("-", "-", None))
+        elif m.group("word"):
+            word = m.group("word")
+            field = _FIELD_RE.match(word)
+            near = _NEAR_RE.match(word)
+            if field and field.group(1).lower() in TEXT_FIELDS + FILTER_FIELDS:
+                tokens.append(("field", field.group(2), field.group(1).lower()))
+            elif word in OPERATORS:
+                tokens.append(("op", OPERATORS[word], None))
+            elif near:
+                tokens.append(("near", word, None))
+            else:
+                tokens.append(("term", word, None))
+    return tokens
+
+def _term(text: str, field: Optional[str] = None) -> Term:
+    prefix = text.endswith("*")
+    text = text.rstrip("*")
+    if not _words(text):
+        raise QueryError(f"terme sans lettre ni chiffre: {text or '*'}")
+    return Term(text, prefix, field)
+
+def _field(value: str, field: str) -> Node:
+    if field in TEXT_FIELDS and not (field == "from" and "@" in value):
+        return _term(value, field)
+    value = value.strip()
+    if field == "type":
+        value = value.lower()
+        if value not in SOURCE_TYPES and value not in extractors.EXTENSIONS:
+            raise QueryError(f"type inconnu: {value} ({', '.join(SOURCE_TYPES + tuple(extractors.EXTENSIONS))})")
+    elif field == "date":
+        low, sep, high = value.partition("..")
+        if not any(bound and _DATE_RE.match(bound) for bound in (low, high)) or \
+                any(bound and not _DATE_RE.match(bound) for bound in (low, high)):
+            raise QueryError(f"date attendue AAAA[-MM[-JJ]] ou début..fin: {value}")
+        if not sep:
+            high = low
+        value = f"{low}..{high}"
+    return Filter(field, value.lower() if field == "from" else value)
+
+class _Parser:
+    """Descente récursive: OU < ET < NON < NEAR < primaire."""
+
+    def __init__(self, tokens: List[Tuple[str, str, Optional[str]]]):
+        self.tokens = tokens
+        self.pos = 0
+
+    def peek(self) -> Optional[Tuple[str, str, Optional[str]]]:
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def take(self) -> Tuple[str, str, Optional[str]]:
+        self.pos += 1
+        return self.tokens[self.pos - 1]
+
+    def or_expr(self) -> Node:
+        children = [self.and_expr()]
+        while self.peek() and self.peek()[:2] == ("op", "OR"):
+            self.take()
+            children.append(self.and_expr())
+        return children[0] if len(children) == 1 else Or(tuple(children))
+
+    def and_expr(self) -> Node:
+        children = [self.unary()]
+        while self.peek() and self.peek()[0] != ")" and self.peek()[:2] != ("op", "OR"):
+            if self.peek()[:2] == ("op", "AND"):
+                self.take()
+            children.append(self.unary())
+        return children[0] if len(children) == 1 else And(tuple(children))
+
+    def unary(self) -> Node:
+        token = self.peek()
+        if token and (token[0] == "-" or token[:2] == ("op", "NOT")):
+            self.take()
+            return Not(self.unary())
+        return self.near()
+
+    def near(self) -> Node:
+        first = self.primary()
+        terms = [first]
+        distance = DEFAULT_NEAR
+        while self.peek() and self.peek()[0] == "near":
+            distance = int(_NEAR_RE.match(self.take()[1]).group(1) or DEFAULT_NEAR)
+            terms.append(self.primary())
+        if len(terms) == 1:
+            return first
+        if not all(isinstance(t, Term) for t in terms):
+            raise QueryError("NEAR relie des mots ou des expressions")
+        if len({t.field for t in terms}) > 1:
+            raise QueryError("NEAR: tous les termes doivent viser le même champ")
+        return Near(tuple(terms), distance)
+
+    def primary(self) -> Node:
+        token = self.peek()
+        if token is None:
+            raise QueryError("terme attendu en fin de requête")
+        kind, value, field = self.take()
+        if kind == "(":
+            node = self.or_expr()
+            if not self.peek() or self.take()[0] != ")":
+                raise QueryError("parenthèse fermante manquante")
+            return node
+        if kind in ("term", "phrase"):
+            return _term(value)
+        if kind == "field":
+            return _field(value, field)
+        raise QueryError(f"terme attendu avant '{value}'")
+
+def parse(query: str) -> Node:
+    """Analyse une requête; QueryError si elle est mal formée."""
+    tokens = _tokens(query)
+    if not tokens:
+        raise QueryError("requête vide")
+    parser = _Parser(tokens)
+    node = parser.or_expr()
+    if parser.peek():
+        raise QueryError(f"'{parser.peek()[1]}' inattendu")
+    return node
+
+def with_filters(node: Node, doc_type: Optional[str] = None, date_from: Optional[str] = None,
+                 date_to: Optional[str] = None, min_quality: Optional[float] = None) -> Node:
+    """Ajoute à la requête les filtres des options (--type, --from/--to, --min-quality)."""
+    filters: List[Node] = []
+    if doc_type:
+        filters.append(Filter("type", doc_type))
+    if date_from or date_to:
+        filters.append(Filter("date", f"{date_from or ''}..{date_to or ''}"))
+    if min_quality is not None:
+        filters.append(Filter("quality", str(min_quality)))
+    if not filters:
+        return node
+    return And((*(node.children if isinstance(node, And) else (node,)), *filters))
+
+def _only_filters(node: Node) -> bool:
+    if isinstance(node, Filter):
+        return True
+    if isinstance(node, Not):
+        return _only_filters(node.child)
+    if isinstance(node, (And, Or)):
+        return all(_only_filters(child) for child in node.children)
+    return False
+
+def filters(node: Node) -> Node:
+    """
+    Champs structurés de la requête sans ses termes (filtres d'une recherche
+    non lexicale): conjonctions de tête gardées, branches mêlant termes et
+    champs ignorées.
+    """
+    if isinstance(node, And):
+        return And(tuple(filters(child) for child in node.children))
+    return node if _only_filters(node) else And(())
+
+def to_text(node: Node) -> str:
+    """Forme canonique de l'arbre, parenthèses explicites (--explain)."""
+    if isinstance(node, Term):
+        text = f'"{node.text}"' if " " in node.text else node.text
+        return f"{node.field + ':' if node.field else ''}{text}{'*' if node.prefix else ''}"
+    if isinstance(node, Near):
+        return f"NEAR({' '.join(to_text(t) for t in node.terms)}, {node.distance})"
+    if isinstance(node, Filter):
+        return f"{node.field}:{node.value}"
+    if isinstance(node, Not):
+        return f"NOT {to_text(node.child)}"
+    operator = " AND " if isinstance(node, And) else " OR "
+    return "(" + operator.join(to_text(child) for child in node.children) + ")"
+
+def plain_text(node: Node) -> str:
+    """Mots des termes positifs (texte à encoder pour la recherche sémantique)."""
+    if isinstance(node, Term):
+        return node.text
+    if isinstance(node, Near):
+        return " ".join(t.text for t in node.terms)
+    if isinstance(node, (And, Or)):
+        return " ".join(filter(None, (plain_text(child) for child in node.children)))
+    return ""
+
+# --- Compilation ---
+
+class Pred(NamedTuple):
+    """Prédicat SQL sur la table de la source; estimate: lignes attendues (None: inconnu)."""
+    sql: str
+    params: Tuple
+    estimate: Optional[int] = None
+    indexed: bool = False
+
+class _Part(NamedTuple):
+    """Compilation partielle: expression MATCH positive, exclusions FTS, prédicats SQL."""
+    match: Optional[str] = None
+    estimate: Optional[int] = None
+    exclude: Tuple[Tuple[str, Optional[int]], ...] = ()
+    where: Tuple[Pred, ...] = ()
+
+_TRUE = _Part()
+_FALSE = None
+
+def _words(text: str) -> List[str]:
+    """Jetons au sens du tokenizer unicode61 remove_diacritics (estimation des fréquences)."""
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return re.findall(r"[^\W_]+", text)
+
+def _quote(text: str) -> str:
+    return '"' + text.replace('"', '""') + '"'
+
+class _Compiler:
+    """Compile l'arbre pour une source et une table FTS (celle de la source ou passages_fts)."""
+
+    def __init__(self, conn: Optional[sqlite3.Connection], source: str, fts: str, alias: str):
+        self.conn = conn
+        self.source = source
+        self.table = SOURCES[source][0]
+        self.fts = fts
+        self.alias = alias
+        self._vocab: Dict[str, Optional[str]] = {}
+
+    # Estimations
+    def _vocab_table(self, fts: str) -> Optional[str]:
+        """Table fts5vocab temporaire (fréquence documentaire des termes), None si indisponible."""
+        if fts not in self._vocab:
+            name = f"temp.{fts}_vocab"
+            try:
+                self.conn.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS {name} USING fts5vocab(main, {fts}, 'row')")
+                self._vocab[fts] = name
+            except (sqlite3.Error, AttributeError):
+                self._vocab[fts] = None
+        return self._vocab[fts]
+
+    def _doc_count(self, fts: str, word: str, prefix: bool) -> Optional[int]:
+        vocab = self._vocab_table(fts)
+        if vocab is None:
+            return None
+        try:
+            if prefix:
+                return self.conn.execute(f"SELECT COALESCE(SUM(doc), 0) FROM {vocab} WHERE term >= ? AND term < ?",
+                                         (word, word + "\uffff")).fetchone()[0]
+            row = self.conn.execute(f"SELECT doc FROM {vocab} WHERE term = ?", (word,)).fetchone()
+        except sqlite3.Error:
+            return None
+        return row[0] if row else 0
+
+    def _term_estimate(self, fts: str, term: Term) -> Optional[int]:
+        """Une expression ne dépasse pas son mot le plus rare."""
+        words = _words(term.text)
+        counts = [self._doc_count(fts, w, term.prefix and i == len(words) - 1) for i, w in enumerate(words)]
+        return None if None in counts or not counts else min(counts)
+
+    def _count(self, sql: str, params: Sequence) -> Optional[int]:
+        """Lignes de la table qui satisfont un prédicat indexé (borné à ESTIMATE_CAP)."""
+        if self.conn is None:
+            return None
+        try:
+            return self.conn.execute(
+                f"SELECT COUNT(*) FROM (SELECT 1 FROM {self.table} {self.alias} WHERE {sql} LIMIT {ESTIMATE_CAP})",
+                list(params)
+            ).fetchone()[0]
+        except sqlite3.Error:
+            return None
+
+    # Texte
+    def _render(self, term: Term, fts: str) -> Optional[str]:
+        expr = _quote(term.text) + ("*" if term.prefix else "")
+        if term.field is None:
+            return expr
+        column = TEXT_COLUMNS[fts].get(term.field)
+        return f"{column} : {expr}" if column else None
+
+    def text(self, node: Union[Term, Near]) -> Optional[_Part]:
+        terms = node.terms if isinstance(node, Near) else (node,)
+        field = terms[0].field
+        if field is None or field in TEXT_COLUMNS[self.fts]:
+            return self._text_part(node, self.fts)
+        # Champ absent de cette table: pièce jointe → champ de l'email parent
+        if self.source == "attachment" and field in TEXT_COLUMNS["emails_fts"]:
+            part = self._text_part(node, "emails_fts")
+            sql = f"{self.alias}.email_id IN (SELECT rowid FROM emails_fts WHERE emails_fts MATCH ?)"
+            return _Part(where=(Pred(sql, (part.match,), part.estimate),))
+        return _FALSE
+
+    def _text_part(self, node: Union[Term, Near], fts: str) -> _Part:
+        if isinstance(node, Term):
+            return _Part(self._render(node, fts), self._term_estimate(fts, node))
+        phrases = " ".join(_quote(t.text) + ("*" if t.prefix else "") for t in node.terms)
+        expr = f"NEAR({phrases}, {node.distance})"
+        column = TEXT_COLUMNS[fts].get(node.terms[0].field) if node.terms[0].field else None
+        estimates = [self._term_estimate(fts, t) for t in node.terms]
+        return _Part(f"{column} : {expr}" if column else expr,
+                     None if None in estimates else min(estimates))
+
+    # Champs structurés
+    def filter(self, node: Filter) -> Optional[_Part]:
+        a = self.alias
+        if node.field == "type":
+            if node.value in SOURCE_TYPES:
+                return _TRUE if node.value == self.source else _FALSE
+            if self.source == "document":
+                return self._pred(f"{a}.doc_type = ?", (node.value,), indexed=False)
+            if self.source == "attachment":
+                exts = extractors.EXTENSIONS[node.value]
+                return self._pred("(" + " OR ".join(f"lower({a}.filename) LIKE ?" for _ in exts) + ")",
+                                  tuple(f"%{ext}" for ext in exts), indexed=False)
+            return _FALSE
+        if node.field == "quality":
+            if self.source != "document":
+                return _TRUE
+            return self._pred(f"({a}.ocr_quality IS NULL OR {a}.ocr_quality >= ?)", (float(node.value),),
+                              indexed=False)
+        if self.source == "document" and node.field == "from":  # Pas d'expéditeur
+            return _FALSE
+        if node.field == "from":
+            if node.value.startswith("@"):
+                conds, params, indexed = ["sender_email LIKE ?"], (f"%{node.value}",), False
+            else:
+                conds, params, indexed = ["sender_email = ?"], (node.value,), True
+        else:
+            low, _, high = node.value.partition("..")
+            column = "doc_date" if self.source == "document" else "date_sent"
+            bounds = [(f"{column} >= ?", low), (f"{column} < ?", high and high + "~")]  # ~: après tout suffixe ISO
+            conds = [cond for cond, value in bounds if value]
+            params, indexed = tuple(value for _, value in bounds if value), True
+        if self.source in ("email", "document"):
+            return self._pred(" AND ".join(f"{a}.{cond}" for cond in conds), params, indexed)
+        # Pièce jointe: champ de l'email parent
+        return self._pred(f"{a}.email_id IN (SELECT id FROM emails WHERE {' AND '.join(conds)})", params, indexed)
+
+    def _pred(self, sql: str, params: Tuple, indexed: bool) -> _Part:
+        return _Part(where=(Pred(sql, params, self._count(sql, params) if indexed else None, indexed),))
+
+    # Opérateurs
+    def compile(self, node: Node) -> Optional[_Part]:
+        if isinstance(node, (Term, Near)):
+            return self.text(node)
+        if isinstance(node, Filter):
+            return self.filter(node)
+        if isinstance(node, Not):
+            return self._not(self.compile(node.child))
+        parts = [self.compile(child) for child in node.children]
+        return self._and(parts) if isinstance(node, And) else self._or(parts)
+
+    def _and(self, parts: List[Optional[_Part]]) -> Optional[_Part]:
+        if any(p is _FALSE for p in parts):
+            return _FALSE
+        matches = [p for p in parts if p.match]
+        estimates = [p.estimate for p in matches]
+        return _Part(
+            match=" AND ".join(f"({p.match})" if len(matches) > 1 else p.match for p in matches) or None,
+            estimate=min(estimates) if estimates and None not in estimates else None,
+            exclude=tuple(e for p in parts for e in p.exclude),
+            where=tuple(w for p in parts for w in p.where),
+        )
+
+    def _or(self, parts: List[Optional[_Part]]) -> Optional[_Part]:
+        parts = [p for p in parts if p is not _FALSE]
+        if not parts:
+            return _FALSE
+        if any(p == _TRUE for p in parts):
+            return _TRUE
+        if len(parts) == 1:
+            return parts[0]
+        if all(p.match and not p.exclude and not p.where for p in parts):
+            estimates = [p.estimate for p in parts]
+            return _Part(" OR ".join(f"({p.match})" for p in parts),
+                         None if None in estimates else sum(estimates))
+        # Texte et champs mêlés: chaque branche devient un prédicat SQL
+        preds = [self._as_pred(p) for p in parts]
+        estimates = [p.estimate for p in preds]
+        return _Part(where=(Pred("(" + " OR ".join(p.sql for p in preds) + ")",
+                                 tuple(x for p in preds for x in p.params),
+                                 None if None in estimates else sum(estimates)),))
+
+    def _not(self, part: Optional[_Part]) -> Optional[_Part]:
+        if part is _FALSE:
+            return _TRUE
+        if part == _TRUE:
+            return _FALSE
+        if part.match and not part.exclude and not part.where:
+            return _Part(exclude=((part.match, part.estimate),))
+        pred = self._as_pred(part)
+        return _Part(where=(Pred(f"NOT {pred.sql}", pred.params),))
+
+    def _in_fts(self, match: str, negate: bool = False) -> str:
+        return f"{self.alias}.id {'NOT IN' if negate else 'IN'} (SELECT rowid FROM {self.fts} WHERE {self.fts} MATCH ?)"
+
+    def _as_pred(self, part: _Part) -> Pred:
+        """Compilation partielle → un seul prédicat SQL (sous-requêtes FTS sur rowid)."""
+        preds = list(part.where)
+        if part.match:
+            preds.insert(0, Pred(self._in_fts(part.match), (part.match,), part.estimate))
+        preds += [Pred(self._in_fts(expr, negate=True), (expr,)) for expr, _ in part.exclude]
+        estimates = [p.estimate for p in preds if p.estimate is not None]
+        return Pred("(" + " AND ".join(p.sql for p in preds) + ")",
+                    tuple(x for p in preds for x in p.params), min(estimates) if estimates else None)
+
+class Plan(NamedTuple):
+    """
+    Accès choisi pour une source: 'fts' (MATCH mène, bm25), 'index' (prédicats
+    indexés), 'scan' (lecture de la table), 'none' (aucun résultat possible).
+    """
+    source: str
+    access: str
+    match: Optional[str]
+    where: Tuple[Pred, ...]
+    estimate: Optional[int]
+    alias: str
+    fts: str
+
+    def where_sql(self) -> Tuple[str, List]:
+        """(' AND p1 AND p2', paramètres) des prédicats, dans l'ordre du plan."""
+        return ("".join(f" AND {p.sql}" for p in self.where),
+                [x for p in self.where for x in p.params])
+
+    def from_sql(self) -> Tuple[str, List]:
+        """FROM ... WHERE ... selon l'accès (alias de la table de la source)."""
+        table = SOURCES[self.source][0]
+        where, params = self.where_sql()
+        if self.match:
+            return (f"FROM {self.fts} JOIN {table} {self.alias} ON {self.alias}.id = {self.fts}.rowid "
+                    f"WHERE {self.fts} MATCH ?{where}", [self.match] + params)
+        return f"FROM {table} {self.alias} WHERE 1{where}", params
+
+    def describe(self) -> str:
+        """Plan lisible (query_db.py --explain)."""
+        if self.access == "none":
+            reason = "estimation nulle" if self.estimate == 0 else "filtres incompatibles avec la source"
+            return f"{self.source}: non interrogé ({reason})"
+        lines = [f"{self.source}: accès {self.access}"]
+        if self.match:
+            lines.append(f"  MATCH {self.fts}: {self.match}  (~{_fmt(self.estimate)} lignes)")
+        for p in self.where:
+            lines.append(f"  AND {p.sql}  {list(p.params)}  (~{_fmt(p.estimate)} lignes{', index' if p.indexed else ''})")
+        return "\n".join(lines)
+
+def _fmt(estimate: Optional[int]) -> str:
+    if estimate is None:
+        return "?"
+    return f"{estimate}+" if estimate >= ESTIMATE_CAP else str(estimate)
+
+def plan(conn: Optional[sqlite3.Connection], node: Node, source: str,
+         fts: Optional[str] = None, alias: str = "s") -> Plan:
+    """
+    Compile la requête pour une source. fts: table FTS visée (défaut: celle
+    de la source; 'passages_fts' pour les passages). Sans connexion, pas
+    d'estimation (ordre des prédicats conservé, aucune source écartée sur
+    le vocabulaire).
+    """
+    fts = fts or SOURCES[source][1]
+    compiler = _Compiler(conn, source, fts, alias)
+    part = compiler.compile(node)
+    # Estimations exactes ou majorantes: zéro pour une partie requise = aucun résultat
+    if part is _FALSE or (part.match and part.estimate == 0) or any(p.estimate == 0 for p in part.where):
+        return Plan(source, "none", None, (), 0 if part else None, alias, fts)
+
+    where = list(part.where)
+    match = part.match
+    if match:
+        for expr, _ in part.exclude:
+            match = f"({match}) NOT ({expr})"
+    else:
+        where += [Pred(compiler._in_fts(expr, negate=True), (expr,)) for expr, _ in part.exclude]
+    # Le plus sélectif d'abord; inconnus (LIKE, exclusions) en dernier
+    where.sort(key=lambda p: (p.estimate is None, p.estimate or 0))
+
+    if match:
+        access = "fts"
+    elif any(p.indexed for p in where):
+        access = "index"
+    else:
+        access = "scan"
+    return Plan(source, access, match, tuple(where), part.estimate, alias, fts)
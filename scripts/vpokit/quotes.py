@@ -0,0 +1,83 @@
+"""
+quotes.py - Segmentation d'un corps d'email: nouveau contenu / historique cité
+
+Chaque réponse d'un long fil reprend tout l'historique. On sépare le texte
+propre au message (indexé en FTS) des citations, en-têtes de transfert et
+signature (conservés dans body_text uniquement).
+"""
+
+import re
+from typing import List, Optional, Tuple
+
+# Séparateurs introduisant l'historique cité
+_SEPARATOR_RE = re.compile(
+    r"^\s*-{2,}\s*(original message|message d'origine|forwarded message|"
+    r"message transféré|ursprüngliche nachricht)\s*-{2,}\s*$",
+    re.IGNORECASE
+)
+_ATTRIBUTION_RE = re.compile(
+    r"^\s*(on\s.+\swrote|le\s.+\sa\s+écrit|am\s.+\sschrieb)\s*:\s*$",
+    re.IGNORECASE
+)
+_UNDERSCORE_RE = re.compile(r"^\s*_{10,}\s*$")
+_HEADER_FROM_RE = re.compile(r"^\s*\*?(from|de|von)\s*:", re.IGNORECASE)
+_HEADER_NEXT_RE = re.compile(
+    r"^\s*\*?(sent|envoyé|date|gesendet|to|à|an|subject|objet|betreff)\s*:",
+    re.IGNORECASE
+)
+_QUOTE_LINE_RE = re.compile(r"^\s*>")
+_SIGNATURE_RE = re.compile(r"^-- ?$")
+_MOBILE_RE = re.compile(
+    r"^\s*(sent from my|envoyé de mon|envoyé depuis mon|von meinem)\b",
+    re.IGNORECASE
+)
+
+def _is_header_block(lines: List[str], i: int) -> bool:
+    """Vrai si lines[i] ouvre un bloc d'en-têtes Outlook (De: ... Envoyé: ...)."""
+    if not _HEADER_FROM_RE.match(lines[i]):
+        return False
+    for line in lines[i + 1:i + 5]:
+        if _HEADER_NEXT_RE.match(line):
+            return True
+    return False
+
+def split_reply(text: Optional[str]) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Découpe un corps d'email.
+    Retourne: (nouveau_contenu, historique) - l'historique inclut citations,
+    en-têtes de transfert et signature. Si aucun nouveau contenu n'est trouvé
+    (transfert pur), le texte complet est retourné comme nouveau contenu.
+    """
+    if not text:
+        return text, None
+
+    lines = text.split("\n")
+    cut = len(lines)
+
+    for i, line in enumerate(lines):
+        if (_SEPARATOR_RE.match(line) or _ATTRIBUTION_RE.match(line)
+                or _is_header_block(lines, i)):
+            cut = i
+            # Ligne de soulignés Outlook juste avant l'en-tête
+            if cut > 0 and _UNDERSCORE_RE.match(lines[cut - 1]):
+                cut -= 1
+            break
+
+    new_lines = []
+    old_lines = []
+    in_signature = False
+    for line in lines[:cut]:
+        if not in_signature and (_SIGNATURE_RE.match(line) or _MOBILE_RE.match(line)):
+            in_signature = True
+        if in_signature or _QUOTE_LINE_RE.match(line):
+            old_lines.append(line)
+        else:
+            new_lines.append(line)
+    old_lines.extend(lines[cut:])
+
+    new_text = "\n".join(new_lines).strip()
+    if not new_text:
+        return text, None
+
+    quoted = "\n".join(old_lines).strip() or None
+    return new_text, quoted
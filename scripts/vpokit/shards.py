@@ -0,0 +1,202 @@
+"""
+shards.py - Corpus réparti en plusieurs bases (shards)
+
+Au-delà de quelques dizaines de Go, un seul fichier SQLite pèse: VACUUM
+et sauvegarde immobilisent toute la base. Un corps de dossier peut être
+réparti en bases indépendantes (schéma complet chacune), décrites par un
+manifeste JSON (<nom>.shards.json):
+
+    {"split": "year", "shards": {"2019": "affaire.2019.db", "undated": ...}}
+    {"split": "hash", "count": 4, "shards": {"0": "affaire.0.db", ...}}
+
+year: année de l'email (date d'envoi) ou du document (doc_date), 'undated'
+sans date; hash: préfixe du SHA256 du fichier, réparti uniformément.
+Un email et ses pièces jointes, une archive et ses membres vont dans la
+même base; deux copies d'un fichier (même hash, même date) aussi, le
+dédoublonnage par base reste donc exact. Les bases sont créées à la
+demande par les imports.
+
+La recherche (query_db.py) ouvre une connexion par base, les interroge
+en parallèle (threads: SQLite relâche le GIL) et fusionne les résultats
+par score bm25, comme search_fts fusionne déjà ses trois tables FTS.
+"""
+
+import json
+import os
+import sqlite3
+from pathlib import Path
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from . import fusion
+
+SPLITS = ("year", "hash")
+MANIFEST_SUFFIX = ".shards.json"
+UNDATED = "undated"
+DEFAULT_COUNT = 4            # Bases d'un découpage par hash
+
+class Manifest(NamedTuple):
+    """Découpage d'un corpus; shards: clé → chemin (relatif au manifeste)."""
+    path: Path
+    split: str
+    count: int
+    full_body_fts: bool
+    shards: Dict[str, str]
+
+def is_manifest(path: str) -> bool:
+    return path.endswith(".json")
+
+def create(path: str, split: str, count: int = DEFAULT_COUNT, full_body_fts: bool = False) -> Manifest:
+    """Écrit un manifeste vide (les bases viennent avec les imports)."""
+    if split not in SPLITS:
+        raise ValueError(f"Découpage inconnu: {split} ({', '.join(SPLITS)})")
+    manifest = Manifest(Path(path), split, count if split == "hash" else 0, full_body_fts, {})
+    save(manifest)
+    return manifest
+
+def load(path: str) -> Manifest:
+    data = json.loads(Path(path).read_text(encoding="utf-8"))
+    return Manifest(Path(path), data["split"], data.get("count", 0),
+                    data.get("full_body_fts", False), dict(data.get("shards", {})))
+
+def save(manifest: Manifest) -> None:
+    """Écriture atomique (un import interrompu ne laisse pas un manifeste tronqué)."""
+    data = {"split": manifest.split, "full_body_fts": manifest.full_body_fts, "shards": manifest.shards}
+    if manifest.split == "hash":
+        data["count"] = manifest.count
+    tmp = manifest.path.with_name(manifest.path.name + ".tmp")
+    tmp.write_text(json.dumps(data, indent=2, sort_keys=True), encoding="utf-8")
+    os.replace(tmp, manifest.path)
+
+def shard_key(manifest: Manifest, date: Optional[str], file_hash: Optional[str]) -> str:
+    """Base d'un élément: année de sa date, ou préfixe de son hash."""
+    if manifest.split == "year":
+        year = (date or "")[:4]
+        return year if year.isdigit() else UNDATED
+    return str(int(file_hash[:8], 16) % manifest.count) if file_hash else "0"
+
+def shard_path(manifest: Manifest, key: str) -> Path:
+    """Chemin de la base d'une clé (existante ou à créer à côté du manifeste)."""
+    name = manifest.shards.get(key)
+    if name is None:
+        stem = manifest.path.name[:-len(MANIFEST_SUFFIX)] if manifest.path.name.endswith(MANIFEST_SUFFIX) \
+            else manifest.path.stem
+        name = f"{stem}.{key}.db"
+    return manifest.path.parent / name
+
+def resolve(paths: Sequence[str]) -> List[Tuple[str, Path]]:
+    """
+    (nom, chemin) des bases désignées: bases simples et manifestes, mêlés
+    (recherche sur plusieurs dossiers). Nom: clé du shard, préfixée du
+    manifeste s'il y en a plusieurs.
+    """
+    resolved = []
+    for path in paths:
+        if not is_manifest(path):
+            resolved.append((Path(path).stem, Path(path)))
+            continue
+        manifest = load(path)
+        prefix = f"{Path(path).name[:-len(MANIFEST_SUFFIX)]}/" if len(paths) > 1 else ""
+        resolved += [(prefix + key, shard_path(manifest, key)) for key in sorted(manifest.shards)]
+    return resolved
+
+def manifest_of(db_path: str) -> Optional[Path]:
+    """Manifeste (dans le même dossier) qui liste cette base, s'il y en a un."""
+    path = Path(db_path)
+    for candidate in path.resolve().parent.glob("*" + MANIFEST_SUFFIX):
+        try:
+            manifest = load(str(candidate))
+        except (OSError, ValueError, KeyError):
+            continue
+        if path.name in manifest.shards.values():
+            return candidate
+    return None
+
+def prune(dbs: List[Tuple[str, Path]], date_from: Optional[str], date_to: Optional[str]) -> List[Tuple[str, Path]]:
+    """
+    Écarte les bases annuelles hors de la période (et les non datées, qu'un
+    filtre de date exclut). Sans effet sur les autres noms de base.
+    """
+    if not date_from and not date_to:
+        return dbs
+    kept = []
+    for name, path in dbs:
+        key = name.rsplit("/", 1)[-1]
+        if key == UNDATED:
+            continue
+        if key.isdigit() and len(key) == 4 and (
+                (date_from and key < date_from[:4]) or (date_to and key > date_to[:4])):
+            continue
+        kept.append((name, path))
+    return kept
+
+class Router:
+    """
+    Connexions d'écriture d'un import: une seule base, ou les shards d'un
+    manifeste ouverts (et créés par create_db) à la première ligne qui y va.
+    """
+
+    def __init__(self, db_path: str, create_db: Callable[[str, bool], None]):
+        self.manifest = load(db_path) if is_manifest(db_path) else None
+        self.create_db = create_db
+        self.conns: Dict[str, sqlite3.Connection] = {}
+        if self.manifest is None:
+            self.conns[""] = sqlite3.connect(db_path)
+        else:
+            for key in self.manifest.shards:
+                self.conns[key] = sqlite3.connect(str(shard_path(self.manifest, key)))
+
+    def conn_for(self, date: Optional[str] = None, file_hash: Optional[str] = None) -> sqlite3.Connection:
+        """Connexion de la base qui reçoit un élément (date, hash du fichier)."""
+        if self.manifest is None:
+            return self.conns[""]
+        key = shard_key(self.manifest, date, file_hash)
+        if key not in self.conns:
+            path = shard_path(self.manifest, key)
+            if not path.exists():
+                self.create_db(str(path), self.manifest.full_body_fts)
+            self.manifest.shards[key] = path.name
+            save(self.manifest)
+            self.conns[key] = sqlite3.connect(str(path))
+        return self.conns[key]
+
+    def connections(self) -> List[sqlite3.Connection]:
+        return list(self.conns.values())
+
+    def commit(self) -> None:
+        for conn in self.conns.values():
+            conn.commit()
+
+    def close(self) -> None:
+        for conn in self.conns.values():
+            conn.close()
+
+def search(dbs: List[Tuple[str, Path]], fn: Callable[[sqlite3.Connection], List[Dict[str, Any]]],
+           limit: int, budget: float) -> Tuple[List[Dict[str, Any]], Dict[str, str]]:
+    """
+    Lance fn(connexion) sur chaque base en parallèle (lecture seule) et
+    fusionne par score (bm25: plus petit = meilleur). Chaque résultat reçoit
+    'shard' (nom de sa base). Retourne (résultats, {base abandonnée: raison}).
+    """
+    conns: Dict[str, sqlite3.Connection] = {}
+    unavailable: Dict[str, str] = {}
+    for name, path in dbs:
+        try:
+            conns[name] = sqlite3.connect(path.resolve().as_uri() + "?mode=ro", uri=True,
+                                          check_same_thread=False)
+        except sqlite3.Error as e:
+            unavailable[name] = f"{e} ({path})"  # Shard déplacé ou illisible: les autres répondent
+
+    def leg(name: str) -> List[Dict[str, Any]]:
+        results = fn(conns[name])
+        for r in results:
+            r["shard"] = name
+        return results
+
+    lists, dropped = fusion.run_concurrently(
+        {name: (lambda name=name: leg(name)) for name in conns}, budget,
+        on_timeout={name: conn.interrupt for name, conn in conns.items()},
+        on_finish={name: conn.close for name, conn in conns.items()}
+    )
+    merged = [r for name in conns for r in lists.get(name, [])]
+    merged.sort(key=lambda r: r.get("score", 0))
+    return merged[:limit], {**unavailable, **dropped}
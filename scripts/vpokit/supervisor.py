@@ -0,0 +1,209 @@
+"""
+supervisor.py - Workers d'extraction supervisés (temps, mémoire, plantages)
+
+Un PDF pathologique peut bloquer PyMuPDF indéfiniment ou faire exploser
+la mémoire; dans un run séquentiel, tout s'arrête. Ici chaque fichier est
+traité par un processus worker surveillé:
+
+    - durée maximale par fichier (le worker est tué au-delà, avec ses
+      processus fils: ocrmypdf, tesseract)
+    - mémoire maximale (RSS, lue dans /proc ou via psutil; tué au-delà;
+      hors Linux, inactive sans psutil)
+    - plantage du worker (segfault, OOM killer) détecté et isolé
+
+Le worker fautif est remplacé et le fichier est retenté une fois en mode
+dégradé (fn(item, degraded=True)); en cas de nouvel échec, l'appelant
+reçoit la raison ('timeout', 'memory', 'crash', 'error') pour le mettre
+en quarantaine. Les autres workers continuent: un mauvais fichier ne
+bloque jamais le débit.
+"""
+
+import multiprocessing
+import os
+import signal
+import time
+import traceback
+from collections import deque
+from multiprocessing.connection import wait
+from typing import Any, Callable, Deque, Iterable, Iterator, NamedTuple, Optional, Tuple
+
+from . import extractors
+
+DEFAULT_TIMEOUT = 300                    # Secondes par fichier
+DEFAULT_MAX_MEMORY = 2048 * 1024 * 1024  # Octets (RSS) par worker
+POLL_INTERVAL = 0.5                      # Période de contrôle temps / mémoire
+
+class Outcome(NamedTuple):
+    """Résultat d'un fichier: result si succès, sinon reason + error."""
+    item: Any
+    result: Any
+    reason: Optional[str]   # None, 'error', 'timeout', 'memory', 'crash'
+    error: Optional[str]
+    degraded: bool
+    attempts: int
+
+def _worker_main(conn, fn: Callable[[Any, bool], Any]) -> None:
+    """Boucle du worker: reçoit (item, degraded), renvoie (ok, résultat ou (raison, détail))."""
+    if hasattr(os, "setpgrp"):
+        os.setpgrp()  # Groupe propre: kill() atteint aussi ocrmypdf / tesseract
+    while True:
+        try:
+            task = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            return
+        if task is None:
+            return
+        item, degraded = task
+        try:
+            reply = (True, fn(item, degraded))
+        except MemoryError:
+            reply = (False, ("memory", "MemoryError"))
+        except Exception as e:
+            reply = (False, ("error", f"{e}\n{traceback.format_exc()}"))
+        try:
+            conn.send(reply)
+        except Exception as e:  # Résultat non picklable
+            conn.send((False, ("error", f"Résultat non transmissible: {e}")))
+
+def rss_bytes(pid: int) -> Optional[int]:
+    """Mémoire résidente d'un processus (None si non mesurable)."""
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    if extractors.is_available("psutil"):
+        psutil = extractors.load("psutil")
+        try:
+            return psutil.Process(pid).memory_info().rss
+        except psutil.Error:
+            return None
+    return None
+
+class _Slot:
+    """Un worker et la tâche qu'il traite."""
+
+    def __init__(self, ctx, fn: Callable[[Any, bool], Any]):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child_conn, fn), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.task: Optional[Tuple[Any, bool, int]] = None
+        self.started = 0.0
+
+    def assign(self, task: Tuple[Any, bool, int]) -> None:
+        self.task = task
+        self.started = time.monotonic()
+        self.conn.send(task[:2])
+
+    def kill(self) -> None:
+        """Tue le worker et ses processus fils (groupe POSIX, sinon psutil)."""
+        if hasattr(os, "killpg"):
+            try:
+                os.killpg(self.process.pid, signal.SIGKILL)
+            except OSError:
+                pass  # Worker mort, ou pas encore dans son groupe
+        elif extractors.is_available("psutil"):
+            psutil = extractors.load("psutil")
+            try:
+                for child in psutil.Process(self.process.pid).children(recursive=True):
+                    child.kill()
+            except psutil.Error:
+                pass
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+def supervise(items: Iterable[Any], fn: Callable[[Any, bool], Any], workers: int = 1,
+              timeout: float = DEFAULT_TIMEOUT, max_memory: Optional[int] = DEFAULT_MAX_MEMORY,
+              retry_degraded: bool = True) -> Iterator[Outcome]:
+    """
+    Applique fn(item, degraded) à chaque élément dans des workers supervisés.
+    fn doit être une fonction de module (picklable). Les résultats sont
+    rendus dans l'ordre d'achèvement.
+    """
+    if max_memory and rss_bytes(os.getpid()) is None:
+        print(f"⚠ Limite mémoire ({max_memory // (1024 * 1024)} Mio) inactive: "
+              "RSS non mesurable sans /proc (pip install psutil)")
+    ctx = multiprocessing.get_context()
+    slots = [_Slot(ctx, fn) for _ in range(max(1, workers))]
+    retries: Deque[Tuple[Any, bool, int]] = deque()
+    source = iter(items)
+    exhausted = False
+
+    def failed(task: Tuple[Any, bool, int], reason: str, detail: str) -> Optional[Outcome]:
+        item, degraded, attempts = task
+        if retry_degraded and not degraded:
+            retries.append((item, True, attempts + 1))
+            return None
+        return Outcome(item, None, reason, detail, degraded, attempts)
+
+    try:
+        while True:
+            # Distribution: retentatives d'abord, puis nouveaux fichiers
+            for slot in slots:
+                if slot.task is not None:
+                    continue
+                if retries:
+                    slot.assign(retries.popleft())
+                elif not exhausted:
+                    try:
+                        slot.assign((next(source), False, 1))
+                    except StopIteration:
+                        exhausted = True
+
+            busy = [slot for slot in slots if slot.task is not None]
+            if not busy:
+                return
+
+            wait([s.conn for s in busy] + [s.process.sentinel for s in busy], timeout=POLL_INTERVAL)
+            now = time.monotonic()
+
+            for i, slot in enumerate(slots):
+                task = slot.task
+                if task is None:
+                    continue
+                outcome = None
+                restart = False
+                if slot.conn.poll():
+                    try:
+                        ok, payload = slot.conn.recv()
+                    except (EOFError, OSError):
+                        ok, payload, restart = False, ("crash", "worker interrompu"), True
+                    if ok:
+                        outcome = Outcome(task[0], payload, None, None, task[1], task[2])
+                    else:
+                        outcome = failed(task, *payload)
+                        # Après un MemoryError, le tas du worker est suspect
+                        restart = restart or payload[0] == "memory"
+                elif not slot.process.is_alive():
+                    outcome = failed(task, "crash", f"code de sortie {slot.process.exitcode}")
+                    restart = True
+                elif now - slot.started > timeout:
+                    outcome = failed(task, "timeout", f"plus de {timeout:.0f} s")
+                    restart = True
+                elif max_memory and (rss_bytes(slot.process.pid) or 0) > max_memory:
+                    outcome = failed(task, "memory", f"plus de {max_memory // (1024 * 1024)} Mio")
+                    restart = True
+                else:
+                    continue
+
+                slot.task = None
+                if restart:
+                    slot.kill()
+                    slots[i] = _Slot(ctx, fn)
+                if outcome is not None:
+                    yield outcome
+    finally:
+        for slot in slots:
+            if slot.task is not None:
+                slot.kill()
+            else:
+                try:
+                    slot.conn.send(None)
+                except OSError:
+                    pass
+        for slot in slots:
+            slot.process.join(timeout=5)
+            if slot.process.is_alive():
+                slot.process.kill()
@@ -0,0 +1,37 @@
+"""
+textnorm.py - Normalisation de texte pour l'ingestion (emails et documents)
+
+Fonctions appelées pour chaque email/document: motifs précompilés, et
+chaque passe n'est lancée que si le texte contient ce qu'elle corrige
+(les tests de sous-chaîne sont en C, bien moins coûteux qu'un re.sub).
+"""
+
+import re
+from functools import lru_cache
+from typing import Optional
+
+# Suite d'au moins 2 blancs, ou contenant une tabulation → un espace.
+# Un espace isolé ne matche pas: pas de remplacement inutile.
+_BLANKS_RE = re.compile(r"\t[ \t]*| [ \t]+")
+_NEWLINES_RE = re.compile(r"\n{3,}")
+_EMAIL_RE = re.compile(r"[\w\.-]+@[\w\.-]+\.\w+")
+
+def normalize_text(text: Optional[str]) -> Optional[str]:
+    """Nettoie le texte: fins de ligne, espaces multiples, lignes vides en série."""
+    if not text:
+        return None
+    if "\r\n" in text:
+        text = text.replace("\r\n", "\n")
+    if "\t" in text or "  " in text:
+        text = _BLANKS_RE.sub(" ", text)
+    if "\n\n\n" in text:
+        text = _NEWLINES_RE.sub("\n\n", text)
+    return text.strip()
+
+@lru_cache(maxsize=65536)
+def extract_email_address(sender: Optional[str]) -> Optional[str]:
+    """Extrait l'adresse email d'un champ sender (mémoïsé: peu d'expéditeurs distincts)."""
+    if not sender or "@" not in sender:
+        return None
+    match = _EMAIL_RE.search(sender)
+    return match.group(0).lower() if match else None
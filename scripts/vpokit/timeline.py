@@ -0,0 +1,259 @@
+"""
+timeline.py - Chronologie: dates des documents et cumul d'activité par jour
+
+Un document n'avait que created_at, la date d'import. Sa date est prise dans
+son texte (date annoncée en tête: lettre, acte), à défaut dans ses
+métadonnées (création PDF ou DOCX; pour un scan, c'est la date du scan):
+documents.doc_date, avec son origine dans doc_date_source ('text',
+'metadata', 'none').
+
+La table timeline cumule le nombre d'emails, pièces jointes (date de
+l'email) et documents par jour, et par jour et correspondant pour les
+emails: l'activité d'une période, par semaine ou par mois, se lit en
+quelques centaines de lignes au lieu d'un GROUP BY sur tout le corpus.
+Comme facets.py: les lignes nouvelles (rowid > max_rowid de
+timeline_state) sont ajoutées à la demande; les triggers de init_db
+marquent la source 'stale' quand une ligne déjà cumulée change, elle est
+alors recalculée.
+"""
+
+import io
+import re
+import sqlite3
+import zipfile
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+from . import dates, extractors, querylang
+
+SOURCES = ("email", "attachment", "document")
+COMMIT_EVERY = 500           # Documents datés par transaction (sync_dates)
+
+# Période → expression SQL sur une date ISO ({} : la colonne)
+PERIODS = {
+    "day": "substr({}, 1, 10)",
+    "week": "strftime('%Y-S%W', {})",
+    "month": "substr({}, 1, 7)",
+    "year": "substr({}, 1, 4)",
+}
+
+# Date de chaque source (alias s), pour les résultats d'une recherche
+DATE_COLUMNS = {
+    "email": "s.date_sent",
+    "attachment": "(SELECT date_sent FROM emails WHERE id = s.email_id)",
+    "document": "s.doc_date",
+}
+
+# Source → requêtes (address, day, n) des lignes de rowid > ?
+_ROLLUPS = {
+    "email": [
+        """SELECT '' AS address, substr(s.date_sent, 1, 10) AS day, COUNT(*) AS n FROM emails s
+           WHERE s.id > ? AND s.date_sent IS NOT NULL GROUP BY 2""",
+        """SELECT p.address, substr(s.date_sent, 1, 10) AS day, COUNT(DISTINCT s.id) AS n
+           FROM participants p JOIN emails s ON s.id = p.email_id
+           WHERE s.id > ? AND s.date_sent IS NOT NULL GROUP BY 1, 2""",
+    ],
+    "attachment": [
+        """SELECT '' AS address, substr(e.date_sent, 1, 10) AS day, COUNT(*) AS n
+           FROM attachments s JOIN emails e ON e.id = s.email_id
+           WHERE s.id > ? AND e.date_sent IS NOT NULL GROUP BY 2""",
+    ],
+    "document": [
+        """SELECT '' AS address, s.doc_date AS day, COUNT(*) AS n FROM documents s
+           WHERE s.id > ? AND s.doc_date IS NOT NULL GROUP BY 2""",
+    ],
+}
+
+_TABLES = {"email": "emails", "attachment": "attachments", "document": "documents"}
+
+Source = Union[Path, bytes]
+
+def period_sql(period: str, column: str) -> str:
+    """Expression SQL de la période (day, week, month, year) d'une date ISO."""
+    return PERIODS[period].format(column)
+
+# --- Dates des documents ---
+
+def _pdf_metadata_date(source: Source) -> Optional[str]:
+    fitz = extractors.load("pymupdf")
+    if fitz is None:
+        return None
+    try:
+        doc = fitz.open(str(source)) if isinstance(source, Path) else fitz.open(stream=source, filetype="pdf")
+    except Exception:
+        return None
+    metadata = doc.metadata or {}
+    doc.close()
+    return dates.metadata_date(metadata.get("creationDate")) or dates.metadata_date(metadata.get("modDate"))
+
+def _docx_metadata_date(source: Source) -> Optional[str]:
+    """dcterms:created (à défaut modified) de docProps/core.xml, lu dans le ZIP."""
+    try:
+        with zipfile.ZipFile(source if isinstance(source, Path) else io.BytesIO(source)) as zf:
+            xml = zf.read("docProps/core.xml").decode("utf-8", errors="replace")
+    except (KeyError, zipfile.BadZipFile, OSError):
+        return None
+    for tag in ("created", "modified"):
+        m = re.search(rf"<dcterms:{tag}[^>]*>([^<]+)<", xml)
+        if m and dates.metadata_date(m.group(1)):
+            return dates.metadata_date(m.group(1))
+    return None
+
+_METADATA = {"pdf": _pdf_metadata_date, "docx": _docx_metadata_date}
+
+def document_date(doc_type: Optional[str], source: Optional[Source],
+                  text: Optional[str]) -> Tuple[Optional[str], str]:
+    """
+    (date AAAA-MM-JJ, origine) d'un document: texte d'abord, puis
+    métadonnées (source: chemin ou contenu; None si indisponible).
+    """
+    day = dates.find_date(text)
+    if day:
+        return day, "text"
+    reader = _METADATA.get(doc_type or "")
+    if reader and source is not None:
+        day = reader(source)
+        if day:
+            return day, "metadata"
+    return None, "none"
+
+def sync_dates(conn: sqlite3.Connection, progress: Optional[Callable[[int, int], None]] = None) -> int:
+    """
+    Date les documents importés avant doc_date (texte, puis métadonnées du
+    fichier s'il est encore là). Retourne le nombre de documents traités.
+    """
+    todo = conn.execute(
+        "SELECT id, doc_type, file_path, extracted_text FROM documents WHERE doc_date_source IS NULL"
+    ).fetchall()
+    for done, (doc_id, doc_type, file_path, text) in enumerate(todo, 1):
+        path = Path(file_path) if file_path else None
+        day, origin = document_date(doc_type, path if path and path.is_file() else None, text)
+        conn.execute("UPDATE documents SET doc_date = ?, doc_date_source = ? WHERE id = ?",
+                     (day, origin, doc_id))
+        if done % COMMIT_EVERY == 0:
+            conn.commit()
+            if progress:
+                progress(done, len(todo))
+    conn.commit()
+    if progress and todo:
+        progress(len(todo), len(todo))
+    return len(todo)
+
+# --- Cumul par jour ---
+
+def _state(conn: sqlite3.Connection) -> Dict[str, Tuple[int, int]]:
+    return {source: (max_rowid, stale) for source, max_rowid, stale
+            in conn.execute("SELECT source_type, max_rowid, stale FROM timeline_state")}
+
+def _todo(conn: sqlite3.Connection) -> Tuple[List[str], Dict[str, Tuple[int, int]], Dict[str, int]]:
+    """Sources à compléter ou recalculer, état du cumul, dernier rowid de chaque table."""
+    state = _state(conn)
+    last = {source: conn.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table}").fetchone()[0]
+            for source, table in _TABLES.items()}
+    todo = [source for source in SOURCES
+            if source not in state or state[source][1] or state[source][0] < last[source]]
+    return todo, state, last
+
+def refresh(conn: sqlite3.Connection) -> bool:
+    """
+    Met le cumul à jour (lignes nouvelles, sources 'stale' recalculées).
+    False si la base n'est pas modifiable (lecture seule, occupée).
+    """
+    if not _todo(conn)[0]:
+        return True
+    try:
+        conn.execute("BEGIN IMMEDIATE")  # Aucun trigger 'stale' entre lecture et écriture
+        todo, state, last = _todo(conn)
+        for source in todo:
+            max_rowid, stale = state.get(source, (0, 1))
+            after = 0 if stale else max_rowid
+            if not after:
+                conn.execute("DELETE FROM timeline WHERE source_type = ?", (source,))
+            for sql in _ROLLUPS[source]:
+                conn.execute(f"""
+                    INSERT INTO timeline (address, source_type, day, n)
+                    SELECT address, ?, day, n FROM ({sql}) WHERE 1
+                    ON CONFLICT (address, source_type, day) DO UPDATE SET n = n + excluded.n
+                """, (source, after))
+            conn.execute("INSERT OR REPLACE INTO timeline_state (source_type, max_rowid, stale) VALUES (?, ?, 0)",
+                         (source, last[source]))
+        conn.commit()
+    except sqlite3.OperationalError:
+        # Lecture seule: BEGIN IMMEDIATE passe, la première écriture échoue
+        if conn.in_transaction:
+            conn.rollback()
+        return False
+    return True
+
+def _day_bounds(date_from: Optional[str], date_to: Optional[str]) -> Tuple[str, List[str]]:
+    sql, params = "", []
+    if date_from:
+        sql += " AND day >= ?"
+        params.append(date_from)
+    if date_to:
+        sql += " AND day < ?"
+        params.append(date_to + "~")  # Fin incluse: 2024-06 couvre tout juin
+    return sql, params
+
+def activity(conn: sqlite3.Connection, period: str = "month", date_from: Optional[str] = None,
+             date_to: Optional[str] = None, address: Optional[str] = None,
+             sources: Tuple[str, ...] = SOURCES) -> Dict[str, Dict[str, int]]:
+    """
+    Nombre d'éléments par période et par source ({période: {source: n}}),
+    lu dans le cumul. address: emails de ce correspondant seulement.
+    Base non modifiable et cumul en retard: calcul direct, plus lent.
+    """
+    sources = tuple(s for s in sources if not address or s == "email")
+    if not sources:
+        return {}
+    cte, table, cte_params = "", "timeline", []
+    if not refresh(conn):
+        # Mêmes requêtes que le cumul, sur toute la base
+        parts = [f"SELECT address, '{source}', day, n FROM ({sql})"
+                 for source in SOURCES for sql in _ROLLUPS[source]]
+        cte = f"WITH live(address, source_type, day, n) AS ({' UNION ALL '.join(parts)})"
+        table, cte_params = "live", [0] * len(parts)
+    day_filter, params = _day_bounds(date_from, date_to)
+    rows = conn.execute(f"""
+        {cte}
+        SELECT {period_sql(period, 'day')}, source_type, SUM(n) FROM {table}
+        WHERE address = ? AND source_type IN ({','.join('?' * len(sources))}){day_filter}
+        GROUP BY 1, 2 ORDER BY 1
+    """, cte_params + [(address or "").lower()] + list(sources) + params)
+    result: Dict[str, Dict[str, int]] = {}
+    for bucket, source, n in rows:
+        result.setdefault(bucket, {})[source] = n
+    return result
+
+def hits(conn: sqlite3.Connection, node: "querylang.Node", period: str = "month",
+         address: Optional[str] = None,
+         sources: Tuple[str, ...] = SOURCES) -> Dict[Optional[str], Dict[str, int]]:
+    """
+    Résultats d'une requête par période et par source (None: sans date).
+    Les dates de --from/--to sont dans la requête (querylang.with_filters).
+    """
+    result: Dict[Optional[str], Dict[str, int]] = {}
+    for source in sources:
+        if address and source != "email":
+            continue  # Correspondants: emails seulement, comme le cumul
+        plan = querylang.plan(conn, node, source)
+        if plan.access == "none":
+            continue
+        from_sql, params = plan.from_sql()
+        if address:
+            from_sql += " AND s.id IN (SELECT email_id FROM participants WHERE address = ?)"
+            params.append(address.lower())
+        rows = conn.execute(
+            f"SELECT {period_sql(period, DATE_COLUMNS[source])}, COUNT(*) {from_sql} GROUP BY 1", params
+        )
+        for bucket, n in rows:
+            result.setdefault(bucket, {})[source] = n
+    return result
+
+def available(conn: sqlite3.Connection) -> bool:
+    """Tables timeline présentes (base initialisée avec cette version)."""
+    try:
+        conn.execute("SELECT 1 FROM timeline_state LIMIT 1")
+    except sqlite3.OperationalError:
+        return False
+    return True
@@ -0,0 +1,20 @@
+"""
+tools.py - Détection mémorisée des outils externes (tesseract, ocrmypdf)
+
+On cherche l'exécutable dans le PATH (aucun sous-processus lancé) une seule
+fois par run, au lieu d'un '<outil> --version' à chaque démarrage et d'une
+FileNotFoundError à chaque fichier quand l'outil est absent.
+"""
+
+import shutil
+from functools import lru_cache
+from typing import Optional
+
+@lru_cache(maxsize=None)
+def which(tool: str) -> Optional[str]:
+    """Chemin de l'exécutable, ou None s'il n'est pas dans le PATH."""
+    return shutil.which(tool)
+
+def has_tool(tool: str) -> bool:
+    """Vrai si l'outil est disponible."""
+    return which(tool) is not None
@@ -0,0 +1,194 @@
+"""
+vault.py - Stockage des pièces jointes par hash (vault/ab/cd/<sha256><ext>)
+
+Sur disque lent ou partage réseau, ce sont les appels de métadonnées
+(mkdir, exists) qui dominent. Le vault garde en mémoire les blobs connus
+(amorcés depuis la table attachments) et les sous-dossiers déjà créés:
+un doublon ne coûte aucun appel système.
+
+Les nouveaux blobs sont écrits dans un fichier temporaire puis renommés
+(jamais de fichier partiel sous le nom final). fsync et renommage sont
+regroupés dans sync(), à appeler avant chaque commit DB: les lignes qui
+référencent un blob ne sont validées qu'une fois le blob durable.
+
+Les grosses pièces jointes ne transitent pas en mémoire entre étages:
+spool() les écrit par blocs dans vault/.staging/ en calculant le hash au
+fil de l'eau (utilisable depuis un worker), puis adopt() les range.
+"""
+
+import hashlib
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+from pathlib import Path
+from typing import BinaryIO, Iterator, List, Optional, Set, Tuple, Union
+
+STAGING_DIR = ".staging"
+CHUNK_SIZE = 1 << 20  # 1 Mio
+
+def spool(root: Path, source: Union[bytes, bytearray, memoryview, BinaryIO],
+          chunk_size: int = CHUNK_SIZE) -> Tuple[str, str, int]:
+    """
+    Écrit un contenu (bytes ou flux lisible) dans le staging du vault, par blocs.
+    Retourne: (chemin_temporaire, sha256, taille). Aucune copie complète en mémoire.
+    """
+    staging = Path(root) / STAGING_DIR
+    staging.mkdir(parents=True, exist_ok=True)
+    h = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=staging, suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            if isinstance(source, (bytes, bytearray, memoryview)):
+                view = memoryview(source)
+                chunks = (view[i:i + chunk_size] for i in range(0, len(view), chunk_size))
+            else:
+                chunks = iter(lambda: source.read(chunk_size), b'')
+            for chunk in chunks:
+                h.update(chunk)
+                f.write(chunk)
+                size += len(chunk)
+    except BaseException:
+        Path(tmp_path).unlink(missing_ok=True)
+        raise
+    return tmp_path, h.hexdigest(), size
+
+def iter_blob(vault_path: str, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """Lit une pièce jointe par blocs, quel que soit le format (fichier ou pack://)."""
+    from .packvault import URI_PREFIX, PackReader, parse_uri
+    if vault_path.startswith(URI_PREFIX):
+        root, name = parse_uri(vault_path)
+        yield from PackReader.for_root(root).iter_blob(name, chunk_size)
+        return
+    with open(vault_path, 'rb') as f:
+        yield from iter(lambda: f.read(chunk_size), b'')
+
+def read_blob(vault_path: str) -> bytes:
+    """Lit une pièce jointe entière (fichier ou pack://)."""
+    return b''.join(iter_blob(vault_path))
+
+class Vault:
+    """Vault de fichiers adressés par contenu, à écritures atomiques."""
+
+    def __init__(self, root: Path, fsync: bool = True):
+        self.root = Path(root)
+        self.fsync = fsync
+        self._known: Set[str] = set()
+        self._dirs: Set[Path] = set()
+        self._pending: List[Tuple[Path, Path]] = []
+        self._lock = threading.Lock()
+
+    def seed_from_db(self, conn: sqlite3.Connection) -> int:
+        """Charge les blobs déjà référencés en base; retourne leur nombre."""
+        try:
+            cursor = conn.execute(
+                "SELECT DISTINCT vault_path FROM attachments WHERE vault_path IS NOT NULL"
+            )
+        except sqlite3.OperationalError:
+            return 0
+        with self._lock:
+            for (vault_path,) in cursor:
+                self._known.add(Path(vault_path).name)
+            return len(self._known)
+
+    @staticmethod
+    def blob_name(file_hash: str, filename: Optional[str]) -> str:
+        """Nom du blob: hash + extension d'origine."""
+        ext = Path(filename).suffix if filename else ''
+        return f"{file_hash}{ext}"
+
+    def path_for(self, name: str) -> Path:
+        """Chemin d'un blob. Structure: vault/ab/cd/abcd1234...ext"""
+        return self.root / name[:2] / name[2:4] / name
+
+    def contains(self, name: str) -> bool:
+        with self._lock:
+            return name in self._known
+
+    def _ensure_dir(self, subdir: Path) -> None:
+        if subdir not in self._dirs:
+            subdir.mkdir(parents=True, exist_ok=True)
+            self._dirs.add(subdir)
+
+    def store_bytes(self, data: bytes, filename: Optional[str],
+                    file_hash: Optional[str] = None) -> str:
+        """Enregistre un blob (rendu visible au prochain sync), retourne son chemin."""
+        file_hash = file_hash or hashlib.sha256(data).hexdigest()
+        name = self.blob_name(file_hash, filename)
+        dest = self.path_for(name)
+
+        with self._lock:
+            if name in self._known:
+                return str(dest)
+            self._known.add(name)
+
+        try:
+            self._ensure_dir(dest.parent)
+            tmp = dest.parent / f".{name}.tmp"
+            with open(tmp, 'wb') as f:
+                f.write(data)
+        except BaseException:
+            with self._lock:
+                self._known.discard(name)
+            raise
+
+        with self._lock:
+            self._pending.append((tmp, dest))
+        return str(dest)
+
+    def adopt(self, tmp_path: str, file_hash: str, filename: Optional[str]) -> str:
+        """Range un fichier produit par spool() (supprimé si doublon), retourne son chemin."""
+        name = self.blob_name(file_hash, filename)
+        dest = self.path_for(name)
+
+        with self._lock:
+            duplicate = name in self._known
+            self._known.add(name)
+        if duplicate:
+            Path(tmp_path).unlink(missing_ok=True)
+            return str(dest)
+
+        try:
+            self._ensure_dir(dest.parent)
+        except BaseException:
+            with self._lock:
+                self._known.discard(name)
+            raise
+
+        with self._lock:
+            self._pending.append((Path(tmp_path), dest))
+        return str(dest)
+
+    def clean_staging(self) -> None:
+        """Supprime les fichiers temporaires laissés par un run interrompu."""
+        shutil.rmtree(self.root / STAGING_DIR, ignore_errors=True)
+
+    def sync(self) -> int:
+        """fsync des blobs en attente, renommage, fsync des dossiers. Retourne le nombre de blobs."""
+        with self._lock:
+            pending, self._pending = self._pending, []
+        if not pending:
+            return 0
+
+        if self.fsync:
+            for tmp, _ in pending:
+                fd = os.open(tmp, os.O_RDWR)  # Windows: FlushFileBuffers exige l'écriture
+                try:
+                    os.fsync(fd)
+                finally:
+                    os.close(fd)
+
+        for tmp, dest in pending:
+            os.replace(tmp, dest)
+
+        if self.fsync and hasattr(os, "O_DIRECTORY"):  # Pas de fsync de dossier sous Windows
+            for subdir in {dest.parent for _, dest in pending} | {tmp.parent for tmp, _ in pending}:
+                fd = os.open(subdir, os.O_RDONLY | os.O_DIRECTORY)
+                try:
+                    os.fsync(fd)
+                finally:
+                    os.close(fd)
+
+        return len(pending)
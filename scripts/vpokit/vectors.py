@@ -0,0 +1,510 @@
+"""
+vectors.py - Index vectoriel local pour la recherche sémantique (hors ligne)
+
+FTS5 ne trouve que les mots tapés: "pension alimentaire" manque les emails
+qui parlent de "contribution d'entretien". Ici chaque texte (corps
+d'email, document, pièce jointe) est découpé en passages de CHUNK_WORDS
+mots, et chaque passage devient un vecteur:
+
+    - par défaut, LSA: TF-IDF haché puis SVD tronquée apprise sur un
+      échantillon du corpus (les termes qui apparaissent dans les mêmes
+      passages se rapprochent, sans aucun modèle à télécharger)
+    - si sentence-transformers est installé: un modèle local sur CPU
+      (--model st:<nom>)
+
+Stockage dans <base>.vec/: vecteurs normalisés quantifiés en int8
+(vectors.i8, lu par memmap), modèle et index IVF dans model.npz. IVF:
+les vecteurs sont rangés par centroïde k-means; une requête ne parcourt
+que les nprobe listes les plus proches (plus la "queue" ajoutée par
+update depuis le dernier build). numpy n'est importé qu'à l'usage.
+"""
+
+import json
+import random
+import re
+import sqlite3
+import time
+import unicodedata
+import zlib
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from . import extractors
+from .ocrquality import LEXICON
+
+INDEX_VERSION = 1
+VEC_SUFFIX = ".vec"           # Dossier de l'index à côté de la base
+META_NAME = "meta.json"
+MODEL_NAME = "model.npz"
+VECTORS_NAME = "vectors.i8"
+
+DEFAULT_DIM = 256
+CHUNK_WORDS = 200             # Mots par passage
+CHUNK_OVERLAP = 40            # Mots repris du passage précédent
+STEM_LEN = 7                  # Troncature des mots (pluriels, conjugaisons)
+HASH_BITS = 20                # Espace de hachage des termes
+MAX_FEATURES = 50_000         # Termes gardés pour la projection (df >= 2)
+SVD_SAMPLE = 20_000           # Passages pour apprendre la projection
+SVD_OVERSAMPLE = 10
+SVD_POWER_ITER = 2
+KMEANS_SAMPLE = 100_000
+KMEANS_ITER = 10
+DEFAULT_NPROBE = 16           # Listes IVF parcourues par requête
+BATCH = 512                   # Passages encodés par lot
+QUANT = 127.0                 # Échelle int8 des vecteurs normalisés
+
+SOURCE_TYPES = ("email", "document", "attachment")
+
+_TOKEN_RE = re.compile(r"[^\W\d_]{2,}")
+_WORDS_RE = re.compile(r"\S+")
+
+def _strip_accents(text: str) -> str:
+    return "".join(c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c))
+
+_STOPWORDS = frozenset(_strip_accents(w) for w in LEXICON)
+
+def np_module():
+    """numpy, importé au premier besoin."""
+    np = extractors.load("numpy")
+    if np is None:
+        raise RuntimeError("La recherche sémantique demande numpy (pip install numpy)")
+    return np
+
+def vec_dir_for(db_path: str) -> Path:
+    """Dossier de l'index vectoriel d'une base (vpo_affaire.db → vpo_affaire.vec/)."""
+    return Path(db_path).with_suffix(VEC_SUFFIX)
+
+# ---------------------------------------------------------------------------
+# Textes et passages
+# ---------------------------------------------------------------------------
+
+def tokens(text: str) -> List[str]:
+    """Termes d'un texte: minuscules sans accents, mots vides retirés, tronqués."""
+    words = _TOKEN_RE.findall(_strip_accents(text.lower()))
+    return [w[:STEM_LEN] for w in words if w not in _STOPWORDS]
+
+@lru_cache(maxsize=1 << 18)
+def _feature(token: str) -> int:
+    return zlib.crc32(token.encode("utf-8")) & ((1 << HASH_BITS) - 1)
+
+def term_counts(text: str) -> Dict[int, int]:
+    counts: Dict[int, int] = {}
+    for token in tokens(text):
+        f = _feature(token)
+        counts[f] = counts.get(f, 0) + 1
+    return counts
+
+def chunk_spans(text: str, words: int = CHUNK_WORDS, overlap: int = CHUNK_OVERLAP) -> List[Tuple[int, int]]:
+    """Découpe un texte en passages (début, fin en caractères) de `words` mots."""
+    bounds = [(m.start(), m.end()) for m in _WORDS_RE.finditer(text)]
+    if not bounds:
+        return []
+    step = max(1, words - overlap)
+    spans = []
+    for first in range(0, len(bounds), step):
+        last = min(first + words, len(bounds)) - 1
+        spans.append((bounds[first][0], bounds[last][1]))
+        if last == len(bounds) - 1:
+            break
+    return spans
+
+_SOURCE_SQL = {
+    "email": "SELECT id, COALESCE(subject, '') || char(10) || char(10) || COALESCE(body_text, '') FROM emails",
+    "document": "SELECT id, COALESCE(extracted_text, '') FROM documents",
+    "attachment": "SELECT id, COALESCE(extracted_text, '') FROM attachments",
+}
+
+def source_text(conn: sqlite3.Connection, source_type: str, source_id: int) -> str:
+    """Texte indexé d'une source (mêmes offsets que lors de l'indexation)."""
+    row = conn.execute(_SOURCE_SQL[source_type] + " WHERE id = ?", (source_id,)).fetchone()
+    return row[1] if row else ""
+
+def source_texts(conn: sqlite3.Connection, source_type: str, source_ids: Sequence[int]) -> Dict[int, str]:
+    """Textes indexés de plusieurs sources d'un même type, en une requête."""
+    if not source_ids:
+        return {}
+    placeholders = ",".join("?" * len(source_ids))
+    return dict(conn.execute(f"{_SOURCE_SQL[source_type]} WHERE id IN ({placeholders})", list(source_ids)))
+
+def iter_chunks(conn: sqlite3.Connection, skip: Optional[set] = None
+                ) -> Iterator[Tuple[str, int, int, int, int, str]]:
+    """Itère (type, id, n° passage, début, fin, texte) sur toutes les sources indexables."""
+    for source_type in SOURCE_TYPES:
+        try:
+            cursor = conn.execute(_SOURCE_SQL[source_type])
+        except sqlite3.OperationalError:
+            continue
+        for source_id, text in cursor:
+            if skip and (source_type, source_id) in skip:
+                continue
+            for chunk_no, (start, end) in enumerate(chunk_spans(text)):
+                yield source_type, source_id, chunk_no, start, end, text[start:end]
+
+# ---------------------------------------------------------------------------
+# Modèles d'encodage
+# ---------------------------------------------------------------------------
+
+def _csr(rows: Sequence[Dict[int, float]]):
+    """Lignes creuses {colonne: valeur} → (indptr, indices, data)."""
+    np = np_module()
+    lengths = np.fromiter((len(r) for r in rows), dtype=np.int64, count=len(rows))
+    indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=indptr[1:])
+    indices = np.fromiter((c for r in rows for c in r), dtype=np.int64, count=int(indptr[-1]))
+    data = np.fromiter((v for r in rows for v in r.values()), dtype=np.float32, count=int(indptr[-1]))
+    return indptr, indices, data
+
+def _csr_dot(csr, dense, block: int = 256):
+    """Produit matrice creuse × dense, par blocs de lignes (mémoire bornée)."""
+    np = np_module()
+    indptr, indices, data = csr
+    n = len(indptr) - 1
+    out = np.zeros((n, dense.shape[1]), dtype=np.float32)
+    for r0 in range(0, n, block):
+        r1 = min(n, r0 + block)
+        a, b = indptr[r0], indptr[r1]
+        if a == b:
+            continue
+        prod = data[a:b, None] * dense[indices[a:b]]
+        starts = indptr[r0:r1]
+        nonempty = starts < indptr[r0 + 1:r1 + 1]
+        # Segments contigus: les lignes vides n'occupent aucun élément
+        out[r0:r1][nonempty] = np.add.reduceat(prod, starts[nonempty] - a, axis=0)
+    return out
+
+def _csr_tdot(csr, dense, n_cols: int):
+    """Produit transposé (matrice creuse)ᵀ × dense."""
+    np = np_module()
+    indptr, indices, data = csr
+    rows = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+    out = np.empty((n_cols, dense.shape[1]), dtype=np.float32)
+    for j in range(dense.shape[1]):
+        out[:, j] = np.bincount(indices, weights=data * dense[rows, j], minlength=n_cols)
+    return out
+
+class LsaModel:
+    """TF-IDF haché → projection SVD (LSA)."""
+
+    name = "lsa"
+
+    def __init__(self, features, idf, components):
+        self.features = features      # Identifiants de termes gardés, triés (int64)
+        self.idf = idf                # float32, un par terme
+        self.components = components  # float32, termes × dimensions
+        self.dim = components.shape[1]
+
+    def _rows(self, texts: Sequence[str]) -> List[Dict[int, float]]:
+        np = np_module()
+        rows = []
+        for text in texts:
+            counts = term_counts(text)
+            if not counts:
+                rows.append({})
+                continue
+            keys = np.fromiter(counts, dtype=np.int64, count=len(counts))
+            pos = np.searchsorted(self.features, keys)
+            pos[pos >= len(self.features)] = 0
+            known = self.features[pos] == keys
+            tf = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))[known]
+            cols = pos[known]
+            weights = (1.0 + np.log(tf)) * self.idf[cols]
+            norm = float(np.sqrt((weights * weights).sum())) or 1.0
+            rows.append(dict(zip(cols.tolist(), (weights / norm).tolist())))
+        return rows
+
+    def encode(self, texts: Sequence[str]):
+        """Vecteurs normalisés (lignes nulles si aucun terme connu)."""
+        np = np_module()
+        vecs = _csr_dot(_csr(self._rows(texts)), self.components)
+        norms = np.linalg.norm(vecs, axis=1, keepdims=True)
+        return vecs / np.where(norms > 0, norms, 1.0)
+
+    @classmethod
+    def fit(cls, texts: Sequence[str], dim: int = DEFAULT_DIM, seed: int = 0) -> "LsaModel":
+        """Apprend IDF et projection sur un échantillon de passages (SVD randomisée)."""
+        np = np_module()
+        samples = [term_counts(t) for t in texts]
+        samples = [s for s in samples if s]
+        if not samples:
+            raise ValueError("Aucun texte indexable")
+
+        df: Dict[int, int] = {}
+        for counts in samples:
+            for f in counts:
+                df[f] = df.get(f, 0) + 1
+        min_df = 2 if len(samples) >= 50 else 1
+        kept = sorted((f for f, n in df.items() if n >= min_df), key=lambda f: -df[f])[:MAX_FEATURES]
+        features = np.array(sorted(kept), dtype=np.int64)
+        n_docs = len(samples)
+        idf = np.array([np.log((1 + n_docs) / (1 + df[f])) + 1.0 for f in features.tolist()],
+                       dtype=np.float32)
+
+        model = cls(features, idf, np.zeros((len(features), 1), dtype=np.float32))
+        X = _csr([r for r in model._rows_from_counts(samples) if r])
+        n_rows, n_cols = len(X[0]) - 1, len(features)
+        k = max(1, min(dim + SVD_OVERSAMPLE, n_rows, n_cols))
+        rng = np.random.default_rng(seed)
+
+        Y = _csr_dot(X, rng.standard_normal((n_cols, k)).astype(np.float32))
+        for _ in range(SVD_POWER_ITER):
+            Q, _ = np.linalg.qr(Y)
+            Z, _ = np.linalg.qr(_csr_tdot(X, Q.astype(np.float32), n_cols))
+            Y = _csr_dot(X, Z.astype(np.float32))
+        Q, _ = np.linalg.qr(Y)
+        B = _csr_tdot(X, Q.astype(np.float32), n_cols).T
+        _, _, vt = np.linalg.svd(B, full_matrices=False)
+        components = np.ascontiguousarray(vt[:min(dim, k)].T, dtype=np.float32)
+        return cls(features, idf, components)
+
+    def _rows_from_counts(self, samples: List[Dict[int, int]]) -> List[Dict[int, float]]:
+        np = np_module()
+        index = {f: i for i, f in enumerate(self.features.tolist())}
+        rows = []
+        for counts in samples:
+            row = {index[f]: (1.0 + float(np.log(tf))) * float(self.idf[index[f]])
+                   for f, tf in counts.items() if f in index}
+            norm = sum(v * v for v in row.values()) ** 0.5 or 1.0
+            rows.append({c: v / norm for c, v in row.items()})
+        return rows
+
+    def arrays(self) -> Dict[str, Any]:
+        return {"features": self.features, "idf": self.idf, "components": self.components}
+
+class SentenceModel:
+    """Modèle local sentence-transformers (CPU)."""
+
+    def __init__(self, model_name: str):
+        st = extractors.load("sentence_transformers")
+        if st is None:
+            raise RuntimeError("Modèle demandé mais sentence-transformers absent")
+        self.name = f"st:{model_name}"
+        self.model = st.SentenceTransformer(model_name, device="cpu")
+        self.dim = self.model.get_sentence_embedding_dimension()
+
+    def encode(self, texts: Sequence[str]):
+        np = np_module()
+        return np.asarray(self.model.encode(list(texts), batch_size=64, normalize_embeddings=True,
+                                            show_progress_bar=False), dtype=np.float32)
+
+    def arrays(self) -> Dict[str, Any]:
+        return {}
+
+# ---------------------------------------------------------------------------
+# IVF
+# ---------------------------------------------------------------------------
+
+def quantize(vecs):
+    np = np_module()
+    return np.clip(np.rint(vecs * QUANT), -127, 127).astype(np.int8)
+
+def kmeans(vecs, n_lists: int, iterations: int = KMEANS_ITER, seed: int = 0):
+    """k-means sphérique (produit scalaire sur vecteurs normalisés)."""
+    np = np_module()
+    rng = np.random.default_rng(seed)
+    n_lists = min(n_lists, len(vecs))
+    centroids = vecs[rng.choice(len(vecs), n_lists, replace=False)].copy()
+    for _ in range(iterations):
+        assign = assign_lists(vecs, centroids)
+        order = np.argsort(assign, kind="stable")
+        counts = np.bincount(assign, minlength=n_lists)
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        empty = counts == 0
+        sums = np.zeros_like(centroids)
+        sums[~empty] = np.add.reduceat(vecs[order], starts[~empty], axis=0)
+        # Une liste vide repart d'un vecteur pris au hasard
+        sums[empty] = vecs[rng.choice(len(vecs), int(empty.sum()))]
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        centroids = sums / np.where(norms > 0, norms, 1.0)
+    return centroids.astype(np.float32)
+
+def assign_lists(vecs, centroids, block: int = 8192):
+    np = np_module()
+    out = np.empty(len(vecs), dtype=np.int64)
+    for i in range(0, len(vecs), block):
+        out[i:i + block] = np.argmax(vecs[i:i + block] @ centroids.T, axis=1)
+    return out
+
+def default_lists(count: int) -> int:
+    """Nombre de listes IVF: ~4·√n, entre 1 et 65536."""
+    return max(1, min(65536, int(4 * count ** 0.5), count))
+
+# ---------------------------------------------------------------------------
+# Construction
+# ---------------------------------------------------------------------------
+
+def _load_model(vec_dir: Path, meta: Dict[str, Any]):
+    np = np_module()
+    arrays = np.load(vec_dir / MODEL_NAME)
+    if meta["model"] == "lsa":
+        model = LsaModel(arrays["features"], arrays["idf"], arrays["components"])
+    else:
+        model = SentenceModel(meta["model"][3:])
+    return model, arrays
+
+def _encode_all(conn: sqlite3.Connection, model, out_path: Path, skip: Optional[set],
+                progress: Optional[Callable[[int], None]]) -> List[Tuple[str, int, int, int, int]]:
+    """Encode tous les passages (sauf sources déjà indexées) à la suite de out_path."""
+    np = np_module()
+    records = []
+    batch: List[Tuple[str, int, int, int, int, str]] = []
+
+    with open(out_path, "ab") as f:
+        def flush():
+            vecs = model.encode([c[5] for c in batch])
+            keep = np.linalg.norm(vecs, axis=1) > 0
+            f.write(quantize(vecs[keep]).tobytes())
+            records.extend(c[:5] for c, k in zip(batch, keep.tolist()) if k)
+            batch.clear()
+            if progress:
+                progress(len(records))
+
+        for chunk in iter_chunks(conn, skip):
+            batch.append(chunk)
+            if len(batch) >= BATCH:
+                flush()
+        if batch:
+            flush()
+    return records
+
+def build(conn: sqlite3.Connection, vec_dir: Path, dim: int = DEFAULT_DIM,
+          model_name: Optional[str] = None, n_lists: Optional[int] = None,
+          progress: Optional[Callable[[int], None]] = None) -> Dict[str, Any]:
+    """Reconstruit l'index complet (modèle, vecteurs, IVF) et la table vec_chunks."""
+    np = np_module()
+    vec_dir.mkdir(parents=True, exist_ok=True)
+    started = time.time()
+
+    if model_name:
+        model = SentenceModel(model_name)
+    else:
+        # Échantillon uniforme (réservoir) des passages pour apprendre la projection
+        rng = random.Random(0)
+        sample: List[str] = []
+        for seen, chunk in enumerate(iter_chunks(conn)):
+            if len(sample) < SVD_SAMPLE:
+                sample.append(chunk[5])
+            else:
+                j = rng.randint(0, seen)
+                if j < SVD_SAMPLE:
+                    sample[j] = chunk[5]
+        model = LsaModel.fit(sample, dim)
+        del sample
+
+    raw_path = vec_dir / (VECTORS_NAME + ".tmp")
+    raw_path.unlink(missing_ok=True)
+    records = _encode_all(conn, model, raw_path, None, progress)
+    count = len(records)
+    if not count:
+        raw_path.unlink(missing_ok=True)
+        raise ValueError("Aucun passage indexable")
+
+    raw = np.memmap(raw_path, dtype=np.int8, mode="r", shape=(count, model.dim))
+    sample_rows = np.sort(np.random.default_rng(0).choice(count, min(count, KMEANS_SAMPLE), replace=False))
+    centroids = kmeans(raw[sample_rows].astype(np.float32) / QUANT, n_lists or default_lists(count))
+    lists = len(centroids)
+    assign = np.concatenate([
+        assign_lists(raw[i:i + 65536].astype(np.float32) / QUANT, centroids)
+        for i in range(0, count, 65536)
+    ])
+    order = np.argsort(assign, kind="stable")
+    offsets = np.zeros(lists + 1, dtype=np.int64)
+    np.cumsum(np.bincount(assign, minlength=lists), out=offsets[1:])
+
+    # Vecteurs rangés par liste IVF: chaque liste est une tranche contiguë
+    tmp_path = vec_dir / (VECTORS_NAME + ".new")
+    with open(tmp_path, "wb") as f:
+        for i in range(0, count, 65536):
+            f.write(np.asarray(raw[order[i:i + 65536]]).tobytes())
+    del raw
+    raw_path.unlink()
+    tmp_path.replace(vec_dir / VECTORS_NAME)
+
+    np.savez(vec_dir / MODEL_NAME, centroids=centroids, offsets=offsets, **model.arrays())
+    conn.execute("DELETE FROM vec_chunks")
+    conn.executemany(
+        "INSERT INTO vec_chunks (vec_row, source_type, source_id, chunk_no, char_start, char_end) "
+        "VALUES (?, ?, ?, ?, ?, ?)",
+        ((row, *records[i]) for row, i in enumerate(order.tolist()))
+    )
+    conn.commit()
+
+    meta = {"version": INDEX_VERSION, "model": model.name, "dim": model.dim, "count": count,
+            "indexed": count, "lists": lists, "built_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "build_seconds": round(time.time() - started, 1)}
+    (vec_dir / META_NAME).write_text(json.dumps(meta, indent=2))
+    return meta
+
+def update(conn: sqlite3.Connection, vec_dir: Path,
+           progress: Optional[Callable[[int], None]] = None) -> Dict[str, Any]:
+    """
+    Ajoute les sources pas encore indexées à la fin de vectors.i8 (la "queue",
+    parcourue entièrement à chaque requête) avec le modèle existant. Un texte
+    modifié a perdu ses vec_chunks (triggers de init_db): il est réencodé.
+    """
+    meta = read_meta(vec_dir)
+    model, _ = _load_model(vec_dir, meta)
+    skip = set(conn.execute("SELECT DISTINCT source_type, source_id FROM vec_chunks"))
+    records = _encode_all(conn, model, vec_dir / VECTORS_NAME, skip, progress)
+    conn.executemany(
+        "INSERT INTO vec_chunks (vec_row, source_type, source_id, chunk_no, char_start, char_end) "
+        "VALUES (?, ?, ?, ?, ?, ?)",
+        ((meta["count"] + i, *rec) for i, rec in enumerate(records))
+    )
+    conn.commit()
+    meta["count"] += len(records)
+    (vec_dir / META_NAME).write_text(json.dumps(meta, indent=2))
+    return meta
+
+def read_meta(vec_dir: Path) -> Dict[str, Any]:
+    path = vec_dir / META_NAME
+    if not path.exists():
+        raise FileNotFoundError(f"Index vectoriel absent: {vec_dir} (python embed.py build)")
+    return json.loads(path.read_text())
+
+# ---------------------------------------------------------------------------
+# Recherche
+# ---------------------------------------------------------------------------
+
+class VectorIndex:
+    """Index ouvert en lecture (vecteurs en memmap)."""
+
+    def __init__(self, vec_dir: Path):
+        np = np_module()
+        self.meta = read_meta(vec_dir)
+        self.model, arrays = _load_model(vec_dir, self.meta)
+        self.centroids = arrays["centroids"]
+        self.offsets = arrays["offsets"]
+        self.vectors = np.memmap(vec_dir / VECTORS_NAME, dtype=np.int8, mode="r",
+                                 shape=(self.meta["count"], self.meta["dim"]))
+
+    def embed(self, text: str):
+        return self.model.encode([text])[0]
+
+    def search(self, query_vec, k: int = 20, nprobe: int = DEFAULT_NPROBE) -> List[Tuple[int, float]]:
+        """Top-k (vec_row, similarité cosinus) parmi les listes IVF les plus proches + la queue."""
+        np = np_module()
+        if not np.any(query_vec):
+            return []
+        q = query_vec.astype(np.float32)
+        lists = len(self.centroids)
+        probe = np.argsort(-(self.centroids @ q))[:min(nprobe, lists)]
+        segments = [(int(self.offsets[l]), int(self.offsets[l + 1])) for l in probe]
+        if self.meta["count"] > self.meta["indexed"]:
+            segments.append((self.meta["indexed"], self.meta["count"]))
+
+        rows, scores = [], []
+        for a, b in segments:
+            if a == b:
+                continue
+            rows.append(np.arange(a, b))
+            scores.append(self.vectors[a:b].astype(np.float32) @ q)
+        if not rows:
+            return []
+        rows, scores = np.concatenate(rows), np.concatenate(scores) / QUANT
+        if len(scores) > k:
+            top = np.argpartition(-scores, k)[:k]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.argsort(-scores[top])]
+        return [(int(rows[i]), float(scores[i])) for i in top]